@@ -0,0 +1,120 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how long it takes to hand messages to MHonArc.
+
+This archives messages with the MHonArc archiver one at a time, and in
+batches.  The command stands in for MHonArc; give another one to run MHonArc
+itself.
+
+A fresh SQLite database in a temporary directory is used, and thrown away
+afterward.
+
+Usage: python contrib/benchmarks/archive.py [messages] [batch size] [command]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from mailman.app.lifecycle import create_list
+from mailman.archiving.mhonarc import MHonArc
+from mailman.config import config
+from mailman.core.initialize import initialize
+from mailman.interfaces.domain import IDomainManager
+from mailman.testing.helpers import specialized_message_from_string as mfs
+from zope.component import getUtility
+
+
+DEFAULT_MESSAGES = 200
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_COMMAND = 'cat > /dev/null'
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+
+[database]
+class: mailman.database.sqlite.SQLiteDatabase
+url: sqlite:///{var_dir}/mailman.db
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+
+[archiver.mhonarc]
+configuration: {var_dir}/mhonarc.cfg
+"""
+
+MHONARC_CONFIG = """\
+[general]
+base_url: http://$hostname/archives/$fqdn_listname
+command: {command}
+batch_size: {batch_size}
+"""
+
+MESSAGE = """\
+From: anne@example.com
+To: test@example.com
+Subject: Message {0}
+Message-ID: <{0}@example.com>
+
+This is message {0}.
+"""
+
+
+def main(messages, batch_size, command):
+    var_dir = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(var_dir=var_dir))
+        initialize(config_file)
+        getUtility(IDomainManager).add('example.com')
+        mlist = create_list('test@example.com')
+        config.db.commit()
+        print('{0:>10} {1:>12} {2:>14}'.format(
+            'batch size', 'total (s)', 'message (ms)'))
+        for size in (1, batch_size):
+            with open(os.path.join(var_dir, 'mhonarc.cfg'), 'w') as fp:
+                fp.write(MHONARC_CONFIG.format(
+                    command=command, batch_size=size))
+            archiver = MHonArc()
+            start = time.perf_counter()
+            for i in range(messages):
+                archiver.archive_message(mlist, mfs(MESSAGE.format(i)))
+            archiver.flush(force=True)
+            seconds = time.perf_counter() - start
+            print('{0:>10} {1:>12.4f} {2:>14.2f}'.format(
+                size, seconds, seconds / messages * 1000))
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    messages = (int(arguments[0]) if len(arguments) > 0
+                else DEFAULT_MESSAGES)
+    batch_size = (int(arguments[1]) if len(arguments) > 1
+                  else DEFAULT_BATCH_SIZE)
+    command = arguments[2] if len(arguments) > 2 else DEFAULT_COMMAND
+    sys.exit(main(messages, batch_size, command))
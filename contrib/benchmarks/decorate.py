@@ -0,0 +1,111 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how long it takes to expand a personalized footer.
+
+This expands the footer template of a mailing list for many recipients, the
+way the decorate handler does for each recipient of a personalized message,
+with the filled in templates forgotten before each expansion, and without.
+
+A fresh SQLite database in a temporary directory is used, and thrown away
+afterward.
+
+Usage: python contrib/benchmarks/decorate.py [recipients]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.core.initialize import initialize
+from mailman.handlers import decorate
+from mailman.interfaces.domain import IDomainManager
+from zope.component import getUtility
+
+
+DEFAULT_RECIPIENTS = 1000
+
+FOOTER = """\
+_______________________________________________
+$display_name mailing list
+$fqdn_listname
+$listinfo_uri
+
+This message was sent to $user_address ($user_name).
+To change your options, visit $user_optionsurl
+"""
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+
+[database]
+class: mailman.database.sqlite.SQLiteDatabase
+url: sqlite:///{var_dir}/mailman.db
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+"""
+
+
+def main(recipients):
+    var_dir = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(var_dir=var_dir))
+        initialize(config_file)
+        getUtility(IDomainManager).add('example.com')
+        mlist = create_list('test@example.com')
+        mlist.display_name = 'Test'
+        config.db.commit()
+        print('{0:>10} {1:>12} {2:>16}'.format(
+            'cache', 'total (s)', 'recipient (us)'))
+        for name, clear in (('no', True), ('yes', False)):
+            decorate._decorations.clear()
+            start = time.perf_counter()
+            for i in range(recipients):
+                if clear:
+                    decorate._decorations.clear()
+                email = 'person{0}@example.com'.format(i)
+                decorate.decorate_template(mlist, FOOTER, dict(
+                    user_address=email,
+                    user_delivered_to=email,
+                    user_language='English (USA)',
+                    user_name='Person {0}'.format(i),
+                    user_optionsurl='http://example.com/options/' + email,
+                    ))
+            seconds = time.perf_counter() - start
+            print('{0:>10} {1:>12.4f} {2:>16.1f}'.format(
+                name, seconds, seconds / recipients * 1e6))
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    recipients = (int(arguments[0]) if len(arguments) > 0
+                  else DEFAULT_RECIPIENTS)
+    sys.exit(main(recipients))
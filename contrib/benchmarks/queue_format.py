@@ -0,0 +1,121 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare the cost of the pickle and raw queue file formats.
+
+For several message sizes, this measures the time it takes to enqueue a
+message, to dequeue it and use it, and to dequeue it and enqueue it again
+without looking at the message, as the retry runner and the outgoing runner
+do for deferred deliveries.
+
+Usage: python contrib/benchmarks/queue_format.py [size-in-kb ...]
+"""
+
+import sys
+import time
+import email
+import shutil
+import tempfile
+
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from mailman.core.switchboard import Switchboard
+from mailman.email.message import Message
+
+
+DEFAULT_SIZES = (1, 10, 100, 1000)
+ROUNDS = 200
+
+
+def make_message(kbytes):
+    outer = MIMEMultipart()
+    outer['From'] = 'anne@example.com'
+    outer['To'] = 'test@example.com'
+    outer['Subject'] = 'A benchmark message'
+    outer['Message-ID'] = '<benchmark@example.com>'
+    line = 'All work and no play makes Jack a dull boy.\n'
+    body = line * (kbytes * 1024 // len(line) + 1)
+    # Split the body over a few parts so that there's some structure to parse.
+    for i in range(4):
+        outer.attach(MIMEText(body[i::4]))
+    return email.message_from_string(outer.as_string(), Message)
+
+
+def timeit(function, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        function()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def measure(switchboard, msg, rounds):
+    def enqueue():
+        filebase = switchboard.enqueue(msg, listid='test.example.com')
+        switchboard.dequeue(filebase)
+        switchboard.finish(filebase)
+
+    def dequeue():
+        filebase = switchboard.enqueue(msg, listid='test.example.com')
+        start = time.perf_counter()
+        qmsg, qdata = switchboard.dequeue(filebase)
+        qmsg.get('message-id')
+        dequeue.elapsed += time.perf_counter() - start
+        switchboard.finish(filebase)
+    dequeue.elapsed = 0.0
+
+    def requeue():
+        filebase = switchboard.enqueue(msg, listid='test.example.com')
+        start = time.perf_counter()
+        qmsg, qdata = switchboard.dequeue(filebase)
+        new_filebase = switchboard.enqueue(qmsg, qdata)
+        switchboard.finish(filebase)
+        requeue.elapsed += time.perf_counter() - start
+        switchboard.dequeue(new_filebase)
+        switchboard.finish(new_filebase)
+    requeue.elapsed = 0.0
+
+    enqueue_cost = timeit(enqueue, rounds)
+    timeit(dequeue, rounds)
+    timeit(requeue, rounds)
+    return (enqueue_cost,
+            dequeue.elapsed / rounds * 1e6,
+            requeue.elapsed / rounds * 1e6)
+
+
+def main(sizes):
+    print('All times are in microseconds per message.  The enqueue column')
+    print('includes a dequeue of the entry that is not used.')
+    print('{:>8}  {:>7}  {:>10}  {:>10}  {:>10}'.format(
+        'size', 'format', 'enqueue', 'dequeue', 'requeue'))
+    for kbytes in sizes:
+        msg = make_message(kbytes)
+        rounds = max(10, ROUNDS // kbytes)
+        for queue_format in ('pickle', 'raw'):
+            queue_directory = tempfile.mkdtemp()
+            try:
+                switchboard = Switchboard(
+                    'bench', queue_directory, queue_format=queue_format)
+                results = measure(switchboard, msg, rounds)
+            finally:
+                shutil.rmtree(queue_directory)
+            print('{:>6}kB  {:>7}  {:>10.0f}  {:>10.0f}  {:>10.0f}'.format(
+                kbytes, queue_format, *results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES))
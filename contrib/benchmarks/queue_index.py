@@ -0,0 +1,95 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare the directory scanning and indexed switchboard file listings.
+
+For each queue size, this fills a temporary queue directory with empty .pck
+files, then measures how long it takes a runner to get its next batch of
+files, both by scanning the directory (the `poll` wakeup mode) and from the
+incremental queue index (the `notify` wakeup mode).  Between passes a few new
+entries are added, as would happen on a live system.
+
+Usage: python contrib/benchmarks/queue_index.py [size ...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+
+from mailman.core.switchboard import Switchboard
+from mailman.utilities.inotify import DirectoryWatcher
+
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+PASSES = 5
+ARRIVALS = 100
+BATCH = 100
+
+
+def make_entries(queue_directory, count, start):
+    for i in range(start, start + count):
+        now = repr(time.time() + i * 1e-6)
+        digest = hashlib.sha1(now.encode('utf-8')).hexdigest()
+        path = os.path.join(queue_directory, now + '+' + digest + '.pck')
+        # Mimic the switchboard: write a temporary file and rename it.
+        with open(path + '.tmp', 'wb'):
+            pass
+        os.rename(path + '.tmp', path)
+
+
+def measure(switchboard, queue_directory, size):
+    timings = []
+    for i in range(PASSES):
+        make_entries(queue_directory, ARRIVALS, size + i * ARRIVALS)
+        start = time.perf_counter()
+        files = switchboard.get_files(count=BATCH)
+        timings.append(time.perf_counter() - start)
+        assert len(files) == BATCH
+    return min(timings)
+
+
+def main(sizes):
+    print('{:>10}  {:>12}  {:>12}  {:>12}'.format(
+        'files', 'scan (ms)', 'index (ms)', 'build (ms)'))
+    for size in sizes:
+        queue_directory = tempfile.mkdtemp()
+        try:
+            make_entries(queue_directory, size, 0)
+            switchboard = Switchboard('bench', queue_directory)
+            scan = measure(switchboard, queue_directory, size)
+            watcher = DirectoryWatcher(queue_directory, '.pck')
+            if not watcher.is_notifying:
+                print('inotify is not available; cannot measure the index')
+                return 1
+            start = time.perf_counter()
+            switchboard.use_index(watcher)
+            build = time.perf_counter() - start
+            index = measure(switchboard, queue_directory,
+                            size + PASSES * ARRIVALS)
+            watcher.close()
+        finally:
+            shutil.rmtree(queue_directory)
+        print('{:>10}  {:>12.2f}  {:>12.2f}  {:>12.2f}'.format(
+            size, scan * 1000, index * 1000, build * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES))
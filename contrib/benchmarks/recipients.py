@@ -0,0 +1,173 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how long it takes to calculate a mailing list's recipients.
+
+For several roster sizes, this compares loading every regular delivery member
+and checking its delivery status in Python, the way the member-recipients
+handler used to, with asking the database for just the email addresses.
+Every tenth member gets digests, and every twentieth has delivery disabled,
+half of them through their address's preferences.
+
+The members are inserted directly into a fresh database, which is thrown away
+afterward.  By default this is a SQLite database in a temporary directory;
+give a database URL to use something else, e.g. PostgreSQL.  The database
+must be empty.
+
+Usage: python contrib/benchmarks/recipients.py [url] [size ...]
+"""
+
+import os
+import sys
+import time
+import uuid
+import shutil
+import tempfile
+
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.core.initialize import initialize
+from mailman.interfaces.domain import IDomainManager
+from mailman.interfaces.member import (
+    DeliveryMode, DeliveryStatus, MemberRole)
+from mailman.model.address import Address
+from mailman.model.member import Member
+from mailman.model.preferences import Preferences
+from zope.component import getUtility
+
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+CHUNK_SIZE = 10000
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+
+[database]
+class: {database}
+url: {url}
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+"""
+
+DATABASES = {
+    'sqlite': 'mailman.database.sqlite.SQLiteDatabase',
+    'postgres': 'mailman.database.postgresql.PostgreSQLDatabase',
+    }
+
+
+def populate(mlist, start, stop):
+    """Subscribe members start through stop-1 to the mailing list."""
+    engine = config.db.engine
+    for first in range(start, stop, CHUNK_SIZE):
+        last = min(first + CHUNK_SIZE, stop)
+        preferences = []
+        addresses = []
+        members = []
+        for i in range(first, last):
+            # Each member has two preference rows, the address's and the
+            # member's own.  Row ids are assigned here so that the rows can
+            # be inserted in bulk.
+            address_preferences = dict(id=2 * i + 1)
+            member_preferences = dict(id=2 * i + 2)
+            if i % 10 == 0:
+                member_preferences['delivery_mode'] = DeliveryMode.mime_digests
+            if i % 20 == 5:
+                member_preferences['delivery_status'] = DeliveryStatus.by_user
+            elif i % 20 == 15:
+                address_preferences['delivery_status'] = (
+                    DeliveryStatus.by_bounces)
+            preferences.extend((address_preferences, member_preferences))
+            email = 'person{0}@example.com'.format(i)
+            addresses.append(dict(
+                id=i + 1, email=email, _original=email,
+                preferences_id=2 * i + 1))
+            members.append(dict(
+                id=i + 1, _member_id=uuid.uuid4(), role=MemberRole.member,
+                list_id=mlist.list_id, address_id=i + 1,
+                preferences_id=2 * i + 2))
+        with engine.begin() as connection:
+            for table, rows in ((Preferences.__table__, preferences),
+                                (Address.__table__, addresses),
+                                (Member.__table__, members)):
+                # Fill in the missing columns, since the rows of one
+                # executemany() must all have the same keys.
+                keys = set().union(*rows)
+                connection.execute(table.insert(), [
+                    {key: row.get(key) for key in keys} for row in rows])
+
+
+def timeit(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(url, sizes):
+    var_dir = tempfile.mkdtemp()
+    try:
+        if url is None:
+            url = 'sqlite:///{0}/mailman.db'.format(var_dir)
+        scheme = url.split(':')[0].split('+')[0]
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(
+                var_dir=var_dir, url=url,
+                database=DATABASES.get(scheme, DATABASES['postgres'])))
+        initialize(config_file)
+        getUtility(IDomainManager).add('example.com')
+        mlist = create_list('test@example.com')
+        config.db.commit()
+
+        def scan():
+            return set(member.address.email
+                       for member in mlist.regular_members.members
+                       if member.delivery_status == DeliveryStatus.enabled)
+
+        def query():
+            return set(mlist.regular_members.get_emails(
+                DeliveryStatus.enabled))
+
+        print('{0:>10} {1:>12} {2:>12} {3:>10}'.format(
+            'members', 'scan (s)', 'query (s)', 'speedup'))
+        populated = 0
+        for size in sorted(sizes):
+            populate(mlist, populated, size)
+            populated = size
+            # Start each measurement with nothing cached in the session.
+            config.db.store.expire_all()
+            scan_time, scanned = timeit(scan)
+            config.db.store.expire_all()
+            query_time, queried = timeit(query)
+            assert scanned == queried, 'Different recipients'
+            print('{0:>10} {1:>12.3f} {2:>12.3f} {3:>9.1f}x'.format(
+                size, scan_time, query_time, scan_time / query_time))
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    url = None
+    if len(arguments) > 0 and '://' in arguments[0]:
+        url = arguments.pop(0)
+    sys.exit(main(url, [int(size) for size in arguments] or DEFAULT_SIZES))
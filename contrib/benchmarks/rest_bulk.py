@@ -0,0 +1,214 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how long it takes to subscribe many members over REST.
+
+This subscribes new addresses to a mailing list with a POST to /members for
+each of them, and other new addresses to another mailing list with a single
+bulk request to /members/bulk.  Then it unsubscribes the bulk members with
+another bulk request.  All the subscriptions are pre-verified, pre-confirmed
+and pre-approved, so they complete right away.
+
+The REST server runs in a child process, using a fresh database, which is
+thrown away afterward.  By default this is a SQLite database in a temporary
+directory; give a database URL to use something else, e.g. PostgreSQL.  The
+database must be empty.
+
+Usage: python contrib/benchmarks/rest_bulk.py [url] [members]
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import shutil
+import signal
+import tempfile
+import threading
+
+from http.client import HTTPConnection
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.core.initialize import initialize
+from mailman.interfaces.domain import IDomainManager
+from urllib.parse import urlencode
+from zope.component import getUtility
+
+
+DEFAULT_MEMBERS = 500
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+
+[database]
+class: {database}
+url: {url}
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+"""
+
+DATABASES = {
+    'sqlite': 'mailman.database.sqlite.SQLiteDatabase',
+    'postgres': 'mailman.database.postgresql.PostgreSQLDatabase',
+    }
+
+PRE = dict(pre_verified=True, pre_confirmed=True, pre_approved=True)
+
+
+def serve():
+    """Start a REST server in a child process, returning its pid and port."""
+    # The REST modules can only be imported once Mailman is initialized.
+    from mailman.rest import wsgiapp
+    server = wsgiapp.WSGIServer(
+        ('localhost', 0), wsgiapp.AdminWebServiceWSGIRequestHandler)
+    server.set_app(wsgiapp.make_application())
+    port = server.server_port
+    # The server must not share the database connections of this process.
+    config.db.store.close()
+    config.db.engine.dispose()
+    pid = os.fork()
+    if pid > 0:
+        server.socket.close()
+        return pid, port
+    # As in the REST runner, the server is stopped from another thread.
+    event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: event.set())
+    def stopper():
+        event.wait()
+        server.shutdown()
+    threading.Thread(target=stopper).start()
+    try:
+        server.serve_forever()
+        server.server_close()
+    finally:
+        os._exit(0)
+
+
+def post(port, path, body=None, content_type=None):
+    """Make a POST request, returning the status and the body."""
+    connection = HTTPConnection('localhost', port)
+    credentials = '{0}:{1}'.format(
+        config.webservice.admin_user, config.webservice.admin_pass)
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(
+            credentials.encode('utf-8')).decode('ascii'),
+        }
+    if content_type is not None:
+        headers['Content-Type'] = content_type
+    connection.request('POST', path, body, headers)
+    response = connection.getresponse()
+    content = response.read()
+    connection.close()
+    return response.status, content
+
+
+def single(port, members):
+    """Subscribe the members one request at a time."""
+    for i in range(members):
+        # The parameters are in the query string, which every version of
+        # Falcon reads.
+        status, content = post(port, '/3.0/members?' + urlencode(dict(
+            list_id='one.example.com',
+            subscriber='single{0}@example.com'.format(i),
+            **PRE)))
+        assert status == 201, (status, content)
+
+
+def bulk(port, members, action):
+    """Subscribe or unsubscribe the members with one request."""
+    rows = []
+    for i in range(members):
+        row = dict(action=action, list_id='two.example.com',
+                   subscriber='bulk{0}@example.com'.format(i))
+        if action == 'subscribe':
+            row.update(PRE)
+        rows.append(json.dumps(row) + '\n')
+    status, content = post(port, '/3.0/members/bulk',
+                           ''.join(rows).encode('utf-8'),
+                           'application/x-ndjson')
+    assert status == 200, (status, content)
+    results = [json.loads(line) for line in content.splitlines()]
+    expected = (201 if action == 'subscribe' else 204)
+    assert len(results) == members, len(results)
+    assert all(result['status'] == expected for result in results), results
+
+
+def timeit(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main(url, members):
+    var_dir = tempfile.mkdtemp()
+    try:
+        if url is None:
+            url = 'sqlite:///{0}/mailman.db'.format(var_dir)
+        scheme = url.split(':')[0].split('+')[0]
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(
+                var_dir=var_dir, url=url,
+                database=DATABASES.get(scheme, DATABASES['postgres'])))
+        initialize(config_file)
+        getUtility(IDomainManager).add('example.com')
+        for fqdn_listname in ('one@example.com', 'two@example.com'):
+            mlist = create_list(fqdn_listname)
+            # Don't send the new members any mail.
+            mlist.send_welcome_message = False
+        config.db.commit()
+        pid, port = serve()
+        try:
+            # Wait until the server is ready.
+            for i in range(100):
+                try:
+                    post(port, '/3.0/members/bulk')
+                    break
+                except ConnectionRefusedError:
+                    time.sleep(0.1)
+            print('{0} members'.format(members))
+            print('{0:>20} {1:>12} {2:>12}'.format(
+                'requests', 'total (s)', 'member (ms)'))
+            for name, function, args in (
+                    ('single subscribe', single, ()),
+                    ('bulk subscribe', bulk, ('subscribe',)),
+                    ('bulk unsubscribe', bulk, ('unsubscribe',)),
+                    ):
+                seconds = timeit(function, port, members, *args)
+                print('{0:>20} {1:>12.2f} {2:>12.2f}'.format(
+                    name, seconds, seconds / members * 1000))
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    url = None
+    if len(arguments) > 0 and '://' in arguments[0]:
+        url = arguments.pop(0)
+    members = int(arguments[0]) if len(arguments) > 0 else DEFAULT_MEMBERS
+    sys.exit(main(url, members))
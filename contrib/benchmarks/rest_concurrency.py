@@ -0,0 +1,231 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure the latency of REST requests while slow requests are running.
+
+Some clients keep requesting a whole roster, which is slow, while another
+client makes quick requests for the system versions.  This measures how long
+the quick requests take, and how many slow requests are done, with the REST
+server handling one request at a time, and with worker threads and worker
+processes.
+
+The members are inserted directly into a fresh database, which is thrown away
+afterward.  By default this is a SQLite database in a temporary directory;
+give a database URL to use something else, e.g. PostgreSQL.  The database
+must be empty.  Mailman only lets the REST server use workers with databases
+other than SQLite, but this benchmark only reads from the database, so it
+uses them with SQLite too.
+
+Usage: python contrib/benchmarks/rest_concurrency.py [url] [members]
+"""
+
+import os
+import sys
+import time
+import uuid
+import base64
+import shutil
+import signal
+import tempfile
+import threading
+
+from http.client import HTTPConnection
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.core.initialize import initialize
+from mailman.interfaces.domain import IDomainManager
+from mailman.interfaces.member import MemberRole
+from mailman.model.address import Address
+from mailman.model.member import Member
+from mailman.model.preferences import Preferences
+from zope.component import getUtility
+
+
+DEFAULT_MEMBERS = 5000
+CHUNK_SIZE = 10000
+SLOW_CLIENTS = 3
+WORKERS = 4
+DURATION = 5
+
+SLOW_PATH = '/3.0/lists/test.example.com/roster/member'
+QUICK_PATH = '/3.0/system/versions'
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+
+[database]
+class: {database}
+url: {url}
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+"""
+
+DATABASES = {
+    'sqlite': 'mailman.database.sqlite.SQLiteDatabase',
+    'postgres': 'mailman.database.postgresql.PostgreSQLDatabase',
+    }
+
+SERVERS = (
+    ('single', 'WSGIServer', {}),
+    ('threads', 'ThreadPoolWSGIServer', dict(workers=WORKERS)),
+    ('processes', 'PreforkWSGIServer', dict(workers=WORKERS)),
+    )
+
+
+def populate(mlist, start, stop):
+    """Subscribe members start through stop-1 to the mailing list."""
+    engine = config.db.engine
+    for first in range(start, stop, CHUNK_SIZE):
+        last = min(first + CHUNK_SIZE, stop)
+        preferences = []
+        addresses = []
+        members = []
+        for i in range(first, last):
+            # Each member has two preference rows, the address's and the
+            # member's own.  Row ids are assigned here so that the rows can
+            # be inserted in bulk.
+            preferences.extend((dict(id=2 * i + 1), dict(id=2 * i + 2)))
+            email = 'person{0}@example.com'.format(i)
+            addresses.append(dict(
+                id=i + 1, email=email, _original=email,
+                preferences_id=2 * i + 1))
+            members.append(dict(
+                id=i + 1, _member_id=uuid.uuid4(), role=MemberRole.member,
+                list_id=mlist.list_id, address_id=i + 1,
+                preferences_id=2 * i + 2))
+        with engine.begin() as connection:
+            for table, rows in ((Preferences.__table__, preferences),
+                                (Address.__table__, addresses),
+                                (Member.__table__, members)):
+                connection.execute(table.insert(), rows)
+
+
+def serve(class_name, kws):
+    """Start a REST server in a child process, returning its pid and port."""
+    # The REST modules can only be imported once Mailman is initialized.
+    from mailman.rest import wsgiapp
+    server = getattr(wsgiapp, class_name)(
+        ('localhost', 0), wsgiapp.AdminWebServiceWSGIRequestHandler, **kws)
+    server.set_app(wsgiapp.make_application())
+    port = server.server_port
+    # The server must not share the database connections of this process.
+    config.db.store.close()
+    config.db.engine.dispose()
+    pid = os.fork()
+    if pid > 0:
+        server.socket.close()
+        return pid, port
+    # As in the REST runner, the server is stopped from another thread.
+    event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: event.set())
+    def stopper():
+        event.wait()
+        server.shutdown()
+    threading.Thread(target=stopper).start()
+    try:
+        server.serve_forever()
+        server.server_close()
+    finally:
+        os._exit(0)
+
+
+def get(port, path):
+    """Make a GET request, returning how long it took."""
+    start = time.perf_counter()
+    connection = HTTPConnection('localhost', port)
+    credentials = '{0}:{1}'.format(
+        config.webservice.admin_user, config.webservice.admin_pass)
+    connection.request('GET', path, headers={
+        'Authorization': 'Basic ' + base64.b64encode(
+            credentials.encode('utf-8')).decode('ascii'),
+        })
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    assert response.status == 200, response.status
+    return time.perf_counter() - start
+
+
+def measure(port):
+    """Return the quick requests' latencies, and the slow requests' count."""
+    deadline = time.perf_counter() + DURATION
+    slow = []
+    def slow_client():
+        while time.perf_counter() < deadline:
+            slow.append(get(port, SLOW_PATH))
+    threads = [threading.Thread(target=slow_client)
+               for i in range(SLOW_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    quick = []
+    while time.perf_counter() < deadline:
+        quick.append(get(port, QUICK_PATH))
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    return sorted(quick), len(slow)
+
+
+def main(url, members):
+    var_dir = tempfile.mkdtemp()
+    try:
+        if url is None:
+            url = 'sqlite:///{0}/mailman.db'.format(var_dir)
+        scheme = url.split(':')[0].split('+')[0]
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(
+                var_dir=var_dir, url=url,
+                database=DATABASES.get(scheme, DATABASES['postgres'])))
+        initialize(config_file)
+        getUtility(IDomainManager).add('example.com')
+        mlist = create_list('test@example.com')
+        config.db.commit()
+        populate(mlist, 0, members)
+        print('{0} members, {1} clients requesting the roster, {2} workers'
+              .format(members, SLOW_CLIENTS, WORKERS))
+        print('{0:>10} {1:>12} {2:>12} {3:>12} {4:>10}'.format(
+            'server', 'median (s)', '95% (s)', 'max (s)', 'rosters'))
+        for name, class_name, kws in SERVERS:
+            pid, port = serve(class_name, kws)
+            try:
+                # Wait until the server is ready.
+                get(port, QUICK_PATH)
+                quick, slow = measure(port)
+            finally:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            print('{0:>10} {1:>12.4f} {2:>12.4f} {3:>12.4f} {4:>10}'.format(
+                name, quick[len(quick) // 2],
+                quick[int(len(quick) * 0.95)], quick[-1], slow))
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    url = None
+    if len(arguments) > 0 and '://' in arguments[0]:
+        url = arguments.pop(0)
+    members = int(arguments[0]) if len(arguments) > 0 else DEFAULT_MEMBERS
+    sys.exit(main(url, members))
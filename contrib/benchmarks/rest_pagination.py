@@ -0,0 +1,171 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how long it takes to page through a large roster over REST.
+
+For several roster sizes, this fetches a page of 25 members from the start,
+the middle and the end of the roster.  It compares sorting the whole roster
+in Python and slicing it, the way the REST API used to, with OFFSET and LIMIT
+in the database, and with paging by key, using the cursor of the previous
+page.
+
+The members are inserted directly into a fresh database, which is thrown away
+afterward.  By default this is a SQLite database in a temporary directory;
+give a database URL to use something else, e.g. PostgreSQL.  The database
+must be empty.
+
+Usage: python contrib/benchmarks/rest_pagination.py [url] [size ...]
+"""
+
+import os
+import sys
+import time
+import uuid
+import shutil
+import tempfile
+
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.core.initialize import initialize
+from mailman.interfaces.domain import IDomainManager
+from mailman.interfaces.member import MemberRole
+from mailman.model.address import Address
+from mailman.model.member import Member
+from mailman.model.preferences import Preferences
+from operator import attrgetter
+from zope.component import getUtility
+
+
+DEFAULT_SIZES = (10000, 100000)
+CHUNK_SIZE = 10000
+PAGE_SIZE = 25
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+
+[database]
+class: {database}
+url: {url}
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+"""
+
+DATABASES = {
+    'sqlite': 'mailman.database.sqlite.SQLiteDatabase',
+    'postgres': 'mailman.database.postgresql.PostgreSQLDatabase',
+    }
+
+
+def populate(mlist, start, stop):
+    """Subscribe members start through stop-1 to the mailing list."""
+    engine = config.db.engine
+    for first in range(start, stop, CHUNK_SIZE):
+        last = min(first + CHUNK_SIZE, stop)
+        preferences = []
+        addresses = []
+        members = []
+        for i in range(first, last):
+            # Each member has two preference rows, the address's and the
+            # member's own.  Row ids are assigned here so that the rows can
+            # be inserted in bulk.
+            preferences.extend((dict(id=2 * i + 1), dict(id=2 * i + 2)))
+            # Don't subscribe the members in email order.
+            email = 'person{0}@example.com'.format((i * 7919) % stop)
+            addresses.append(dict(
+                id=i + 1, email=email, _original=email,
+                preferences_id=2 * i + 1))
+            members.append(dict(
+                id=i + 1, _member_id=uuid.uuid4(), role=MemberRole.member,
+                list_id=mlist.list_id, address_id=i + 1,
+                preferences_id=2 * i + 2))
+        with engine.begin() as connection:
+            for table, rows in ((Preferences.__table__, preferences),
+                                (Address.__table__, addresses),
+                                (Member.__table__, members)):
+                connection.execute(table.insert(), rows)
+
+
+def timeit(function):
+    # Start each measurement with nothing cached in the session.
+    config.db.store.expire_all()
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(url, sizes):
+    var_dir = tempfile.mkdtemp()
+    try:
+        if url is None:
+            url = 'sqlite:///{0}/mailman.db'.format(var_dir)
+        scheme = url.split(':')[0].split('+')[0]
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(
+                var_dir=var_dir, url=url,
+                database=DATABASES.get(scheme, DATABASES['postgres'])))
+        initialize(config_file)
+        getUtility(IDomainManager).add('example.com')
+        mlist = create_list('test@example.com')
+        config.db.commit()
+        roster = mlist.members
+
+        print('{0:>10} {1:>8} {2:>12} {3:>12} {4:>12}'.format(
+            'members', 'page', 'sort (s)', 'offset (s)', 'key (s)'))
+        for size in sorted(sizes):
+            # The emails depend on the size, so start over every time.
+            with config.db.engine.begin() as connection:
+                for table in (Member.__table__, Address.__table__,
+                              Preferences.__table__):
+                    connection.execute(table.delete())
+            populate(mlist, 0, size)
+            for page in (1, size // PAGE_SIZE // 2, size // PAGE_SIZE):
+                start = (page - 1) * PAGE_SIZE
+                def sort():
+                    members = sorted(roster.members,
+                                     key=attrgetter('address.email'))
+                    return members[start:start + PAGE_SIZE]
+                def offset():
+                    return roster.sorted_members[start:start + PAGE_SIZE]
+                # The key of the last member on the previous page, as a
+                # client paging with the cursor would have.
+                after = (None if start == 0 else
+                         roster.sorted_members.page(start)[1])
+                def key():
+                    return roster.sorted_members.page(PAGE_SIZE, after)[0]
+                sort_time, sorted_page = timeit(sort)
+                offset_time, offset_page = timeit(offset)
+                key_time, key_page = timeit(key)
+                assert sorted_page == offset_page == key_page, 'Bad page'
+                print('{0:>10} {1:>8} {2:>12.4f} {3:>12.4f} {4:>12.4f}'.format(
+                    size, page, sort_time, offset_time, key_time))
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    url = None
+    if len(arguments) > 0 and '://' in arguments[0]:
+        url = arguments.pop(0)
+    sys.exit(main(url, [int(size) for size in arguments] or DEFAULT_SIZES))
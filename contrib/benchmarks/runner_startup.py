@@ -0,0 +1,123 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how long it takes the master watcher to start runners.
+
+For several numbers of runners, this starts that many virgin runners, and
+waits until each of them has logged that it started.  This is done with every
+runner exec'ing bin/runner, and with the runners forked from a zygote.  For
+the zygote, both a cold start, which includes starting the zygote itself, and
+a restart with the zygote already running are measured.
+
+Everything happens in a temporary directory, which is thrown away afterward.
+
+Usage: python contrib/benchmarks/runner_startup.py [count ...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+
+from mailman.bin.master import Loop
+from mailman.config import config
+from mailman.core.initialize import initialize
+
+
+DEFAULT_COUNTS = (1, 8, 32)
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+
+[runner.virgin]
+dispatch: claim
+"""
+
+STARTED = 'virgin runner started.'
+
+
+def start(loop, log_file, count):
+    """Start the runners, returning the time until all have started."""
+    with open(log_file) as fp:
+        fp.seek(0, os.SEEK_END)
+        begin = time.perf_counter()
+        for slice_number in range(count):
+            spec = 'virgin:{0}:{1}'.format(slice_number, count)
+            pid = loop._start_runner(spec)
+            loop._kids.add(pid, ('virgin', slice_number, count, 0))
+        # Wait until every runner has logged its start.
+        started = 0
+        while started < count:
+            line = fp.readline()
+            if line == '':
+                time.sleep(0.001)
+            elif STARTED in line:
+                started += 1
+        return time.perf_counter() - begin
+
+
+def stop(loop):
+    for pid in loop._kids:
+        os.kill(pid, signal.SIGTERM)
+    while len(loop._kids) > 0:
+        pid, status = (loop._wait() if loop._zygote_mode else os.wait())
+        loop._kids.drop(pid)
+
+
+def main(counts):
+    var_dir = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(var_dir=var_dir))
+        initialize(config_file)
+        log_file = os.path.join(config.LOG_DIR, 'mailman.log')
+        open(log_file, 'a').close()
+        print('{0:>8} {1:>12} {2:>12} {3:>12}'.format(
+            'runners', 'exec (s)', 'zygote (s)', 'warm (s)'))
+        for count in counts:
+            loop = Loop(config_file=config_file)
+            exec_time = start(loop, log_file, count)
+            stop(loop)
+            config.push('zygote', '[mailman]\nzygote: yes')
+            try:
+                loop = Loop(config_file=config_file)
+            finally:
+                config.pop('zygote')
+            zygote_time = start(loop, log_file, count)
+            stop(loop)
+            warm_time = start(loop, log_file, count)
+            stop(loop)
+            loop.cleanup()
+            print('{0:>8} {1:>12.3f} {2:>12.3f} {3:>12.3f}'.format(
+                count, exec_time, zygote_time, warm_time), flush=True)
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main([int(count) for count in sys.argv[1:]] or DEFAULT_COUNTS))
@@ -0,0 +1,153 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure SMTP sessions per second with and without connection pooling.
+
+This starts a small local SMTP sink, standing in for the outgoing MTA, which
+throws away everything it receives.  To make the number of round trips
+visible on the loopback interface, the sink waits for a simulated round trip
+time before it sends each batch of replies.  It advertises PIPELINING.
+
+Three ways of sending are compared:
+
+* a new connection for every message, which is what happened when every
+  delivery made its own connection;
+* connections from a `ConnectionPool`, without pipelining;
+* connections from a `ConnectionPool`, with pipelining.
+
+Usage: python contrib/benchmarks/smtp_pool.py [messages [recipients [rtt]]]
+
+where rtt is the simulated round trip time in milliseconds.
+"""
+
+import sys
+import time
+import threading
+import socketserver
+
+from mailman.config import config
+from mailman.mta.connection import Connection, ConnectionPool
+
+
+DEFAULT_MESSAGES = 200
+DEFAULT_RECIPIENTS = 10
+DEFAULT_RTT = 2.0
+
+MESSAGE = """\
+From: anne@example.com
+To: test@example.com
+Subject: benchmark
+
+Hello.
+"""
+
+
+class SinkHandler(socketserver.BaseRequestHandler):
+    """Just enough of an SMTP server to accept and discard messages."""
+
+    def reply(self, line):
+        self.replies.append(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        rtt = self.server.rtt
+        self.replies = []
+        self.reply('220 sink ESMTP')
+        buffer = b''
+        in_data = False
+        while True:
+            if self.replies:
+                time.sleep(rtt)
+                self.request.sendall(b''.join(self.replies))
+                self.replies = []
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return
+            buffer += chunk
+            while b'\r\n' in buffer:
+                line, buffer = buffer.split(b'\r\n', 1)
+                if in_data:
+                    if line == b'.':
+                        in_data = False
+                        self.reply('250 Ok')
+                    continue
+                command = line[:4].upper()
+                if command == b'EHLO':
+                    self.reply('250-sink')
+                    self.reply('250 PIPELINING')
+                elif command == b'DATA':
+                    in_data = True
+                    self.reply('354 End data with <CR><LF>.<CR><LF>')
+                elif command == b'QUIT':
+                    self.reply('221 Bye')
+                    self.request.sendall(b''.join(self.replies))
+                    return
+                else:
+                    # HELO, MAIL, RCPT, RSET and NOOP.
+                    self.reply('250 Ok')
+
+
+class Sink(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def run(send, messages, recipients):
+    addresses = ['person{}@example.com'.format(i) for i in range(recipients)]
+    start = time.perf_counter()
+    for i in range(messages):
+        send('anne@example.com', addresses, MESSAGE)
+    return messages / (time.perf_counter() - start)
+
+
+def main(messages, recipients, rtt):
+    config.load()
+    sink = Sink(('127.0.0.1', 0), SinkHandler)
+    sink.rtt = rtt / 1000.0
+    host, port = sink.server_address
+    thread = threading.Thread(target=sink.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def send_unpooled(sender, recipients, msgtext):
+        connection = Connection(host, port, 0, pipelining=False)
+        connection.sendmail(sender, recipients, msgtext)
+        connection.quit()
+
+    def pooled(pipelining):
+        pool = ConnectionPool(host, port, 0, pipelining=pipelining)
+        def send(sender, recipients, msgtext):
+            with pool.connection() as connection:
+                connection.sendmail(sender, recipients, msgtext)
+        return send
+
+    print('{} messages, {} recipients each, {:.1f}ms round trips'.format(
+        messages, recipients, rtt))
+    for name, send in (('connection per message', send_unpooled),
+                       ('pooled', pooled(False)),
+                       ('pooled + pipelining', pooled(True))):
+        print('{:<24} {:>8.1f} sessions/s'.format(
+            name, run(send, messages, recipients)))
+    sink.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    sys.exit(main(
+        int(arguments[0]) if len(arguments) > 0 else DEFAULT_MESSAGES,
+        int(arguments[1]) if len(arguments) > 1 else DEFAULT_RECIPIENTS,
+        float(arguments[2]) if len(arguments) > 2 else DEFAULT_RTT))
@@ -0,0 +1,106 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how long it takes to load a mailing list's footer template.
+
+This loads the footer template of a mailing list the way the decorate handler
+does for each recipient of a personalized message, with the template loader's
+cache emptied before each load, and with the cache.
+
+A fresh SQLite database in a temporary directory is used, and thrown away
+afterward.
+
+Usage: python contrib/benchmarks/templates.py [loads]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.core.initialize import initialize
+from mailman.interfaces.domain import IDomainManager
+from mailman.interfaces.templates import ITemplateLoader
+from mailman.templates import __file__ as templates_file
+from mailman.utilities.string import expand
+from zope.component import getUtility
+
+
+DEFAULT_LOADS = 1000
+
+CONFIG = """\
+[mailman]
+layout: benchmark
+
+[paths.benchmark]
+var_dir: {var_dir}
+template_dir: {template_dir}
+
+[database]
+class: mailman.database.sqlite.SQLiteDatabase
+url: sqlite:///{var_dir}/mailman.db
+
+[mta]
+incoming: mailman.mta.null.NullMTA
+"""
+
+
+def main(loads):
+    var_dir = tempfile.mkdtemp()
+    try:
+        # Search the site templates too, but in a directory which is old
+        # enough for the loader to trust.
+        template_dir = os.path.dirname(templates_file)
+        config_file = os.path.join(var_dir, 'benchmark.cfg')
+        with open(config_file, 'w') as fp:
+            fp.write(CONFIG.format(var_dir=var_dir,
+                                   template_dir=template_dir))
+        initialize(config_file)
+        getUtility(IDomainManager).add('example.com')
+        mlist = create_list('test@example.com')
+        config.db.commit()
+        loader = getUtility(ITemplateLoader)
+        uri = expand(mlist.footer_uri, dict(
+            listname=mlist.fqdn_listname,
+            language=mlist.preferred_language.code,
+            ))
+        print('{0:>10} {1:>12} {2:>12} {3:>8} {4:>8}'.format(
+            'cache', 'total (s)', 'load (us)', 'hits', 'misses'))
+        for name, clear in (('no', True), ('yes', False)):
+            loader.clear()
+            hits, misses = loader.hits, loader.misses
+            start = time.perf_counter()
+            for i in range(loads):
+                if clear:
+                    loader.clear()
+                loader.get(uri, mlist)
+            seconds = time.perf_counter() - start
+            print('{0:>10} {1:>12.4f} {2:>12.1f} {3:>8} {4:>8}'.format(
+                name, seconds, seconds / loads * 1e6,
+                loader.hits - hits, loader.misses - misses))
+    finally:
+        shutil.rmtree(var_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    loads = int(arguments[0]) if len(arguments) > 0 else DEFAULT_LOADS
+    sys.exit(main(loads))
@@ -17,9 +17,18 @@
 
 """The `mailman` package."""
 
+import os
 import sys
 
 
+# Profile the start-up when asked to, from as early as possible.  See
+# mailman.utilities.startup.
+if os.environ.get('MAILMAN_STARTUP_PROFILE'):       # pragma: no cover
+    from mailman.utilities.startup import profile
+    profile.start()
+    del profile
+
+
 # This is a namespace package.
 try:
     import pkg_resources
@@ -51,7 +51,7 @@ def _get_message(uri_template, mlist, language):
             listname=mlist.fqdn_listname,
             language=language.code,
             ))
-        message = getUtility(ITemplateLoader).get(uri)
+        message = getUtility(ITemplateLoader).get(uri, mlist)
     except URLError:
         log.exception('Message URI not found ({0}): {1}'.format(
             mlist.fqdn_listname, uri_template))
@@ -101,7 +101,8 @@ def handle_ConfirmationNeededEvent(event):
     template = getUtility(ITemplateLoader).get(
         'mailman:///{0}/{1}/confirm.txt'.format(
             event.mlist.fqdn_listname,
-            event.mlist.preferred_language.code))
+            event.mlist.preferred_language.code),
+        event.mlist)
     text = _(template)
     msg = UserNotification(email_address, confirm_address, subject, text)
     msg.send(event.mlist, add_precedence=False)
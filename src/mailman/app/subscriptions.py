@@ -48,9 +48,9 @@ from mailman.interfaces.user import IUser
 from mailman.interfaces.usermanager import IUserManager
 from mailman.interfaces.workflow import IWorkflowStateManager
 from mailman.model.member import Member
+from mailman.model.roster import all_members
 from mailman.utilities.datetime import now
 from mailman.utilities.i18n import make
-from operator import attrgetter
 from sqlalchemy import and_, or_
 from zope.component import getUtility
 from zope.event import notify
@@ -349,25 +349,7 @@ class SubscriptionService:
 
     def get_members(self):
         """See `ISubscriptionService`."""
-        # {list_id -> {role -> [members]}}
-        by_list = {}
-        user_manager = getUtility(IUserManager)
-        for member in user_manager.members:
-            by_role = by_list.setdefault(member.list_id, {})
-            members = by_role.setdefault(member.role.name, [])
-            members.append(member)
-        # Flatten into single list sorted as per the interface.
-        all_members = []
-        address_of_member = attrgetter('address.email')
-        for list_id in sorted(by_list):
-            by_role = by_list[list_id]
-            all_members.extend(
-                sorted(by_role.get('owner', []), key=address_of_member))
-            all_members.extend(
-                sorted(by_role.get('moderator', []), key=address_of_member))
-            all_members.extend(
-                sorted(by_role.get('member', []), key=address_of_member))
-        return all_members
+        return all_members()
 
     @dbconnection
     def get_member(self, store, member_id):
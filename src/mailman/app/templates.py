@@ -22,11 +22,17 @@ __all__ = [
     ]
 
 
+import os
+import time
+import threading
+
+from collections import OrderedDict
 from contextlib import closing
+from mailman.config import config
 from mailman.interfaces.languages import ILanguageManager
 from mailman.interfaces.listmanager import IListManager
 from mailman.interfaces.templates import ITemplateLoader
-from mailman.utilities.i18n import TemplateNotFoundError, find
+from mailman.utilities.i18n import TemplateNotFoundError, find, search
 from urllib.error import URLError
 from urllib.parse import urlparse
 from urllib.request import BaseHandler, build_opener, install_opener, urlopen
@@ -35,50 +41,86 @@ from zope.component import getUtility
 from zope.interface import implementer
 
 
+# Templates whose files, or the directories watched for new ones, changed
+# less than this many seconds before they were read aren't trusted to be
+# current.
+RACY_SECONDS = 2
+
+
+
+def _parse(url, mlist=None):
+    """Parse a mailman: URL.
+
+    The URL is of the form:
+
+    mailman:///<fqdn_listname>/<language>/<template_name>
+
+    where only the template name is required.
+
+    :param url: The URL.
+    :type url: str
+    :param mlist: A mailing list which is already known.  If the URL names
+        it, it isn't looked up again.
+    :type mlist: `IMailingList`
+    :return: The template name, the mailing list or None, and the language
+        code or None.
+    :rtype: 3-tuple
+    :raises URLError: when the URL is bad.
+    """
+    known = mlist
+    mlist = code = template = None
+    parsed = urlparse(url)
+    assert parsed.scheme == 'mailman'
+    def get_list(fqdn_listname):
+        if known is not None and known.fqdn_listname == fqdn_listname:
+            return known
+        return getUtility(IListManager).get(fqdn_listname)
+    # The path can contain one, two, or three components.  Since no empty
+    # path components are legal, filter them out.
+    parts = [p for p in parsed.path.split('/') if p]
+    if len(parts) == 0:
+        raise URLError('No template specified')
+    elif len(parts) == 1:
+        template = parts[0]
+    elif len(parts) == 2:
+        part0, template = parts
+        # Is part0 a language code or a mailing list?  It better be one or
+        # the other, and there's no possibility of namespace collisions
+        # because language codes don't contain @ and mailing list names MUST
+        # contain @.
+        language = getUtility(ILanguageManager).get(part0)
+        mlist = (None if language is not None else get_list(part0))
+        if language is None and mlist is None:
+            raise URLError('Bad language or list name')
+        elif mlist is None:
+            code = language.code
+    elif len(parts) == 3:
+        fqdn_listname, code, template = parts
+        mlist = get_list(fqdn_listname)
+        if mlist is None:
+            raise URLError('Missing list')
+        language = getUtility(ILanguageManager).get(code)
+        if language is None:
+            raise URLError('No such language')
+        code = language.code
+    else:
+        raise URLError('No such file')
+    return template, mlist, code
+
+
+def _signature(path):
+    # Files and directories which change get a new signature.
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
 
 class MailmanHandler(BaseHandler):
     # Handle internal mailman: URLs.
     def mailman_open(self, req):
-        # Parse urls of the form:
-        #
-        # mailman:///<fqdn_listname>/<language>/<template_name>
-        #
-        # where only the template name is required.
-        mlist = code = template = None
         # Parse the full requested URL and be sure it's something we handle.
         original_url = req.get_full_url()
-        parsed = urlparse(original_url)
-        assert parsed.scheme == 'mailman'
-        # The path can contain one, two, or three components.  Since no empty
-        # path components are legal, filter them out.
-        parts = [p for p in parsed.path.split('/') if p]
-        if len(parts) == 0:
-            raise URLError('No template specified')
-        elif len(parts) == 1:
-            template = parts[0]
-        elif len(parts) == 2:
-            part0, template = parts
-            # Is part0 a language code or a mailing list?  It better be one or
-            # the other, and there's no possibility of namespace collisions
-            # because language codes don't contain @ and mailing list names
-            # MUST contain @.
-            language = getUtility(ILanguageManager).get(part0)
-            mlist = getUtility(IListManager).get(part0)
-            if language is None and mlist is None:
-                raise URLError('Bad language or list name')
-            elif mlist is None:
-                code = language.code
-        elif len(parts) == 3:
-            fqdn_listname, code, template = parts
-            mlist = getUtility(IListManager).get(fqdn_listname)
-            if mlist is None:
-                raise URLError('Missing list')
-            language = getUtility(ILanguageManager).get(code)
-            if language is None:
-                raise URLError('No such language')
-            code = language.code
-        else:
-            raise URLError('No such file')
+        template, mlist, code = _parse(original_url)
         # Find the template, mutating any missing template exception.
         try:
             path, fp = find(template, mlist, code)
@@ -88,6 +130,55 @@ class MailmanHandler(BaseHandler):
 
 
 
+class _Entry:
+    """A cached template."""
+
+    def __init__(self, template, mlist, code):
+        # Find the template, mutating any missing template exception.
+        try:
+            self.path, fp = find(template, mlist, code)
+        except TemplateNotFoundError:
+            raise URLError('No such file')
+        with fp:
+            stat = os.fstat(fp.fileno())
+            self.content = fp.read()
+        self._signatures = {self.path: (stat.st_mtime_ns, stat.st_size)}
+        # A template could be added in any of the places which are searched
+        # before this one, so remember the directories which would change if
+        # it was.  Those which don't exist yet are watched by way of the
+        # nearest one which does.
+        for path in search(template, mlist, code):
+            if path == self.path:
+                break
+            directory = os.path.dirname(path)
+            while directory not in self._signatures:
+                try:
+                    self._signatures[directory] = _signature(directory)
+                    break
+                except OSError:
+                    parent = os.path.dirname(directory)
+                    if parent == directory:
+                        break
+                    directory = parent
+        # File system times are coarse, so a change made just before or
+        # after the template was read might not change them.  Until they're
+        # old enough, the template is read every time.
+        recent = int((time.time() - RACY_SECONDS) * 1e9)
+        self._racy = any(signature[0] >= recent
+                         for signature in self._signatures.values())
+
+    def is_current(self):
+        """Whether the template would still be found, unchanged."""
+        if self._racy:
+            return False
+        try:
+            return all(_signature(path) == signature
+                       for path, signature in self._signatures.items())
+        except OSError:
+            return False
+
+
+
 @implementer(ITemplateLoader)
 class TemplateLoader:
     """Loader of templates, with caching and support for mailman:// URIs."""
@@ -95,8 +186,41 @@ class TemplateLoader:
     def __init__(self):
         opener = build_opener(MailmanHandler())
         install_opener(opener)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, uri, mlist=None):
+        """See `ITemplateLoader`."""
+        if urlparse(uri).scheme != 'mailman':
+            with closing(urlopen(uri)) as fp:
+                return fp.read()
+        template, mlist, code = _parse(uri, mlist)
+        # Besides the URI, the search for the template depends on the mailing
+        # list's language, the site's language and where the templates are.
+        key = (uri,
+               None if mlist is None else mlist.preferred_language.code,
+               config.mailman.default_language,
+               config.TEMPLATE_DIR)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+        if entry is not None and entry.is_current():
+            with self._lock:
+                self.hits += 1
+            return entry.content
+        entry = _Entry(template, mlist, code)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > int(config.mailman.template_cache_size):
+                self._cache.popitem(last=False)
+        return entry.content
 
-    def get(self, uri):
+    def clear(self):
         """See `ITemplateLoader`."""
-        with closing(urlopen(uri)) as fp:
-            return fp.read()
+        with self._lock:
+            self._cache.clear()
@@ -18,11 +18,13 @@
 """Test the template downloader API."""
 
 __all__ = [
+    'TestTemplateCache',
     'TestTemplateLoader',
     ]
 
 
 import os
+import time
 import shutil
 import tempfile
 import unittest
@@ -31,6 +33,7 @@ from mailman.app.lifecycle import create_list
 from mailman.config import config
 from mailman.interfaces.templates import ITemplateLoader
 from mailman.testing.layers import ConfigLayer
+from sqlalchemy import event
 from urllib.error import URLError
 from zope.component import getUtility
 
@@ -131,3 +134,125 @@ class TestTemplateLoader(unittest.TestCase):
         content = self._loader.get('mailman:///it/demo.txt')
         self.assertIsInstance(content, str)
         self.assertEqual(content, test_text.decode('utf-8'))
+
+
+
+class TestTemplateCache(unittest.TestCase):
+    """Test the template loader's cache."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self.var_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.var_dir)
+        config.push('template config', """\
+        [paths.testing]
+        var_dir: {0}
+        """.format(self.var_dir))
+        self.addCleanup(config.pop, 'template config')
+        self._write('site/en/demo.txt', 'Site content')
+        self._loader = getUtility(ITemplateLoader)
+        self._mlist = create_list('test@example.com')
+        self._counts = (self._loader.hits, self._loader.misses)
+
+    def _write(self, path, content):
+        path = os.path.join(self.var_dir, 'templates', path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            print(content, end='', file=fp)
+        # Age everything, so that the templates can be cached.
+        for directory, dirnames, filenames in os.walk(self.var_dir):
+            for name in [directory] + [
+                    os.path.join(directory, filename)
+                    for filename in filenames]:
+                os.utime(name, (time.time() - 60, time.time() - 60))
+
+    def _get(self, uri='mailman:///test@example.com/en/demo.txt'):
+        return self._loader.get(uri, self._mlist)
+
+    def _assertCounts(self, hits, misses):
+        self.assertEqual(self._loader.hits - self._counts[0], hits)
+        self.assertEqual(self._loader.misses - self._counts[1], misses)
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self._get(), 'Site content')
+        self.assertEqual(self._get(), 'Site content')
+        self._assertCounts(1, 1)
+        self.assertEqual(self._get('mailman:///demo.txt'), 'Site content')
+        self._assertCounts(1, 2)
+
+    def test_changed(self):
+        self._get()
+        self._write('site/en/demo.txt', 'New content')
+        self.assertEqual(self._get(), 'New content')
+        self._assertCounts(0, 2)
+
+    def test_new_override(self):
+        # Templates found before the cached one are noticed, even when their
+        # directories didn't exist.
+        italian = 'mailman:///test@example.com/it/demo.txt'
+        self._get()
+        self.assertEqual(self._get(italian), 'Site content')
+        self._write('lists/test@example.com/en/demo.txt', 'List content')
+        self.assertEqual(self._get(), 'List content')
+        self._write('domains/example.com/it/demo.txt', 'Domain content')
+        self.assertEqual(self._get(italian), 'Domain content')
+        self._assertCounts(0, 4)
+
+    def test_recently_changed(self):
+        # Templates changed just before they were read are read again.
+        self._get()
+        path = os.path.join(self.var_dir, 'templates', 'site', 'en',
+                            'demo.txt')
+        os.utime(path)
+        self._get()
+        self._get()
+        self._assertCounts(0, 3)
+
+    def test_list_language(self):
+        # The mailing list's preferred language is part of the key.
+        self._write('site/it/demo.txt', 'Italian content')
+        self.assertEqual(self._get('mailman:///test@example.com/demo.txt'),
+                         'Site content')
+        self._mlist.preferred_language = 'it'
+        self.assertEqual(self._get('mailman:///test@example.com/demo.txt'),
+                         'Italian content')
+        self._assertCounts(0, 2)
+
+    def test_list_not_looked_up(self):
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(config.db.engine, 'before_cursor_execute', record)
+        self.addCleanup(event.remove, config.db.engine,
+                        'before_cursor_execute', record)
+        self._get()
+        self._get('mailman:///test@example.com/demo.txt')
+        self.assertEqual(statements, [])
+        # Another mailing list is looked up.
+        with self.assertRaises(URLError):
+            self._get('mailman:///other@example.com/en/demo.txt')
+        self.assertNotEqual(statements, [])
+
+    def test_least_recently_used(self):
+        self._write('site/en/other.txt', 'Other content')
+        config.push('size', """\
+        [mailman]
+        template_cache_size: 2
+        """)
+        self.addCleanup(config.pop, 'size')
+        self._loader.clear()
+        self._get('mailman:///demo.txt')
+        self._get('mailman:///other.txt')
+        self._get('mailman:///demo.txt')
+        self._get('mailman:///en/demo.txt')
+        self._assertCounts(1, 3)
+        self._get('mailman:///demo.txt')
+        self._get('mailman:///other.txt')
+        self._assertCounts(2, 4)
+
+    def test_clear(self):
+        self._get()
+        self._loader.clear()
+        self._get()
+        self._assertCounts(0, 2)
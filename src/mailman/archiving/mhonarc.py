@@ -22,12 +22,19 @@ __all__ = [
     ]
 
 
+import os
+import shlex
 import logging
+import mailbox
 import subprocess
 
+from collections import ChainMap
+from flufl.lock import Lock
+from lazr.config import as_timedelta
 from mailman.config import config
 from mailman.config.config import external_configuration
-from mailman.interfaces.archiver import IArchiver
+from mailman.interfaces.archiver import IBatchingArchiver
+from mailman.utilities.datetime import now
 from mailman.utilities.string import expand
 from urllib.parse import urljoin
 from zope.interface import implementer
@@ -36,8 +43,14 @@ from zope.interface import implementer
 log = logging.getLogger('mailman.archiver')
 
 
+# The batches of messages which this process knows about, by the path of the
+# mailbox they are collected in.  Each is a list of the time the batch was
+# started, or first seen, and the number of messages in it.
+_batches = {}
+
+
 
-@implementer(IArchiver)
+@implementer(IBatchingArchiver)
 class MHonArc:
     """Local MHonArc archiver."""
 
@@ -50,6 +63,10 @@ class MHonArc:
             config.archiver.mhonarc.configuration)
         self.base_url = archiver_config.get('general', 'base_url')
         self.command = archiver_config.get('general', 'command')
+        self.batch_size = archiver_config.getint(
+            'general', 'batch_size', fallback=1)
+        self.batch_interval = as_timedelta(archiver_config.get(
+            'general', 'batch_interval', fallback='0s'))
 
     def list_url(self, mlist):
         """See `IArchiver`."""
@@ -75,18 +92,109 @@ class MHonArc:
 
     def archive_message(self, mlist, msg):
         """See `IArchiver`."""
-        substitutions = config.__dict__.copy()
-        substitutions['listname'] = mlist.fqdn_listname
+        if self.batch_size <= 1:
+            self._run(mlist.fqdn_listname, msg['message-id'],
+                      text=msg.as_string())
+            return None
+        # Collect the message in the mailing list's batch, which is archived
+        # once it is big enough, or by flush() once it is old enough.
+        os.makedirs(self._batch_dir, exist_ok=True)
+        path = self._batch_path(mlist.fqdn_listname)
+        with Lock(self._lock_file(mlist.fqdn_listname)):
+            batch = self._batch(path)
+            mbox = mailbox.mbox(path)
+            try:
+                mbox.add(msg)
+            finally:
+                mbox.close()
+            batch[1] += 1
+            is_full = (batch[1] >= self.batch_size)
+        if is_full:
+            self._archive_batch(mlist.fqdn_listname)
+        # Can we get more information, such as the url to the message just
+        # archived, out of MHonArc?
+        return None
+
+    def flush(self, force=False):
+        """See `IBatchingArchiver`."""
+        try:
+            filenames = os.listdir(self._batch_dir)
+        except FileNotFoundError:
+            return
+        for filename in sorted(filenames):
+            fqdn_listname, ext = os.path.splitext(filename)
+            if ext != '.mbox':
+                continue
+            path = os.path.join(self._batch_dir, filename)
+            batch = _batches.get(path)
+            if batch is None:
+                with Lock(self._lock_file(fqdn_listname)):
+                    batch = self._batch(path)
+            if (force or self.batch_size <= 1 or (
+                    self.batch_interval.total_seconds() > 0 and
+                    now() - batch[0] >= self.batch_interval)):
+                self._archive_batch(fqdn_listname)
+
+    @property
+    def _batch_dir(self):
+        return os.path.join(config.ARCHIVE_DIR, 'mhonarc')
+
+    def _batch_path(self, fqdn_listname):
+        return os.path.join(self._batch_dir, fqdn_listname + '.mbox')
+
+    def _lock_file(self, fqdn_listname):
+        return os.path.join(
+            config.LOCK_DIR, '{0}-mhonarc.lock'.format(fqdn_listname))
+
+    def _batch(self, path):
+        # The mailing list's lock must be held.  The batch may have been
+        # started by another process, or before a restart.
+        batch = _batches.get(path)
+        if batch is None:
+            count = 0
+            if os.path.exists(path):
+                mbox = mailbox.mbox(path, create=False)
+                try:
+                    count = len(mbox)
+                finally:
+                    mbox.close()
+            batch = _batches[path] = [now(), count]
+        return batch
+
+    def _archive_batch(self, fqdn_listname):
+        # Take the batch away from the processes collecting messages, so that
+        # MHonArc can be run on it without holding the lock.
+        path = self._batch_path(fqdn_listname)
+        batch_path = '{0}.{1}.{2}'.format(
+            path, os.getpid(), now().strftime('%Y%m%d%H%M%S%f'))
+        with Lock(self._lock_file(fqdn_listname)):
+            _batches.pop(path, None)
+            try:
+                os.rename(path, batch_path)
+            except FileNotFoundError:
+                # Another process got to it first.
+                return
+        if self._run(fqdn_listname, batch_path, path=batch_path):
+            os.remove(batch_path)
+        else:
+            log.error('%s: mhonarc batch kept in %s' % (
+                fqdn_listname, batch_path))
+
+    def _run(self, fqdn_listname, what, text=None, path=None):
+        # Run MHonArc on the message text, or on the mailbox at the path,
+        # returning whether it succeeded.  What is being archived is named in
+        # the log.
+        substitutions = ChainMap(dict(listname=fqdn_listname), config.__dict__)
         command = expand(self.command, substitutions)
+        if path is not None:
+            command += ' ' + shlex.quote(path)
         proc = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            universal_newlines=True, shell=True)
-        stdout, stderr = proc.communicate(msg.as_string())
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True, shell=True)
+        stdout, stderr = proc.communicate(text)
         if proc.returncode != 0:
             log.error('%s: mhonarc subprocess had non-zero exit code: %s' %
-                      (msg['message-id'], proc.returncode))
+                      (what, proc.returncode))
         log.info(stdout)
         log.error(stderr)
-        # Can we get more information, such as the url to the message just
-        # archived, out of MHonArc?
-        return None
+        return proc.returncode == 0
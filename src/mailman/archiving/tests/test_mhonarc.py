@@ -0,0 +1,183 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the MHonArc archiver."""
+
+__all__ = [
+    'TestMHonArc',
+    ]
+
+
+import os
+import shutil
+import mailbox
+import tempfile
+import unittest
+
+from mailman.app.lifecycle import create_list
+from mailman.archiving.mhonarc import MHonArc, _batches
+from mailman.config import config
+from mailman.database.transaction import transaction
+from mailman.testing.helpers import LogFileMark
+from mailman.testing.helpers import (
+    specialized_message_from_string as mfs)
+from mailman.testing.layers import ConfigLayer
+from mailman.utilities.datetime import factory
+
+
+CONFIGURATION = """\
+[general]
+base_url: http://$hostname/archives/$fqdn_listname
+command: echo run >> {0}/runs; {1}
+batch_size: {2}
+batch_interval: {3}
+"""
+
+
+
+class TestMHonArc(unittest.TestCase):
+    """Test the MHonArc archiver."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        with transaction():
+            self._mlist = create_list('test@example.com')
+        self._tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._tempdir)
+        config.push('mhonarc', """
+        [paths.testing]
+        archive_dir: {0}/archives
+        [archiver.mhonarc]
+        configuration: {0}/mhonarc.cfg
+        """.format(self._tempdir))
+        self.addCleanup(config.pop, 'mhonarc')
+        self.addCleanup(_batches.clear)
+        self._batch_path = os.path.join(
+            config.ARCHIVE_DIR, 'mhonarc', 'test@example.com.mbox')
+
+    def _archiver(self, batch_size=1, batch_interval='0s',
+                  command='cat >> {0}/$listname.out'):
+        configuration = CONFIGURATION.format(
+            self._tempdir, command.format(self._tempdir),
+            batch_size, batch_interval)
+        with open(os.path.join(self._tempdir, 'mhonarc.cfg'), 'w') as fp:
+            fp.write(configuration)
+        return MHonArc()
+
+    def _archive(self, archiver, *numbers):
+        for number in numbers:
+            archiver.archive_message(self._mlist, mfs("""\
+From: anne@example.com
+To: test@example.com
+Subject: Message {0}
+Message-ID: <{0}>
+
+Message {0}
+""".format(number)))
+
+    def _runs(self):
+        try:
+            with open(os.path.join(self._tempdir, 'runs')) as fp:
+                return len(fp.readlines())
+        except FileNotFoundError:
+            return 0
+
+    def _subjects(self):
+        # The archived messages, as MHonArc would have read them.
+        path = os.path.join(self._tempdir, 'test@example.com.out')
+        mbox = mailbox.mbox(path, create=False)
+        try:
+            return [message['subject'] for message in mbox]
+        finally:
+            mbox.close()
+
+    def test_one_at_a_time(self):
+        # The message is piped to the command.
+        archiver = self._archiver()
+        self._archive(archiver, 1)
+        self.assertEqual(self._runs(), 1)
+        with open(os.path.join(self._tempdir, 'test@example.com.out')) as fp:
+            self.assertIn('Subject: Message 1\n', fp.read())
+        self._archive(archiver, 2)
+        self.assertEqual(self._runs(), 2)
+        self.assertFalse(os.path.exists(self._batch_path))
+
+    def test_batch_size(self):
+        archiver = self._archiver(batch_size=3)
+        self._archive(archiver, 1, 2)
+        self.assertEqual(self._runs(), 0)
+        self.assertTrue(os.path.exists(self._batch_path))
+        self._archive(archiver, 3, 4)
+        self.assertEqual(self._runs(), 1)
+        self.assertEqual(self._subjects(),
+                         ['Message 1', 'Message 2', 'Message 3'])
+        # The fourth message starts the next batch.
+        self.assertEqual(len(os.listdir(os.path.dirname(self._batch_path))),
+                         1)
+        archiver.flush(force=True)
+        self.assertEqual(self._runs(), 2)
+        self.assertEqual(self._subjects()[3:], ['Message 4'])
+        self.assertFalse(os.path.exists(self._batch_path))
+
+    def test_batch_interval(self):
+        archiver = self._archiver(batch_size=10, batch_interval='1d')
+        self._archive(archiver, 1)
+        archiver.flush()
+        self.assertEqual(self._runs(), 0)
+        factory.fast_forward()
+        archiver.flush()
+        self.assertEqual(self._runs(), 1)
+        self.assertEqual(self._subjects(), ['Message 1'])
+
+    def test_no_batch_interval(self):
+        archiver = self._archiver(batch_size=10)
+        self._archive(archiver, 1)
+        factory.fast_forward(days=100)
+        archiver.flush()
+        self.assertEqual(self._runs(), 0)
+
+    def test_batch_left_over(self):
+        # Messages collected before a restart, or by another process, count
+        # toward the batch.
+        archiver = self._archiver(batch_size=3)
+        self._archive(archiver, 1, 2)
+        _batches.clear()
+        self._archive(archiver, 3)
+        self.assertEqual(self._runs(), 1)
+        self.assertEqual(self._subjects(),
+                         ['Message 1', 'Message 2', 'Message 3'])
+
+    def test_no_longer_batching(self):
+        # Batches left over from when the archiver was batching are archived
+        # the next time it's flushed.
+        self._archive(self._archiver(batch_size=3), 1)
+        self._archiver().flush()
+        self.assertEqual(self._runs(), 1)
+        self.assertFalse(os.path.exists(self._batch_path))
+
+    def test_failed_batch_kept(self):
+        archiver = self._archiver(batch_size=2, command='false')
+        mark = LogFileMark('mailman.archiver')
+        self._archive(archiver, 1, 2)
+        filenames = os.listdir(os.path.dirname(self._batch_path))
+        self.assertEqual(len(filenames), 1)
+        self.assertTrue(filenames[0].startswith('test@example.com.mbox.'))
+        self.assertIn('mhonarc batch kept in', mark.read())
+        # The failed batch isn't tried again.
+        archiver.flush(force=True)
+        self.assertEqual(self._runs(), 1)
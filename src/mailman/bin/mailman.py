@@ -18,23 +18,45 @@
 """The 'mailman' command dispatcher."""
 
 __all__ = [
+    'find_subcommand',
     'main',
     ]
 
 
 import os
+import sys
 import argparse
 
 from functools import cmp_to_key
 from mailman.core.i18n import _
 from mailman.core.initialize import initialize
 from mailman.interfaces.command import ICLISubCommand
-from mailman.utilities.modules import find_components
+from mailman.utilities.modules import find_lazy_components
+from mailman.utilities.startup import profile
 from mailman.version import MAILMAN_VERSION_FULL
 from zope.interface.verify import verifyObject
 
 
 
+def find_subcommand(arguments):
+    """Return the name of the subcommand in the command line arguments.
+
+    :param arguments: The command line arguments, without the program name.
+    :type arguments: list of str
+    :return: The subcommand name, or None if no subcommand was given.
+    :rtype: str
+    """
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument in ('-C', '--config'):
+            # Skip the option's value.
+            next(arguments, None)
+        elif not argument.startswith('-'):
+            return argument
+    return None
+
+
+
 def main():
     """The `mailman` command dispatcher."""
     # Create the basic parser and add all globally common options.
@@ -60,31 +82,41 @@ def main():
     # this should be pluggable or not.  If so, then we'll probably have to
     # partially parse the arguments now, then initialize the system, then find
     # the plugins.  Punt on this for now.
+    #
+    # Only the subcommand being run is imported.  The names and descriptions
+    # of the others come from the component registry cache.
     subparser = parser.add_subparsers(title='Commands')
-    subcommands = []
-    for command_class in find_components('mailman.commands', ICLISubCommand):
-        command = command_class()
-        verifyObject(ICLISubCommand, command)
-        subcommands.append(command)
+    with profile.phase('subcommands'):
+        subcommands = list(find_lazy_components(
+            'mailman.commands', ICLISubCommand, ('name', '__doc__')))
     # --help should display the subcommands by alphabetical order, except that
     # 'mailman help' should be first.
     def sort_function(command, other):
         """Sorting helper."""
-        if command.name == 'help':
+        command_name = command.attributes['name']
+        other_name = other.attributes['name']
+        if command_name == 'help':
             return -1
-        elif other.name == 'help':
+        elif other_name == 'help':
             return 1
-        elif command.name < other.name:
+        elif command_name < other_name:
             return -1
-        elif command.name == other.name:
+        elif command_name == other_name:
             return 0
         else:
-            assert command.name > other.name
+            assert command_name > other_name
             return 1
     subcommands.sort(key=cmp_to_key(sort_function))
-    for command in subcommands:
+    selected = find_subcommand(sys.argv[1:])
+    for lazy_command in subcommands:
         command_parser = subparser.add_parser(
-            command.name, help=_(command.__doc__))
+            lazy_command.attributes['name'],
+            help=_(lazy_command.attributes['__doc__']))
+        if lazy_command.attributes['name'] != selected:
+            continue
+        with profile.phase('subcommand: {0}'.format(selected)):
+            command = lazy_command.load()()
+        verifyObject(ICLISubCommand, command)
         command.add(parser, command_parser)
         command_parser.set_defaults(func=command.process)
     args = parser.parse_args()
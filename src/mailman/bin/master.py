@@ -25,18 +25,24 @@ __all__ = [
 
 import os
 import sys
+import time
+import fcntl
 import errno
+import select
 import signal
 import socket
 import logging
 
+from collections import deque
 from datetime import timedelta
 from enum import Enum
 from flufl.lock import Lock, NotLockedError, TimeOutError
-from lazr.config import as_boolean
+from lazr.config import as_boolean, as_timedelta
 from mailman.config import config
 from mailman.core.i18n import _
 from mailman.core.logging import reopen
+from mailman.core.scaling import (
+    RunnerScaler, sample_queue, status_path, write_status)
 from mailman.utilities.options import Options
 
 
@@ -246,6 +252,9 @@ class PIDWatcher:
         for pid in self._pids.keys():
             yield pid
 
+    def __len__(self):
+        return len(self._pids)
+
     def add(self, pid, info):
         """Add process information.
 
@@ -290,6 +299,116 @@ class PIDWatcher:
         """
         return self._pids.pop(pid, None)
 
+    def find(self, name):
+        """Return the processes of a runner.
+
+        :param name: The runner name.
+        :type name: str
+        :return: The process ids and information of the runner's processes,
+            ordered by slice number.
+        :rtype: list of 2-tuples of (pid, info)
+        """
+        return sorted(((pid, info) for pid, info in list(self._pids.items())
+                       if info[0] == name),
+                      key=lambda item: item[1][1])
+
+
+
+class Zygote:
+    """The master watcher's end of a zygote process.
+
+    A zygote is a `bin/runner --zygote` process, which forks ready runners on
+    demand.  The runners are the zygote's children, so it reports their exits
+    to the master.
+    """
+
+    def __init__(self, pid, connection):
+        self.pid = pid
+        self.alive = True
+        self.exits = deque()
+        self._connection = connection
+        self._buffer = b''
+        self._started = deque()
+        # The runners started by this zygote which haven't exited yet.
+        self._runners = set()
+
+    def fileno(self):
+        return self._connection.fileno()
+
+    def spawn(self, spec):
+        """Start a runner.
+
+        :param spec: A runner spec, in a format acceptable to bin/runner's
+            --runner argument, e.g. name:slice:count
+        :type spec: string
+        :return: The process id of the runner, or None if the zygote has
+            died.
+        :rtype: int
+        """
+        try:
+            self._connection.sendall((spec + '\n').encode('utf-8'))
+        except OSError:
+            self._died()
+        while self.alive and len(self._started) == 0:
+            self.receive()
+        if len(self._started) == 0:
+            return None
+        return self._started.popleft()
+
+    def receive(self):
+        """Read the zygote's reports.
+
+        Exited runners are appended to `exits` as (pid, status) 2-tuples.
+        """
+        try:
+            data = self._connection.recv(4096)
+        except InterruptedError:
+            return
+        except OSError:
+            data = b''
+        if len(data) == 0:
+            self._died()
+            return
+        self._buffer += data
+        while b'\n' in self._buffer:
+            line, newline, self._buffer = self._buffer.partition(b'\n')
+            words = line.decode('utf-8').split()
+            if words[0] == 'started':
+                pid = int(words[1])
+                self._runners.add(pid)
+                self._started.append(pid)
+            elif words[0] == 'exited':
+                pid = int(words[1])
+                self._runners.discard(pid)
+                self.exits.append((pid, int(words[2])))
+
+    def _died(self):
+        if not self.alive:
+            return
+        self.alive = False
+        self._connection.close()
+        # Nobody reports the orphaned runners' exits anymore, so stop them,
+        # and let the master count them as exited.
+        log = logging.getLogger('mailman.runner')
+        if len(self._runners) > 0:
+            log.error('Zygote [{0:d}] died, stopping its runners: {1}'.format(
+                self.pid, ', '.join(str(pid)
+                                    for pid in sorted(self._runners))))
+        for pid in self._runners:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            self.exits.append((pid, signal.SIGTERM))
+        self._runners.clear()
+
+    def retire(self):
+        """Tell the zygote to exit once all its runners have exited."""
+        try:
+            self._connection.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
 
 
 class Loop:
@@ -300,6 +419,20 @@ class Loop:
         self._restartable = restartable
         self._config_file = config_file
         self._kids = PIDWatcher()
+        # Autoscaling runners, and the runner processes being stopped because
+        # their runner has scaled down.
+        self._scalers = {}
+        self._stopping = set()
+        self._scale_interval = None
+        self._next_sample = 0
+        self._wakeup = None
+        self._scaling = True
+        # In zygote mode, the runners are forked from a zygote process.  The
+        # last zygote is the current one.  Older zygotes were retired when
+        # the runners were restarted, but may still have runners.
+        self._zygote_mode = as_boolean(config.mailman.zygote)
+        self._zygotes = []
+        self._stale_zygote = False
 
     def install_signal_handlers(self):
         """Install various signals handlers for control from the master."""
@@ -321,6 +454,9 @@ class Loop:
         signal.signal(signal.SIGHUP, sighup_handler)
         # SIGUSR1 is used by 'mailman restart'.
         def sigusr1_handler(signum, frame):
+            # Restarted runners should see the current configuration, so
+            # they must come from a new zygote.
+            self._stale_zygote = True
             for pid in self._kids:
                 os.kill(pid, signal.SIGUSR1)
             log.info('Master watcher caught SIGUSR1.  Exiting.')
@@ -328,6 +464,7 @@ class Loop:
         # SIGTERM is what init will kill this process with when changing run
         # levels.  It's also the signal 'mailman stop' uses.
         def sigterm_handler(signum, frame):
+            self._scaling = False
             for pid in self._kids:
                 os.kill(pid, signal.SIGTERM)
             log.info('Master watcher caught SIGTERM.  Exiting.')
@@ -350,18 +487,55 @@ class Loop:
         :return: The process id of the child runner.
         :rtype: int
         """
+        if self._zygote_mode:
+            pid = self._zygote().spawn(spec)
+            if pid is None:
+                # The zygote died before it could start the runner.  Try
+                # once more with a new one.
+                pid = self._zygote().spawn(spec)
+            if pid is None:
+                raise RuntimeError('Zygote cannot start runner: ' + spec)
+            return pid
         pid = os.fork()
         if pid:
             # Parent.
             return pid
         # Child.
-        #
+        self._exec_runner('--runner=' + spec)
+
+    def _zygote(self):
+        """Return the current zygote, starting a new one if necessary."""
+        if (len(self._zygotes) > 0 and self._zygotes[-1].alive and
+                not self._stale_zygote):
+            return self._zygotes[-1]
+        self._stale_zygote = False
+        if len(self._zygotes) > 0:
+            self._zygotes[-1].retire()
+        connection, zygote_end = socket.socketpair()
+        pid = os.fork()
+        if pid:
+            # Parent.
+            zygote_end.close()
+            log = logging.getLogger('mailman.runner')
+            log.debug('[{0:d}] zygote'.format(pid))
+            zygote = Zygote(pid, connection)
+            self._zygotes.append(zygote)
+            return zygote
+        # Child.  The zygote talks to the master over its standard input.
+        os.dup2(zygote_end.fileno(), 0)
+        self._exec_runner('--zygote')
+
+    def _exec_runner(self, rswitch):
+        """Replace the current process with bin/runner.
+
+        :param rswitch: The bin/runner switch saying what to run.
+        :type rswitch: string
+        """
         # Set the environment variable which tells the runner that it's
         # running under bin/master control.  This subtly changes the error
         # behavior of bin/runner.
         env = {'MAILMAN_UNDER_MASTER_CONTROL': '1'}
         # Craft the command line arguments for the exec() call.
-        rswitch = '--runner=' + spec
         # Wherever master lives, so too must live the runner script.
         exe = os.path.join(config.BIN_DIR, 'runner')
         # config.PYTHON, which is the absolute path to the Python interpreter,
@@ -413,11 +587,30 @@ class Loop:
             runner_config = getattr(config, section_name)
             if not as_boolean(runner_config.start):
                 continue
-            # Find out how many runners to instantiate.  This must be a power
-            # of 2.
+            # Find out how many runners to instantiate.  Unless the runners
+            # claim their queue entries, this must be a power of 2.
             count = int(runner_config.instances)
-            assert (count & (count - 1)) == 0, (
+            assert (runner_config.dispatch == 'claim' or
+                    (count & (count - 1)) == 0), (
                 'Runner "{0}", not a power of 2: {1}'.format(name, count))
+            scaler = RunnerScaler.from_config(name, runner_config)
+            if scaler is not None:
+                log = logging.getLogger('mailman.runner')
+                if runner_config.dispatch != 'claim':
+                    log.error('Runner {0} not autoscaled: '
+                              'dispatch is not claim'.format(name))
+                elif name not in config.switchboards:
+                    # Runners without a queue, e.g. rest and lmtp, have
+                    # nothing to sample.
+                    log.error('Runner {0} not autoscaled: '
+                              'it has no queue'.format(name))
+                else:
+                    self._scalers[name] = scaler
+                    interval = as_timedelta(
+                        runner_config.scale_interval).total_seconds()
+                    if (self._scale_interval is None or
+                            interval < self._scale_interval):
+                        self._scale_interval = interval
             for slice_number in range(count):
                 # runner name, slice #, # of slices, restart count
                 info = (name, slice_number, count, 0)
@@ -434,6 +627,124 @@ class Loop:
         # test suite).
         signal.pause()
 
+    def scale(self, now=None):
+        """Sample the autoscaled runners' queues and scale the runners.
+
+        At most one runner process is started or stopped for each runner.
+        Stopped runner processes finish their current queue entry and exit
+        normally, so they are not restarted.  The scalers' state is written
+        to the autoscaling status file.
+
+        :param now: The current time, in seconds since the epoch.  Defaults
+            to the current time.
+        :type now: float
+        """
+        if now is None:
+            now = time.time()
+        log = logging.getLogger('mailman.runner')
+        for name in sorted(self._scalers):
+            scaler = self._scalers[name]
+            kids = [(pid, info) for pid, info in self._kids.find(name)
+                    if pid not in self._stopping]
+            depth, age = sample_queue(config.switchboards[name], now)
+            instances = scaler.decide(len(kids), depth, age, now)
+            if instances > len(kids):
+                # Use the lowest free slice number.  The slices don't split
+                # the queue when the runners claim their entries, but they
+                # tell the processes apart in the log.
+                used = set(info[1] for pid, info in kids)
+                slice_number = min(set(range(len(kids) + 1)) - used)
+                info = (name, slice_number, scaler.maximum, 0)
+                spec = '{0}:{1:d}:{2:d}'.format(
+                    name, slice_number, scaler.maximum)
+                pid = self._start_runner(spec)
+                self._kids.add(pid, info)
+                log.info('Scaling runner {0} up to {1:d} instances '
+                         '[{2:d}]: {3}'.format(
+                             name, instances, pid,
+                             scaler.decisions[-1]['reason']))
+            elif instances < len(kids):
+                # Stop the process with the highest slice number.
+                pid, info = kids[-1]
+                self._stopping.add(pid)
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    # It already exited; loop() will reap it.
+                    pass
+                log.info('Scaling runner {0} down to {1:d} instances '
+                         '[{2:d}]: {3}'.format(
+                             name, instances, pid,
+                             scaler.decisions[-1]['reason']))
+        write_status(self._scalers[name] for name in sorted(self._scalers))
+
+    def _zygote_exit(self):
+        """Return a runner exit reported by a zygote, if there is one."""
+        for zygote in list(self._zygotes):
+            if len(zygote.exits) > 0:
+                return zygote.exits.popleft()
+            if not zygote.alive:
+                # Reap the dead zygote.
+                try:
+                    os.waitpid(zygote.pid, 0)
+                except ChildProcessError:
+                    pass
+                self._zygotes.remove(zygote)
+        return None
+
+    def _wait(self):
+        """Wait for a runner process to exit, scaling the runners meanwhile.
+
+        :return: The process id and exit status of the exited process.
+        :rtype: 2-tuple of (int, int)
+        :raise OSError: with errno ECHILD when there are no runners left.
+        """
+        if self._wakeup is None:
+            # Wake up from select() as soon as a runner process exits, or
+            # any other signal arrives.  Without a Python level handler for
+            # SIGCHLD, its wakeup byte would never be written.
+            self._wakeup = os.pipe()
+            for fd in self._wakeup:
+                flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            signal.set_wakeup_fd(self._wakeup[1])
+            signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        while True:
+            if self._zygote_mode:
+                reported = self._zygote_exit()
+                if reported is not None:
+                    return reported
+                if len(self._kids) == 0:
+                    raise OSError(errno.ECHILD, 'No runners')
+            else:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid != 0:
+                    return pid, status
+            # Once the master is shutting down, it only waits for the
+            # runner processes to exit.
+            timeout = None
+            if self._scaling and len(self._scalers) > 0:
+                now = time.time()
+                if now >= self._next_sample:
+                    self.scale(now)
+                    self._next_sample = now + self._scale_interval
+                    continue
+                timeout = self._next_sample - now
+            zygotes = [zygote for zygote in self._zygotes if zygote.alive]
+            try:
+                readable, writable, errors = select.select(
+                    [self._wakeup[0]] + zygotes, [], [], timeout)
+            except InterruptedError:
+                readable = []
+            for zygote in zygotes:
+                if zygote in readable:
+                    zygote.receive()
+            try:
+                while os.read(self._wakeup[0], 512):
+                    pass
+            except BlockingIOError:
+                pass
+
     def loop(self):
         """Main loop.
 
@@ -442,10 +753,15 @@ class Loop:
         """
         log = logging.getLogger('mailman.runner')
         log.info('Master started')
-        self._pause()
+        # When runners are autoscaled, the master must keep sampling their
+        # queues rather than sleep until a signal is received.
+        if len(self._scalers) == 0 and not self._zygote_mode:
+            self._pause()
         while True:
             try:
-                pid, status = os.wait()
+                pid, status = (os.wait() if len(self._scalers) == 0 and
+                               not self._zygote_mode
+                               else self._wait())
             except OSError as error:
                 # No children?  We're done.
                 if error.errno == errno.ECHILD:
@@ -470,7 +786,10 @@ class Loop:
             rname, slice_number, count, restarts = self._kids.pop(pid)
             config_name = 'runner.' + rname
             restart = False
-            if why == signal.SIGUSR1 and self._restartable:
+            if pid in self._stopping:
+                # This process was stopped because its runner scaled down.
+                self._stopping.discard(pid)
+            elif why == signal.SIGUSR1 and self._restartable:
                 restart = True
             # Have we hit the maximum number of restarts?
             restarts += 1
@@ -510,9 +829,11 @@ Runner {0} reached maximum restart limit of {1:d}, not restarting.""",
                     # The child has already exited.
                     log.info('ESRCH on pid: %d', pid)
         # Wait for all the children to go away.
+        self._scaling = False
         while self._kids:
             try:
-                pid, status = os.wait()
+                pid, status = (self._wait() if self._zygote_mode
+                               else os.wait())
                 self._kids.drop(pid)
             except OSError as error:
                 if error.errno == errno.ECHILD:
@@ -520,6 +841,19 @@ Runner {0} reached maximum restart limit of {1:d}, not restarting.""",
                 elif error.errno == errno.EINTR:
                     continue
                 raise
+        # The zygotes exit once their runners have.
+        for zygote in self._zygotes:
+            zygote.retire()
+            try:
+                os.waitpid(zygote.pid, 0)
+            except ChildProcessError:
+                pass
+        del self._zygotes[:]
+        if len(self._scalers) > 0:
+            try:
+                os.remove(status_path())
+            except FileNotFoundError:
+                pass
 
 
 
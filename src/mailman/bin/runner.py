@@ -24,14 +24,20 @@ __all__ = [
 
 import os
 import sys
+import fcntl
+import random
+import select
 import signal
+import socket
 import logging
 import argparse
 import traceback
 
+from lazr.config import as_boolean
 from mailman.config import config
 from mailman.core.i18n import _
 from mailman.core.initialize import initialize
+from mailman.core.logging import reopen
 from mailman.utilities.modules import find_name
 from mailman.version import MAILMAN_VERSION_FULL
 
@@ -100,6 +106,136 @@ def make_runner(name, slice, range, once=False):
     return runner_class(name, slice)
 
 
+def run_runner(name, slice, range, once=False):
+    """Run a runner until it stops.
+
+    :return: The runner's exit status.
+    :rtype: int
+    """
+    runner = make_runner(name, slice, range, once)
+    runner.set_signals()
+    # Now start up the main loop
+    log.info('%s runner started.', runner.name)
+    runner.run()
+    log.info('%s runner exiting.', runner.name)
+    return runner.status
+
+
+def _fork_runner(spec, connection, wakeup):
+    """Fork a runner process from the zygote."""
+    name, colon, slices = spec.partition(':')
+    slice, colon, range = slices.partition(':')
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 1
+    try:
+        # The runner must not hold on to the zygote's connection to the
+        # master, nor its signal handling.
+        connection.close()
+        signal.set_wakeup_fd(-1)
+        for fd in wakeup:
+            os.close(fd)
+        for signum in (signal.SIGCHLD, signal.SIGHUP, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        # Give the runner a state of its own, the way a fresh process would
+        # have.  In particular, it must not share database connections with
+        # any other process.
+        random.seed()
+        reopen()
+        config.db.engine.dispose()
+        status = run_runner(name, int(slice or 1), int(range or 1))
+    except SystemExit as error:
+        status = error.code
+    except:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status if isinstance(status, int) else 1)
+
+
+def serve_zygote():
+    """Fork ready runners on the master watcher's demand.
+
+    The zygote has initialized Mailman and imported all the runners, so the
+    runners it forks start without delay.  The master watcher sends runner
+    specs, one per line, over the socket on standard input.  The zygote
+    answers each with a `started <pid>` line, and reports every runner which
+    exits with an `exited <pid> <status>` line.  When the master shuts down
+    its end of the socket, the zygote exits as soon as all its runners have.
+    """
+    # Import all the runners, and everything they import, up front.  A
+    # runner which can't be imported reports this when it's started.
+    for section in config.runner_configs:
+        if as_boolean(section.start):
+            try:
+                find_name(getattr(section, 'class'))
+            except ImportError:
+                pass
+    # Connections opened while initializing must not be carried into the
+    # runners.
+    config.db.store.close()
+    config.db.engine.dispose()
+    connection = socket.fromfd(0, socket.AF_UNIX, socket.SOCK_STREAM)
+    os.close(0)
+    os.open(os.devnull, os.O_RDONLY)
+    # Wake up from select() when a runner exits.
+    wakeup = os.pipe()
+    for fd in wakeup:
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    signal.set_wakeup_fd(wakeup[1])
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    # Hangups and control-C are for the master and the runners.
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    log.info('Zygote started')
+    children = set()
+    retired = orphaned = False
+    buffer = b''
+    while not retired or len(children) > 0:
+        try:
+            readable, writable, errors = select.select(
+                [wakeup[0]] + ([] if retired else [connection]), [], [])
+        except InterruptedError:
+            readable = []
+        try:
+            while os.read(wakeup[0], 512):
+                pass
+        except BlockingIOError:
+            pass
+        replies = []
+        while len(children) > 0:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            children.discard(pid)
+            replies.append('exited {0:d} {1:d}\n'.format(pid, status))
+        if connection in readable:
+            try:
+                data = connection.recv(4096)
+            except ConnectionError:
+                data = b''
+            if len(data) == 0:
+                retired = True
+            buffer += data
+            while b'\n' in buffer:
+                line, newline, buffer = buffer.partition(b'\n')
+                pid = _fork_runner(line.decode('utf-8'), connection, wakeup)
+                children.add(pid)
+                replies.append('started {0:d}\n'.format(pid))
+        if len(replies) > 0 and not orphaned:
+            try:
+                connection.sendall(''.join(replies).encode('utf-8'))
+            except ConnectionError:
+                # The master is gone.  Like runners started by the master
+                # itself, ours keep running until they are stopped.
+                orphaned = retired = True
+    log.info('Zygote stopped')
+    return 0
+
+
 
 def main():
     global log
@@ -148,7 +284,10 @@ def main():
 
         When using the `slice:range` form, you must ensure that each
         runner for the queue is given the same range value.  If
-        `slice:runner` is not given, then 1:1 is used.
+        `slice:runner` is not given, then 1:1 is used.  When the
+        runner's `dispatch` setting is `claim`, slice and range are
+        ignored, and any number of runners can be started for the
+        queue at any time.
         """))
     parser.add_argument(
         '-o', '--once',
@@ -165,9 +304,14 @@ def main():
         '-v', '--verbose',
         default=None, action='store_true', help=_("""\
         Display more debugging information to the log file."""))
+    parser.add_argument(
+        '--zygote',
+        default=False, action='store_true', help=_("""\
+        Run as the master watcher's zygote, which forks ready runners
+        on demand.  This is only for the master watcher's use."""))
 
     args = parser.parse_args()
-    if args.runner is None and not args.list:
+    if args.runner is None and not args.list and not args.zygote:
         parser.error(_('No runner name given.'))
 
     # Initialize the system.  Honor the -C flag if given.
@@ -196,10 +340,6 @@ def main():
             print(_('$name runs $classname'))
         sys.exit(0)
 
-    runner = make_runner(*args.runner, once=args.once)
-    runner.set_signals()
-    # Now start up the main loop
-    log.info('%s runner started.', runner.name)
-    runner.run()
-    log.info('%s runner exiting.', runner.name)
-    sys.exit(runner.status)
+    if args.zygote:
+        sys.exit(serve_zygote())
+    sys.exit(run_runner(*args.runner, once=args.once))
@@ -0,0 +1,59 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the mailman command dispatcher."""
+
+__all__ = [
+    'TestSubcommands',
+    ]
+
+
+import unittest
+
+from mailman.bin.mailman import find_subcommand
+from mailman.interfaces.command import ICLISubCommand
+from mailman.utilities.modules import find_lazy_components
+from zope.interface.verify import verifyObject
+
+
+
+class TestSubcommands(unittest.TestCase):
+    """Test finding the subcommands."""
+
+    def test_find_subcommand(self):
+        self.assertEqual(find_subcommand(['status']), 'status')
+        self.assertEqual(find_subcommand(['-C', 'x.cfg', 'members', '-a']),
+                         'members')
+        self.assertEqual(find_subcommand(['--config', 'status', 'info']),
+                         'info')
+        self.assertEqual(find_subcommand(['-Cx.cfg', 'lists']), 'lists')
+        self.assertIsNone(find_subcommand([]))
+        self.assertIsNone(find_subcommand(['-h']))
+
+    def test_lazy_subcommands(self):
+        # The subcommand names and descriptions recorded in the component
+        # registry match the subcommands.
+        lazy_commands = list(find_lazy_components(
+            'mailman.commands', ICLISubCommand, ('name', '__doc__')))
+        self.assertIn('status', [lazy_command.attributes['name']
+                                 for lazy_command in lazy_commands])
+        for lazy_command in lazy_commands:
+            command = lazy_command.load()()
+            verifyObject(ICLISubCommand, command)
+            self.assertEqual(lazy_command.attributes['name'], command.name)
+            self.assertEqual(lazy_command.attributes['__doc__'],
+                             command.__doc__)
@@ -19,16 +19,25 @@
 
 __all__ = [
     'TestMasterLock',
+    'TestScaling',
+    'TestZygote',
     ]
 
 
 import os
 import errno
+import signal
 import tempfile
 import unittest
+import subprocess
 
 from flufl.lock import Lock
 from mailman.bin import master
+from mailman.config import config
+from mailman.core.scaling import read_status, status_path
+from mailman.testing.helpers import (
+    LogFileMark, configuration, specialized_message_from_string as mfs)
+from mailman.testing.layers import ConfigLayer
 
 
 
@@ -68,3 +77,167 @@ class TestMasterLock(unittest.TestCase):
             my_lock.unlock()
         self.assertEqual(state, master.WatcherState.conflict)
         # XXX test stale_lock and host_mismatch states.
+
+
+
+class FakeLoop(master.Loop):
+    """Start sleeping processes instead of runners."""
+
+    def __init__(self):
+        super().__init__()
+        self.specs = []
+        self.processes = {}
+
+    def _start_runner(self, spec):
+        process = subprocess.Popen(['sleep', '60'])
+        self.specs.append(spec)
+        self.processes[process.pid] = process
+        return process.pid
+
+
+
+class TestScaling(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._loop = FakeLoop()
+        self.addCleanup(self._stop)
+
+    def _stop(self):
+        for process in self._loop.processes.values():
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        try:
+            os.remove(status_path())
+        except FileNotFoundError:
+            pass
+
+    def _fill(self, count):
+        switchboard = config.switchboards['out']
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+
+A message.
+""")
+        return [switchboard.enqueue(msg) for i in range(count)]
+
+    @configuration('runner.out', dispatch='claim', max_instances=3,
+                   scale_up_depth=2, scale_down_depth=0, scale_cooldown='0s')
+    def test_scale_up_and_down(self):
+        self._loop.start_runners(['out'])
+        self.assertEqual(self._loop.specs, ['out:0:1'])
+        filebases = self._fill(3)
+        self._loop.scale()
+        self.assertEqual(self._loop.specs, ['out:0:1', 'out:1:3'])
+        status = read_status()
+        self.assertEqual(len(status), 1)
+        self.assertEqual(status[0]['name'], 'out')
+        self.assertEqual(status[0]['instances'], 2)
+        self.assertEqual(status[0]['depth'], 3)
+        # Once the queue is empty, the newest process is stopped.
+        for filebase in filebases:
+            config.switchboards['out'].dequeue(filebase)
+        self._loop.scale()
+        stopped = self._loop.processes[self._loop._kids.find('out')[-1][0]]
+        self.assertEqual(stopped.wait(), -signal.SIGTERM)
+        self.assertEqual(read_status()[0]['instances'], 1)
+        # The stopped process isn't counted anymore, even before the master
+        # has reaped it, so the last one keeps running.
+        self._loop.scale()
+        self.assertEqual(
+            len([process for process in self._loop.processes.values()
+                 if process.poll() is None]), 1)
+
+    @configuration('runner.out', max_instances=3)
+    def test_hash_dispatch_not_scaled(self):
+        # Only runners which claim their queue entries can be autoscaled.
+        self._loop.start_runners(['out'])
+        self._fill(10)
+        self._loop.scale()
+        self.assertEqual(self._loop.specs, ['out:0:1'])
+        self.assertEqual(read_status(), [])
+
+    @configuration('runner.rest', dispatch='claim', max_instances=3)
+    def test_no_queue_not_scaled(self):
+        # Runners without a queue have nothing to sample.
+        mark = LogFileMark('mailman.runner')
+        self._loop.start_runners(['rest'])
+        self._loop.scale()
+        self.assertEqual(self._loop.specs, ['rest:0:1'])
+        self.assertEqual(read_status(), [])
+        self.assertIn('Runner rest not autoscaled: it has no queue',
+                      mark.read())
+
+
+
+def _parent(pid):
+    with open('/proc/{0:d}/stat'.format(pid)) as fp:
+        return int(fp.read().rsplit(')', 1)[1].split()[1])
+
+
+
+@unittest.skipUnless(os.path.exists('/proc/self/stat'), 'Needs /proc')
+class TestZygote(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        with configuration('mailman', zygote='yes'):
+            self._loop = master.Loop(config_file=config.filename)
+        self.addCleanup(self._stop)
+
+    def _stop(self):
+        self._loop.cleanup()
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    def _wait(self):
+        pid, status = self._loop._wait()
+        self._loop._kids.pop(pid)
+        return pid, status
+
+    def test_runners_come_from_the_zygote(self):
+        self._loop.start_runners(['in', 'virgin'])
+        pids = list(self._loop._kids)
+        self.assertEqual(len(pids), 2)
+        zygote = self._loop._zygotes[0]
+        for pid in pids:
+            self.assertEqual(_parent(pid), zygote.pid)
+        # The master hears about runners that exit.
+        os.kill(pids[0], signal.SIGTERM)
+        pid, status = self._wait()
+        self.assertEqual(pid, pids[0])
+        self.assertEqual(len(self._loop._zygotes), 1)
+
+    def test_new_zygote_on_restart(self):
+        self._loop.start_runners(['virgin'])
+        old_pid = list(self._loop._kids)[0]
+        old_zygote = self._loop._zygotes[0]
+        # A restart retires the old zygote, which still reports its runner.
+        self._loop._stale_zygote = True
+        new_pid = self._loop._start_runner('virgin:0:1')
+        self._loop._kids.add(new_pid, ('virgin', 0, 1, 1))
+        self.assertEqual(len(self._loop._zygotes), 2)
+        new_zygote = self._loop._zygotes[1]
+        self.assertNotEqual(new_zygote.pid, old_zygote.pid)
+        self.assertEqual(_parent(new_pid), new_zygote.pid)
+        os.kill(old_pid, signal.SIGTERM)
+        pid, status = self._wait()
+        self.assertEqual(pid, old_pid)
+        # Without runners, the old zygote exits.
+        old_zygote.receive()
+        self.assertFalse(old_zygote.alive)
+        self.assertIsNone(self._loop._zygote_exit())
+        self.assertEqual(self._loop._zygotes, [new_zygote])
+
+    def test_zygote_dies(self):
+        self._loop.start_runners(['virgin'])
+        runner_pid = list(self._loop._kids)[0]
+        zygote = self._loop._zygotes[0]
+        os.kill(zygote.pid, signal.SIGKILL)
+        # The orphaned runner is stopped, and counts as exited.
+        pid, status = self._wait()
+        self.assertEqual(pid, runner_pid)
+        self.assertEqual(status, signal.SIGTERM)
+        self.assertFalse(zygote.alive)
@@ -0,0 +1,102 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""The `mailman startup` subcommand."""
+
+__all__ = [
+    'Startup',
+    ]
+
+
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+from mailman.config import config
+from mailman.core.i18n import _
+from mailman.interfaces.command import ICLISubCommand
+from mailman.utilities.startup import PROFILE_ENVIRONMENT
+from tempfile import TemporaryDirectory
+from zope.interface import implementer
+
+
+
+@implementer(ICLISubCommand)
+class Startup:
+    """Profile the start up of the mailman command."""
+
+    name = 'startup'
+
+    def add(self, parser, command_parser):
+        """See `ICLISubCommand`."""
+        self.parser = parser
+        command_parser.add_argument(
+            '-o', '--output',
+            default=None, help=_("""\
+            Write the full profile report to this file, as JSON.  The report
+            contains the time taken by every phase of the start up, and by
+            every module import."""))
+        command_parser.add_argument(
+            '-n', '--imports',
+            default=10, type=int, help=_("""\
+            Print this many of the slowest module imports.  The default is
+            10."""))
+        command_parser.add_argument(
+            'arguments',
+            nargs='*', help=_("""\
+            The mailman subcommand, with its arguments, to profile.  The
+            default is `version`.  Use -- to separate the subcommand's options
+            from this command's."""))
+
+    def process(self, args):
+        """See `ICLISubCommand`."""
+        arguments = (['version'] if len(args.arguments) == 0
+                     else args.arguments)
+        command = [sys.executable, os.path.join(config.BIN_DIR, 'mailman')]
+        # Profile with the same configuration file as this command uses.
+        config_path = (config.filename if args.config is None
+                       else os.path.abspath(os.path.expanduser(args.config)))
+        if config_path is not None:
+            command.extend(['-C', config_path])
+        command.extend(arguments)
+        with TemporaryDirectory() as tempdir:
+            report_path = os.path.join(tempdir, 'profile.json')
+            env = os.environ.copy()
+            env[PROFILE_ENVIRONMENT] = report_path
+            subprocess.call(command, env=env, stdout=subprocess.DEVNULL)
+            if not os.path.exists(report_path):
+                self.parser.error(_('No start up profile was written'))
+            with open(report_path) as fp:
+                report = json.load(fp)
+            if args.output is not None:
+                shutil.copyfile(report_path, args.output)
+        arguments = ' '.join(arguments)
+        elapsed = '{0:.3f}'.format(report['elapsed'])
+        print(_('mailman $arguments started up in $elapsed seconds'))
+        print()
+        print(_('Phases:'))
+        for phase in report['phases']:
+            print('    {0:{1}.3f}  {2}{3}'.format(
+                phase['duration'], 7, '  ' * phase['depth'], phase['name']))
+        print()
+        count = min(args.imports, len(report['imports']))
+        print(_('The $count slowest imports (self, cumulative):'))
+        for record in report['imports'][:count]:
+            print('    {0:7.3f}  {1:7.3f}  {2}'.format(
+                record['self'], record['cumulative'], record['module']))
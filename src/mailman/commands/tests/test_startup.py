@@ -0,0 +1,71 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the startup subcommand."""
+
+__all__ = [
+    'TestStartup',
+    ]
+
+
+import os
+import json
+import mock
+import shutil
+import tempfile
+import unittest
+
+from io import StringIO
+from mailman.commands.cli_startup import Startup
+from mailman.testing.layers import ConfigLayer
+
+
+class FakeArgs:
+    config = None
+    output = None
+    imports = 5
+    arguments = []
+
+
+
+class TestStartup(unittest.TestCase):
+    """Test the startup subcommand."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self.command = Startup()
+        self.args = FakeArgs()
+        self._tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._tempdir)
+
+    def test_report(self):
+        self.args.output = os.path.join(self._tempdir, 'profile.json')
+        output = StringIO()
+        with mock.patch('sys.stdout', output):
+            self.command.process(self.args)
+        with open(self.args.output) as fp:
+            report = json.load(fp)
+        self.assertEqual(report['argv'][-1], 'version')
+        names = [phase['name'] for phase in report['phases']]
+        for name in ('subcommands', 'initialize_1', 'database',
+                     'find_components: mailman.rules'):
+            self.assertIn(name, names)
+        self.assertGreater(len(report['imports']), 0)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('mailman version started up in'))
+        self.assertEqual(lines[-6], 'The 5 slowest imports (self, cumulative):')
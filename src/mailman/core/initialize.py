@@ -40,6 +40,7 @@ import mailman.core.logging
 
 from mailman.interfaces.database import IDatabaseFactory
 from mailman.utilities.modules import call_name
+from mailman.utilities.startup import PROFILE_ENVIRONMENT, profile
 from pkg_resources import resource_string as resource_bytes
 from zope.component import getUtility
 from zope.configuration import xmlconfig
@@ -105,8 +106,9 @@ def initialize_1(config_path=None):
     :param config_path: The path to the configuration file.
     :type config_path: string
     """
-    zcml = resource_bytes('mailman.config', 'configure.zcml')
-    xmlconfig.string(zcml.decode('utf-8'))
+    with profile.phase('zcml'):
+        zcml = resource_bytes('mailman.config', 'configure.zcml')
+        xmlconfig.string(zcml.decode('utf-8'))
     # By default, set the umask so that only owner and group can read and
     # write our files.  Specifically we must have g+rw and we probably want
     # o-rwx although I think in most cases it doesn't hurt if other can read
@@ -114,17 +116,19 @@ def initialize_1(config_path=None):
     os.umask(0o007)
     # Initialize configuration event subscribers.  This must be done before
     # setting up the configuration system.
-    from mailman.app.events import initialize as initialize_events
-    initialize_events()
+    with profile.phase('events'):
+        from mailman.app.events import initialize as initialize_events
+        initialize_events()
     # config_path will be set if the command line argument -C is given.  That
     # case overrides all others.  When not given on the command line, the
     # configuration file is searched for in the file system.
-    if config_path is None:
-        config_path = search_for_configuration_file()
-    elif config_path is INHIBIT_CONFIG_FILE:
-        # For the test suite, force this back to not using a config file.
-        config_path = None
-    mailman.config.config.load(config_path)
+    with profile.phase('configuration'):
+        if config_path is None:
+            config_path = search_for_configuration_file()
+        elif config_path is INHIBIT_CONFIG_FILE:
+            # For the test suite, force this back to not using a config file.
+            config_path = None
+        mailman.config.config.load(config_path)
     # Use this environment variable to define an extra configuration file for
     # testing.  This is used by the tox.ini to run the full test suite under
     # PostgreSQL.
@@ -152,15 +156,18 @@ def initialize_2(debug=False, propagate_logs=None, testing=False):
     :type propagate_logs: boolean or None
     """
     # Create the queue and log directories if they don't already exist.
-    mailman.core.logging.initialize(propagate_logs)
+    with profile.phase('logging'):
+        mailman.core.logging.initialize(propagate_logs)
     # Run the pre-hook if there is one.
     config = mailman.config.config
     if config.mailman.pre_hook:
-        call_name(config.mailman.pre_hook)
+        with profile.phase('pre-hook'):
+            call_name(config.mailman.pre_hook)
     # Instantiate the database class, ensure that it's of the right type, and
     # initialize it.  Then stash the object on our configuration object.
     utility_name = ('testing' if testing else 'production')
-    config.db = getUtility(IDatabaseFactory, utility_name).create()
+    with profile.phase('database'):
+        config.db = getUtility(IDatabaseFactory, utility_name).create()
     # Initialize the rules and chains.  Do the imports here so as to avoid
     # circular imports.
     from mailman.app.commands import initialize as initialize_commands
@@ -168,10 +175,14 @@ def initialize_2(debug=False, propagate_logs=None, testing=False):
     from mailman.core.pipelines import initialize as initialize_pipelines
     from mailman.core.rules import initialize as initialize_rules
     # Order here is somewhat important.
-    initialize_rules()
-    initialize_chains()
-    initialize_pipelines()
-    initialize_commands()
+    with profile.phase('rules'):
+        initialize_rules()
+    with profile.phase('chains'):
+        initialize_chains()
+    with profile.phase('pipelines'):
+        initialize_pipelines()
+    with profile.phase('commands'):
+        initialize_commands()
 
 
 def initialize_3():
@@ -182,11 +193,19 @@ def initialize_3():
     # Run the post-hook if there is one.
     config = mailman.config.config
     if config.mailman.post_hook:
-        call_name(config.mailman.post_hook)
+        with profile.phase('post-hook'):
+            call_name(config.mailman.post_hook)
 
 
 
 def initialize(config_path=None, propagate_logs=None):
-    initialize_1(config_path)
-    initialize_2(propagate_logs=propagate_logs)
-    initialize_3()
+    with profile.phase('initialize_1'):
+        initialize_1(config_path)
+    with profile.phase('initialize_2'):
+        initialize_2(propagate_logs=propagate_logs)
+    with profile.phase('initialize_3'):
+        initialize_3()
+    # Write the start-up profile, if one is being taken.
+    if profile.active:
+        profile.stop()
+        profile.write(os.environ[PROFILE_ENVIRONMENT])
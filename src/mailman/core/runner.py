@@ -22,6 +22,7 @@ __all__ = [
     ]
 
 
+import os
 import time
 import signal
 import logging
@@ -36,6 +37,8 @@ from mailman.core.switchboard import Switchboard
 from mailman.interfaces.languages import ILanguageManager
 from mailman.interfaces.listmanager import IListManager
 from mailman.interfaces.runner import IRunner, RunnerCrashEvent
+from mailman.interfaces.switchboard import QueueEntryClaimedError
+from mailman.utilities.inotify import DirectoryWatcher
 from mailman.utilities.string import expand
 from zope.component import getUtility
 from zope.event import notify
@@ -70,8 +73,13 @@ class Runner:
         # should not have queue_directory or switchboard instance.
         if self.is_queue_runner:
             self.queue_directory = expand(section.path, substitutions)
+            # When the runners claim their queue entries, any number of them
+            # can share the queue, and the process id identifies the claims.
+            claim = (str(os.getpid()) if section.dispatch == 'claim'
+                     else None)
             self.switchboard = Switchboard(
-                name, self.queue_directory, slice, numslices, True)
+                name, self.queue_directory, slice, numslices, True,
+                section.queue_format, claim)
         else:
             self.queue_directory = None
             self.switchboard= None
@@ -82,6 +90,23 @@ class Runner:
                             self.sleep_time.microseconds / 1.0e6)
         self.max_restarts = int(section.max_restarts)
         self.start = as_boolean(section.start)
+        # Group commit settings.  Queue entries are processed in a single
+        # database transaction until either this many have been processed, or
+        # this much time has passed.
+        self.commit_batch = int(section.commit_batch)
+        commit_interval = as_timedelta(section.commit_interval)
+        self.commit_interval = (86400 * commit_interval.days +
+                                commit_interval.seconds +
+                                commit_interval.microseconds / 1.0e6)
+        # When configured to, idle queue runners block on file system
+        # notifications for new queue files instead of just sleeping.  The
+        # same notifications keep the switchboard's index of the queue up to
+        # date, so it doesn't have to rescan the directory every time.
+        self._watcher = None
+        if self.is_queue_runner and section.wakeup == 'notify':
+            self._watcher = DirectoryWatcher(self.queue_directory, '.pck')
+            if self._watcher.is_notifying:
+                self.switchboard.use_index(self._watcher)
         self._stop = False
         self.status = 0
 
@@ -142,12 +167,25 @@ class Runner:
         # List all the files in our queue directory.  The switchboard is
         # guaranteed to hand us the files in FIFO order.
         files = self.switchboard.files
+        # When several entries are committed together, each is processed
+        # inside a savepoint, so that a failure only rolls back that entry's
+        # changes.  The backup files of the processed entries are only
+        # removed once their transaction has been committed, so that a crash
+        # before then replays them.  They are set aside meanwhile, so that
+        # the replay only counts against the entry which was in flight.
+        batching = (self.commit_batch > 1)
+        uncommitted = []
+        batch_started = None
         for filebase in files:
             dlog.debug('[%s] processing filebase: %s', me, filebase)
             try:
                 # Ask the switchboard for the message and metadata objects
                 # associated with this queue file.
                 msg, msgdata = self.switchboard.dequeue(filebase)
+            except QueueEntryClaimedError:
+                # Another runner got to this entry first.
+                dlog.debug('[%s] already claimed: %s', me, filebase)
+                continue
             except Exception as error:
                 # This used to just catch email.Errors.MessageParseError, but
                 # other problems can occur in message parsing, e.g.
@@ -158,13 +196,20 @@ class Runner:
                 elog.error('Skipping and preserving unparseable message: %s',
                            filebase)
                 self.switchboard.finish(filebase, preserve=True)
-                config.db.abort()
+                if not batching:
+                    config.db.abort()
                 continue
             try:
                 dlog.debug('[%s] processing onefile', me)
-                self._process_one_file(msg, msgdata)
-                dlog.debug('[%s] finishing filebase: %s', me, filebase)
-                self.switchboard.finish(filebase)
+                if batching:
+                    with config.db.savepoint():
+                        self._process_one_file(msg, msgdata)
+                    self.switchboard.mark_processed(filebase)
+                else:
+                    self._process_one_file(msg, msgdata)
+                if batch_started is None:
+                    batch_started = time.time()
+                uncommitted.append(filebase)
             except Exception as error:
                 # All runners that implement _dispose() must guarantee that
                 # exceptions are caught and dealt with properly.  Still, there
@@ -192,19 +237,43 @@ class Runner:
                         'SHUNTING FAILED, preserving original entry: %s',
                         filebase)
                     self.switchboard.finish(filebase, preserve=True)
-                config.db.abort()
+                if not batching:
+                    config.db.abort()
             # Other work we want to do each time through the loop.
             dlog.debug('[%s] doing periodic', me)
             self._do_periodic()
-            dlog.debug('[%s] committing transaction', me)
-            config.db.commit()
+            if (not batching or
+                    len(uncommitted) >= self.commit_batch or
+                    (batch_started is not None and
+                     0 < self.commit_interval <=
+                     time.time() - batch_started)):
+                self._commit(uncommitted)
+                batch_started = None
             dlog.debug('[%s] checking short circuit', me)
             if self._short_circuit():
                 dlog.debug('[%s] short circuiting', me)
                 break
+        # Commit whatever is left of the last batch.
+        if batching and len(files) > 0:
+            self._commit(uncommitted)
         dlog.debug('[%s] ending oneloop: %s', me, len(files))
         return len(files)
 
+    def _commit(self, uncommitted):
+        """Commit the transaction, then finish the processed queue entries.
+
+        :param uncommitted: The base names of the queue entries processed in
+            the current transaction.  This list is emptied.
+        :type uncommitted: list
+        """
+        me = self.__class__.__name__
+        dlog.debug('[%s] committing transaction', me)
+        config.db.commit()
+        for filebase in uncommitted:
+            dlog.debug('[%s] finishing filebase: %s', me, filebase)
+            self.switchboard.finish(filebase)
+        del uncommitted[:]
+
     def _process_one_file(self, msg, msgdata):
         """See `IRunner`."""
         # Do some common sanity checking on the message metadata.  It's got to
@@ -271,7 +340,8 @@ class Runner:
 
     def _clean_up(self):
         """See `IRunner`."""
-        pass
+        if self._watcher is not None:
+            self._watcher.close()
 
     def _dispose(self, mlist, msg, msgdata):
         """See `IRunner`."""
@@ -285,7 +355,12 @@ class Runner:
         """See `IRunner`."""
         if filecnt or self.sleep_float <= 0:
             return
-        time.sleep(self.sleep_float)
+        if self._watcher is None:
+            time.sleep(self.sleep_float)
+        else:
+            # Wake up as soon as a new queue file shows up, but never wait
+            # longer than the polling interval.
+            self._watcher.wait(self.sleep_float)
 
     def _short_circuit(self):
         """See `IRunner`."""
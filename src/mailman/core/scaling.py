@@ -0,0 +1,257 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Scale the number of queue runner processes with the queue's load.
+
+The master watcher keeps a `RunnerScaler` for every runner with autoscaling
+enabled.  Every so often it samples the runner's queue, and the scaler
+decides whether to start another runner process, stop one, or leave things
+as they are.  The scalers' state and their recent decisions are written to a
+status file, which the REST API serves.
+"""
+
+__all__ = [
+    'RunnerScaler',
+    'read_status',
+    'sample_queue',
+    'status_path',
+    'write_status',
+    ]
+
+
+import os
+import json
+import time
+
+from collections import deque
+from datetime import datetime
+from lazr.config import as_timedelta
+from mailman.config import config
+
+
+# The number of decisions to remember for each runner.
+HISTORY = 20
+
+
+
+class RunnerScaler:
+    """Decide how many processes a queue runner needs."""
+
+    def __init__(self, name, minimum, maximum, up_depth, up_age, down_depth,
+                 cooldown):
+        """Create a scaler.
+
+        :param name: The runner name.
+        :type name: str
+        :param minimum: The fewest runner processes to run.
+        :type minimum: int
+        :param maximum: The most runner processes to run.
+        :type maximum: int
+        :param up_depth: Start another process when there are more than this
+            many queue entries for each running process.
+        :type up_depth: int
+        :param up_age: Start another process when the oldest queue entry is
+            older than this many seconds.  Zero disables this check.
+        :type up_age: float
+        :param down_depth: Stop a process when there would still be at most
+            this many queue entries for each of the remaining processes.  For
+            the scaler not to flap, this must be smaller than `up_depth`.
+        :type down_depth: int
+        :param cooldown: Only stop a process when the queue has been quiet for
+            this many seconds, and no process has been started or stopped for
+            as long.
+        :type cooldown: float
+        """
+        assert 1 <= minimum <= maximum, (
+            'Bad instance bounds: {0}..{1}'.format(minimum, maximum))
+        assert down_depth < up_depth, (
+            'No hysteresis: {0} >= {1}'.format(down_depth, up_depth))
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.up_depth = up_depth
+        self.up_age = up_age
+        self.down_depth = down_depth
+        self.cooldown = cooldown
+        self.instances = minimum
+        self.depth = 0
+        self.age = 0.0
+        self.sampled = None
+        self.decisions = deque(maxlen=HISTORY)
+        self._last_change = None
+        self._quiet_since = None
+
+    @classmethod
+    def from_config(cls, name, section):
+        """Create the scaler for a runner, if it has autoscaling enabled.
+
+        :param name: The runner name.
+        :type name: str
+        :param section: The runner's configuration section.
+        :return: The scaler, or None if the runner's `max_instances` is not
+            greater than its `instances`.
+        :rtype: `RunnerScaler` or None
+        """
+        minimum = int(section.instances)
+        maximum = int(section.max_instances)
+        if maximum <= minimum:
+            return None
+        return cls(name, minimum, maximum,
+                   int(section.scale_up_depth),
+                   as_timedelta(section.scale_up_age).total_seconds(),
+                   int(section.scale_down_depth),
+                   as_timedelta(section.scale_cooldown).total_seconds())
+
+    def decide(self, instances, depth, age, now=None):
+        """Decide how many processes the runner should have.
+
+        The number of processes changes by at most one per decision.  Every
+        change is remembered in `decisions`.
+
+        :param instances: The number of runner processes currently running.
+        :type instances: int
+        :param depth: The number of entries in the runner's queue.
+        :type depth: int
+        :param age: The age of the oldest queue entry, in seconds.
+        :type age: float
+        :param now: The time of the sample, in seconds since the epoch.
+            Defaults to the current time.
+        :type now: float
+        :return: The number of processes the runner should have.
+        :rtype: int
+        """
+        if now is None:
+            now = time.time()
+        self.instances = instances
+        self.depth = depth
+        self.age = age
+        self.sampled = now
+        if depth > self.up_depth * instances:
+            self._quiet_since = None
+            reason = 'queue depth {0} > {1} per instance'.format(
+                depth, self.up_depth)
+            if instances < self.maximum:
+                return self._change(instances + 1, reason, now)
+        elif self.up_age > 0 and age > self.up_age:
+            self._quiet_since = None
+            reason = 'oldest entry age {0:.1f}s > {1:.1f}s'.format(
+                age, self.up_age)
+            if instances < self.maximum:
+                return self._change(instances + 1, reason, now)
+        elif depth <= self.down_depth * (instances - 1):
+            if self._quiet_since is None:
+                self._quiet_since = now
+            if (instances > self.minimum and
+                    now - self._quiet_since >= self.cooldown and
+                    (self._last_change is None or
+                     now - self._last_change >= self.cooldown)):
+                reason = 'queue depth {0} <= {1} per instance for {2:.0f}s'
+                return self._change(instances - 1, reason.format(
+                    depth, self.down_depth, now - self._quiet_since), now)
+        else:
+            self._quiet_since = None
+        # If more processes are running than allowed, e.g. because the
+        # configuration changed, the surplus ones are left to the operator.
+        return instances
+
+    def _change(self, instances, reason, now):
+        self.decisions.append(dict(
+            when=datetime.fromtimestamp(now).isoformat(),
+            before=self.instances,
+            after=instances,
+            depth=self.depth,
+            age=round(self.age, 3),
+            reason=reason,
+            ))
+        self._last_change = now
+        self.instances = instances
+        return instances
+
+    def as_dict(self):
+        """Return the scaler's state, for the status file.
+
+        :return: The scaler's state.
+        :rtype: dict
+        """
+        return dict(
+            name=self.name,
+            instances=self.instances,
+            min_instances=self.minimum,
+            max_instances=self.maximum,
+            depth=self.depth,
+            age=round(self.age, 3),
+            sampled=(None if self.sampled is None
+                     else datetime.fromtimestamp(self.sampled).isoformat()),
+            decisions=list(self.decisions),
+            )
+
+
+
+def sample_queue(switchboard, now=None):
+    """Measure the load on a queue.
+
+    :param switchboard: The queue's switchboard.
+    :type switchboard: `ISwitchboard`
+    :param now: The current time, in seconds since the epoch.  Defaults to
+        the current time.
+    :type now: float
+    :return: The number of entries in the queue, and the age of the oldest
+        one in seconds (zero for an empty queue).
+    :rtype: 2-tuple of (int, float)
+    """
+    if now is None:
+        now = time.time()
+    files = switchboard.files
+    if len(files) == 0:
+        return 0, 0.0
+    # The file base starts with the time the entry was enqueued, and the
+    # files are sorted oldest first.
+    when = float(files[0].split('+', 1)[0])
+    return len(files), max(now - when, 0.0)
+
+
+def status_path():
+    """The path to the autoscaling status file."""
+    return os.path.join(config.DATA_DIR, 'autoscaling.json')
+
+
+def write_status(scalers):
+    """Write the scalers' state to the status file.
+
+    :param scalers: The scalers.
+    :type scalers: sequence of `RunnerScaler`
+    """
+    path = status_path()
+    # Write the file atomically, since the REST API may be reading it.
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump([scaler.as_dict() for scaler in scalers], fp)
+    os.rename(tmp_path, path)
+
+
+def read_status():
+    """Read the scalers' state from the status file.
+
+    :return: The state of each scaler, as written by the master watcher.
+        This is empty when the master isn't autoscaling any runners.
+    :rtype: list of dicts
+    """
+    try:
+        with open(status_path()) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return []
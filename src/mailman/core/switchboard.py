@@ -22,6 +22,17 @@ subclass).  Metadata is represented as a Python dictionary.  For every
 message/metadata pair in a queue, a single file containing two pickles is
 written.  First, the message is written to the pickle, then the metadata
 dictionary is written.
+
+Queues can alternatively use the `raw` format.  Such files start with a magic
+string, followed by the metadata pickle and then the message's raw RFC 5322
+bytes.  The message is only parsed when it is first used, so entries which are
+just moved between queues are never parsed at all.
+
+Several runners can share a queue in one of two ways.  By default, the hash
+space of the queue file names is split into slices, one per runner.  In the
+claiming mode, every runner sees the whole queue, and claims an entry by
+renaming it to a backup file with its own claim suffix.  Only one runner can
+win that rename, so runners can come and go without dividing up the queue.
 """
 
 __all__ = [
@@ -33,14 +44,16 @@ __all__ = [
 import os
 import time
 import email
+import heapq
 import pickle
 import hashlib
 import logging
 
 from mailman.config import config
-from mailman.email.message import Message
+from mailman.email.message import LazyMessage, Message
 from mailman.interfaces.configuration import ConfigurationUpdatedEvent
-from mailman.interfaces.switchboard import ISwitchboard
+from mailman.interfaces.switchboard import (
+    ISwitchboard, QueueEntryClaimedError)
 from mailman.utilities.filesystem import makedirs
 from mailman.utilities.string import expand
 from zope.interface import implementer
@@ -56,6 +69,15 @@ DELTA = .0001
 # In order to prevent loops and a message flood, when the count reaches this
 # value, we move the file to the bad queue as a .psv.
 MAX_BAK_COUNT = 3
+# The first bytes of queue files in the raw format.
+RAW_MAGIC = b'MMQRAW1\n'
+# In the claiming mode, backup files have this extension, followed by the
+# claim identifier of the runner that claimed them.
+CLAIM_EXT = '.bak-'
+# The backup files of entries which were processed, but whose transaction
+# hasn't been committed yet, are set aside with this extension.  In the
+# claiming mode, it is followed by a dash and the claim identifier.
+DONE_EXT = '.done'
 
 elog = logging.getLogger('mailman.error')
 
@@ -65,8 +87,8 @@ elog = logging.getLogger('mailman.error')
 class Switchboard:
     """See `ISwitchboard`."""
 
-    def __init__(self, name, queue_directory,
-                 slice=None, numslices=1, recover=False):
+    def __init__(self, name, queue_directory, slice=None, numslices=1,
+                 recover=False, queue_format='pickle', claim=None):
         """Create a switchboard object.
 
         :param name: The queue name.
@@ -77,15 +99,37 @@ class Switchboard:
             None, it must be [0..`numslices`).
         :type slice: int or None
         :param numslices: The total number of slices to split this queue
-            directory into.  It must be a power of 2.
+            directory into.  It must be a power of 2.  This is ignored in the
+            claiming mode.
         :type numslices: int
         :param recover: True if backup files should be recovered.
         :type recover: bool
+        :param queue_format: The format new queue files are written in,
+            either 'pickle' or 'raw'.  Files in either format can always be
+            read.
+        :type queue_format: str
+        :param claim: If given, the switchboard works in the claiming mode,
+            and this identifies its claims.  It must be unique among the
+            switchboards working on the queue, and it must not contain a
+            period.  When it is a process id, the claims of a process which
+            no longer exists are recovered along with the backup files.
+        :type claim: str or None
         """
+        assert queue_format in ('pickle', 'raw'), (
+            'Bad queue format: {0}'.format(queue_format))
+        assert claim is None or '.' not in claim, (
+            'Bad claim identifier: {0}'.format(claim))
+        if claim is not None:
+            slice = None
+            numslices = 1
         assert (numslices & (numslices - 1)) == 0, (
             'Not a power of 2: {0}'.format(numslices))
         self.name = name
         self.queue_directory = queue_directory
+        self.queue_format = queue_format
+        self._claim = claim
+        # The entries set aside by mark_processed(), until they're finished.
+        self._processed = set()
         # If configured to, create the directory if it doesn't yet exist.
         if config.create_paths:
             makedirs(self.queue_directory, 0o770)
@@ -96,6 +140,8 @@ class Switchboard:
         if numslices != 1:
             self._lower = ((shamax + 1) * slice) / numslices
             self._upper = (((shamax + 1) * (slice + 1)) / numslices) - 1
+        # The incremental queue index, if enabled.
+        self._index = None
         if recover:
             self.recover_backup_files()
 
@@ -111,7 +157,16 @@ class Switchboard:
         list_id = data.get('listid', '--nolist--')
         # Get some data for the input to the sha hash.
         now = repr(time.time())
-        if data.get('_plaintext'):
+        raw = None
+        if self.queue_format == 'raw' and not data.get('_plaintext'):
+            # Messages which were never parsed are written back as is.
+            raw = LazyMessage.unparsed(_msg)
+            if raw is None:
+                raw = _raw_bytes(_msg, data)
+        if raw is not None:
+            protocol = pickle.HIGHEST_PROTOCOL
+            msgsave = raw
+        elif data.get('_plaintext'):
             protocol = 0
             msgsave = pickle.dumps(str(_msg), protocol)
         else:
@@ -126,7 +181,6 @@ class Switchboard:
         # and the sha hex digest.
         filebase = now + '+' + hashlib.sha1(hashfood).hexdigest()
         filename = os.path.join(self.queue_directory, filebase + '.pck')
-        tmpfile = filename + '.tmp'
         # Always add the metadata schema version number
         data['version'] = config.QFILE_SCHEMA_VERSION
         # Filter out volatile entries.  Use .keys() so that we can mutate the
@@ -137,28 +191,60 @@ class Switchboard:
         # We have to tell the dequeue() method whether to parse the message
         # object or not.
         data['_parsemsg'] = (protocol == 0)
-        # Write to the pickle file the message object and metadata.
+        self._write(filename, msgsave, data, protocol, raw is not None)
+        return filebase
+
+    def _write(self, filename, msgsave, data, protocol, raw):
+        """Atomically write a queue file.
+
+        :param msgsave: The pickled message, or its raw bytes.
+        :param raw: True to write the file in the raw format.
+        """
+        tmpfile = filename + '.tmp'
         with open(tmpfile, 'wb') as fp:
-            fp.write(msgsave)
-            pickle.dump(data, fp, protocol)
+            if raw:
+                fp.write(RAW_MAGIC)
+                pickle.dump(data, fp, protocol)
+                fp.write(msgsave)
+            else:
+                # Write to the pickle file the message object and metadata.
+                fp.write(msgsave)
+                pickle.dump(data, fp, protocol)
             fp.flush()
             os.fsync(fp.fileno())
         os.rename(tmpfile, filename)
-        return filebase
 
     def dequeue(self, filebase):
         """See `ISwitchboard`."""
+        if self._index is not None:
+            self._index.remove(filebase)
         # Calculate the filename from the given filebase.
         filename = os.path.join(self.queue_directory, filebase + '.pck')
-        backfile = os.path.join(self.queue_directory, filebase + '.bak')
+        backfile = self._backup_path(filebase)
+        if self._claim is not None:
+            # Other runners are working on the same queue, so claim the entry
+            # before reading it.  Only one of them can rename the file.
+            try:
+                os.rename(filename, backfile)
+            except FileNotFoundError:
+                raise QueueEntryClaimedError(filebase) from None
+            filename = backfile
         # Read the message object and metadata.
         with open(filename, 'rb') as fp:
             # Move the file to the backup file name for processing.  If this
             # process crashes uncleanly the .bak file will be used to
             # re-instate the .pck file in order to try again.
-            os.rename(filename, backfile)
-            msg = pickle.load(fp)
-            data = pickle.load(fp)
+            if filename != backfile:
+                os.rename(filename, backfile)
+            if fp.read(len(RAW_MAGIC)) == RAW_MAGIC:
+                data = pickle.load(fp)
+                msg = LazyMessage(fp.read())
+                if 'original_size' in data:
+                    msg.original_size = data['original_size']
+            else:
+                fp.seek(0)
+                msg = pickle.load(fp)
+                data = pickle.load(fp)
         if data.get('_parsemsg'):
             # Calculate the original size of the text now so that we won't
             # have to generate the message later when we do size restriction
@@ -171,7 +257,11 @@ class Switchboard:
 
     def finish(self, filebase, preserve=False):
         """See `ISwitchboard`."""
-        bakfile = os.path.join(self.queue_directory, filebase + '.bak')
+        if filebase in self._processed:
+            self._processed.discard(filebase)
+            bakfile = self._processed_path(filebase)
+        else:
+            bakfile = self._backup_path(filebase)
         try:
             if preserve:
                 bad_dir = config.switchboards['bad'].queue_directory
@@ -183,14 +273,59 @@ class Switchboard:
             elog.exception(
                 'Failed to unlink/preserve backup file: %s', bakfile)
 
+    def _backup_path(self, filebase):
+        """The path of the backup file for a dequeued entry."""
+        if self._claim is None:
+            extension = '.bak'
+        else:
+            extension = CLAIM_EXT + self._claim
+        return os.path.join(self.queue_directory, filebase + extension)
+
+    def _processed_path(self, filebase):
+        """The path of the backup file for a processed entry."""
+        if self._claim is None:
+            extension = DONE_EXT
+        else:
+            extension = DONE_EXT + '-' + self._claim
+        return os.path.join(self.queue_directory, filebase + extension)
+
+    def mark_processed(self, filebase):
+        """Set aside the backup file of an entry that has been processed.
+
+        The entry is still only removed by `finish()`, once the transaction
+        it was processed in has been committed.  Should the process crash
+        before then, the entry is recovered like any other backup file, but
+        this doesn't count toward its `MAX_BAK_COUNT`.  Only the entry which
+        was being processed when the crash happened is counted against.
+
+        :param filebase: The base name of a dequeued entry.
+        :type filebase: str
+        """
+        os.rename(self._backup_path(filebase), self._processed_path(filebase))
+        self._processed.add(filebase)
+
     @property
     def files(self):
         """See `ISwitchboard`."""
         return self.get_files()
 
-    def get_files(self, extension='.pck'):
+    def get_files(self, extension='.pck', count=None):
         """See `ISwitchboard`."""
+        if self._index is not None and extension == '.pck':
+            return self._index.get(count)
         times = {}
+        for filebase in self._scan(extension):
+            when, digest = filebase.split('+', 1)
+            key = float(when)
+            while key in times:
+                key += DELTA
+            times[key] = filebase
+        # FIFO sort
+        files = [times[k] for k in sorted(times)]
+        return files if count is None else files[:count]
+
+    def _scan(self, extension):
+        """Yield the base names of the files with extension in our slice."""
         lower = self._lower
         upper = self._upper
         for f in os.listdir(self.queue_directory):
@@ -199,17 +334,34 @@ class Switchboard:
             filebase, ext = os.path.splitext(f)
             if ext != extension:
                 continue
-            when, digest = filebase.split('+', 1)
             # Throw out any files which don't match our bitrange.  BAW: test
             # performance and end-cases of this algorithm.  MAS: both
             # comparisons need to be <= to get complete range.
-            if lower is None or (lower <= int(digest, 16) <= upper):
-                key = float(when)
-                while key in times:
-                    key += DELTA
-                times[key] = filebase
-        # FIFO sort
-        return [times[k] for k in sorted(times)]
+            if lower is None or self._in_slice(filebase):
+                yield filebase
+
+    def _in_slice(self, filebase):
+        """Is the given queue file in this switchboard's slice?"""
+        if self._lower is None:
+            return True
+        when, digest = filebase.split('+', 1)
+        return self._lower <= int(digest, 16) <= self._upper
+
+    def use_index(self, watcher):
+        """Track the queue in memory instead of rescanning the directory.
+
+        Once enabled, the .pck files in this switchboard's slice are kept in
+        a heap ordered by enqueue time.  The heap is fed by the file
+        notifications collected by `watcher`, and the queue directory is only
+        scanned again if notifications were lost.  This is only safe when
+        every new queue file is reported by the watcher, so it must not be
+        used when the watcher falls back to polling.
+
+        :param watcher: The watcher for this switchboard's queue directory.
+        :type watcher: `mailman.utilities.inotify.DirectoryWatcher`
+        """
+        assert watcher.is_notifying, 'Watcher is not using notifications'
+        self._index = _QueueIndex(self, watcher)
 
     def recover_backup_files(self):
         """See `ISwitchboard`."""
@@ -218,39 +370,260 @@ class Switchboard:
         # normal dequeuing process will handle them.  We keep count in
         # _bak_count in the metadata of the number of times we recover this
         # file.  When the count reaches MAX_BAK_COUNT, we move the .bak file
-        # to a .psv file in the bad queue.
-        for filebase in self.get_files('.bak'):
-            src = os.path.join(self.queue_directory, filebase + '.bak')
-            dst = os.path.join(self.queue_directory, filebase + '.pck')
-            with open(src, 'rb+') as fp:
-                try:
+        # to a .psv file in the bad queue.  Entries which were processed
+        # without their transaction being committed are moved back without
+        # being counted.
+        if self._claim is None:
+            for filebase in self.get_files('.bak'):
+                src = os.path.join(self.queue_directory, filebase + '.bak')
+                self._recover(src, filebase)
+            for filebase in self.get_files(DONE_EXT):
+                src = os.path.join(self.queue_directory, filebase + DONE_EXT)
+                self._recover(src, filebase, count=False)
+        else:
+            # Other runners may be recovering the same files, so each one is
+            # claimed first.  The backup files claimed by runners which are
+            # gone are recovered too.
+            for name in os.listdir(self.queue_directory):
+                filebase, ext = os.path.splitext(name)
+                count = not ext.startswith(DONE_EXT)
+                if ext in ('.bak', DONE_EXT):
+                    claim = None
+                elif ext.startswith((CLAIM_EXT, DONE_EXT + '-')):
+                    claim = ext.split('-', 1)[1]
+                    if claim != self._claim and _is_live(claim):
+                        continue
+                else:
+                    continue
+                path = os.path.join(self.queue_directory, name)
+                src = self._backup_path(filebase)
+                if path != src:
+                    try:
+                        os.rename(path, src)
+                    except FileNotFoundError:
+                        # Another runner claimed it first.
+                        continue
+                self._recover(src, filebase, count)
+        if self.queue_format == 'raw':
+            self._convert_to_raw()
+
+    def _recover(self, src, filebase, count=True):
+        """Move a backup file back into the queue.
+
+        :param src: The path of the backup file.
+        :param filebase: The base name of the queue entry.
+        :param count: Whether the recovery counts toward `MAX_BAK_COUNT`.
+        """
+        dst = os.path.join(self.queue_directory, filebase + '.pck')
+        if not count:
+            self._processed.discard(filebase)
+            os.rename(src, dst)
+            return
+        with open(src, 'rb+') as fp:
+            try:
+                if fp.read(len(RAW_MAGIC)) == RAW_MAGIC:
+                    data_pos = fp.tell()
+                    data = pickle.load(fp)
+                    # The raw message follows the metadata.
+                    rest = fp.read()
+                else:
                     # Throw away the message object.
+                    fp.seek(0)
                     pickle.load(fp)
                     data_pos = fp.tell()
                     data = pickle.load(fp)
-                except Exception as error:
-                    # If unpickling throws any exception, just log and
-                    # preserve this entry
-                    elog.error('Unpickling .bak exception: %s\n'
-                               'Preserving file: %s', error, filebase)
+                    rest = b''
+            except Exception as error:
+                # If unpickling throws any exception, just log and preserve
+                # this entry
+                elog.error('Unpickling .bak exception: %s\n'
+                           'Preserving file: %s', error, filebase)
+                self.finish(filebase, preserve=True)
+            else:
+                data['_bak_count'] = data.get('_bak_count', 0) + 1
+                fp.seek(data_pos)
+                if data.get('_parsemsg'):
+                    protocol = 0
+                else:
+                    protocol = 1
+                pickle.dump(data, fp, protocol)
+                fp.write(rest)
+                fp.truncate()
+                fp.flush()
+                os.fsync(fp.fileno())
+                if data['_bak_count'] >= MAX_BAK_COUNT:
+                    elog.error('.bak file max count, preserving file: %s',
+                               filebase)
                     self.finish(filebase, preserve=True)
                 else:
-                    data['_bak_count'] = data.get('_bak_count', 0) + 1
-                    fp.seek(data_pos)
-                    if data.get('_parsemsg'):
-                        protocol = 0
-                    else:
-                        protocol = 1
-                    pickle.dump(data, fp, protocol)
-                    fp.truncate()
-                    fp.flush()
-                    os.fsync(fp.fileno())
-                    if data['_bak_count'] >= MAX_BAK_COUNT:
-                        elog.error('.bak file max count, preserving file: %s',
-                                   filebase)
-                        self.finish(filebase, preserve=True)
-                    else:
-                        os.rename(src, dst)
+                    os.rename(src, dst)
+
+    def _convert_to_raw(self):
+        """Rewrite the pickled queue files in our slice in the raw format.
+
+        This migrates existing queue entries after a queue has been switched
+        to the raw format.  Entries which can't be represented as raw bytes
+        are left alone; they can still be dequeued just fine.
+        """
+        for filebase in self.get_files():
+            filename = os.path.join(self.queue_directory, filebase + '.pck')
+            if self._claim is None:
+                self._convert_file(filename, filebase)
+                continue
+            # Other runners may be dequeuing the entries at the same time, so
+            # each one is claimed while it is being converted.
+            backfile = self._backup_path(filebase)
+            try:
+                os.rename(filename, backfile)
+            except FileNotFoundError:
+                continue
+            try:
+                self._convert_file(backfile, filebase)
+            finally:
+                os.rename(backfile, filename)
+
+    def _convert_file(self, filename, filebase):
+        """Rewrite one pickled queue file in the raw format."""
+        try:
+            with open(filename, 'rb') as fp:
+                if fp.read(len(RAW_MAGIC)) == RAW_MAGIC:
+                    return
+                fp.seek(0)
+                msg = pickle.load(fp)
+                data = pickle.load(fp)
+        except Exception as error:
+            # Leave it to dequeue() to deal with broken entries.
+            elog.error('Cannot convert queue file %s: %s', filebase, error)
+            return
+        if data.get('_parsemsg'):
+            return
+        raw = _raw_bytes(msg, data)
+        if raw is None:
+            return
+        self._write(filename, raw, data, pickle.HIGHEST_PROTOCOL, True)
+
+
+
+def _is_live(claim):
+    """Is the runner holding a claim still around?
+
+    Only claims which are process ids can be checked.  Any other claim is
+    assumed to be live.
+    """
+    try:
+        pid = int(claim)
+    except ValueError:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to someone else.
+        pass
+    return True
+
+
+
+def _raw_bytes(msg, data):
+    """Return the message as raw bytes, or None if that's not possible.
+
+    Message attributes are not preserved in the raw format, so the message's
+    original size is recorded in the metadata dictionary `data`.
+    """
+    try:
+        # The generator would RFC 2047 encode non-ASCII header values, so
+        # they wouldn't survive the round trip unchanged.
+        for part in msg.walk():
+            for value in part.values():
+                if isinstance(value, str):
+                    value.encode('ascii', 'surrogateescape')
+        raw = msg.as_bytes(unixfrom=(msg.get_unixfrom() is not None))
+    except (LookupError, UnicodeError):
+        # E.g. non-ASCII text or unknown charsets.  Such messages can still
+        # be pickled.
+        return None
+    original_size = getattr(msg, 'original_size', None)
+    if original_size is not None and 'original_size' not in data:
+        data['original_size'] = original_size
+    return raw
+
+
+
+class _QueueIndex:
+    """An incremental, in-memory FIFO index of a switchboard's queue files."""
+
+    def __init__(self, switchboard, watcher):
+        self._switchboard = switchboard
+        self._watcher = watcher
+        # Heap of (enqueue time, filebase) for entries that may be handed out.
+        # Entries are deleted lazily, so the heap may contain stale items;
+        # only those with a filebase in _queued are valid.
+        self._heap = []
+        self._queued = set()
+        # Entries handed out by the last get() that haven't been dequeued.
+        self._handed_out = set()
+        # Entries dequeued since the notifications were last collected.  Any
+        # notification for these is stale and must be ignored.
+        self._dequeued = set()
+        self._rebuild()
+
+    def _push(self, filebase):
+        when, digest = filebase.split('+', 1)
+        self._queued.add(filebase)
+        heapq.heappush(self._heap, (float(when), filebase))
+
+    def _rebuild(self):
+        # Drop any pending notifications first; everything they might tell
+        # us about will be picked up by the directory scan.
+        self._watcher.collect()
+        self._heap = []
+        self._queued = set()
+        self._handed_out = set()
+        self._dequeued = set()
+        for filebase in self._switchboard._scan('.pck'):
+            self._push(filebase)
+
+    def _update(self):
+        names = self._watcher.collect()
+        if names is None:
+            # Notifications were lost, so start over from the directory.
+            self._rebuild()
+            return
+        for name in names:
+            filebase = os.path.splitext(name)[0]
+            if (filebase in self._queued or
+                    filebase in self._handed_out or
+                    filebase in self._dequeued):
+                continue
+            if self._switchboard._in_slice(filebase):
+                self._push(filebase)
+        self._dequeued = set()
+
+    def get(self, count=None):
+        """Hand out the oldest queue entries in FIFO order."""
+        self._update()
+        # Entries from the last call which were never dequeued go back in
+        # line, so they'll be handed out again.
+        for filebase in self._handed_out:
+            self._push(filebase)
+        self._handed_out = set()
+        files = []
+        while len(self._heap) > 0 and (count is None or len(files) < count):
+            when, filebase = heapq.heappop(self._heap)
+            if filebase not in self._queued:
+                # This entry is stale.
+                continue
+            self._queued.remove(filebase)
+            self._handed_out.add(filebase)
+            files.append(filebase)
+        return files
+
+    def remove(self, filebase):
+        """The entry is being dequeued."""
+        self._queued.discard(filebase)
+        self._handed_out.discard(filebase)
+        self._dequeued.add(filebase)
 
 
 
@@ -269,4 +642,5 @@ def handle_ConfigurationUpdatedEvent(event):
             substitutions = config.paths
             substitutions['name'] = name
             path = expand(conf.path, substitutions)
-            config.switchboards[name] = Switchboard(name, path)
+            config.switchboards[name] = Switchboard(
+                name, path, queue_format=conf.queue_format)
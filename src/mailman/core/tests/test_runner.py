@@ -22,18 +22,23 @@ __all__ = [
     ]
 
 
+import time
 import unittest
 
 from mailman.app.lifecycle import create_list
 from mailman.config import config
 from mailman.core.runner import Runner
+from mailman.core.switchboard import MAX_BAK_COUNT, Switchboard
 from mailman.interfaces.runner import RunnerCrashEvent
+from mailman.interfaces.usermanager import IUserManager
 from mailman.runners.virgin import VirginRunner
 from mailman.testing.helpers import (
     LogFileMark, configuration, event_subscribers, get_queue_messages,
     make_digest_messages, make_testable_runner,
     specialized_message_from_string as mfs)
 from mailman.testing.layers import ConfigLayer
+from unittest.mock import patch
+from zope.component import getUtility
 
 
 
@@ -42,6 +47,39 @@ class CrashingRunner(Runner):
         raise RuntimeError('borked')
 
 
+class ProcessCrash(BaseException):
+    """Stand in for the runner process crashing."""
+
+
+class AddressingRunner(Runner):
+    """Create an address for each message, crashing for some of them."""
+
+    seen = []
+
+    def _dispose(self, mlist, msg, msgdata):
+        # Record which backup files exist while this entry is processed.
+        msgdata['bak_files'] = (self.switchboard.get_files('.bak') +
+                                self.switchboard.get_files('.done'))
+        self.seen.append(msgdata)
+        getUtility(IUserManager).create_address(msg.sender)
+        if msg.sender.startswith('crash'):
+            raise RuntimeError('borked')
+        if msg.sender.startswith('poison'):
+            raise ProcessCrash
+
+
+class RivalRunner(Runner):
+    """Let another switchboard claim the rest of the queue."""
+
+    rival = None
+    seen = []
+
+    def _dispose(self, mlist, msg, msgdata):
+        for filebase in self.rival.files:
+            self.rival.dequeue(filebase)
+        self.seen.append(msg.sender)
+
+
 
 class TestRunner(unittest.TestCase):
     """Test the Runner base class behavior."""
@@ -120,3 +158,136 @@ Message-ID: <ant>
         # The list's -request address is the original sender.
         self.assertEqual(bag.msgdata['original_sender'],
                          'test-request@example.com')
+
+    @configuration('runner.in', wakeup='notify', sleep_time='10s')
+    def test_notify_wakeup(self):
+        # In notify mode an idle runner wakes up as soon as a new queue file
+        # appears instead of sleeping for the full sleep_time.
+        runner = make_testable_runner(CrashingRunner, 'in')
+        if not runner._watcher.is_notifying:
+            runner._clean_up()
+            self.skipTest('inotify is not available')
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+        config.switchboards['in'].enqueue(msg, listid='test.example.com')
+        start = time.time()
+        runner._snooze(0)
+        self.assertLess(time.time() - start, 5)
+        runner._clean_up()
+
+    def _enqueue_senders(self, *senders):
+        for sender in senders:
+            msg = mfs("""\
+From: {}
+To: test@example.com
+
+""".format(sender))
+            config.switchboards['in'].enqueue(msg, listid='test.example.com')
+
+    @configuration('runner.in', commit_batch=10)
+    def test_group_commit(self):
+        # With group commits, the backup files of the processed entries are
+        # kept until the transaction has been committed.
+        AddressingRunner.seen = []
+        runner = make_testable_runner(AddressingRunner, 'in')
+        self._enqueue_senders(
+            'anne@example.com', 'bart@example.com', 'cris@example.com')
+        with patch.object(config.db, 'commit',
+                          wraps=config.db.commit) as commit:
+            runner.run()
+        self.assertEqual(commit.call_count, 1)
+        self.assertEqual(
+            [len(msgdata['bak_files']) for msgdata in AddressingRunner.seen],
+            [1, 2, 3])
+        self.assertEqual(len(runner.switchboard.get_files('.bak')), 0)
+        self.assertEqual(len(runner.switchboard.get_files('.done')), 0)
+        self.assertEqual(len(runner.switchboard.files), 0)
+        user_manager = getUtility(IUserManager)
+        for email in ('anne@example.com', 'bart@example.com',
+                      'cris@example.com'):
+            self.assertIsNotNone(user_manager.get_address(email))
+
+    @configuration('runner.in', commit_batch=2)
+    def test_group_commit_batch_size(self):
+        AddressingRunner.seen = []
+        runner = make_testable_runner(AddressingRunner, 'in')
+        self._enqueue_senders(
+            'anne@example.com', 'bart@example.com', 'cris@example.com')
+        with patch.object(config.db, 'commit',
+                          wraps=config.db.commit) as commit:
+            runner.run()
+        self.assertEqual(commit.call_count, 2)
+        self.assertEqual(
+            [len(msgdata['bak_files']) for msgdata in AddressingRunner.seen],
+            [1, 2, 1])
+
+    @configuration('runner.in', commit_batch=10)
+    def test_group_commit_failure(self):
+        # An entry that fails only rolls back its own changes.
+        AddressingRunner.seen = []
+        runner = make_testable_runner(AddressingRunner, 'in')
+        self._enqueue_senders(
+            'anne@example.com', 'crash@example.com', 'cris@example.com')
+        runner.run()
+        user_manager = getUtility(IUserManager)
+        self.assertIsNotNone(user_manager.get_address('anne@example.com'))
+        self.assertIsNone(user_manager.get_address('crash@example.com'))
+        self.assertIsNotNone(user_manager.get_address('cris@example.com'))
+        shunted = get_queue_messages('shunt')
+        self.assertEqual(len(shunted), 1)
+        self.assertEqual(shunted[0].msg.sender, 'crash@example.com')
+        self.assertEqual(len(runner.switchboard.get_files('.bak')), 0)
+
+    @configuration('runner.in', commit_batch=10)
+    def test_group_commit_crash(self):
+        # An entry which keeps crashing the runner ends up in the bad queue,
+        # but the replays don't count against the entries processed along
+        # with it.
+        AddressingRunner.seen = []
+        runner = make_testable_runner(AddressingRunner, 'in')
+        self._enqueue_senders(
+            'anne@example.com', 'poison@example.com', 'cris@example.com')
+        # The mailing list has to survive the crashes.
+        config.db.commit()
+        for count in range(MAX_BAK_COUNT):
+            with self.assertRaises(ProcessCrash):
+                runner.run()
+            # The runner is restarted.
+            config.db.abort()
+            runner.switchboard.recover_backup_files()
+        # The poison entry is preserved in the bad queue.
+        preserved = config.switchboards['bad'].get_files('.psv')
+        self.assertEqual(len(preserved), 1)
+        self.assertEqual(AddressingRunner.seen[-1]['_bak_count'],
+                         MAX_BAK_COUNT - 1)
+        # The other entries are delivered, without having been counted.
+        AddressingRunner.seen = []
+        runner.run()
+        self.assertEqual(
+            [msgdata.get('_bak_count') for msgdata in AddressingRunner.seen],
+            [None, None])
+        user_manager = getUtility(IUserManager)
+        self.assertIsNotNone(user_manager.get_address('anne@example.com'))
+        self.assertIsNone(user_manager.get_address('poison@example.com'))
+        self.assertIsNotNone(user_manager.get_address('cris@example.com'))
+        self.assertEqual(len(runner.switchboard.files), 0)
+
+    @configuration('runner.in', dispatch='claim', instances=3)
+    def test_claimed_entries(self):
+        # Entries which another runner claimed first are skipped.
+        runner = make_testable_runner(RivalRunner, 'in')
+        RivalRunner.rival = Switchboard(
+            'in', runner.queue_directory, claim='rival')
+        RivalRunner.seen = []
+        error_log = LogFileMark('mailman.error')
+        self._enqueue_senders(
+            'anne@example.com', 'bart@example.com', 'cris@example.com')
+        runner.run()
+        self.assertEqual(RivalRunner.seen, ['anne@example.com'])
+        self.assertEqual(error_log.read(), '')
+        self.assertEqual(len(get_queue_messages('shunt')), 0)
+        self.assertEqual(len(RivalRunner.rival.get_files('.bak-rival')), 2)
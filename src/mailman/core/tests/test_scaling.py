@@ -0,0 +1,144 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the runner autoscaling policy."""
+
+__all__ = [
+    'TestRunnerScaler',
+    'TestSampling',
+    ]
+
+
+import os
+import unittest
+
+from mailman.config import config
+from mailman.core.scaling import (
+    RunnerScaler, read_status, sample_queue, status_path, write_status)
+from mailman.testing.helpers import (
+    configuration, specialized_message_from_string as mfs)
+from mailman.testing.layers import ConfigLayer
+
+
+
+class TestRunnerScaler(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        # Between 1 and 3 instances; up above 10 entries per instance or a
+        # 60 second old entry, down at 2 entries per remaining instance
+        # after 30 quiet seconds.
+        self._scaler = RunnerScaler('out', 1, 3, 10, 60, 2, 30)
+
+    def test_steady(self):
+        self.assertEqual(self._scaler.decide(1, 5, 1.0, now=0), 1)
+        self.assertEqual(len(self._scaler.decisions), 0)
+
+    def test_scale_up_on_depth(self):
+        self.assertEqual(self._scaler.decide(1, 11, 1.0, now=0), 2)
+        # One instance at a time.
+        self.assertEqual(self._scaler.decide(2, 100, 1.0, now=10), 3)
+        # Never above the maximum.
+        self.assertEqual(self._scaler.decide(3, 1000, 1.0, now=20), 3)
+        decisions = list(self._scaler.decisions)
+        self.assertEqual([(decision['before'], decision['after'])
+                          for decision in decisions], [(1, 2), (2, 3)])
+        self.assertEqual(decisions[0]['reason'],
+                         'queue depth 11 > 10 per instance')
+
+    def test_scale_up_on_age(self):
+        self.assertEqual(self._scaler.decide(1, 3, 61.0, now=0), 2)
+        self.assertEqual(self._scaler.decisions[-1]['reason'],
+                         'oldest entry age 61.0s > 60.0s')
+
+    def test_no_age_limit(self):
+        scaler = RunnerScaler('out', 1, 3, 10, 0, 2, 30)
+        self.assertEqual(scaler.decide(1, 3, 3600.0, now=0), 1)
+
+    def test_scale_down_after_cooldown(self):
+        self._scaler.decide(1, 100, 1.0, now=0)
+        self._scaler.decide(2, 100, 1.0, now=10)
+        # The queue is quiet, but not for long enough.
+        self.assertEqual(self._scaler.decide(3, 4, 1.0, now=20), 3)
+        self.assertEqual(self._scaler.decide(3, 4, 1.0, now=49), 3)
+        self.assertEqual(self._scaler.decide(3, 4, 1.0, now=50), 2)
+        # The cooldown starts over after every change.
+        self.assertEqual(self._scaler.decide(2, 0, 0.0, now=60), 2)
+        self.assertEqual(self._scaler.decide(2, 0, 0.0, now=80), 1)
+        # Never below the minimum.
+        self.assertEqual(self._scaler.decide(1, 0, 0.0, now=200), 1)
+
+    def test_hysteresis(self):
+        # Between the thresholds, nothing changes, and the quiet period
+        # starts over.
+        self._scaler.decide(1, 100, 1.0, now=0)
+        self.assertEqual(self._scaler.decide(2, 1, 1.0, now=100), 2)
+        self.assertEqual(self._scaler.decide(2, 5, 1.0, now=110), 2)
+        self.assertEqual(self._scaler.decide(2, 1, 1.0, now=120), 2)
+        self.assertEqual(self._scaler.decide(2, 1, 1.0, now=150), 1)
+
+    @configuration('runner.out', max_instances=4, scale_up_depth=20,
+                   scale_up_age='0s', scale_down_depth=3,
+                   scale_cooldown='1m')
+    def test_from_config(self):
+        scaler = RunnerScaler.from_config('out', getattr(config, 'runner.out'))
+        self.assertEqual(scaler.minimum, 1)
+        self.assertEqual(scaler.maximum, 4)
+        self.assertEqual(scaler.up_depth, 20)
+        self.assertEqual(scaler.up_age, 0)
+        self.assertEqual(scaler.down_depth, 3)
+        self.assertEqual(scaler.cooldown, 60)
+
+    def test_from_config_disabled(self):
+        section = getattr(config, 'runner.out')
+        self.assertIsNone(RunnerScaler.from_config('out', section))
+
+
+
+class TestSampling(unittest.TestCase):
+    layer = ConfigLayer
+
+    def test_empty_queue(self):
+        self.assertEqual(sample_queue(config.switchboards['out']), (0, 0.0))
+
+    def test_sample_queue(self):
+        switchboard = config.switchboards['out']
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+
+A message.
+""")
+        filebase = switchboard.enqueue(msg)
+        switchboard.enqueue(msg)
+        when = float(filebase.split('+', 1)[0])
+        depth, age = sample_queue(switchboard, now=when + 30)
+        self.assertEqual(depth, 2)
+        self.assertAlmostEqual(age, 30)
+
+    def test_status(self):
+        self.assertEqual(read_status(), [])
+        scaler = RunnerScaler('out', 1, 3, 10, 60, 2, 30)
+        scaler.decide(1, 11, 1.0, now=0)
+        write_status([scaler])
+        self.addCleanup(os.remove, status_path())
+        status = read_status()
+        self.assertEqual(len(status), 1)
+        self.assertEqual(status[0]['name'], 'out')
+        self.assertEqual(status[0]['instances'], 2)
+        self.assertEqual(status[0]['depth'], 11)
+        self.assertEqual(len(status[0]['decisions']), 1)
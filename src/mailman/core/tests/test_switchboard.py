@@ -18,17 +18,29 @@
 """Switchboard tests."""
 
 __all__ = [
+    'TestClaiming',
+    'TestQueueIndex',
+    'TestRawFormat',
     'TestSwitchboard',
     ]
 
 
+import os
+import sys
+import shutil
+import tempfile
 import unittest
+import subprocess
 
 from mailman.config import config
+from mailman.core.switchboard import RAW_MAGIC, Switchboard
+from mailman.interfaces.switchboard import QueueEntryClaimedError
+from mailman.email.message import LazyMessage, Message
 from mailman.testing.helpers import (
     LogFileMark,
     specialized_message_from_string as mfs)
 from mailman.testing.layers import ConfigLayer
+from mailman.utilities.inotify import DirectoryWatcher
 from unittest.mock import patch
 
 
@@ -56,3 +68,322 @@ Message-ID: <ant>
         traceback = error_log.read().splitlines()
         self.assertEqual(traceback[1], 'Traceback (most recent call last):')
         self.assertEqual(traceback[-1], 'OSError: Oops!')
+
+    def test_get_files_count(self):
+        switchboard = config.switchboards['shunt']
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+        filebases = [switchboard.enqueue(msg) for i in range(3)]
+        self.assertEqual(switchboard.get_files(count=2), filebases[:2])
+        self.assertEqual(switchboard.files, filebases)
+
+
+
+class TestQueueIndex(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._watcher = DirectoryWatcher(self._tempdir, '.pck')
+        if not self._watcher.is_notifying:
+            self._watcher.close()
+            shutil.rmtree(self._tempdir)
+            raise unittest.SkipTest('inotify is not available')
+        self._switchboard = Switchboard('test', self._tempdir)
+        self._msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+
+    def tearDown(self):
+        self._watcher.close()
+        shutil.rmtree(self._tempdir)
+
+    def test_existing_entries(self):
+        # Entries queued before the index is enabled are found by the initial
+        # scan of the queue directory.
+        filebases = [self._switchboard.enqueue(self._msg) for i in range(3)]
+        self._switchboard.use_index(self._watcher)
+        self.assertEqual(self._switchboard.files, filebases)
+
+    def test_new_entries(self):
+        # Entries queued after the index is enabled are picked up from the
+        # file notifications, without scanning the directory.
+        self._switchboard.use_index(self._watcher)
+        self.assertEqual(self._switchboard.files, [])
+        filebases = [self._switchboard.enqueue(self._msg) for i in range(3)]
+        with patch('mailman.core.switchboard.os.listdir') as listdir:
+            files = self._switchboard.files
+        self.assertEqual(files, filebases)
+        self.assertFalse(listdir.called)
+
+    def test_dequeued_entries(self):
+        self._switchboard.use_index(self._watcher)
+        filebases = [self._switchboard.enqueue(self._msg) for i in range(3)]
+        files = self._switchboard.get_files(count=2)
+        self.assertEqual(files, filebases[:2])
+        for filebase in files:
+            self._switchboard.dequeue(filebase)
+            self._switchboard.finish(filebase)
+        self.assertEqual(self._switchboard.files, filebases[2:])
+
+    def test_unprocessed_entries_are_handed_out_again(self):
+        # Entries handed out but never dequeued are not lost.
+        self._switchboard.use_index(self._watcher)
+        filebases = [self._switchboard.enqueue(self._msg) for i in range(3)]
+        self.assertEqual(self._switchboard.files, filebases)
+        self._switchboard.dequeue(filebases[0])
+        self.assertEqual(self._switchboard.files, filebases[1:])
+        self.assertEqual(self._switchboard.files, filebases[1:])
+
+    def test_stale_notifications(self):
+        # An entry which is dequeued before its notification is collected
+        # doesn't come back.
+        filebase = self._switchboard.enqueue(self._msg)
+        self._switchboard.use_index(self._watcher)
+        self.assertEqual(self._switchboard.files, [filebase])
+        self._switchboard.dequeue(filebase)
+        # Now the notification about the enqueue is still pending.
+        self._watcher._pending.append(filebase + '.pck')
+        self.assertEqual(self._switchboard.files, [])
+
+    def test_lost_notifications(self):
+        # When notifications are lost, the directory is scanned again.
+        self._switchboard.use_index(self._watcher)
+        filebase = self._switchboard.enqueue(self._msg)
+        with patch.object(self._watcher, 'collect', return_value=None):
+            self.assertEqual(self._switchboard.files, [filebase])
+
+    def test_slices(self):
+        # The index only hands out entries in the switchboard's slice.
+        indexed = Switchboard('test', self._tempdir, 0, 2)
+        indexed.use_index(self._watcher)
+        for i in range(10):
+            self._switchboard.enqueue(self._msg, counter=i)
+        scanned = [Switchboard('test', self._tempdir, slice, 2)
+                   for slice in range(2)]
+        self.assertEqual(indexed.files, scanned[0].files)
+        self.assertEqual(len(scanned[0].files) + len(scanned[1].files), 10)
+
+
+
+class TestRawFormat(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._switchboard = Switchboard(
+            'test', self._tempdir, queue_format='raw')
+        self._msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+A message.
+""")
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir)
+
+    def _read(self, filebase):
+        path = os.path.join(self._tempdir, filebase + '.pck')
+        with open(path, 'rb') as fp:
+            return fp.read()
+
+    def test_lazy_parsing(self):
+        filebase = self._switchboard.enqueue(self._msg, listid='a.example.com')
+        self.assertTrue(self._read(filebase).startswith(RAW_MAGIC))
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msgdata['listid'], 'a.example.com')
+        # The message has not been parsed yet.
+        self.assertIsNotNone(LazyMessage.unparsed(msg))
+        self.assertEqual(msg['message-id'], '<ant>')
+        self.assertIsNone(LazyMessage.unparsed(msg))
+        self.assertEqual(type(msg), Message)
+        self.assertEqual(msg.get_payload(), 'A message.\n')
+
+    def test_original_size(self):
+        # The message's original size survives the trip through the queue.
+        self.assertEqual(self._msg.original_size, 74)
+        filebase = self._switchboard.enqueue(self._msg)
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msgdata['original_size'], 74)
+        self.assertEqual(msg.original_size, 74)
+
+    def test_requeue_without_parsing(self):
+        # An unparsed message is written back to the queue as is.
+        filebase = self._switchboard.enqueue(self._msg)
+        contents = self._read(filebase)
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        with patch('mailman.email.message.email.message_from_bytes') as parse:
+            filebase = self._switchboard.enqueue(msg, msgdata)
+        self.assertFalse(parse.called)
+        self.assertEqual(self._read(filebase)[-50:], contents[-50:])
+
+    def test_pickle_fallback(self):
+        # Messages that can't be turned into bytes are pickled.
+        self._msg['Subject'] = 'Non-ASCII \u00e9'
+        filebase = self._switchboard.enqueue(self._msg)
+        self.assertFalse(self._read(filebase).startswith(RAW_MAGIC))
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msg['subject'], 'Non-ASCII \u00e9')
+
+    def test_unixfrom(self):
+        # The envelope sender survives the round trip, but none is invented.
+        filebase = self._switchboard.enqueue(self._msg)
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertIsNone(msg.get_unixfrom())
+        self._msg.set_unixfrom('From bart@example.com Sat Oct 17 2015')
+        filebase = self._switchboard.enqueue(self._msg)
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msg.get_unixfrom(),
+                         'From bart@example.com Sat Oct 17 2015')
+
+    def test_read_both_formats(self):
+        # Queue files in the pickle format can still be read.
+        pickler = Switchboard('test', self._tempdir)
+        filebase = pickler.enqueue(self._msg)
+        self.assertFalse(self._read(filebase).startswith(RAW_MAGIC))
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msg['message-id'], '<ant>')
+
+    def test_recover_backup_files(self):
+        filebase = self._switchboard.enqueue(self._msg)
+        self._switchboard.dequeue(filebase)
+        self._switchboard.recover_backup_files()
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msgdata['_bak_count'], 1)
+        self.assertEqual(msg.get_payload(), 'A message.\n')
+
+    def test_recover_processed_files(self):
+        # Entries which were processed, but not finished, are recovered
+        # without counting toward MAX_BAK_COUNT.
+        filebase = self._switchboard.enqueue(self._msg)
+        self._switchboard.dequeue(filebase)
+        self._switchboard.mark_processed(filebase)
+        self.assertEqual(self._switchboard.get_files('.done'), [filebase])
+        self._switchboard.recover_backup_files()
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.mark_processed(filebase)
+        self._switchboard.finish(filebase)
+        self.assertNotIn('_bak_count', msgdata)
+        self.assertEqual(os.listdir(self._tempdir), [])
+
+    def test_convert_pickled_files(self):
+        # When a queue is switched to the raw format, the existing pickled
+        # entries are converted on recovery.
+        pickler = Switchboard('test', self._tempdir)
+        filebase = pickler.enqueue(self._msg, listid='a.example.com')
+        self._switchboard.recover_backup_files()
+        self.assertTrue(self._read(filebase).startswith(RAW_MAGIC))
+        msg, msgdata = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msgdata['listid'], 'a.example.com')
+        self.assertEqual(msg['message-id'], '<ant>')
+
+
+
+class TestClaiming(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._ant = Switchboard('test', self._tempdir, claim='ant')
+        self._bee = Switchboard('test', self._tempdir, claim='bee')
+        self._msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir)
+
+    def _dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return str(process.pid)
+
+    def test_whole_queue(self):
+        # Every switchboard sees the whole queue, and there can be any number
+        # of them.
+        filebases = [self._ant.enqueue(self._msg) for i in range(3)]
+        self.assertEqual(self._ant.files, filebases)
+        self.assertEqual(self._bee.files, filebases)
+        cat = Switchboard('test', self._tempdir, 2, 3, claim='cat')
+        self.assertEqual(cat.files, filebases)
+
+    def test_claim(self):
+        # Only one switchboard can dequeue an entry.
+        filebase = self._ant.enqueue(self._msg)
+        msg, msgdata = self._ant.dequeue(filebase)
+        self.assertEqual(msg['message-id'], '<ant>')
+        self.assertEqual(os.listdir(self._tempdir), [filebase + '.bak-ant'])
+        with self.assertRaises(QueueEntryClaimedError) as cm:
+            self._bee.dequeue(filebase)
+        self.assertEqual(cm.exception.filebase, filebase)
+        self._ant.finish(filebase)
+        self.assertEqual(os.listdir(self._tempdir), [])
+
+    def test_recover_own_claims(self):
+        filebase = self._ant.enqueue(self._msg)
+        self._ant.dequeue(filebase)
+        self._ant.recover_backup_files()
+        msg, msgdata = self._bee.dequeue(filebase)
+        self.assertEqual(msgdata['_bak_count'], 1)
+
+    def test_recover_dead_claims(self):
+        # The claims of processes which are gone are recovered, but those of
+        # live processes are left alone.
+        dead = Switchboard('test', self._tempdir, claim=self._dead_pid())
+        live = Switchboard('test', self._tempdir, claim=str(os.getpid()))
+        old = Switchboard('test', self._tempdir)
+        filebases = [self._ant.enqueue(self._msg) for i in range(3)]
+        dead.dequeue(filebases[0])
+        live.dequeue(filebases[1])
+        old.dequeue(filebases[2])
+        self._bee.recover_backup_files()
+        self.assertEqual(self._ant.files, [filebases[0], filebases[2]])
+        self.assertEqual(live.get_files('.bak-' + str(os.getpid())),
+                         [filebases[1]])
+
+    def test_recover_processed_claims(self):
+        # Processed entries are recovered from dead claims too, without being
+        # counted.
+        dead = Switchboard('test', self._tempdir, claim=self._dead_pid())
+        filebases = [self._ant.enqueue(self._msg) for i in range(2)]
+        for filebase in filebases:
+            dead.dequeue(filebase)
+        dead.mark_processed(filebases[0])
+        self._bee.recover_backup_files()
+        self.assertEqual(self._ant.files, filebases)
+        msg, msgdata = self._ant.dequeue(filebases[0])
+        self.assertNotIn('_bak_count', msgdata)
+        msg, msgdata = self._ant.dequeue(filebases[1])
+        self.assertEqual(msgdata['_bak_count'], 1)
+
+    def test_convert_to_raw(self):
+        # Claiming switchboards convert queue files too.
+        filebase = self._ant.enqueue(self._msg)
+        raw = Switchboard('test', self._tempdir, queue_format='raw',
+                          claim='cat')
+        raw.recover_backup_files()
+        with open(os.path.join(self._tempdir, filebase + '.pck'), 'rb') as fp:
+            self.assertTrue(fp.read().startswith(RAW_MAGIC))
+        msg, msgdata = self._bee.dequeue(filebase)
+        self.assertEqual(msg['message-id'], '<ant>')
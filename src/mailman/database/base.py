@@ -22,19 +22,25 @@ __all__ = [
     ]
 
 
+import os
 import logging
 
+from contextlib import contextmanager
 from mailman.config import config
 from mailman.interfaces.database import IDatabase
 from mailman.utilities.string import expand
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
 from zope.interface import implementer
 
 
 log = logging.getLogger('mailman.database')
 
 
+# The size of the tokens in the changes file.
+TOKEN_SIZE = 16
+
+
 
 @implementer(IDatabase)
 class SABaseDatabase:
@@ -45,6 +51,7 @@ class SABaseDatabase:
     def __init__(self):
         self.url = None
         self.store = None
+        self._changes_file = None
 
     def begin(self):
         """See `IDatabase`."""
@@ -59,6 +66,75 @@ class SABaseDatabase:
         """See `IDatabase`."""
         self.store.rollback()
 
+    @property
+    def generation(self):
+        """See `IDatabase`."""
+        # The changes file is only read once per transaction, e.g. once for
+        # each message a runner processes, however often it's asked for.
+        if self.store is None:
+            return None
+        info = self.store.info
+        if 'generation' not in info:
+            info['generation'] = self._read_generation()
+        return info['generation']
+
+    def _read_generation(self):
+        # Every process which changes the database writes a new random token
+        # over the one in the changes file.
+        try:
+            with open(self._changes_file, 'rb') as fp:
+                return fp.read()
+        except (OSError, TypeError):
+            return None
+
+    def _changed(self):
+        token = os.urandom(TOKEN_SIZE)
+        try:
+            fd = os.open(self._changes_file, os.O_WRONLY | os.O_CREAT, 0o660)
+            try:
+                os.write(fd, token)
+            finally:
+                os.close(fd)
+        except OSError:
+            # The change is committed anyway, but it can't be tracked any
+            # more, so stop claiming that the database is unchanged.
+            log.exception('Cannot track database changes in %s',
+                          self._changes_file)
+            self._changes_file = None
+
+    def _note_change(self, session, *args):
+        session.info['changed'] = True
+
+    def _note_bulk_change(self, context):
+        context.session.info['changed'] = True
+
+    def _after_commit(self, session):
+        # Committing a savepoint only makes its changes part of the enclosing
+        # transaction.
+        if session.transaction.nested:
+            return
+        session.info.pop('generation', None)
+        if session.info.pop('changed', False):
+            self._changed()
+
+    def _after_soft_rollback(self, session, previous_transaction):
+        # Rolling back a savepoint leaves the changes flushed before it.
+        if previous_transaction.parent is None:
+            session.info.pop('changed', None)
+            session.info.pop('generation', None)
+
+    @contextmanager
+    def savepoint(self):
+        """See `IDatabase`."""
+        nested = self.store.begin_nested()
+        try:
+            yield
+        except:
+            nested.rollback()
+            raise
+        else:
+            nested.commit()
+
     def _pre_reset(self, store):
         """Clean up method for testing.
 
@@ -108,6 +184,19 @@ class SABaseDatabase:
         # half dozen and all...
         self.url = url
         self.engine = create_engine(url)
-        session = sessionmaker(bind=self.engine)
-        self.store = session()
+        # Each thread gets its own session, e.g. the REST server's worker
+        # threads.
+        self.store = scoped_session(sessionmaker(bind=self.engine))
+        # Keep track of the transactions which change the database, so that
+        # e.g. the REST server knows when its cached etags are stale.  Count
+        # starting up as a change, since e.g. the schema may have been
+        # upgraded.
+        self._changes_file = os.path.join(config.DATA_DIR, 'db-changes')
+        self._changed()
+        event.listen(self.store, 'after_flush', self._note_change)
+        event.listen(self.store, 'after_bulk_update', self._note_bulk_change)
+        event.listen(self.store, 'after_bulk_delete', self._note_bulk_change)
+        event.listen(self.store, 'after_commit', self._after_commit)
+        event.listen(self.store, 'after_soft_rollback',
+                     self._after_soft_rollback)
         self.store.commit()
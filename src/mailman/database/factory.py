@@ -122,6 +122,8 @@ def _reset(self):
     Model._reset(self)
     self._post_reset(self.store)
     self.store.commit()
+    # The tables were emptied outside of the session.
+    self._changed()
 
 
 @implementer(IDatabaseFactory)
@@ -43,3 +43,14 @@ class SQLiteDatabase(SABaseDatabase):
         # Ignore errors
         if fd > 0:
             os.close(fd)
+
+    def savepoint(self):
+        """See `IDatabase`."""
+        # pysqlite doesn't start a transaction before a SAVEPOINT statement,
+        # so SQLite treats the savepoint as the outermost transaction and
+        # releasing it would commit everything.  Make sure a real transaction
+        # is in progress first.
+        connection = self.store.connection()
+        if not connection.connection.in_transaction:
+            connection.execute('BEGIN')
+        return super(SQLiteDatabase, self).savepoint()
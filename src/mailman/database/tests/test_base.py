@@ -0,0 +1,127 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the database generation."""
+
+__all__ = [
+    'TestGeneration',
+    ]
+
+
+import os
+import unittest
+
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.database.base import TOKEN_SIZE
+from mailman.database.transaction import transaction
+from mailman.model.address import Address
+from mailman.testing.layers import ConfigLayer
+
+
+
+class TestGeneration(unittest.TestCase):
+    """Test the database generation."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        with transaction():
+            self._mlist = create_list('test@example.com')
+        self._generation = config.db.generation
+
+    def test_change(self):
+        self.assertIsNotNone(self._generation)
+        with transaction():
+            self._mlist.display_name = 'Changed'
+        self.assertNotEqual(config.db.generation, self._generation)
+
+    def test_no_change(self):
+        with transaction():
+            self._mlist.display_name
+        self.assertEqual(config.db.generation, self._generation)
+
+    def test_rollback(self):
+        self._mlist.display_name = 'Changed'
+        config.db.store.flush()
+        config.db.abort()
+        self.assertEqual(config.db.generation, self._generation)
+        # The rolled back change isn't counted by the next transaction.
+        config.db.commit()
+        self.assertEqual(config.db.generation, self._generation)
+
+    def test_other_process(self):
+        # Changes committed by another process are seen once the current
+        # transaction is over.
+        with open(config.db._changes_file, 'wb') as fp:
+            fp.write(os.urandom(TOKEN_SIZE))
+        self.assertEqual(config.db.generation, self._generation)
+        config.db.abort()
+        self.assertNotEqual(config.db.generation, self._generation)
+
+    def test_bulk_change(self):
+        with transaction():
+            config.db.store.query(Address).delete()
+        self.assertNotEqual(config.db.generation, self._generation)
+
+    def test_generations_differ(self):
+        generations = set()
+        for display_name in ('One', 'Two', 'Three'):
+            with transaction():
+                self._mlist.display_name = display_name
+            generations.add(config.db.generation)
+        self.assertEqual(len(generations), 3)
+
+    def test_savepoint_rolled_back(self):
+        # Rolling back a savepoint doesn't forget the changes flushed before
+        # it.
+        with transaction():
+            self._mlist.display_name = 'Changed'
+            config.db.store.flush()
+            with self.assertRaises(RuntimeError):
+                with config.db.savepoint():
+                    self._mlist.description = 'Rolled back'
+                    config.db.store.flush()
+                    raise RuntimeError
+        self.assertNotEqual(config.db.generation, self._generation)
+
+    def test_savepoint_committed(self):
+        # Committing a savepoint doesn't commit the changes yet.
+        with transaction():
+            with config.db.savepoint():
+                self._mlist.display_name = 'Changed'
+            self.assertEqual(config.db.generation, self._generation)
+        self.assertNotEqual(config.db.generation, self._generation)
+
+    def test_bounded(self):
+        # The changes file doesn't grow with the changes.
+        for display_name in ('One', 'Two', 'Three'):
+            with transaction():
+                self._mlist.display_name = display_name
+        self.assertEqual(os.path.getsize(config.db._changes_file), TOKEN_SIZE)
+
+    def test_not_writable(self):
+        # When changes can't be tracked, committing them still works, but
+        # there's no generation any more.
+        changes_file = config.db._changes_file
+        self.addCleanup(setattr, config.db, '_changes_file', changes_file)
+        config.db._changes_file = os.path.join(
+            changes_file, 'missing', 'db-changes')
+        with transaction():
+            self._mlist.display_name = 'Changed'
+        self.assertEqual(self._mlist.display_name, 'Changed')
+        self.assertIsNone(config.db.generation)
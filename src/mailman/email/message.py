@@ -24,6 +24,7 @@ attributes.
 """
 
 __all__ = [
+    'LazyMessage',
     'Message',
     'MultipartDigestMessage',
     'OwnerNotification',
@@ -130,6 +131,46 @@ class Message(email.message.Message):
         return clean_senders
 
 
+
+class LazyMessage(Message):
+    """A message which is only parsed when it is first used.
+
+    The message is created from its raw RFC 5322 bytes, and parsed the first
+    time any of its attributes are accessed.  At that point the instance turns
+    into a plain `Message`, so there is no overhead afterward.  Until then,
+    the raw bytes can be retrieved with `LazyMessage.unparsed()`, e.g. to
+    write the message back into a queue without parsing it at all.
+    """
+
+    def __init__(self, raw):
+        # Don't call the base class constructor; parsing sets everything up.
+        object.__setattr__(self, '_lazy_raw', raw)
+
+    def __getattribute__(self, name):
+        namespace = object.__getattribute__(self, '__dict__')
+        if '_lazy_raw' in namespace:
+            raw = namespace.pop('_lazy_raw')
+            parsed = email.message_from_bytes(raw, Message)
+            # Attributes set before parsing, such as original_size, win.
+            parsed.__dict__.update(namespace)
+            namespace.clear()
+            namespace.update(parsed.__dict__)
+            object.__setattr__(self, '__class__', Message)
+        return object.__getattribute__(self, name)
+
+    @staticmethod
+    def unparsed(msg):
+        """Return the raw bytes of a message which hasn't been parsed yet.
+
+        :param msg: Any message object.
+        :return: The raw bytes if `msg` is a `LazyMessage` which has not been
+            parsed yet, otherwise None.
+        """
+        if type(msg) is not LazyMessage:
+            return None
+        return object.__getattribute__(msg, '__dict__').get('_lazy_raw')
+
+
 
 class MultipartDigestMessage(MIMEMultipart, Message):
     """Mix-in class for MIME digest messages."""
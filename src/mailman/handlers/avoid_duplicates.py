@@ -78,6 +78,9 @@ class AvoidDuplicates:
             # No one was explicitly addressed, so we can't do any dup
             # collapsing
             return
+        # Look up the explicitly addressed recipients' memberships at once.
+        members = mlist.members.get_members(
+            r for r in recips if r in explicit_recips)
         newrecips = set()
         for r in recips:
             # If this recipient is explicitly addressed...
@@ -86,7 +89,7 @@ class AvoidDuplicates:
                 # If the member wants to receive duplicates, or if the
                 # recipient is not a member at all, they will get a copy.
                 # header.
-                member = mlist.members.get_member(r)
+                member = members.get(r)
                 if member and not member.receive_list_copy:
                     send_duplicate = False
                 # We'll send a duplicate unless the user doesn't wish it.  If
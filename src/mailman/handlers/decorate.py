@@ -21,18 +21,23 @@ __all__ = [
     'Decorate',
     'decorate',
     'decorate_template',
+    'member_substitutions',
     ]
 
 
 import re
 import logging
+import threading
 
+from collections import OrderedDict, namedtuple
 from email.mime.text import MIMEText
+from mailman.config import config
 from mailman.core.i18n import _
 from mailman.email.message import Message
 from mailman.interfaces.handler import IHandler
 from mailman.interfaces.templates import ITemplateLoader
 from mailman.utilities.string import expand
+from string import Template
 from urllib.error import URLError
 from zope.component import getUtility
 from zope.interface import implementer
@@ -51,14 +56,7 @@ def process(mlist, msg, msgdata):
     member = msgdata.get('member')
     if member is not None:
         # Calculate the extra personalization dictionary.
-        recipient = msgdata.get('recipient', member.address.original_email)
-        d['user_address'] = recipient
-        d['user_delivered_to'] = member.address.original_email
-        d['user_language'] = member.preferred_language.description
-        d['user_name'] = (member.user.display_name
-                          if member.user.display_name
-                          else member.address.original_email)
-        d['user_optionsurl'] = member.options_url
+        d.update(member_substitutions(member, msgdata.get('recipient')))
     # These strings are descriptive for the log file and shouldn't be i18n'd
     d.update(msgdata.get('decoration-data', {}))
     try:
@@ -197,6 +195,31 @@ def process(mlist, msg, msgdata):
     msg['Content-Type'] = 'multipart/mixed'
 
 
+
+def member_substitutions(member, recipient=None):
+    """Return the personalization substitutions for a member.
+
+    :param member: The member receiving the message.
+    :type member: `IMember`
+    :param recipient: The address the message is delivered to.  This
+        defaults to the member's address.
+    :type recipient: string
+    :return: The substitutions for the user_* placeholders.
+    :rtype: dict
+    """
+    if recipient is None:
+        recipient = member.address.original_email
+    return dict(
+        user_address=recipient,
+        user_delivered_to=member.address.original_email,
+        user_language=member.preferred_language.description,
+        user_name=(member.user.display_name
+                   if member.user.display_name
+                   else member.address.original_email),
+        user_optionsurl=member.options_url,
+        )
+
+
 
 def decorate(mlist, uri, extradict=None):
     """Expand the decoration template from its URI."""
@@ -208,17 +231,25 @@ def decorate(mlist, uri, extradict=None):
         listname=mlist.fqdn_listname,
         language=mlist.preferred_language.code,
         ))
-    template = loader.get(template_uri)
+    template = loader.get(template_uri, mlist)
     return decorate_template(mlist, template, extradict)
 
 
 
 def decorate_template(mlist, template, extradict=None):
     """Expand the decoration template."""
-    # Create a dictionary which includes the default set of interpolation
-    # variables allowed in headers and footers.  These will be augmented by
-    # any key/value pairs in the extradict.
-    substitutions = dict(
+    # The mailing list's fields are filled in once per template, and the
+    # result is reused until the mailing list changes.  Only the
+    # interpolation variables in the extradict are filled in each time.
+    return _decorations.get(mlist, template).expand(extradict)
+
+
+
+def _list_substitutions(mlist):
+    # The default set of interpolation variables allowed in headers and
+    # footers.  These will be augmented by any key/value pairs in the
+    # extradict.
+    return dict(
         fqdn_listname = mlist.fqdn_listname,
         list_name     = mlist.list_name,
         host_name     = mlist.mail_host,
@@ -228,13 +259,161 @@ def decorate_template(mlist, template, extradict=None):
         description   = mlist.description,
         info          = mlist.info,
         )
-    if extradict is not None:
-        substitutions.update(extradict)
-    text = expand(template, substitutions)
+
+
+# The text between the placeholders of a template, as it is and with its line
+# endings normalized.
+_Text = namedtuple('_Text', 'raw normalized')
+
+
+def _normalize(text):
     # Turn any \r\n line endings into just \n
     return re.sub(r' *\r?\n', r'\n', text)
 
 
+class _Decoration:
+    """A decoration template, with the mailing list's fields filled in."""
+
+    def __init__(self, mlist, template):
+        self._template = template
+        self._substitutions = _list_substitutions(mlist)
+        # The expanded template is split into the text around the remaining
+        # placeholders, and the placeholders themselves.  The text is kept
+        # both as it is, and with its line endings normalized.
+        self._parts = []
+        text = []
+        last = 0
+        for mo in Template.pattern.finditer(template):
+            text.append(template[last:mo.start()])
+            last = mo.end()
+            name = mo.group('named') or mo.group('braced')
+            if name is None:
+                # Like safe_substitute(), keep invalid placeholders as they
+                # are.
+                text.append(Template.delimiter
+                            if mo.group('escaped') is not None
+                            else mo.group())
+            elif name in self._substitutions:
+                text.append(str(self._substitutions[name]))
+            else:
+                self._add_text(text)
+                text = []
+                self._parts.append((name, mo.group()))
+        text.append(template[last:])
+        self._add_text(text)
+        self._text = _normalize(''.join(
+            part.raw if isinstance(part, _Text) else part[1]
+            for part in self._parts))
+
+    def _add_text(self, text):
+        text = ''.join(text)
+        self._parts.append(_Text(text, _normalize(text)))
+
+    def expand(self, extradict=None):
+        """Fill in the remaining placeholders.
+
+        :param extradict: The other interpolation variables.
+        :type extradict: dict
+        :return: The expanded template.
+        :rtype: string
+        """
+        if not extradict:
+            return self._text
+        if not self._substitutions.keys().isdisjoint(extradict):
+            # The mailing list's fields are overridden.
+            substitutions = dict(self._substitutions)
+            substitutions.update(extradict)
+            return _normalize(expand(self._template, substitutions))
+        pieces = []
+        normalize = False
+        for part in self._parts:
+            if isinstance(part, _Text):
+                pieces.append(part)
+                continue
+            name, placeholder = part
+            if name not in extradict:
+                pieces.append(placeholder)
+                continue
+            value = str(extradict[name])
+            # Line endings in the value, or next to it, still have to be
+            # normalized, along with the text around them.
+            if not value or value[-1] in ' \r' or '\n' in value:
+                normalize = True
+            pieces.append(value)
+        if normalize:
+            return _normalize(''.join(
+                piece.raw if isinstance(piece, _Text) else piece
+                for piece in pieces))
+        return ''.join(
+            piece.normalized if isinstance(piece, _Text) else piece
+            for piece in pieces)
+
+
+class _Decorations:
+    """The decoration templates of the mailing lists, by template text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        # The domains' base URLs by mail host, with the database generation
+        # they were looked up at.
+        self._base_urls = {}
+
+    def get(self, mlist, template):
+        """Return the decoration for the mailing list's template.
+
+        :param mlist: The mailing list.
+        :type mlist: `IMailingList`
+        :param template: The text of the template.
+        :type template: string
+        :return: The decoration.
+        :rtype: `_Decoration`
+        """
+        # A decoration is kept until the mailing list's fields change, even
+        # before they are committed, or until the base URL of its domain,
+        # which the listinfo URI is made from, does.
+        key = (mlist.list_id, template)
+        signature = (mlist.list_name, mlist.mail_host, mlist.display_name,
+                     mlist.description, mlist.info, self._base_url(mlist))
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        decoration = _Decoration(mlist, template)
+        with self._lock:
+            self._cache[key] = (signature, decoration)
+            self._cache.move_to_end(key)
+            while len(self._cache) > int(config.mailman.decoration_cache_size):
+                self._cache.popitem(last=False)
+        return decoration
+
+    def _base_url(self, mlist):
+        # Looking up the domain takes a query, so it's only looked up again
+        # once the database has changed.
+        generation = config.db.generation
+        if generation is None:
+            return mlist.domain.base_url
+        with self._lock:
+            entry = self._base_urls.get(mlist.mail_host)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+        base_url = mlist.domain.base_url
+        with self._lock:
+            self._base_urls[mlist.mail_host] = (generation, base_url)
+        return base_url
+
+    def clear(self):
+        """Forget all the decorations."""
+        with self._lock:
+            self._cache.clear()
+            self._base_urls.clear()
+
+
+_decorations = _Decorations()
+
+
 
 @implementer(IHandler)
 class Decorate:
@@ -45,9 +45,8 @@ class OwnerRecipients:
             return
         # -owner messages go to both the owners and moderators, which is most
         # conveniently accessed via the administrators roster.
-        recipients = set(admin.address.email
-                         for admin in mlist.administrators.members
-                         if admin.delivery_status == DeliveryStatus.enabled)
+        recipients = set(
+            mlist.administrators.get_emails(DeliveryStatus.enabled))
         # To prevent -owner messages from going into a black hole, if there
         # are no administrators available, the message goes to the site owner.
         if len(recipients) == 0:
@@ -0,0 +1,163 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the decoration templates."""
+
+__all__ = [
+    'TestDecorateTemplate',
+    ]
+
+
+import re
+import unittest
+
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.database.transaction import transaction
+from mailman.handlers.decorate import _decorations, decorate_template
+from mailman.testing.layers import ConfigLayer
+from mailman.utilities.string import expand
+from sqlalchemy import event
+from unittest.mock import patch
+
+
+def _expand(mlist, template, extradict=None):
+    # Expand the template all at once, the way it used to be.
+    substitutions = dict(
+        fqdn_listname=mlist.fqdn_listname,
+        list_name=mlist.list_name,
+        host_name=mlist.mail_host,
+        display_name=mlist.display_name,
+        listinfo_uri=mlist.script_url('listinfo'),
+        list_requests=mlist.request_address,
+        description=mlist.description,
+        info=mlist.info,
+        )
+    if extradict is not None:
+        substitutions.update(extradict)
+    return re.sub(r' *\r?\n', r'\n', expand(template, substitutions))
+
+
+
+class TestDecorateTemplate(unittest.TestCase):
+    """Test the decoration templates."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        with transaction():
+            self._mlist = create_list('ant@example.com')
+            self._mlist.display_name = 'Ant'
+            self._mlist.info = 'All  \r\nabout ants'
+
+    def test_same_expansion(self):
+        templates = (
+            '',
+            'No placeholders  \r\n',
+            '$display_name at $listinfo_uri\r\n${fqdn_listname}',
+            '$info $$user_name $user_name ${user_address}',
+            'Dear $user_name  \r\n$$ $5 $ ${bad $user_unknown  \n',
+            '$user_name$user_address  \n',
+            'Trailing space $user_name\n',
+            'Trailing space  $user_name\r\nend',
+            )
+        extradicts = (
+            None,
+            {},
+            dict(user_name='Anne', user_address='anne@example.com'),
+            dict(user_name='', user_address='  '),
+            dict(user_name='Anne  \r\nPerson', user_address='\n'),
+            dict(user_name='Anne\r', user_address='$display_name'),
+            dict(user_name=None, user_address=7),
+            dict(user_name='Anne', display_name='Overridden  \n'),
+            )
+        for template in templates:
+            for extradict in extradicts:
+                self.assertEqual(
+                    decorate_template(self._mlist, template, extradict),
+                    _expand(self._mlist, template, extradict),
+                    (template, extradict))
+
+    def test_no_queries(self):
+        # Once the mailing list's fields are filled in, only the recipient's
+        # are filled in for each message.
+        template = '$display_name $listinfo_uri $user_name'
+        self.assertEqual(
+            decorate_template(self._mlist, template, dict(user_name='Anne')),
+            'Ant http://lists.example.com/listinfo/ant@example.com Anne')
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(config.db.engine, 'before_cursor_execute', record)
+        self.addCleanup(event.remove, config.db.engine,
+                        'before_cursor_execute', record)
+        self.assertEqual(
+            decorate_template(self._mlist, template, dict(user_name='Bart')),
+            'Ant http://lists.example.com/listinfo/ant@example.com Bart')
+        self.assertEqual(statements, [])
+
+    def test_list_changed(self):
+        template = '$display_name: $description'
+        self.assertEqual(decorate_template(self._mlist, template), 'Ant: ')
+        # Changes are seen before they are committed.
+        self._mlist.description = 'About ants'
+        self.assertEqual(decorate_template(self._mlist, template),
+                         'Ant: About ants')
+        self._mlist.display_name = 'Bee'
+        self.assertEqual(decorate_template(self._mlist, template),
+                         'Bee: About ants')
+
+    def test_domain_changed(self):
+        template = '$listinfo_uri'
+        self.assertEqual(decorate_template(self._mlist, template),
+                         'http://lists.example.com/listinfo/ant@example.com')
+        with transaction():
+            self._mlist.domain.base_url = 'https://www.example.com'
+        self.assertEqual(decorate_template(self._mlist, template),
+                         'https://www.example.com/listinfo/ant@example.com')
+
+    def test_other_list(self):
+        template = '$fqdn_listname'
+        with transaction():
+            bee = create_list('bee@example.com')
+        self.assertEqual(decorate_template(self._mlist, template),
+                         'ant@example.com')
+        self.assertEqual(decorate_template(bee, template), 'bee@example.com')
+
+    def test_other_changes(self):
+        # Changes to other parts of the database don't fill in the template
+        # again.
+        template = '$display_name $listinfo_uri'
+        decoration = _decorations.get(self._mlist, template)
+        with transaction():
+            create_list('bee@example.com')
+        self.assertIs(_decorations.get(self._mlist, template), decoration)
+
+    def test_generation_read_once(self):
+        # The database generation is only read once per transaction, e.g.
+        # once for each message, however many recipients it has.
+        config.db.commit()
+        template = '$display_name $user_name'
+        with patch.object(config.db, '_read_generation',
+                          wraps=config.db._read_generation) as read:
+            for name in ('Anne', 'Bart', 'Cris'):
+                decorate_template(self._mlist, template,
+                                  dict(user_name=name))
+            self.assertEqual(read.call_count, 1)
+            config.db.commit()
+            decorate_template(self._mlist, template, dict(user_name='Dave'))
+            self.assertEqual(read.call_count, 2)
@@ -27,8 +27,10 @@ import unittest
 
 from mailman.app.lifecycle import create_list
 from mailman.handlers.to_digest import ToDigest
-from mailman.testing.helpers import specialized_message_from_string as mfs
+from mailman.testing.helpers import (
+    get_queue_messages, specialized_message_from_string as mfs)
 from mailman.testing.layers import ConfigLayer
+from mailman.utilities.mailbox import Mailbox
 
 
 
@@ -57,3 +59,21 @@ Message-ID: <ant>
         # Make sure the digest mbox is not empty.
         mailbox_path = os.path.join(self._mlist.data_path, 'digest.mmdf')
         self.assertGreater(os.path.getsize(mailbox_path), 0)
+
+    def test_index(self):
+        # The message's subject and author are recorded in the mailbox's
+        # index, which is moved along with the mailbox when the digest is
+        # sent.
+        self._mlist.digest_size_threshold = 100
+        self._handler.process(self._mlist, self._msg, {})
+        mailbox_path = os.path.join(self._mlist.data_path, 'digest.mmdf')
+        with Mailbox(mailbox_path) as mailbox:
+            self.assertEqual(mailbox.get_index(), [
+                ('A disposable message', 'anne@example.com')])
+        self._mlist.digest_size_threshold = 0
+        self._handler.process(self._mlist, self._msg, {})
+        self.assertFalse(os.path.exists(mailbox_path + '.toc'))
+        items = get_queue_messages('digest')
+        self.assertEqual(len(items), 1)
+        with Mailbox(items[0].msgdata['digest_path']) as mailbox:
+            self.assertEqual(len(mailbox.get_index()), 2)
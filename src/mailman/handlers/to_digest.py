@@ -30,7 +30,7 @@ from mailman.email.message import Message
 from mailman.interfaces.digests import DigestFrequency
 from mailman.interfaces.handler import IHandler
 from mailman.utilities.datetime import now as right_now
-from mailman.utilities.mailbox import Mailbox
+from mailman.utilities.mailbox import Mailbox, index_path
 from zope.interface import implementer
 
 
@@ -49,7 +49,9 @@ class ToDigest:
             return
         # Open the mailbox that will be used to collect the current digest.
         mailbox_path = os.path.join(mlist.data_path, 'digest.mmdf')
-        # Lock the mailbox and append the message.
+        # Lock the mailbox and append the message.  This also records the
+        # message's subject and author in the mailbox's index, for the
+        # digest's table of contents.
         with Mailbox(mailbox_path, create=True) as mbox:
             mbox.add(msg)
         # Calculate the current size of the mailbox file.  This will not tell
@@ -69,6 +71,7 @@ class ToDigest:
             digest_number = mlist.next_digest_number
             bump_digest_number_and_volume(mlist)
             os.rename(mailbox_path, mailbox_dest)
+            os.rename(index_path(mailbox_path), index_path(mailbox_dest))
             config.switchboards['digest'].enqueue(
                 Message(),
                 listid=mlist.list_id,
@@ -21,6 +21,7 @@ __all__ = [
     'ArchivePolicy',
     'ClobberDate',
     'IArchiver',
+    'IBatchingArchiver',
     ]
 
 
@@ -72,6 +73,9 @@ class IArchiver(Interface):
     def archive_message(mlist, msg):
         """Send the message to the archiver.
 
+        The message is shared with the other archivers, so it must not be
+        changed.
+
         :param mlist: The IMailingList object.
         :param msg: The message object.
         :returns: The url string or None if the message's archive url cannot
@@ -79,3 +83,23 @@ class IArchiver(Interface):
         """
 
     # XXX How to handle attachments?
+
+
+
+class IBatchingArchiver(IArchiver):
+    """An archiver which can archive messages in batches.
+
+    Such an archiver may only collect the messages sent to it, and archive
+    them later, when the archive runner flushes it.
+    """
+
+    def flush(force=False):
+        """Archive the messages collected since the last time.
+
+        The archive runner calls this every time around its loop, and when
+        it stops.
+
+        :param force: Whether to archive all the collected messages, or only
+            the batches which are due.
+        :type force: bool
+        """
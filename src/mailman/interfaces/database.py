@@ -54,8 +54,26 @@ class IDatabase(Interface):
     def abort():
         """Abort the current transaction."""
 
+    def savepoint():
+        """A context manager for a nested transaction.
+
+        When the block exits with an exception, only the changes made inside
+        the block are rolled back, and the exception is re-raised.  The
+        changes are otherwise kept as part of the current transaction, which
+        still has to be committed.
+        """
+
+    generation = Attribute(
+        """A value which changes whenever a transaction changes the database.
+
+        This includes transactions committed by other processes.  It is None
+        when the changes can't be tracked.  It is looked up once per
+        transaction, so it only changes between transactions.""")
+
     store = Attribute(
-        """The underlying database object on which you can do queries.""")
+        """The underlying database object on which you can do queries.
+
+        Each thread has its own session behind this object.""")
 
 
 
@@ -94,7 +94,9 @@ class IDomain(Interface):
     mailing_lists = Attribute(
         """All mailing lists for this domain.
 
-        The mailing lists are returned in order sorted by list-id.
+        The mailing lists are returned in order sorted by list-id, as a
+        sequence which is loaded from the database as it is sliced or
+        iterated over.
         """)
 
     def confirm_url(token=''):
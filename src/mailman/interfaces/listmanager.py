@@ -126,9 +126,11 @@ class IListManager(Interface):
         """
 
     mailing_lists = Attribute(
-        """An iterator over all the mailing list objects.
+        """A sequence of all the mailing list objects.
 
-        The mailing lists are returned in order sorted by `list_id`.
+        The mailing lists are returned in order sorted by `list_id`.  They
+        are loaded from the database as the sequence is sliced or iterated
+        over.
         """)
 
     def __iter__():
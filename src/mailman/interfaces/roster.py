@@ -37,6 +37,13 @@ class IRoster(Interface):
     members = Attribute(
         """An iterator over all the IMembers managed by this roster.""")
 
+    sorted_members = Attribute(
+        """The members managed by this roster, ordered by email address.
+
+        This is a sequence.  Slices of it are loaded from the database only
+        when they are taken, so it can be paged through cheaply.
+        """)
+
     member_count = Attribute(
         """The number of members managed by this roster.""")
 
@@ -68,6 +75,35 @@ class IRoster(Interface):
         :rtype: `IMember` or None
         """
 
+    def get_members(emails):
+        """Get the members for many addresses at once.
+
+        This is like calling ``get_member()`` for each email address, but
+        it takes only a few queries no matter how many addresses there
+        are.  The members' addresses, users and preferences are loaded
+        along with them.
+
+        :param emails: The email addresses to search for.
+        :type emails: iterable of strings
+        :return: A mapping from the email addresses which are subscribed to
+            their members.
+        :rtype: dict
+        """
+
+    def get_emails(delivery_status=None):
+        """The email addresses of the members in this roster.
+
+        This is like getting the address of each of the ``members``, but it
+        doesn't load any of them.  Instead, the members' addresses and
+        preferences are resolved by the database.
+
+        :param delivery_status: If given, only return the addresses of the
+            members with this delivery status.
+        :type delivery_status: `DeliveryStatus`
+        :return: The members' email addresses.
+        :rtype: iterator of strings
+        """
+
     def get_memberships(email):
         """Get the memberships for the given address.
 
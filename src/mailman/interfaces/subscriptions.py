@@ -72,14 +72,15 @@ class ISubscriptionService(Interface):
     def get_members():
         """Return a sequence of all members of all mailing lists.
 
-        The members are sorted first by fully-qualified mailing list name,
-        then by subscribed email address, then by role.  Because the user may
-        be a member of the list under multiple roles (e.g. as an owner and as
-        a digest member), the member can appear multiple times in this list.
-        Roles are sorted by: owner, moderator, member.
+        The members are sorted first by mailing list id, then by role, then
+        by subscribed email address.  Because the user may be a member of the
+        list under multiple roles (e.g. as an owner and as a digest member),
+        the member can appear multiple times in this list.  Roles are sorted
+        by: owner, moderator, member.  The members are loaded from the
+        database as the sequence is sliced or iterated over.
 
         :return: The list of all members.
-        :rtype: list of `IMember`
+        :rtype: sequence of `IMember`
         """
 
     def get_member(member_id):
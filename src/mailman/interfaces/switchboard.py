@@ -19,12 +19,26 @@
 
 __all__ = [
     'ISwitchboard',
+    'QueueEntryClaimedError',
     ]
 
 
+from mailman.interfaces.errors import MailmanError
 from zope.interface import Interface, Attribute
 
 
+
+class QueueEntryClaimedError(MailmanError):
+    """Another runner has already claimed the queue entry."""
+
+    def __init__(self, filebase):
+        super(QueueEntryClaimedError, self).__init__()
+        self.filebase = filebase
+
+    def __str__(self):
+        return self.filebase
+
+
 
 class ISwitchboard(Interface):
     """The switchboard."""
@@ -58,6 +72,10 @@ class ISwitchboard(Interface):
         be removed by calling the .finish() method.
 
         Returned is a 2-tuple of the form (message, metadata).
+
+        When several runners claim entries from the same queue, and another
+        runner has already claimed this one, `QueueEntryClaimedError` is
+        raised.
         """
 
     def finish(filebase, preserve=False):
@@ -73,12 +91,13 @@ class ISwitchboard(Interface):
         The base names of the matching files are returned.
         """)
 
-    def get_files(extension='.pck'):
+    def get_files(extension='.pck', count=None):
         """Like the 'files' attribute, but accepts an alternative extension.
 
         Only the files in the queue directory that have a matching extension
         are returned.  Like 'files', the base names of the matching files are
-        returned.
+        returned, in FIFO order.  If `count` is given, at most that many of
+        the oldest files are returned.
         """
 
     def recover_backup_files():
@@ -22,23 +22,40 @@ __all__ = [
     ]
 
 
-from zope.interface import Interface
+from zope.interface import Attribute, Interface
 
 
 
 class ITemplateLoader(Interface):
     """The template downloader utility."""
 
-    def get(uri):
+    hits = Attribute(
+        """The number of templates found in the cache.""")
+
+    misses = Attribute(
+        """The number of templates which had to be searched for and read.""")
+
+    def get(uri, mlist=None):
         """Download the named URI, and return the response and content.
 
         This API uses `urllib2`_ so consult its documentation for details.
 
+        The templates of `mailman:` URIs are cached, along with where they
+        were found.  A cached template is used for as long as its file, and
+        the directories where the template would be found first, don't
+        change.
+
         .. _`urllib2`: http://docs.python.org/library/urllib2.html
 
         :param uri: The URI of the resource.  These may be any URI supported
             by `urllib2` and also `mailman:` URIs for internal resources.
         :type uri: string
+        :param mlist: The mailing list the template is for, if any.  When a
+            `mailman:` URI names this mailing list, it isn't looked up again.
+        :type mlist: `IMailingList`
         :return: The template string as a unicode.
         :rtype: str
         """
+
+    def clear():
+        """Forget all the cached templates."""
@@ -85,7 +85,11 @@ class IUserManager(Interface):
         """
 
     users = Attribute(
-        """An iterator over all the `IUsers` managed by this user manager.""")
+        """A sequence of all the `IUsers` managed by this user manager.
+
+        The users are in the order they were created.  They are loaded from
+        the database as the sequence is sliced or iterated over.
+        """)
 
     def create_address(email, display_name=None):
         """Create and return an address unlinked to any user.
@@ -121,6 +125,20 @@ class IUserManager(Interface):
         :rtype: `IAddress` or None
         """
 
+    def get_addresses(emails):
+        """Find the `IAddress` objects for many email addresses at once.
+
+        This is like calling `get_address()` for each email address, but it
+        takes only a few queries no matter how many addresses there are.  The
+        users the addresses are linked to are loaded along with them.
+
+        :param emails: The text email addresses.
+        :type emails: iterable of strings
+        :return: A mapping from the lower cased email addresses which are
+            registered to their `IAddress` objects.
+        :rtype: dict
+        """
+
     addresses = Attribute(
         """An iterator over all the `IAddresses` managed by this manager.""")
 
@@ -31,6 +31,7 @@ from mailman.interfaces.domain import (
 from mailman.interfaces.user import IUser
 from mailman.interfaces.usermanager import IUserManager
 from mailman.model.mailinglist import MailingList
+from mailman.utilities.queries import QuerySequence
 from urllib.parse import urljoin, urlparse
 from sqlalchemy import Column, Integer, Unicode
 from sqlalchemy.orm import relationship
@@ -95,10 +96,8 @@ class Domain(Model):
     def mailing_lists(self, store):
         """See `IDomain`."""
         mailing_lists = store.query(MailingList).filter(
-            MailingList.mail_host == self.mail_host
-            ).order_by(MailingList._list_id)
-        for mlist in mailing_lists:
-            yield mlist
+            MailingList.mail_host == self.mail_host)
+        return QuerySequence(mailing_lists, (MailingList._list_id,))
 
     def confirm_url(self, token=''):
         """See `IDomain`."""
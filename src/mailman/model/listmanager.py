@@ -30,6 +30,7 @@ from mailman.interfaces.listmanager import (
 from mailman.model.mailinglist import IAcceptableAliasSet, MailingList
 from mailman.model.mime import ContentFilter
 from mailman.utilities.datetime import now
+from mailman.utilities.queries import QuerySequence
 from zope.event import notify
 from zope.interface import implementer
 
@@ -84,9 +85,7 @@ class ListManager:
     @dbconnection
     def mailing_lists(self, store):
         """See `IListManager`."""
-        for mlist in store.query(MailingList).order_by(
-                MailingList._list_id).all():
-            yield mlist
+        return QuerySequence(store.query(MailingList), (MailingList._list_id,))
 
     @dbconnection
     def __iter__(self, store):
@@ -63,6 +63,10 @@ class Member(Model):
     preferences = relationship('Preferences')
     user_id = Column(Integer, ForeignKey('user.id'))
     _user = relationship('User')
+    _mailing_list = relationship(
+        'MailingList', primaryjoin='Member.list_id == MailingList._list_id',
+        foreign_keys=list_id, uselist=False, viewonly=True,
+        load_on_pending=True)
 
     def __init__(self, role, list_id, subscriber):
         self._member_id = uid_factory.new_uid()
@@ -96,8 +100,7 @@ class Member(Model):
     @property
     def mailing_list(self):
         """See `IMember`."""
-        list_manager = getUtility(IListManager)
-        return list_manager.get_by_list_id(self.list_id)
+        return self._mailing_list
 
     @property
     def member_id(self):
@@ -133,21 +136,25 @@ class Member(Model):
         """See `IMember`."""
         return (self._user
                 if self._address is None
-                else getUtility(IUserManager).get_user(self._address.email))
+                else self._address.user)
 
     @property
     def subscriber(self):
         return (self._user if self._address is None else self._address)
 
     def _lookup(self, preference, default=None):
+        # When the member comes from a roster, the address, user and
+        # preference rows are already loaded, so this doesn't hit the
+        # database.
         pref = getattr(self.preferences, preference)
         if pref is not None:
             return pref
-        pref = getattr(self.address.preferences, preference)
+        address = self.address
+        pref = getattr(address.preferences, preference)
         if pref is not None:
             return pref
-        if self.address.user:
-            pref = getattr(self.address.user.preferences, preference)
+        if address.user:
+            pref = getattr(address.user.preferences, preference)
             if pref is not None:
                 return pref
         if default is None:
@@ -31,18 +31,30 @@ __all__ = [
     'OwnerRoster',
     'RegularMemberRoster',
     'Subscribers',
+    'all_members',
     ]
 
 
+from mailman.core.constants import system_preferences
 from mailman.database.transaction import dbconnection
 from mailman.interfaces.member import DeliveryMode, MemberRole
 from mailman.interfaces.roster import IRoster
 from mailman.model.address import Address
 from mailman.model.member import Member
-from sqlalchemy import and_, or_
+from mailman.model.preferences import Preferences
+from mailman.utilities.queries import QuerySequence
+from operator import attrgetter
+from sqlalchemy import and_, case, func, literal, or_
+from sqlalchemy.orm import aliased, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from zope.interface import implementer
 
 
+# Most databases limit the number of parameters in a query, so look up this
+# many email addresses at a time.
+IN_CHUNK_SIZE = 500
+
+
 
 @implementer(IRoster)
 class AbstractRoster:
@@ -60,17 +72,44 @@ class AbstractRoster:
         self._mlist = mlist
 
     @dbconnection
-    def _query(self, store):
-        return store.query(Member).filter(
+    def _query(self, store, effective=None):
+        query = store.query(Member)
+        if effective is not None:
+            query = effective.join(query)
+        return query.filter(
             Member.list_id == self._mlist.list_id,
             Member.role == self.role)
 
+    def _adopt(self, member):
+        # All the members belong to this roster's mailing list.
+        set_committed_value(member, '_mailing_list', self._mlist)
+        return member
+
+    def _load(self, query):
+        """Iterate over the members found by a query.
+
+        The members' addresses, users and preferences are loaded in the same
+        query, and they all belong to this roster's mailing list, so that
+        resolving their preferences doesn't take any more queries.
+        """
+        for member in _with_subscribers(query):
+            yield self._adopt(member)
+
     @property
     def members(self):
         """See `IRoster`."""
-        for member in self._query():
+        for member in self._load(self._query()):
             yield member
 
+    @property
+    def sorted_members(self):
+        """See `IRoster`."""
+        effective = _Effective()
+        return QuerySequence(
+            _with_subscribers(self._query(effective)),
+            (effective.address.email, Member.id),
+            prepare=self._adopt)
+
     @property
     def member_count(self):
         """See `IRoster`."""
@@ -132,6 +171,41 @@ class AbstractRoster:
                 if memberships[0]._address is not None
                 else memberships[1])
 
+    @dbconnection
+    def get_members(self, store, emails):
+        """See ``IRoster``."""
+        # Avoid circular imports.
+        from mailman.model.user import User
+        emails = sorted(set(emails))
+        found = {}
+        for start in range(0, len(emails), IN_CHUNK_SIZE):
+            chunk = emails[start:start + IN_CHUNK_SIZE]
+            # Members subscribed with their preferred address.
+            query = self._query().join(
+                User, Member.user_id == User.id).join(
+                Address, User._preferred_address_id == Address.id).filter(
+                Address.email.in_(chunk))
+            for member in self._load(query):
+                found[member._user._preferred_address.email] = member
+            # Members subscribed with an explicit address.  As with
+            # get_member(), these win over the preferred address ones.
+            query = self._query().join(
+                Address, Member.address_id == Address.id).filter(
+                Address.email.in_(chunk))
+            for member in self._load(query):
+                found[member._address.email] = member
+        return found
+
+    def get_emails(self, delivery_status=None):
+        """See ``IRoster``."""
+        effective = _Effective()
+        query = self._query(effective).with_entities(effective.address.email)
+        if delivery_status is not None:
+            query = query.filter(
+                effective.preference('delivery_status') == delivery_status)
+        for email, in query:
+            yield email
+
     def get_memberships(self, email):
         """See ``IRoster``."""
         memberships = self._get_all_memberships(email)
@@ -141,6 +215,101 @@ class AbstractRoster:
         return memberships
 
 
+
+def _with_subscribers(query):
+    """Load the members' addresses, users and preferences with them."""
+    # Avoid circular imports.
+    from mailman.model.user import User
+    return query.options(
+        joinedload(Member.preferences),
+        joinedload(Member._address).joinedload(Address.preferences),
+        joinedload(Member._address).joinedload(
+            Address.user).joinedload(User.preferences),
+        joinedload(Member._user).joinedload(User.preferences),
+        joinedload(Member._user).joinedload(
+            User._preferred_address).joinedload(Address.preferences),
+        )
+
+
+
+@dbconnection
+def all_members(store):
+    """All the owners, moderators and members of all the mailing lists.
+
+    :return: The members, ordered by list id, then by role (owners,
+        moderators, members), then by email address.  They are loaded from
+        the database as the sequence is sliced or iterated over.
+    :rtype: `QuerySequence` of `IMember`
+    """
+    effective = _Effective()
+    query = effective.join(store.query(Member)).filter(Member.role.in_((
+        MemberRole.owner, MemberRole.moderator, MemberRole.member)))
+    role_order = case([
+        (Member.role == MemberRole.owner, 0),
+        (Member.role == MemberRole.moderator, 1),
+        ], else_=2)
+    return QuerySequence(
+        _with_subscribers(query),
+        (Member.list_id, role_order, effective.address.email, Member.id))
+
+
+
+class _Effective:
+    """Resolve the members' addresses and preferences in SQL.
+
+    This joins the same rows that `Member` looks at to find its address and
+    its preferences, so that queries can filter and select on them without
+    loading any members.
+    """
+
+    def __init__(self):
+        # Avoid circular imports.
+        from mailman.model.user import User
+        self.user = aliased(User)
+        self.address = aliased(Address)
+        self.address_user = aliased(User)
+        self._preferences = (
+            aliased(Preferences),
+            aliased(Preferences),
+            aliased(Preferences),
+            )
+
+    def join(self, query):
+        """Join the members' addresses, users and preferences to a query.
+
+        :param query: A query on `Member`.
+        :return: The joined query.
+        """
+        member_prefs, address_prefs, user_prefs = self._preferences
+        # A member is subscribed either with an explicit address, or with
+        # its user's preferred address.  Either way, the address's user
+        # provides the last level of preferences.
+        return query.outerjoin(
+            self.user, Member.user_id == self.user.id).join(
+            self.address, self.address.id == func.coalesce(
+                Member.address_id, self.user._preferred_address_id)).outerjoin(
+            self.address_user,
+            self.address.user_id == self.address_user.id).outerjoin(
+            member_prefs, Member.preferences_id == member_prefs.id).outerjoin(
+            address_prefs,
+            self.address.preferences_id == address_prefs.id).outerjoin(
+            user_prefs, self.address_user.preferences_id == user_prefs.id)
+
+    def preference(self, name):
+        """The effective value of a member preference.
+
+        :param name: The name of the preference.
+        :type name: string
+        :return: A column expression which resolves the preference the same
+            way `Member` does, falling back to the system default.
+        """
+        column = getattr(Preferences, name)
+        return func.coalesce(
+            *[getattr(preferences, name) for preferences in self._preferences],
+            literal(getattr(system_preferences, name), column.type),
+            type_=column.type)
+
+
 
 class MemberRoster(AbstractRoster):
     """Return all the members of a list."""
@@ -180,8 +349,11 @@ class AdministratorRoster(AbstractRoster):
     name = 'administrator'
 
     @dbconnection
-    def _query(self, store):
-        return store.query(Member).filter(
+    def _query(self, store, effective=None):
+        query = store.query(Member)
+        if effective is not None:
+            query = effective.join(query)
+        return query.filter(
             Member.list_id == self._mlist.list_id,
             or_(Member.role == MemberRole.owner,
                 Member.role == MemberRole.moderator))
@@ -209,42 +381,24 @@ class DeliveryMemberRoster(AbstractRoster):
     """Return all the members having a particular kind of delivery."""
 
     role = MemberRole.member
+    delivery_modes = ()
 
-    @property
-    def member_count(self):
-        """See `IRoster`."""
-        # XXX 2012-03-15 BAW: It would be nice to make this more efficient.
-        # The problem is that you'd have to change the loop in _get_members()
-        # checking the delivery mode to a query parameter.
-        return len(tuple(self.members))
-
-    @dbconnection
-    def _get_members(self, store, *delivery_modes):
-        """The set of members for a mailing list, filter by delivery mode.
-
-        :param delivery_modes: The modes to filter on.
-        :type delivery_modes: sequence of `DeliveryMode`.
-        :return: A generator of members.
-        :rtype: generator
-        """
-        results = store.query(Member).filter_by(
-            list_id = self._mlist.list_id,
-            role = MemberRole.member)
-        for member in results:
-            if member.delivery_mode in delivery_modes:
-                yield member
+    def _query(self, effective=None):
+        # The delivery mode is filtered on in the query, so the effective
+        # addresses and preferences are always needed.
+        if effective is None:
+            effective = _Effective()
+        query = super()._query(effective)
+        return query.filter(
+            effective.preference('delivery_mode').in_(self.delivery_modes))
 
 
+
 class RegularMemberRoster(DeliveryMemberRoster):
     """Return all the regular delivery members of a list."""
 
     name = 'regular_members'
-
-    @property
-    def members(self):
-        """See `IRoster`."""
-        for member in self._get_members(DeliveryMode.regular):
-            yield member
+    delivery_modes = (DeliveryMode.regular,)
 
 
 
@@ -252,14 +406,9 @@ class DigestMemberRoster(DeliveryMemberRoster):
     """Return all the regular delivery members of a list."""
 
     name = 'digest_members'
-
-    @property
-    def members(self):
-        """See `IRoster`."""
-        for member in self._get_members(DeliveryMode.plaintext_digests,
-                                        DeliveryMode.mime_digests,
-                                        DeliveryMode.summary_digests):
-            yield member
+    delivery_modes = (DeliveryMode.plaintext_digests,
+                      DeliveryMode.mime_digests,
+                      DeliveryMode.summary_digests)
 
 
 
@@ -269,8 +418,11 @@ class Subscribers(AbstractRoster):
     name = 'subscribers'
 
     @dbconnection
-    def _query(self, store):
-        return store.query(Member).filter_by(list_id = self._mlist.list_id)
+    def _query(self, store, effective=None):
+        query = store.query(Member)
+        if effective is not None:
+            query = effective.join(query)
+        return query.filter(Member.list_id == self._mlist.list_id)
 
 
 
@@ -302,6 +454,11 @@ class Memberships:
         for member in self._query():
             yield member
 
+    @property
+    def sorted_members(self):
+        """See `IRoster`."""
+        return sorted(self.members, key=attrgetter('address.email'))
+
     @property
     def users(self):
         """See `IRoster`."""
@@ -328,6 +485,22 @@ class Memberships:
                 'Too many matching member results: {0}'.format(
                     results.count()))
 
+    def get_members(self, emails):
+        """See `IRoster`."""
+        members = {}
+        for email in emails:
+            member = self.get_member(email)
+            if member is not None:
+                members[email] = member
+        return members
+
+    def get_emails(self, delivery_status=None):
+        """See `IRoster`."""
+        for member in self.members:
+            if (delivery_status is None or
+                    member.delivery_status == delivery_status):
+                yield member.address.email
+
     @dbconnection
     def get_memberships(self, store, address):
         """See `IRoster`."""
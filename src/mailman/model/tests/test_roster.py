@@ -26,12 +26,15 @@ __all__ = [
 import unittest
 
 from mailman.app.lifecycle import create_list
+from mailman.config import config
 from mailman.interfaces.address import IAddress
-from mailman.interfaces.member import DeliveryMode, MemberRole
+from mailman.interfaces.member import (
+    DeliveryMode, DeliveryStatus, MemberRole)
 from mailman.interfaces.user import IUser
 from mailman.interfaces.usermanager import IUserManager
 from mailman.testing.layers import ConfigLayer
 from mailman.utilities.datetime import now
+from sqlalchemy import event
 from zope.component import getUtility
 
 
@@ -127,6 +130,98 @@ class TestMailingListRoster(unittest.TestCase):
         self.assertEqual(self._mlist.digest_members.member_count, 1)
         self.assertEqual(self._mlist.subscribers.member_count, 4)
 
+    def test_preferences_in_one_query(self):
+        # Scanning a roster and resolving the members' preferences takes a
+        # single query.
+        anne = self._mlist.subscribe(self._anne, role=MemberRole.member)
+        anne.preferences.delivery_status = DeliveryStatus.by_user
+        self._mlist.subscribe(self._bart, role=MemberRole.member)
+        user = getUtility(IUserManager).make_user('dave@example.com')
+        address = list(user.addresses)[0]
+        address.verified_on = now()
+        user.preferred_address = address
+        user.preferences.receive_own_postings = False
+        self._mlist.subscribe(user, role=MemberRole.member)
+        config.db.commit()
+        # Load the mailing list again after the commit.
+        self.assertEqual(self._mlist.list_id, 'test.example.com')
+        statements = []
+        def count(*args, **kws):
+            statements.append(args)
+        event.listen(config.db.engine, 'before_cursor_execute', count)
+        try:
+            preferences = {
+                member.address.email: (
+                    member.delivery_status,
+                    member.delivery_mode,
+                    member.receive_own_postings,
+                    member.preferred_language.code,
+                    member.mailing_list.list_id)
+                for member in self._mlist.regular_members.members
+                }
+        finally:
+            event.remove(config.db.engine, 'before_cursor_execute', count)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(preferences, {
+            'anne@example.com': (DeliveryStatus.by_user, DeliveryMode.regular,
+                                 True, 'en', 'test.example.com'),
+            'bart@example.com': (DeliveryStatus.enabled, DeliveryMode.regular,
+                                 True, 'en', 'test.example.com'),
+            'dave@example.com': (DeliveryStatus.enabled, DeliveryMode.regular,
+                                 False, 'en', 'test.example.com'),
+            })
+
+    def test_get_emails(self):
+        # The members' addresses and preferences are resolved in the query,
+        # with the member's own preferences taking precedence over the
+        # address's, then the user's, then the system defaults.
+        user_manager = getUtility(IUserManager)
+        anne = self._mlist.subscribe(self._anne, role=MemberRole.member)
+        anne.preferences.delivery_status = DeliveryStatus.by_user
+        self._anne.preferences.delivery_status = DeliveryStatus.enabled
+        self._bart.preferences.delivery_mode = DeliveryMode.mime_digests
+        self._mlist.subscribe(self._bart, role=MemberRole.member)
+        self._mlist.subscribe(self._cris, role=MemberRole.member)
+        # Dave is subscribed as a user, through the preferred address.
+        dave = user_manager.make_user('dave@example.com')
+        address = list(dave.addresses)[0]
+        address.verified_on = now()
+        dave.preferred_address = address
+        dave.preferences.delivery_status = DeliveryStatus.by_bounces
+        self._mlist.subscribe(dave, role=MemberRole.member)
+        # Elle's address is linked to a user with digest delivery.
+        elle = user_manager.make_user('elle@example.com')
+        elle.preferences.delivery_mode = DeliveryMode.plaintext_digests
+        self._mlist.subscribe(
+            list(elle.addresses)[0], role=MemberRole.member)
+        self._mlist.subscribe(self._cris, role=MemberRole.owner)
+        self.assertEqual(
+            sorted(self._mlist.regular_members.get_emails()),
+            ['anne@example.com', 'cris@example.com', 'dave@example.com'])
+        self.assertEqual(
+            sorted(self._mlist.regular_members.get_emails(
+                DeliveryStatus.enabled)),
+            ['cris@example.com'])
+        self.assertEqual(
+            sorted(self._mlist.digest_members.get_emails(
+                DeliveryStatus.enabled)),
+            ['bart@example.com', 'elle@example.com'])
+        self.assertEqual(
+            sorted(self._mlist.members.get_emails(DeliveryStatus.by_user)),
+            ['anne@example.com'])
+        self.assertEqual(
+            list(self._mlist.administrators.get_emails()),
+            ['cris@example.com'])
+        # The emails match the rosters' members.
+        for roster in (self._mlist.regular_members,
+                       self._mlist.digest_members,
+                       self._mlist.subscribers):
+            self.assertEqual(
+                sorted(roster.get_emails()),
+                sorted(member.address.email for member in roster.members))
+        self.assertEqual(self._mlist.regular_members.member_count, 3)
+        self.assertEqual(self._mlist.digest_members.member_count, 2)
+
 
 
 class TestMembershipsRoster(unittest.TestCase):
@@ -200,3 +295,39 @@ class TestMembershipsRoster(unittest.TestCase):
         self.assertEqual(
             [record.address.email for record in memberships],
             ['anne@example.com', 'anne@example.com'])
+
+    def test_get_members(self):
+        # Several members can be looked up at once.
+        bart = getUtility(IUserManager).create_address('bart@example.com')
+        self._ant.subscribe(self._anne)
+        self._ant.subscribe(bart)
+        self._bee.subscribe(bart)
+        members = self._ant.members.get_members([
+            'anne@example.com', 'bart@example.com', 'cris@example.com'])
+        self.assertEqual(sorted(members), [
+            'anne@example.com', 'bart@example.com'])
+        self.assertEqual(members['anne@example.com'].user, self._anne)
+        self.assertEqual(members['bart@example.com'].address, bart)
+        self.assertEqual(members['bart@example.com'].list_id,
+                         'ant.example.com')
+        self.assertEqual(self._ant.owners.get_members(['bart@example.com']),
+                         {})
+
+    def test_get_members_as_user_and_address(self):
+        # Like get_member(), get_members() prefers the explicit address.
+        self._ant.subscribe(self._anne)
+        self._ant.subscribe(self._anne.preferred_address)
+        members = self._ant.members.get_members(['anne@example.com'])
+        self.assertEqual(list(members), ['anne@example.com'])
+        self.assertEqual(
+            members['anne@example.com'],
+            self._ant.members.get_member('anne@example.com'))
+
+    def test_get_members_many(self):
+        # Lots of email addresses are looked up in chunks.
+        user_manager = getUtility(IUserManager)
+        emails = ['person{0}@example.com'.format(i) for i in range(1200)]
+        for email in emails[::100]:
+            self._ant.subscribe(user_manager.create_address(email))
+        members = self._ant.members.get_members(emails)
+        self.assertEqual(sorted(members), sorted(emails[::100]))
@@ -86,3 +86,14 @@ class TestUserManager(unittest.TestCase):
         original = self._usermanager.make_user('anne@example.com')
         copy = self._usermanager.get_user_by_id(original.user_id)
         self.assertEqual(original, copy)
+
+    def test_get_addresses(self):
+        anne = self._usermanager.create_address('Anne@example.com')
+        user = self._usermanager.create_user('bart@example.com')
+        addresses = self._usermanager.get_addresses(
+            ['anne@example.com', 'BART@example.com', 'cris@example.com'])
+        self.assertEqual(sorted(addresses), ['anne@example.com',
+                                             'bart@example.com'])
+        self.assertIs(addresses['anne@example.com'], anne)
+        self.assertIs(addresses['bart@example.com'].user, user)
+        self.assertEqual(self._usermanager.get_addresses([]), {})
@@ -28,7 +28,10 @@ from mailman.interfaces.usermanager import IUserManager
 from mailman.model.address import Address
 from mailman.model.member import Member
 from mailman.model.preferences import Preferences
+from mailman.model.roster import IN_CHUNK_SIZE
 from mailman.model.user import User
+from mailman.utilities.queries import QuerySequence
+from sqlalchemy.orm import joinedload
 from zope.interface import implementer
 
 
@@ -92,8 +95,7 @@ class UserManager:
     @dbconnection
     def users(self, store):
         """See `IUserManager`."""
-        for user in store.query(User).all():
-            yield user
+        return QuerySequence(store.query(User), (User.id,))
 
     @dbconnection
     def create_address(self, store, email, display_name=None):
@@ -129,6 +131,19 @@ class UserManager:
             return None
         return addresses.one()
 
+    @dbconnection
+    def get_addresses(self, store, emails):
+        """See `IUserManager`."""
+        emails = sorted(set(email.lower() for email in emails))
+        found = {}
+        for start in range(0, len(emails), IN_CHUNK_SIZE):
+            query = store.query(Address).options(
+                joinedload(Address.user)).filter(
+                Address.email.in_(emails[start:start + IN_CHUNK_SIZE]))
+            for address in query:
+                found[address.email] = address
+        return found
+
     @property
     @dbconnection
     def addresses(self, store):
@@ -0,0 +1,401 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Asynchronous delivery.
+
+To use this instead of the default synchronous delivery, set this in your
+configuration file:
+
+    [mta]
+    outgoing: mailman.mta.asynchronous.deliver
+
+The messages are crafted exactly as by `mailman.mta.deliver.deliver()`, but
+they are handed to the outgoing mail server from an asyncio event loop, which
+keeps many SMTP transactions in flight at the same time.  A slow or stalled
+transaction only holds up its own recipients, and it is given up after
+`[mta]smtp_timeout`.
+"""
+
+__all__ = [
+    'AsyncBulkDelivery',
+    'AsyncDeliver',
+    'AsyncDeliveryMixin',
+    'SMTPClient',
+    'deliver',
+    ]
+
+
+import re
+import socket
+import asyncio
+import logging
+import smtplib
+
+from base64 import b64encode
+from collections import defaultdict
+from lazr.config import as_boolean, as_timedelta
+from mailman.config import config
+from mailman.mta.bulk import BulkDelivery
+from mailman.mta.deliver import Deliver, deliver_with
+
+
+CRLF = b'\r\n'
+EOL = re.compile(br'(?:\r\n|\n|\r(?!\n))')
+LEADING_DOT = re.compile(br'(?m)^\.')
+
+log = logging.getLogger('mailman.smtp')
+
+
+
+class SMTPClient:
+    """An asyncio SMTP client for one connection to the outgoing MTA.
+
+    The coroutines raise the same exceptions as `smtplib.SMTP` does, so
+    failures can be handled the same way.  A reply that doesn't arrive in
+    time raises `socket.timeout`.
+    """
+
+    def __init__(self, host, port, sessions_per_connection, timeout,
+                 smtp_user=None, smtp_pass=None, pipelining=True):
+        """Create a client.  No connection is made until it is needed.
+
+        :param host: The host name of the SMTP server to connect to.
+        :type host: string
+        :param port: The port number of the SMTP server to connect to.
+        :type port: integer
+        :param sessions_per_connection: The number of SMTP sessions per
+            connection, or zero for no limit.  See `Connection`.
+        :type sessions_per_connection: integer
+        :param timeout: The number of seconds to wait for the server to
+            accept the connection or answer any command.
+        :type timeout: float
+        :param smtp_user: Optional SMTP authentication user name.
+        :type smtp_user: str
+        :param smtp_pass: Optional SMTP authentication password.
+        :type smtp_pass: str
+        :param pipelining: Whether to pipeline the MAIL FROM and RCPT TO
+            commands when the server supports ESMTP PIPELINING.
+        :type pipelining: bool
+        """
+        self._host = host
+        self._port = port
+        self._sessions_per_connection = sessions_per_connection
+        self._timeout = timeout
+        self._username = smtp_user
+        self._password = smtp_pass
+        self._pipelining = pipelining
+        self._session_count = None
+        self._reader = None
+        self._writer = None
+        self._extensions = {}
+
+    @property
+    def is_connected(self):
+        """True if there is an open connection to the server."""
+        return self._writer is not None
+
+    @asyncio.coroutine
+    def _wait(self, coroutine):
+        try:
+            return (yield from asyncio.wait_for(coroutine, self._timeout))
+        except asyncio.TimeoutError:
+            self.close()
+            raise socket.timeout('SMTP server {0}:{1} timed out'.format(
+                self._host, self._port))
+
+    @asyncio.coroutine
+    def _read_reply(self):
+        """Read a (possibly multiline) reply.
+
+        :return: The reply code and text, like `smtplib.SMTP.getreply()`.
+        :rtype: (int, bytes)
+        """
+        lines = []
+        while True:
+            line = yield from self._wait(self._reader.readline())
+            if len(line) == 0:
+                self.close()
+                raise smtplib.SMTPServerDisconnected(
+                    'Connection unexpectedly closed')
+            lines.append(line[4:].strip(b' \t\r\n'))
+            try:
+                code = int(line[:3])
+            except ValueError:
+                code = -1
+                break
+            if line[3:4] != b'-':
+                break
+        return code, b'\n'.join(lines)
+
+    @asyncio.coroutine
+    def _command(self, *lines):
+        """Send one or more (pipelined) commands, and read their replies.
+
+        :return: The reply for each command.
+        :rtype: list of (int, bytes)
+        """
+        self._writer.write(b''.join(
+            line.encode('ascii') + CRLF for line in lines))
+        replies = []
+        for line in lines:
+            replies.append((yield from self._read_reply()))
+        return replies
+
+    @asyncio.coroutine
+    def connect(self):
+        """Connect, say hello and log in if necessary."""
+        log.debug('Connecting to %s:%s', self._host, self._port)
+        self._reader, self._writer = yield from self._wait(
+            asyncio.open_connection(self._host, self._port))
+        try:
+            code, message = yield from self._read_reply()
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, message)
+            [(code, message)] = yield from self._command(
+                'ehlo ' + socket.getfqdn())
+            self._extensions = {}
+            if code == 250:
+                for line in message.decode('ascii', 'replace').splitlines():
+                    keyword, space, parameters = line.partition(' ')
+                    self._extensions[keyword.lower()] = parameters
+            else:
+                [(code, message)] = yield from self._command(
+                    'helo ' + socket.getfqdn())
+                if code != 250:
+                    raise smtplib.SMTPHeloError(code, message)
+            if self._username is not None and self._password is not None:
+                yield from self._login()
+        except Exception:
+            self.close()
+            raise
+        self._session_count = self._sessions_per_connection
+
+    @asyncio.coroutine
+    def _login(self):
+        log.debug('Logging in')
+        mechanisms = self._extensions.get('auth', '').upper().split()
+        if 'PLAIN' in mechanisms:
+            credentials = '\0{0}\0{1}'.format(self._username, self._password)
+            [(code, message)] = yield from self._command(
+                'AUTH PLAIN ' + b64encode(
+                    credentials.encode('utf-8')).decode('ascii'))
+        elif 'LOGIN' in mechanisms:
+            [(code, message)] = yield from self._command('AUTH LOGIN')
+            for value in (self._username, self._password):
+                if code != 334:
+                    break
+                [(code, message)] = yield from self._command(
+                    b64encode(value.encode('utf-8')).decode('ascii'))
+        else:
+            raise smtplib.SMTPException(
+                'No suitable authentication method found.')
+        if code != 235:
+            raise smtplib.SMTPAuthenticationError(code, message)
+
+    @asyncio.coroutine
+    def sendmail(self, envsender, recipients, msgtext):
+        """Like `smtplib.SMTP.sendmail()`.
+
+        :return: The refused recipients, if any recipients were accepted.
+        :rtype: dictionary
+        """
+        data = EOL.sub(CRLF, msgtext.encode('ascii'))
+        if self._writer is None:
+            yield from self.connect()
+        try:
+            results = yield from self._transaction(
+                envsender, recipients, data)
+        except (socket.error, smtplib.SMTPException):
+            # Don't reuse a connection in an unknown state.
+            self.close()
+            raise
+        self._session_count -= 1
+        if self._session_count == 0:
+            yield from self.quit()
+        return results
+
+    @asyncio.coroutine
+    def _transaction(self, envsender, recipients, data):
+        options = ''
+        if 'size' in self._extensions:
+            options = ' size={0}'.format(len(data))
+        commands = ['mail FROM:{0}{1}'.format(
+            smtplib.quoteaddr(envsender), options)]
+        commands.extend('rcpt TO:{0}'.format(smtplib.quoteaddr(recipient))
+                        for recipient in recipients)
+        if self._pipelining and 'pipelining' in self._extensions:
+            replies = yield from self._command(*commands)
+        else:
+            replies = []
+            for command in commands:
+                replies.extend((yield from self._command(command)))
+                if replies[0][0] != 250:
+                    break
+        code, message = replies[0]
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, message, envsender)
+        refused = {}
+        for recipient, (code, message) in zip(recipients, replies[1:]):
+            if code not in (250, 251):
+                refused[recipient] = (code, message)
+        if len(refused) == len(recipients):
+            raise smtplib.SMTPRecipientsRefused(refused)
+        [(code, message)] = yield from self._command('data')
+        if code != 354:
+            raise smtplib.SMTPDataError(code, message)
+        data = LEADING_DOT.sub(b'..', data)
+        if not data.endswith(CRLF):
+            data += CRLF
+        self._writer.write(data + b'.' + CRLF)
+        code, message = yield from self._read_reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, message)
+        return refused
+
+    @asyncio.coroutine
+    def quit(self):
+        """Say goodbye to the server, and close the connection."""
+        if self._writer is None:
+            return
+        try:
+            yield from self._command('quit')
+        except (socket.error, smtplib.SMTPException):
+            pass
+        self.close()
+
+    def close(self):
+        """Close the connection without saying goodbye."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+
+class AsyncDeliveryMixin:
+    """Hand messages to the outgoing mail server from an asyncio event loop.
+
+    Mix this into a delivery class to have all of its messages sent
+    concurrently.  Up to `[mta]max_transactions` SMTP transactions are in
+    flight at the same time, with at most `[mta]max_domain_transactions` of
+    them for any recipient domain.  Each transaction in flight uses its own
+    connection; connections are reused for later transactions.
+    """
+
+    _concurrent = True
+
+    def _send_many(self, deliveries):
+        """See `BaseDelivery`."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(self._send_async(loop, deliveries))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def _make_client(self):
+        username = (config.mta.smtp_user if config.mta.smtp_user else None)
+        password = (config.mta.smtp_pass if config.mta.smtp_pass else None)
+        timeout = as_timedelta(config.mta.smtp_timeout).total_seconds()
+        return SMTPClient(
+            config.mta.smtp_host, int(config.mta.smtp_port),
+            int(config.mta.max_sessions_per_connection), timeout,
+            username, password, as_boolean(config.mta.smtp_pipelining))
+
+    @asyncio.coroutine
+    def _send_async(self, loop, deliveries):
+        in_flight = asyncio.Semaphore(int(config.mta.max_transactions))
+        per_domain = int(config.mta.max_domain_transactions)
+        domains = defaultdict(lambda: asyncio.Semaphore(per_domain))
+        # Connections which are not in use by any transaction.
+        idle = []
+        tasks = []
+        try:
+            try:
+                for args in deliveries:
+                    # This waits for a transaction to finish when too many
+                    # are in flight, which also lets the event loop run.
+                    yield from in_flight.acquire()
+                    tasks.append(loop.create_task(self._send_one(
+                        in_flight, domains, idle, *args)))
+            except Exception:
+                for task in tasks:
+                    task.cancel()
+                raise
+            finally:
+                results = yield from asyncio.gather(
+                    *tasks, return_exceptions=True)
+        finally:
+            for client in idle:
+                yield from client.quit()
+        # Collect the results in delivery order, so that the refused
+        # recipients come out the same as with serial delivery.
+        refused = {}
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+            refused.update(result)
+        return refused
+
+    @asyncio.coroutine
+    def _send_one(self, in_flight, domains, idle, sender, recipients,
+                  msgtext, message_id):
+        recipients = list(recipients)
+        if as_boolean(config.devmode.enabled):
+            # See `Connection.sendmail()`.
+            recipients = [config.devmode.recipient] * len(recipients)
+        # Transactions are limited by the domain of their first recipient.
+        # For individual deliveries that is the only recipient, and bulk
+        # chunks are already split up by top level domain.
+        domain = (recipients[0].rpartition('@')[2].lower()
+                  if len(recipients) > 0 else '')
+        try:
+            yield from domains[domain].acquire()
+            try:
+                client = (idle.pop() if len(idle) > 0
+                          else self._make_client())
+                try:
+                    refused = yield from client.sendmail(
+                        sender, recipients, msgtext)
+                except (socket.error, IOError, smtplib.SMTPException) as error:
+                    refused = self._failed(error, recipients, message_id)
+                if client.is_connected:
+                    idle.append(client)
+                return refused
+            finally:
+                domains[domain].release()
+        finally:
+            in_flight.release()
+
+
+
+class AsyncDeliver(AsyncDeliveryMixin, Deliver):
+    """Individual delivery, sent asynchronously."""
+
+
+class AsyncBulkDelivery(AsyncDeliveryMixin, BulkDelivery):
+    """Bulk delivery, sent asynchronously."""
+
+
+
+def deliver(mlist, msg, msgdata):
+    """Deliver a message to the outgoing mail server asynchronously.
+
+    This can be used as `[mta]outgoing`.  It fails the same way as
+    `mailman.mta.deliver.deliver()`.
+    """
+    deliver_with(AsyncDeliver, AsyncBulkDelivery, mlist, msg, msgdata)
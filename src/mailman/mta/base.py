@@ -28,9 +28,11 @@ import socket
 import logging
 import smtplib
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from mailman.config import config
 from mailman.interfaces.mta import IMailTransportAgentDelivery
-from mailman.mta.connection import Connection
+from mailman.mta.connection import connection_pool
 from zope.interface import implementer
 
 
@@ -44,12 +46,13 @@ class BaseDelivery:
 
     def __init__(self):
         """Create a basic deliverer."""
-        username = (config.mta.smtp_user if config.mta.smtp_user else None)
-        password = (config.mta.smtp_pass if config.mta.smtp_pass else None)
-        self._connection = Connection(
-            config.mta.smtp_host, int(config.mta.smtp_port),
-            int(config.mta.max_sessions_per_connection),
-            username, password)
+        self._max_threads = int(config.mta.max_delivery_threads)
+        self._pool = connection_pool()
+
+    @property
+    def _concurrent(self):
+        """True if deliveries are made concurrently by `_send_many()`."""
+        return self._max_threads > 1
 
     def _deliver_to_recipients(self, mlist, msg, msgdata, recipients):
         """Low-level delivery to a set of recipients.
@@ -65,32 +68,108 @@ class BaseDelivery:
         :return: delivery failures as defined by `smtplib.SMTP.sendmail`
         :rtype: dictionary
         """
-        # Do the actual sending.
+        return self._send_pooled(
+            *self._prepare(mlist, msg, msgdata, recipients))
+
+    def _prepare(self, mlist, msg, msgdata, recipients):
+        """Prepare a delivery for `_send()`.
+
+        Everything that needs the mailing list, the message or the database
+        happens here, so that with threaded delivery, only the SMTP
+        conversation itself happens outside of the calling thread.
+
+        :param mlist: The mailing list being delivered to.
+        :type mlist: `IMailingList`
+        :param msg: The original message being delivered.
+        :type msg: `Message`
+        :param msgdata: Additional message metadata for this delivery.
+        :type msgdata: dictionary
+        :param recipients: The recipients of this message.
+        :type recipients: sequence
+        :return: The envelope sender, the recipients, the message text and
+            the message id.
+        :rtype: 4-tuple
+        """
         sender = self._get_sender(mlist, msg, msgdata)
-        message_id = msg['message-id']
+        return sender, recipients, msg.as_string(), msg['message-id']
+
+    def _send(self, connection, sender, recipients, msgtext, message_id):
+        """Send a prepared message over the given connection.
+
+        :param connection: The connection to the outgoing mail server.
+        :type connection: `Connection`
+        :return: delivery failures as defined by `smtplib.SMTP.sendmail`
+        :rtype: dictionary
+        """
         try:
-            refused = self._connection.sendmail(
-                sender, recipients, msg.as_string())
-        except smtplib.SMTPRecipientsRefused as error:
+            return connection.sendmail(sender, recipients, msgtext)
+        except (socket.error, IOError, smtplib.SMTPException) as error:
+            return self._failed(error, recipients, message_id)
+
+    def _failed(self, error, recipients, message_id):
+        """Work out which recipients a failed delivery refused.
+
+        :param error: The exception raised by the delivery.
+        :type error: `socket.error`, `IOError` or `smtplib.SMTPException`
+        :param recipients: The recipients of the message.
+        :type recipients: sequence
+        :param message_id: The Message-ID of the message, for logging.
+        :type message_id: string
+        :return: delivery failures as defined by `smtplib.SMTP.sendmail`
+        :rtype: dictionary
+        """
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
             log.error('%s recipients refused: %s', message_id, error)
-            refused = error.recipients
-        except smtplib.SMTPResponseException as error:
+            return error.recipients
+        if isinstance(error, smtplib.SMTPResponseException):
             log.error('%s response exception: %s', message_id, error)
-            refused = dict(
+            return dict(
                 # recipient -> (code, error)
                 (recipient, (error.smtp_code, error.smtp_error))
                 for recipient in recipients)
-        except (socket.error, IOError, smtplib.SMTPException) as error:
-            # MTA not responding, or other socket problems, or any other
-            # kind of SMTPException.  In that case, nothing got delivered,
-            # so treat this as a temporary failure.  We use error code 444
-            # for this (temporary, unspecified failure, cf RFC 5321).
-            log.error('%s low level smtp error: %s', message_id, error)
-            error = str(error)
-            refused = dict(
-                # recipient -> (code, error)
-                (recipient, (444, error))
-                for recipient in recipients)
+        # MTA not responding, or other socket problems, or any other kind of
+        # SMTPException.  In that case, nothing got delivered, so treat this
+        # as a temporary failure.  We use error code 444 for this (temporary,
+        # unspecified failure, cf RFC 5321).
+        log.error('%s low level smtp error: %s', message_id, error)
+        error = str(error)
+        return dict(
+            # recipient -> (code, error)
+            (recipient, (444, error))
+            for recipient in recipients)
+
+    def _send_pooled(self, *args):
+        """Like `_send()`, but over a connection from the pool."""
+        with self._pool.connection() as connection:
+            return self._send(connection, *args)
+
+    def _send_many(self, deliveries):
+        """Send prepared messages concurrently.
+
+        By default this uses a pool of delivery threads.  At most
+        `max_delivery_threads` messages are sent at the same time, each over
+        its own pooled SMTP connection.  The results are collected in the
+        order the deliveries were given, so the refused recipients come out
+        exactly as if the messages were sent one after the other.
+
+        :param deliveries: The deliveries to make, as returned by
+            `_prepare()`.  This is consumed in the calling thread, so it can
+            safely be a generator that touches the database.
+        :type deliveries: iterable of 4-tuples
+        :return: delivery failures as defined by `smtplib.SMTP.sendmail`
+        :rtype: dictionary
+        """
+        refused = {}
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self._max_threads) as pool:
+            for args in deliveries:
+                pending.append(pool.submit(self._send_pooled, *args))
+                # Don't get too far ahead of the delivery threads, so that
+                # prepared messages don't pile up in memory.
+                if len(pending) >= 2 * self._max_threads:
+                    refused.update(pending.popleft().result())
+            while pending:
+                refused.update(pending.popleft().result())
         return refused
 
     def _get_sender(self, mlist, msg, msgdata):
@@ -144,27 +223,77 @@ class IndividualDelivery(BaseDelivery):
         delivery address in the return envelope so there can be no ambiguity
         in bounce processing.
         """
+        deliveries = self._splice(mlist, msg, msgdata)
+        if deliveries is not None:
+            if self._concurrent:
+                return self._send_many(deliveries)
+            refused = {}
+            for args in deliveries:
+                refused.update(self._send_pooled(*args))
+            return refused
+        deliveries = self._individualize(mlist, msg, msgdata)
+        if self._concurrent:
+            return self._send_many(
+                self._prepare(mlist, message_copy, msgdata_copy, [recipient])
+                for message_copy, msgdata_copy, recipient in deliveries)
         refused = {}
-        recipients = msgdata.get('recipients', set())
-        for recipient in recipients:
-            log.debug('IndividualDelivery to: %s', recipient)
-            # Make a copy of the original messages and operator on it, since
-            # we're going to munge it repeatedly for each recipient.
-            message_copy = copy.deepcopy(msg)
-            msgdata_copy = msgdata.copy()
-            # Squirrel the current recipient away in the message metadata.
-            # That way the subclass's _get_sender() override can encode the
-            # recipient address in the sender, e.g. for VERP.
-            msgdata_copy['recipient'] = recipient
-            # See if the recipient is a member of the mailing list, and if so,
-            # squirrel this information away for use by other modules, such as
-            # the header/footer decorator.  XXX 2012-03-05 this is probably
-            # highly inefficient on the database.
-            member = mlist.members.get_member(recipient)
-            msgdata_copy['member'] = member
-            for callback in self.callbacks:
-                callback(mlist, message_copy, msgdata_copy)
+        for message_copy, msgdata_copy, recipient in deliveries:
             status = self._deliver_to_recipients(
                 mlist, message_copy, msgdata_copy, [recipient])
             refused.update(status)
         return refused
+
+    def _splice(self, mlist, msg, msgdata):
+        """Prepare the deliveries without individualizing the message.
+
+        Crafting every recipient's message from a copy of the original one
+        is expensive.  Subclasses which can render the recipients' messages
+        more cheaply return the prepared deliveries here, as accepted by
+        `_send_many()`.
+
+        :return: The prepared deliveries, or None to individualize the
+            message for each recipient.
+        :rtype: iterator of 4-tuples, or None
+        """
+        return None
+
+    def _individualize(self, mlist, msg, msgdata):
+        """Craft the message for each recipient in turn.
+
+        :return: The message, the message metadata and the recipient, for
+            each recipient.
+        :rtype: iterator of 3-tuples
+        """
+        recipients = msgdata.get('recipients', set())
+        # See which recipients are members of the mailing list, all at once.
+        members = mlist.members.get_members(recipients)
+        for recipient in recipients:
+            message_copy, msgdata_copy = self._individualize_one(
+                mlist, msg, msgdata, recipient, members.get(recipient))
+            yield message_copy, msgdata_copy, recipient
+
+    def _individualize_one(self, mlist, msg, msgdata, recipient, member):
+        """Craft the message for one recipient.
+
+        :param member: The recipient's membership, if they are a member of
+            the mailing list.
+        :type member: `IMember` or None
+        :return: The message and the message metadata.
+        :rtype: 2-tuple
+        """
+        log.debug('IndividualDelivery to: %s', recipient)
+        # Make a copy of the original messages and operator on it, since
+        # we're going to munge it repeatedly for each recipient.
+        message_copy = copy.deepcopy(msg)
+        msgdata_copy = msgdata.copy()
+        # Squirrel the current recipient away in the message metadata.  That
+        # way the subclass's _get_sender() override can encode the recipient
+        # address in the sender, e.g. for VERP.
+        msgdata_copy['recipient'] = recipient
+        # If the recipient is a member of the mailing list, squirrel this
+        # information away for use by other modules, such as the
+        # header/footer decorator.
+        msgdata_copy['member'] = member
+        for callback in self.callbacks:
+            callback(mlist, message_copy, msgdata_copy)
+        return message_copy, msgdata_copy
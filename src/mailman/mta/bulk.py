@@ -99,8 +99,16 @@ class BulkDelivery(BaseDelivery):
 
     def deliver(self, mlist, msg, msgdata):
         """See `IMailTransportAgentDelivery`."""
+        chunks = self.chunkify(msgdata.get('recipients', set()))
+        if self._concurrent:
+            # Every chunk gets the same message, so only prepare it once.
+            sender, recipients, msgtext, message_id = self._prepare(
+                mlist, msg, msgdata, [])
+            return self._send_many(
+                (sender, recipients, msgtext, message_id)
+                for recipients in chunks)
         refused = {}
-        for recipients in self.chunkify(msgdata.get('recipients', set())):
+        for recipients in chunks:
             chunk_refused = self._deliver_to_recipients(
                 mlist, msg, msgdata, recipients)
             refused.update(chunk_refused)
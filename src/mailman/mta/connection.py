@@ -19,24 +19,40 @@
 
 __all__ = [
     'Connection',
+    'ConnectionPool',
+    'close_pools',
+    'connection_pool',
     ]
 
 
+import time
+import socket
 import logging
 import smtplib
+import threading
 
-from lazr.config import as_boolean
+from contextlib import contextmanager
+from lazr.config import as_boolean, as_timedelta
 from mailman.config import config
 
 
+CRLF = '\r\n'
+# Pooled connections which have been idle for longer than this many seconds
+# are checked with a NOOP before they are used again.
+CHECK_AFTER = 1.0
+
 log = logging.getLogger('mailman.smtp')
 
+# The process-wide connection pools, keyed by the connection parameters.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
 
-
 class Connection:
     """Manage a connection to the SMTP server."""
     def __init__(self, host, port, sessions_per_connection,
-                 smtp_user=None, smtp_pass=None):
+                 smtp_user=None, smtp_pass=None, pipelining=True):
         """Create a connection manager.
 
         :param host: The host name of the SMTP server to connect to.
@@ -54,23 +70,39 @@ class Connection:
         :type smtp_user: str
         :param smtp_pass: Optional SMTP authentication password.  If given,
             `smtp_user` must also be given.
+        :param pipelining: Whether to pipeline the MAIL FROM and RCPT TO
+            commands when the server supports ESMTP PIPELINING.
+        :type pipelining: bool
         """
         self._host = host
         self._port = port
         self._sessions_per_connection = sessions_per_connection
         self._username = smtp_user
         self._password = smtp_pass
+        self._pipelining = pipelining
         self._session_count = None
         self._connection = None
 
+    @property
+    def is_connected(self):
+        """True if there is an open connection to the server."""
+        return self._connection is not None
+
     def _connect(self):
         """Open a new connection."""
-        self._connection = smtplib.SMTP()
+        connection = smtplib.SMTP()
         log.debug('Connecting to %s:%s', self._host, self._port)
-        self._connection.connect(self._host, self._port)
+        connection.connect(self._host, self._port)
         if self._username is not None and self._password is not None:
             log.debug('Logging in')
-            self._connection.login(self._username, self._password)
+            try:
+                connection.login(self._username, self._password)
+            except smtplib.SMTPException:
+                # Don't leave an unauthenticated connection behind for the
+                # next message to use.
+                connection.close()
+                raise
+        self._connection = connection
         self._session_count = self._sessions_per_connection
 
     def sendmail(self, envsender, recipients, msgtext):
@@ -84,8 +116,14 @@ class Connection:
         try:
             log.debug('envsender: %s, recipients: %s, size(msgtext): %s',
                       envsender, recipients, len(msgtext))
-            results = self._connection.sendmail(envsender, recipients, msgtext)
-        except smtplib.SMTPException:
+            self._connection.ehlo_or_helo_if_needed()
+            if self._pipelining and self._connection.has_extn('pipelining'):
+                results = self._pipelined_sendmail(
+                    envsender, recipients, msgtext)
+            else:
+                results = self._connection.sendmail(
+                    envsender, recipients, msgtext)
+        except (socket.error, smtplib.SMTPException):
             # For safety, close this connection.  The next send attempt will
             # automatically re-open it.  Pass the exception on up.
             self.quit()
@@ -99,12 +137,210 @@ class Connection:
             self.quit()
         return results
 
+    def _pipelined_sendmail(self, envsender, recipients, msgtext):
+        """Like `smtplib.SMTP.sendmail`, but with ESMTP PIPELINING.
+
+        The MAIL FROM and all the RCPT TO commands are sent together, and
+        only then are their replies read, so a transaction with any number of
+        recipients costs two round trips instead of two plus one per
+        recipient (RFC 2920).
+        """
+        connection = self._connection
+        if isinstance(msgtext, str):
+            msgtext = smtplib._fix_eols(msgtext).encode('ascii')
+        options = ''
+        if connection.has_extn('size'):
+            options = ' size={0}'.format(len(msgtext))
+        commands = ['mail FROM:{0}{1}'.format(
+            smtplib.quoteaddr(envsender), options)]
+        commands.extend('rcpt TO:{0}'.format(smtplib.quoteaddr(recipient))
+                        for recipient in recipients)
+        connection.send(CRLF.join(commands) + CRLF)
+        code, response = connection.getreply()
+        sender_code, sender_response = code, response
+        refused = {}
+        for recipient in recipients:
+            code, response = connection.getreply()
+            if code not in (250, 251):
+                refused[recipient] = (code, response)
+        if sender_code != 250:
+            if sender_code == 421:
+                connection.close()
+            else:
+                connection.rset()
+            raise smtplib.SMTPSenderRefused(
+                sender_code, sender_response, envsender)
+        if len(refused) == len(recipients):
+            connection.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        code, response = connection.data(msgtext)
+        if code != 250:
+            if code == 421:
+                connection.close()
+            else:
+                connection.rset()
+            raise smtplib.SMTPDataError(code, response)
+        return refused
+
+    def check(self):
+        """Make sure an open connection is still usable.
+
+        If the server doesn't answer a NOOP, the connection is closed, and
+        the next `sendmail()` will open a new one.
+        """
+        if self._connection is None:
+            return
+        try:
+            code, response = self._connection.noop()
+        except (socket.error, smtplib.SMTPException):
+            code = None
+        if code != 250:
+            log.debug('Dropping stale connection to %s:%s',
+                      self._host, self._port)
+            self._connection.close()
+            self._connection = None
+
     def quit(self):
         """Mimic `smtplib.SMTP.quit`."""
         if self._connection is None:
             return
         try:
             self._connection.quit()
-        except smtplib.SMTPException:
-            pass
+        except (socket.error, smtplib.SMTPException):
+            self._connection.close()
         self._connection = None
+
+
+
+class ConnectionPool:
+    """A pool of connections to one SMTP server.
+
+    Connections are handed out by `acquire()` and handed back by
+    `release()`, so that a connection can be reused by later messages and by
+    any delivery strategy, without logging into the server again.
+    """
+
+    def __init__(self, host, port, sessions_per_connection,
+                 smtp_user=None, smtp_pass=None, pipelining=True,
+                 max_connections=0, idle_timeout=0):
+        """Create a connection pool.
+
+        The first six arguments are passed to every new `Connection`.
+
+        :param max_connections: The maximum number of connections to the
+            server that can be in use at the same time.  `acquire()` blocks
+            until a connection is released when this many are in use.  Zero
+            means no limit.
+        :type max_connections: integer
+        :param idle_timeout: The number of seconds after which an unused
+            connection is closed instead of being reused.  Zero means idle
+            connections are kept forever.
+        :type idle_timeout: float
+        """
+        self._arguments = (host, port, sessions_per_connection,
+                           smtp_user, smtp_pass, pipelining)
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+        self._condition = threading.Condition()
+        # Connections waiting to be reused, with the time they were released,
+        # most recently released last.
+        self._idle = []
+        self._in_use = 0
+
+    def acquire(self):
+        """Get a connection from the pool.
+
+        :return: A connection, which must be given back with `release()`.
+        :rtype: `Connection`
+        """
+        now = time.time()
+        with self._condition:
+            while 0 < self._max_connections <= self._in_use:
+                self._condition.wait()
+            self._in_use += 1
+            expired = []
+            if self._idle_timeout > 0:
+                expired = [connection
+                           for released, connection in self._idle
+                           if now - released > self._idle_timeout]
+                self._idle = [(released, connection)
+                              for released, connection in self._idle
+                              if now - released <= self._idle_timeout]
+            released, connection = (self._idle.pop()
+                                    if len(self._idle) > 0
+                                    else (None, None))
+        for stale in expired:
+            stale.quit()
+        if connection is None:
+            return Connection(*self._arguments)
+        if now - released > CHECK_AFTER:
+            connection.check()
+        return connection
+
+    def release(self, connection):
+        """Give a connection back to the pool.
+
+        :param connection: A connection returned by `acquire()`.
+        :type connection: `Connection`
+        """
+        with self._condition:
+            self._in_use -= 1
+            # A connection that was closed, e.g. because of an error or
+            # because it reached its maximum number of sessions, would just
+            # open a new one, so there's no point in keeping it.
+            if connection.is_connected:
+                self._idle.append((time.time(), connection))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Use a connection from the pool for the duration of the block."""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        """Close all the idle connections."""
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+        for released, connection in idle:
+            connection.quit()
+
+
+
+def connection_pool():
+    """Return the pool of connections to the configured outgoing MTA.
+
+    There is one pool per process for each combination of connection
+    parameters in the `[mta]` section.
+
+    :return: The connection pool.
+    :rtype: `ConnectionPool`
+    """
+    username = (config.mta.smtp_user if config.mta.smtp_user else None)
+    password = (config.mta.smtp_pass if config.mta.smtp_pass else None)
+    idle_timeout = as_timedelta(config.mta.connection_idle_timeout)
+    key = (config.mta.smtp_host,
+           int(config.mta.smtp_port),
+           int(config.mta.max_sessions_per_connection),
+           username, password,
+           as_boolean(config.mta.smtp_pipelining),
+           int(config.mta.max_connections),
+           idle_timeout.total_seconds())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(*key)
+        return pool
+
+
+def close_pools():
+    """Close the idle connections of all the connection pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -19,24 +19,35 @@
 
 __all__ = [
     'deliver',
+    'deliver_with',
     ]
 
 
+import copy
 import time
 import logging
 
 from mailman.config import config
+from mailman.handlers.decorate import member_substitutions
 from mailman.interfaces.mailinglist import Personalization
 from mailman.interfaces.mta import SomeRecipientsFailed
 from mailman.mta.decorating import DecoratingMixin
 from mailman.mta.personalized import PersonalizedMixin
 from mailman.mta.verp import VERPMixin
-from mailman.mta.base import IndividualDelivery
+from mailman.mta.base import BaseDelivery, IndividualDelivery
 from mailman.mta.bulk import BulkDelivery
+from mailman.mta.splice import MessageSplicer
 from mailman.utilities.string import expand
 
 
 COMMA = ','
+SUBSTITUTIONS = (
+    'user_address',
+    'user_delivered_to',
+    'user_language',
+    'user_name',
+    'user_optionsurl',
+    )
 log = logging.getLogger('mailman.smtp')
 
 
@@ -61,10 +72,104 @@ class Deliver(VERPMixin, DecoratingMixin, PersonalizedMixin,
             self.personalize_to,
             ])
 
+    def _splice(self, mlist, msg, msgdata):
+        """See `IndividualDelivery`.
+
+        The message is decorated and flattened only once, with markers in
+        place of the recipient's details, which are then spliced into the
+        flattened text for each recipient.  Recipients whose details can't be
+        spliced in, and messages whose decoration can't be rendered like
+        this, are individualized in full.
+        """
+        recipients = msgdata.get('recipients', set())
+        if len(recipients) < 2:
+            return None
+        # Only the standard callbacks can be spliced.  Subclasses which
+        # deliver the individualized messages themselves get them in full.
+        callbacks = [getattr(callback, '__func__', None)
+                     for callback in self.callbacks]
+        if (callbacks != [VERPMixin.avoid_duplicates,
+                          DecoratingMixin.decorate,
+                          PersonalizedMixin.personalize_to] or
+                type(self)._deliver_to_recipients is not
+                BaseDelivery._deliver_to_recipients):
+            return None
+        markers = MessageSplicer.make_markers(SUBSTITUTIONS + ('to', 'copy'))
+        to_marker = markers.pop('to')
+        copy_marker = markers.pop('copy')
+        template = copy.deepcopy(msg)
+        template_data = msgdata.copy()
+        template_data.pop('member', None)
+        decoration_data = dict(markers)
+        decoration_data.update(msgdata.get('decoration-data', {}))
+        template_data['decoration-data'] = decoration_data
+        del template['x-mailman-copy']
+        template['X-Mailman-Copy'] = copy_marker
+        self.decorate(mlist, template, template_data)
+        personalized = (mlist.personalize == Personalization.full)
+        if personalized:
+            if 'to' not in template:
+                return None
+            template.replace_header('To', to_marker)
+        else:
+            to_marker = None
+        splicer = MessageSplicer.from_message(
+            template, markers, to_marker, copy_marker)
+        if splicer is None:
+            return None
+        return self._spliced(mlist, msg, msgdata, splicer, personalized)
+
+    def _spliced(self, mlist, msg, msgdata, splicer, personalized):
+        """Prepare each recipient's delivery from the spliced message."""
+        needs_member = bool(splicer.substitutions)
+        duplicates = msgdata.get('add-dup-header', {})
+        message_id = msg['message-id']
+        recipients = msgdata.get('recipients', set())
+        members = mlist.members.get_members(recipients)
+        for recipient in recipients:
+            msgdata_copy = msgdata.copy()
+            msgdata_copy['recipient'] = recipient
+            member = members.get(recipient)
+            substitutions = None
+            if needs_member and member is not None:
+                substitutions = member_substitutions(member, recipient)
+            msgtext = splicer.render(
+                substitutions,
+                self.to_header(recipient, member) if personalized else None,
+                recipient in duplicates)
+            if msgtext is None:
+                message_copy, msgdata_copy = self._individualize_one(
+                    mlist, msg, msgdata, recipient, member)
+                yield self._prepare(
+                    mlist, message_copy, msgdata_copy, [recipient])
+            else:
+                sender = self._get_sender(mlist, msg, msgdata_copy)
+                yield sender, [recipient], msgtext, message_id
+
 
 
 def deliver(mlist, msg, msgdata):
     """Deliver a message to the outgoing mail server."""
+    deliver_with(Deliver, BulkDelivery, mlist, msg, msgdata)
+
+
+def deliver_with(individual, bulk, mlist, msg, msgdata):
+    """Deliver a message to the outgoing mail server with the given agents.
+
+    :param individual: The delivery class to use when every recipient gets
+        their own copy of the message.
+    :type individual: `IMailTransportAgentDelivery` class
+    :param bulk: The delivery class to use otherwise.  It is called with
+        the maximum number of recipients per chunk.
+    :type bulk: `IMailTransportAgentDelivery` class
+    :param mlist: The mailing list being delivered to.
+    :type mlist: `IMailingList`
+    :param msg: The message being delivered.
+    :type msg: `Message`
+    :param msgdata: The message metadata.
+    :type msgdata: dictionary
+    :raises SomeRecipientsFailed: when delivery to any recipient failed.
+    """
     # If there are no recipients, there's nothing to do.
     recipients = msgdata.get('recipients')
     if not recipients:
@@ -74,11 +179,11 @@ def deliver(mlist, msg, msgdata):
     # use individual delivery.  If not specified, use bulk delivery.  See the
     # to-outgoing handler for when the 'verp' key is set in the metadata.
     if msgdata.get('verp', False):
-        agent = Deliver()
+        agent = individual()
     elif mlist.personalize != Personalization.none:
-        agent = Deliver()
+        agent = individual()
     else:
-        agent = BulkDelivery(int(config.mta.max_recipients))
+        agent = bulk(int(config.mta.max_recipients))
     log.debug('Using agent: %s', agent)
     # Keep track of the original recipients and the original sender for
     # logging purposes.
@@ -50,17 +50,32 @@ class PersonalizedMixin:
         # Personalize the To header if the list requests it.
         if mlist.personalize != Personalization.full:
             return
-        recipient = msgdata['recipient']
-        user_manager = getUtility(IUserManager)
-        user = user_manager.get_user(recipient)
-        if user is None:
-            msg.replace_header('To', recipient)
+        msg.replace_header('To', self.to_header(
+            msgdata['recipient'], msgdata.get('member')))
+
+    def to_header(self, recipient, member=None):
+        """Return the personalized To header for the recipient.
+
+        :param recipient: The recipient's address.
+        :type recipient: string
+        :param member: The recipient's membership, if they are a member of
+            the mailing list.  The user is then taken from the membership
+            instead of being looked up.
+        :type member: `IMember`
+        :return: The value of the recipient's To header.
+        :rtype: string
+        """
+        if member is None:
+            user = getUtility(IUserManager).get_user(recipient)
         else:
-            # Convert the unicode name to an email-safe representation.
-            # Create a Header instance for the name so that it's properly
-            # encoded for email transport.
-            name = Header(user.display_name).encode()
-            msg.replace_header('To', formataddr((name, recipient)))
+            user = member.user
+        if user is None:
+            return recipient
+        # Convert the unicode name to an email-safe representation.  Create a
+        # Header instance for the name so that it's properly encoded for
+        # email transport.
+        name = Header(user.display_name).encode()
+        return formataddr((name, recipient))
 
 
 
@@ -0,0 +1,233 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Flatten a message once, then splice in recipient-specific details.
+
+Individualized delivery used to make a deep copy of the message for every
+recipient, run the personalization callbacks over the copy and flatten it
+again.  Most of the message is the same for every recipient though; only the
+To header, the X-Mailman-Copy header and the decorated text differ.  A
+`MessageSplicer` flattens the message once, with unique markers standing in
+for those details, and cuts the text into segments around them.  Rendering
+the message for a recipient then only joins the segments back together with
+the recipient's details in between.
+
+The decorated text parts are the only tricky bit, since their content
+transfer encoding may turn the markers into something unrecognizable.  Those
+parts are therefore left out of the flattened text, and re-encoded for each
+recipient, exactly the way the decorate handler would have encoded them.
+"""
+
+__all__ = [
+    'MessageSplicer',
+    ]
+
+
+import re
+import uuid
+
+from email.charset import Charset
+from email.generator import NLCRE
+from email.message import Message
+
+
+EMPTYSTRING = ''
+NL = '\n'
+
+
+
+class MessageSplicer:
+    """A flattened message with holes for the recipient-specific details."""
+
+    def __init__(self, segments, parts, markers, header_names, policy):
+        # Use `from_message()` to create these.
+        self._segments = segments
+        self._parts = parts
+        self._markers = markers
+        self._header_names = header_names
+        self._fold = policy.clone(max_line_length=0).fold
+
+    @staticmethod
+    def make_markers(keys):
+        """Return unique markers for the substitution keys.
+
+        :param keys: The substitution keys.
+        :type keys: sequence of strings
+        :return: A dictionary mapping each key to a marker which can't occur
+            in any message.
+        :rtype: dict
+        """
+        token = uuid.uuid4().hex
+        return {key: 'mailman-splice-{0}-{1}'.format(token, key)
+                for key in keys}
+
+    @classmethod
+    def from_message(cls, msg, markers, to_marker=None, copy_marker=None):
+        """Flatten a message into segments.
+
+        :param msg: The message to flatten.  Substitution markers take the
+            place of the recipient-specific text.  The To header, if it is
+            to be personalized, contains only `to_marker`, and the
+            X-Mailman-Copy header contains only `copy_marker`.  The message
+            is modified.
+        :type msg: `Message`
+        :param markers: The markers, as returned by `make_markers()`.
+        :type markers: dict
+        :param to_marker: The marker in the To header, or None if the To
+            header is the same for every recipient.
+        :type to_marker: string
+        :param copy_marker: The marker in the X-Mailman-Copy header, or None
+            if there is no such header.
+        :type copy_marker: string
+        :return: The splicer, or None when the message can't be spliced, in
+            which case it must be individualized in full.
+        :rtype: `MessageSplicer` or None
+        """
+        parts = []
+        for part in msg.walk():
+            if part.is_multipart():
+                continue
+            payload = part.get_payload(decode=True)
+            if payload is None:
+                continue
+            charset = part.get_content_charset('us-ascii')
+            try:
+                text = payload.decode(charset)
+            except (LookupError, UnicodeError):
+                continue
+            if not any(marker in text for marker in markers.values()):
+                continue
+            # Re-encoding the text can only give the same result as the
+            # decorate handler when the charset encodes to itself, and the
+            # encoded payload is plain ASCII.  Otherwise the generator has
+            # its own ideas about the encoding.
+            if (Charset(charset).get_output_charset() != charset or
+                    _has_non_ascii(part.get_payload())):
+                return None
+            hole = 'mailman-splice-part-{0}'.format(uuid.uuid4().hex)
+            parts.append((hole, charset, text,
+                          part.get('content-transfer-encoding')))
+            part.set_payload(hole)
+        flattened = msg.as_string()
+        # Find all the holes in the text.  The header holes are whole header
+        # lines in the outermost headers.
+        header_end = flattened.find(NL + NL) + 1
+        if header_end == 0:
+            return None
+        holes = []
+        header_names = {}
+        for hole, marker in (('to', to_marker), ('copy', copy_marker)):
+            if marker is None:
+                continue
+            cre = re.compile(
+                r'^([^:\n]+): {0}\n'.format(re.escape(marker)), re.M)
+            matches = list(cre.finditer(flattened, 0, header_end))
+            if len(matches) != 1:
+                return None
+            header_names[hole] = matches[0].group(1)
+            holes.append((matches[0].start(), matches[0].end(), hole))
+        for index, (hole, charset, text, cte) in enumerate(parts):
+            if flattened.count(hole) != 1:
+                return None
+            start = flattened.index(hole)
+            holes.append((start, start + len(hole), index))
+        holes.sort(key=lambda hole: hole[0])
+        segments = []
+        position = 0
+        for start, end, hole in holes:
+            segments.append(flattened[position:start])
+            segments.append(hole)
+            position = end
+        segments.append(flattened[position:])
+        # Any marker left in the text is in a place we can't fill in.
+        leftovers = list(markers.values())
+        leftovers.extend(
+            marker for marker in (to_marker, copy_marker)
+            if marker is not None)
+        for segment in segments[::2]:
+            if any(marker in segment for marker in leftovers):
+                return None
+        return cls(segments, parts, markers, header_names, msg.policy)
+
+    @property
+    def substitutions(self):
+        """The substitution keys which are used in the message."""
+        return {key for key, marker in self._markers.items()
+                if any(marker in text for hole, charset, text, cte
+                       in self._parts)}
+
+    def render(self, substitutions=None, to=None, copy=False):
+        """Render the message for one recipient.
+
+        :param substitutions: The recipient's values for the substitution
+            keys used in the message.
+        :type substitutions: dict
+        :param to: The recipient's To header.  This is ignored unless the To
+            header is personalized.
+        :type to: string
+        :param copy: Whether to keep the X-Mailman-Copy header.
+        :type copy: bool
+        :return: The flattened message, or None if the recipient's message
+            must be individualized in full.
+        :rtype: string
+        """
+        texts = []
+        for hole, charset, text, cte in self._parts:
+            for key, marker in self._markers.items():
+                if marker not in text:
+                    continue
+                value = (None if substitutions is None
+                         else substitutions.get(key))
+                # The decorate handler strips trailing whitespace from lines,
+                # which we can't do after the fact.
+                if (not value or '\n' in value or '\r' in value or
+                        value.endswith(' ')):
+                    return None
+                text = text.replace(marker, value)
+            # Encode the text just as the decorate handler does.
+            part = Message()
+            try:
+                part.set_payload(text.encode(charset), charset)
+            except UnicodeError:
+                return None
+            payload = part.get_payload()
+            if (part.get('content-transfer-encoding') != cte or
+                    _has_non_ascii(payload)):
+                return None
+            texts.append(NLCRE.sub(NL, payload))
+        pieces = []
+        for i, segment in enumerate(self._segments):
+            if i % 2 == 0:
+                pieces.append(segment)
+            elif segment == 'copy':
+                if copy:
+                    pieces.append(
+                        self._fold(self._header_names['copy'], 'yes'))
+            elif segment == 'to':
+                pieces.append(self._fold(self._header_names['to'], to))
+            else:
+                pieces.append(texts[segment])
+        return EMPTYSTRING.join(pieces)
+
+
+
+def _has_non_ascii(text):
+    try:
+        text.encode('ascii')
+    except UnicodeError:
+        return True
+    return False
@@ -0,0 +1,141 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test asynchronous delivery."""
+
+__all__ = [
+    'TestAsynchronousDelivery',
+    ]
+
+
+import socket
+import unittest
+
+from mailman.app.lifecycle import create_list
+from mailman.interfaces.mta import SomeRecipientsFailed
+from mailman.mta.asynchronous import AsyncBulkDelivery, AsyncDeliver, deliver
+from mailman.testing.helpers import (
+    configuration, specialized_message_from_string as mfs)
+from mailman.testing.layers import SMTPLayer
+
+
+
+class TestAsynchronousDelivery(unittest.TestCase):
+    layer = SMTPLayer
+
+    def setUp(self):
+        self._mlist = create_list('test@example.com')
+        self._msg = mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+Message-ID: <ant>
+
+.A line starting with a dot.
+""")
+        self._recipients = set(
+            '{0}person@example.org'.format(letter)
+            for letter in 'abcdefghij')
+
+    def test_bulk_delivery(self):
+        agent = AsyncBulkDelivery(3)
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(refused, {})
+        messages = list(SMTPLayer.smtpd.messages)
+        self.assertEqual(len(messages), 4)
+        recipients = set()
+        for message in messages:
+            recipients.update(message['x-rcptto'].split(', '))
+            self.assertEqual(message['message-id'], '<ant>')
+            self.assertEqual(message.get_payload().rstrip(),
+                             '.A line starting with a dot.')
+        self.assertEqual(recipients, self._recipients)
+
+    def test_individual_delivery(self):
+        agent = AsyncDeliver()
+        refused = agent.deliver(
+            self._mlist, self._msg,
+            dict(recipients=self._recipients, verp=True))
+        self.assertEqual(refused, {})
+        messages = list(SMTPLayer.smtpd.messages)
+        self.assertEqual(len(messages), 10)
+        for message in messages:
+            self.assertEqual(
+                message['x-mailfrom'],
+                'test-bounces+{0}={1}@example.com'.format(
+                    *message['x-rcptto'].split('@')))
+
+    @configuration('mta', max_transactions=1, smtp_pipelining='no')
+    def test_refused(self):
+        # Failures are reported just like with synchronous delivery.
+        SMTPLayer.smtpd.err_queue.put(('rcpt', 550))
+        SMTPLayer.smtpd.err_queue.put(('mail', 450))
+        agent = AsyncBulkDelivery(5)
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(len(refused), 6)
+        codes = sorted(code for code, message in refused.values())
+        self.assertEqual(codes, [450] * 5 + [550])
+        self.assertEqual(len(list(SMTPLayer.smtpd.messages)), 1)
+
+    @configuration('mta', smtp_user='testuser', smtp_pass='testpass')
+    def test_authentication(self):
+        agent = AsyncBulkDelivery()
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(refused, {})
+        self.assertEqual(SMTPLayer.smtpd.get_authentication_credentials(),
+                         'PLAIN AHRlc3R1c2VyAHRlc3RwYXNz')
+
+    @configuration('mta', smtp_user='baduser', smtp_pass='badpass')
+    def test_authentication_failure(self):
+        agent = AsyncBulkDelivery()
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=['bart@example.com']))
+        self.assertEqual(refused, {
+            'bart@example.com': (571, b'Bad authentication'),
+            })
+
+    def test_timeout(self):
+        # A server that never answers doesn't hold up delivery forever.
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(5)
+        host, port = listener.getsockname()
+        try:
+            with configuration('mta', smtp_host=host, smtp_port=port,
+                               smtp_timeout='0.1s'):
+                agent = AsyncBulkDelivery()
+                refused = agent.deliver(
+                    self._mlist, self._msg,
+                    dict(recipients=['bart@example.com']))
+        finally:
+            listener.close()
+        self.assertEqual(list(refused), ['bart@example.com'])
+        self.assertEqual(refused['bart@example.com'][0], 444)
+
+    def test_deliver(self):
+        # The delivery function raises the same exception as the
+        # synchronous one.
+        SMTPLayer.smtpd.err_queue.put(('mail', 500))
+        msgdata = dict(recipients=['bart@example.com'])
+        with self.assertRaises(SomeRecipientsFailed) as cm:
+            deliver(self._mlist, self._msg, msgdata)
+        self.assertEqual(cm.exception.temporary_failures, [])
+        self.assertEqual(cm.exception.permanent_failures,
+                         ['bart@example.com'])
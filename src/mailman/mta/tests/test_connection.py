@@ -19,15 +19,29 @@
 
 __all__ = [
     'TestConnection',
+    'TestConnectionPool',
+    'TestPipelining',
     ]
 
 
+import time
+import socket
 import unittest
+import threading
 
 from mailman.config import config
-from mailman.mta.connection import Connection
+from mailman.mta.connection import Connection, ConnectionPool
 from mailman.testing.layers import SMTPLayer
-from smtplib import SMTPAuthenticationError
+from smtplib import SMTPAuthenticationError, SMTPSenderRefused
+from unittest.mock import patch
+
+
+MESSAGE = """\
+From: anne@example.com
+To: bart@example.com
+Subject: aardvarks
+
+"""
 
 
 
@@ -49,3 +63,116 @@ Subject: aardvarks
 """)
         self.assertEqual(cm.exception.smtp_code, 571)
         self.assertEqual(cm.exception.smtp_error, b'Bad authentication')
+
+
+
+class TestConnectionPool(unittest.TestCase):
+    layer = SMTPLayer
+
+    def setUp(self):
+        self._pool = ConnectionPool(
+            config.mta.smtp_host, int(config.mta.smtp_port), 0)
+
+    def tearDown(self):
+        self._pool.close()
+
+    def _send(self):
+        with self._pool.connection() as connection:
+            connection.sendmail(
+                'anne@example.com', ['bart@example.com'], MESSAGE)
+        return connection
+
+    def test_reuse(self):
+        # Connections are reused across messages.
+        first = self._send()
+        second = self._send()
+        self.assertIs(first, second)
+        self.assertEqual(len(list(SMTPLayer.smtpd.messages)), 2)
+        self.assertEqual(SMTPLayer.smtpd.get_connection_count(), 1)
+
+    def test_stale_connection(self):
+        # A connection which the server dropped while it was idle fails the
+        # health check, and is replaced transparently.
+        connection = self._send()
+        connection._connection.sock.shutdown(socket.SHUT_RDWR)
+        with patch('mailman.mta.connection.CHECK_AFTER', -1):
+            self._send()
+        self.assertEqual(len(list(SMTPLayer.smtpd.messages)), 2)
+        self.assertEqual(SMTPLayer.smtpd.get_connection_count(), 2)
+
+    def test_idle_timeout(self):
+        # Connections idle for too long are closed instead of reused.
+        pool = ConnectionPool(
+            config.mta.smtp_host, int(config.mta.smtp_port), 0,
+            idle_timeout=10)
+        with pool.connection() as first:
+            first.sendmail('anne@example.com', ['bart@example.com'], MESSAGE)
+        later = time.time() + 11
+        with patch('mailman.mta.connection.time.time', return_value=later):
+            second = pool.acquire()
+        pool.release(second)
+        self.assertIsNot(first, second)
+        self.assertFalse(first.is_connected)
+        pool.close()
+
+    def test_max_connections(self):
+        # When the limit is reached, acquire() waits for a release.
+        pool = ConnectionPool(
+            config.mta.smtp_host, int(config.mta.smtp_port), 0,
+            max_connections=1)
+        acquired = []
+        first = pool.acquire()
+        thread = threading.Thread(
+            target=lambda: acquired.append(pool.acquire()))
+        thread.start()
+        thread.join(0.2)
+        self.assertEqual(acquired, [])
+        pool.release(first)
+        thread.join(10)
+        self.assertEqual(len(acquired), 1)
+        pool.release(acquired[0])
+        pool.close()
+
+
+
+class TestPipelining(unittest.TestCase):
+    layer = SMTPLayer
+
+    def _sendmail(self, pipelining):
+        connection = Connection(
+            config.mta.smtp_host, int(config.mta.smtp_port), 0,
+            pipelining=pipelining)
+        # Refuse the first recipient.
+        SMTPLayer.smtpd.err_queue.put(('rcpt', 550))
+        try:
+            return connection.sendmail(
+                'anne@example.com',
+                ['bart@example.com', 'cris@example.com', 'dave@example.com'],
+                MESSAGE)
+        finally:
+            connection.quit()
+
+    def _check(self, refused):
+        self.assertEqual(list(refused), ['bart@example.com'])
+        self.assertEqual(refused['bart@example.com'][0], 550)
+        messages = list(SMTPLayer.smtpd.messages)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['x-rcptto'],
+                         'cris@example.com, dave@example.com')
+
+    def test_pipelined(self):
+        self._check(self._sendmail(True))
+
+    def test_not_pipelined(self):
+        self._check(self._sendmail(False))
+
+    def test_pipelined_sender_refused(self):
+        connection = Connection(
+            config.mta.smtp_host, int(config.mta.smtp_port), 0)
+        SMTPLayer.smtpd.err_queue.put(('mail', 450))
+        with self.assertRaises(SMTPSenderRefused) as cm:
+            connection.sendmail(
+                'anne@example.com', ['bart@example.com'], MESSAGE)
+        self.assertEqual(cm.exception.smtp_code, 450)
+        self.assertFalse(connection.is_connected)
+        self.assertEqual(len(list(SMTPLayer.smtpd.messages)), 0)
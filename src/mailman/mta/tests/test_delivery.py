@@ -19,6 +19,7 @@
 
 __all__ = [
     'TestIndividualDelivery',
+    'TestThreadedDelivery',
     ]
 
 
@@ -30,10 +31,11 @@ import unittest
 from mailman.app.lifecycle import create_list
 from mailman.config import config
 from mailman.interfaces.mailinglist import Personalization
+from mailman.mta.bulk import BulkDelivery
 from mailman.mta.deliver import Deliver
 from mailman.testing.helpers import (
-    specialized_message_from_string as mfs, subscribe)
-from mailman.testing.layers import ConfigLayer
+    configuration, specialized_message_from_string as mfs, subscribe)
+from mailman.testing.layers import ConfigLayer, SMTPLayer
 
 
 
@@ -132,3 +134,67 @@ name     : Anne Person
 options  : http://example.com/anne@example.org
 
 """)
+
+
+
+class TestThreadedDelivery(unittest.TestCase):
+    """Test delivery by a pool of delivery threads."""
+
+    layer = SMTPLayer
+
+    def setUp(self):
+        self._mlist = create_list('test@example.com')
+        self._msg = mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+Message-ID: <ant>
+
+""")
+        self._recipients = set(
+            '{0}person@example.org'.format(letter)
+            for letter in 'abcdefghij')
+
+    @configuration('mta', max_delivery_threads=4)
+    def test_bulk_delivery(self):
+        # Every chunk is delivered, over no more than four connections.
+        agent = BulkDelivery(1)
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(refused, {})
+        messages = list(SMTPLayer.smtpd.messages)
+        self.assertEqual(
+            set(message['x-rcptto'] for message in messages),
+            self._recipients)
+        self.assertLessEqual(SMTPLayer.smtpd.get_connection_count(), 4)
+
+    @configuration('mta', max_delivery_threads=4)
+    def test_bulk_delivery_refused(self):
+        # Refused recipients are collected from all the delivery threads.
+        SMTPLayer.smtpd.err_queue.put(('mail', 450))
+        agent = BulkDelivery(2)
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(len(refused), 2)
+        for code, error in refused.values():
+            self.assertEqual(code, 450)
+        messages = list(SMTPLayer.smtpd.messages)
+        self.assertEqual(len(messages), 4)
+
+    @configuration('mta', max_delivery_threads=4)
+    def test_individual_delivery(self):
+        # Each recipient gets its own VERP'd message.
+        agent = Deliver()
+        refused = agent.deliver(
+            self._mlist, self._msg,
+            dict(recipients=self._recipients, verp=True))
+        self.assertEqual(refused, {})
+        messages = list(SMTPLayer.smtpd.messages)
+        self.assertEqual(len(messages), 10)
+        for message in messages:
+            recipient = message['x-rcptto']
+            self.assertIn(recipient, self._recipients)
+            self.assertEqual(
+                message['x-mailfrom'],
+                'test-bounces+{0}={1}@example.com'.format(
+                    *recipient.split('@')))
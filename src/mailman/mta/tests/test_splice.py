@@ -0,0 +1,215 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test splicing recipient details into a once-flattened message."""
+
+__all__ = [
+    'TestSplicedDelivery',
+    ]
+
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.interfaces.mailinglist import Personalization
+from mailman.mta.deliver import Deliver
+from mailman.testing.helpers import (
+    specialized_message_from_string as mfs, subscribe)
+from mailman.testing.layers import ConfigLayer
+
+
+
+class TestSplicedDelivery(unittest.TestCase):
+    """Spliced messages are the same as fully individualized ones."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._mlist = create_list('test@example.com')
+        self._mlist.personalize = Personalization.full
+        subscribe(self._mlist, 'Anne', email='anne@example.org')
+        subscribe(self._mlist, 'Bart', email='bart@example.org')
+        # Cris is not a member, so there are no details to splice in.
+        self._recipients = [
+            'anne@example.org',
+            'bart@example.org',
+            'cris@example.org',
+            ]
+        self._template_dir = tempfile.mkdtemp()
+        path = os.path.join(self._template_dir,
+                            'site', 'en', 'member-footer.txt')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fp:
+            print("""\
+address  : $user_address
+name     : $user_name
+options  : $user_optionsurl""", file=fp)
+        config.push('templates', """
+        [paths.testing]
+        template_dir: {0}
+        """.format(self._template_dir))
+        self._mlist.footer_uri = 'mailman:///member-footer.txt'
+        self.maxDiff = None
+
+    def tearDown(self):
+        shutil.rmtree(self._template_dir)
+        config.pop('templates')
+
+    def _assert_spliced(self, msg, **extra):
+        # Splice the message for every recipient, and compare the results
+        # with the fully individualized messages.
+        msgdata = dict(recipients=self._recipients, verp=True)
+        msgdata.update(extra)
+        agent = Deliver()
+        deliveries = agent._splice(self._mlist, msg, msgdata)
+        self.assertIsNotNone(deliveries)
+        spliced = list(deliveries)
+        expected = [
+            agent._prepare(self._mlist, message_copy, msgdata_copy,
+                           [recipient])
+            for message_copy, msgdata_copy, recipient
+            in agent._individualize(self._mlist, msg, msgdata)
+            ]
+        self.assertEqual(len(spliced), len(expected))
+        for (sender, recipients, msgtext, message_id), want in zip(
+                spliced, expected):
+            self.assertEqual(sender, want[0])
+            self.assertEqual(recipients, want[1])
+            self.assertMultiLineEqual(msgtext, want[2])
+            self.assertEqual(message_id, want[3])
+        return spliced
+
+    def test_plain_text(self):
+        spliced = self._assert_spliced(mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+Message-ID: <ant>
+
+A message.
+"""))
+        self.assertIn('To: Anne Person <anne@example.org>', spliced[0][2])
+        self.assertIn('name     : Anne Person', spliced[0][2])
+        self.assertIn('name     : Bart Person', spliced[1][2])
+
+    def test_duplicate_header(self):
+        spliced = self._assert_spliced(mfs("""\
+From: anne@example.org
+To: test@example.com
+X-Mailman-Copy: yes
+Subject: test
+Message-ID: <ant>
+
+A message.
+"""), **{'add-dup-header': {'bart@example.org': True}})
+        self.assertNotIn('X-Mailman-Copy', spliced[0][2])
+        self.assertIn('X-Mailman-Copy: yes', spliced[1][2])
+
+    def test_base64(self):
+        # The decorated text is encoded for each recipient.
+        self._assert_spliced(mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+Message-ID: <ant>
+MIME-Version: 1.0
+Content-Type: text/plain; charset="utf-8"
+Content-Transfer-Encoding: base64
+
+QSBtw6lzc2FnZS4K
+"""))
+
+    def test_wrapped(self):
+        # The message is wrapped in a multipart with the footer.  The
+        # boundary is random, but otherwise the messages are the same.
+        msg = mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+Message-ID: <ant>
+MIME-Version: 1.0
+Content-Type: text/html
+
+<p>A message.</p>
+""")
+        msgdata = dict(recipients=self._recipients)
+        agent = Deliver()
+        spliced = list(agent._splice(self._mlist, msg, msgdata))
+        expected = [
+            agent._prepare(self._mlist, message_copy, msgdata_copy,
+                           [recipient])
+            for message_copy, msgdata_copy, recipient
+            in agent._individualize(self._mlist, msg, msgdata)
+            ]
+        cre = re.compile('=+[0-9]+==')
+        for delivery, want in zip(spliced, expected):
+            self.assertIn('Content-Disposition: inline', delivery[2])
+            self.assertMultiLineEqual(cre.sub('BOUNDARY', delivery[2]),
+                                      cre.sub('BOUNDARY', want[2]))
+
+    def test_multipart_mixed(self):
+        # The footer is added as a separate part.
+        self._assert_spliced(mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+Message-ID: <ant>
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="BOUNDARY"
+
+--BOUNDARY
+Content-Type: text/plain
+
+A message.
+--BOUNDARY
+Content-Type: application/octet-stream
+Content-Transfer-Encoding: base64
+
+AAAA
+--BOUNDARY--
+"""))
+
+    def test_no_decoration(self):
+        self._mlist.footer_uri = None
+        self._mlist.personalize = Personalization.individual
+        self._assert_spliced(mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+Message-ID: <ant>
+
+A message.
+"""))
+
+    def test_other_callbacks(self):
+        # Callbacks which don't know about splicing get full messages.
+        agent = Deliver()
+        agent.callbacks.append(lambda mlist, msg, msgdata: None)
+        msg = mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+
+A message.
+""")
+        self.assertIsNone(agent._splice(
+            self._mlist, msg, dict(recipients=self._recipients)))
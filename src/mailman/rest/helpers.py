@@ -37,12 +37,14 @@ __all__ = [
 
 import json
 import falcon
+import base64
 import hashlib
 
 from datetime import datetime, timedelta
 from enum import Enum
 from lazr.config import as_boolean
 from mailman.config import config
+from mailman.utilities.queries import QuerySequence
 from pprint import pformat
 
 
@@ -86,6 +88,10 @@ class ExtendedEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+class _Tagged(str):
+    """A JSON representation which carries its etag along."""
+
+
 def etag(resource):
     """Calculate the etag and return a JSON representation.
 
@@ -95,6 +101,8 @@ def etag(resource):
     pretty-printed (and thus key-sorted and predictable) representation
     of the dictionary.  It then inserts this value under the `http_etag`
     key, and returns the JSON representation of the modified dictionary.
+    The representation's `etag` attribute is the etag too, so that `okay()`
+    can send it without parsing the JSON again.
 
     :param resource: The original resource representation.
     :type resource: dictionary
@@ -109,7 +117,26 @@ def etag(resource):
     hashfood = pformat(resource).encode('raw-unicode-escape')
     etag = hashlib.sha1(hashfood).hexdigest()
     resource['http_etag'] = '"{0}"'.format(etag)
-    return json.dumps(resource, cls=ExtendedEncoder)
+    tagged = _Tagged(json.dumps(resource, cls=ExtendedEncoder))
+    tagged.etag = resource['http_etag']
+    return tagged
+
+
+def _encode_cursor(values):
+    # The cursor is opaque to clients.
+    cursor = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(cursor).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        values = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        values = None
+    if not isinstance(values, list):
+        raise falcon.HTTPInvalidParam('Invalid cursor', 'after')
+    return values
 
 
 def paginate(method):
@@ -120,6 +147,17 @@ def paginate(method):
     specify the slice they want.  The slice will start at index
     ``(page - 1) * count`` and end (exclusive) at ``(page * count)``.
 
+    Alternatively, the request can give `count` without `page` to page
+    through the collection with a cursor.  The first page is returned, and
+    the request's context gets a `next_cursor`, unless this is the last page.
+    Passing the cursor back in the `after` query parameter returns the next
+    page.  When the collection is a `QuerySequence`, the cursor holds the
+    last entry's ordering keys, so deep pages are as cheap as the first one.
+
+    Either way, the size of the whole collection is left in the request's
+    context as `total_size`.  For a `QuerySequence`, it is counted in the
+    database.
+
     Decorated methods must take ``self`` and ``request`` as the first two
     arguments.
     """
@@ -128,12 +166,42 @@ def paginate(method):
         # get turned into HTTP 400 errors.
         count = request.get_param_as_int('count', min=0)
         page = request.get_param_as_int('page', min=1)
+        after = request.get_param('after')
+        if after is not None:
+            if page is not None:
+                raise falcon.HTTPInvalidParam(
+                    'Cannot be used with page', 'after')
+            if count is None:
+                raise falcon.HTTPMissingParam('count')
+            after = _decode_cursor(after)
         result = method(self, request, *args, **kwargs)
         if count is None and page is None:
             return result
-        list_start = (page - 1) * count
-        list_end = page * count
-        return result[list_start:list_end]
+        request.context['total_size'] = len(result)
+        if page is not None:
+            list_start = (page - 1) * count
+            list_end = page * count
+            return result[list_start:list_end]
+        if isinstance(result, QuerySequence):
+            try:
+                entries, last = result.page(count, after)
+            except ValueError:
+                raise falcon.HTTPInvalidParam('Invalid cursor', 'after')
+        else:
+            # Other collections are paged through by position.
+            if after is None:
+                list_start = 0
+            elif (len(after) == 1 and isinstance(after[0], int) and
+                    after[0] >= 0):
+                list_start = after[0]
+            else:
+                raise falcon.HTTPInvalidParam('Invalid cursor', 'after')
+            entries = list(result[list_start:list_start + count])
+            last = (None if count == 0 or len(entries) < count
+                    else [list_start + count])
+        if last is not None:
+            request.context['next_cursor'] = _encode_cursor(last)
+        return entries
     return wrapper
 
 
@@ -171,19 +239,33 @@ class CollectionMixin:
     def _make_collection(self, request):
         """Provide the collection to the REST layer."""
         collection = self._get_collection(request)
+        # When the collection is paginated, @paginate leaves the size of the
+        # whole collection in the request's context.  Otherwise, the whole
+        # collection is returned, so load it just once.
+        total_size = request.context.get('total_size')
+        if total_size is None:
+            collection = list(collection)
+            total_size = len(collection)
         if len(collection) == 0:
-            return dict(start=0, total_size=0)
+            return dict(start=0, total_size=total_size)
         else:
             entries = [self._resource_as_dict(resource)
                        for resource in collection]
             # Tag the resources but use the dictionaries.
-            [etag(resource) for resource in entries]
+            if as_boolean(config.webservice.entry_etags):
+                [etag(resource) for resource in entries]
             # Create the collection resource
-            return dict(
+            resource = dict(
                 start=0,
-                total_size=len(collection),
+                total_size=total_size,
                 entries=entries,
                 )
+            # When paging with a cursor, @paginate leaves the cursor for the
+            # next page in the request's context.
+            next_cursor = request.context.get('next_cursor')
+            if next_cursor is not None:
+                resource['next_cursor'] = next_cursor
+            return resource
 
 
 
@@ -288,6 +370,10 @@ def okay(response, body=None):
     response.status = falcon.HTTP_200
     if body is not None:
         response.body = body
+        # Representations made by etag() know their etag.
+        tag = getattr(body, 'etag', None)
+        if tag is not None:
+            response.etag = tag
 
 
 def no_content(response):
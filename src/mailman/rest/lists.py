@@ -45,7 +45,6 @@ from mailman.rest.members import AMember, MemberCollection
 from mailman.rest.post_moderation import HeldMessages
 from mailman.rest.sub_moderation import SubscriptionRequests
 from mailman.rest.validator import Validator
-from operator import attrgetter
 from zope.component import getUtility
 
 
@@ -115,7 +114,7 @@ class _ListBase(CollectionMixin):
     @paginate
     def _get_collection(self, request):
         """See `CollectionMixin`."""
-        return list(getUtility(IListManager))
+        return getUtility(IListManager).mailing_lists
 
 
 class AList(_ListBase):
@@ -236,8 +235,7 @@ class MembersOfList(MemberCollection):
         # Overrides _MemberBase._get_collection() because we only want to
         # return the members from the requested roster.
         roster = self._mlist.get_roster(self._role)
-        address_of_member = attrgetter('address.email')
-        return list(sorted(roster.members, key=address_of_member))
+        return roster.sorted_members
 
 
 class ListsForDomain(_ListBase):
@@ -254,7 +252,7 @@ class ListsForDomain(_ListBase):
     @paginate
     def _get_collection(self, request):
         """See `CollectionMixin`."""
-        return list(self._domain.mailing_lists)
+        return self._domain.mailing_lists
 
 
 
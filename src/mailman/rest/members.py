@@ -20,12 +20,24 @@
 __all__ = [
     'AMember',
     'AllMembers',
+    'BulkMembers',
     'FindMembers',
     'MemberCollection',
     ]
 
 
+import csv
+import json
+import codecs
+import falcon
+import logging
+
+from collections import defaultdict
+from itertools import islice
+from lazr.config import as_boolean
 from mailman.app.membership import add_member, delete_member
+from mailman.config import config
+from mailman.database.transaction import transaction
 from mailman.interfaces.address import IAddress, InvalidEmailAddressError
 from mailman.interfaces.listmanager import IListManager
 from mailman.interfaces.member import (
@@ -43,10 +55,118 @@ from mailman.rest.preferences import Preferences, ReadOnlyPreferences
 from mailman.rest.validator import (
     Validator, enum_validator, subscriber_validator)
 from operator import attrgetter
+from tempfile import SpooledTemporaryFile
 from uuid import UUID
 from zope.component import getUtility
 
 
+log = logging.getLogger('mailman.http')
+
+# Bulk requests are kept in memory up to this size, and on disk beyond it.
+SPOOL_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+
+def _subscribe(mlist, subscriber, arguments, response):
+    """Subscribe an address or user to a mailing list.
+
+    :param mlist: The mailing list.
+    :type mlist: `IMailingList`
+    :param subscriber: The address or user being subscribed.
+    :type subscriber: `IAddress` or `IUser`
+    :param arguments: The other validated arguments of the request.
+    :type arguments: dict
+    :param response: The response, which gets the outcome.
+    """
+    # We use the display name if there is one.
+    display_name = arguments.pop('display_name', '')
+    # What role are we subscribing?  Regular members go through the
+    # subscription policy workflow while owners, moderators, and
+    # nonmembers go through the legacy API for now.
+    role = arguments.pop('role', MemberRole.member)
+    if role is MemberRole.member:
+        # Get the pre_ flags for the subscription workflow.
+        pre_verified = arguments.pop('pre_verified', False)
+        pre_confirmed = arguments.pop('pre_confirmed', False)
+        pre_approved = arguments.pop('pre_approved', False)
+        # Now we can run the registration process until either the
+        # subscriber is subscribed, or the workflow is paused for
+        # verification, confirmation, or approval.
+        registrar = IRegistrar(mlist)
+        try:
+            token, token_owner, member = registrar.register(
+                subscriber,
+                pre_verified=pre_verified,
+                pre_confirmed=pre_confirmed,
+                pre_approved=pre_approved)
+        except AlreadySubscribedError:
+            conflict(response, b'Member already subscribed')
+            return
+        if token is None:
+            assert token_owner is TokenOwner.no_one, token_owner
+            # The subscription completed.  Let's get the resulting member
+            # and return the location to the new member.  Member ids are
+            # UUIDs and need to be converted to URLs because JSON doesn't
+            # directly support UUIDs.
+            member_id = member.member_id.int
+            location = path_to('members/{0}'.format(member_id))
+            created(response, location)
+            return
+        # The member could not be directly subscribed because there are
+        # some out-of-band steps that need to be completed.  E.g. the user
+        # must confirm their subscription or the moderator must approve
+        # it.  In this case, an HTTP 202 Accepted is exactly the code that
+        # we should use, and we'll return both the confirmation token and
+        # the "token owner" so the client knows who should confirm it.
+        assert token is not None, token
+        assert token_owner is not TokenOwner.no_one, token_owner
+        assert member is None, member
+        content = dict(token=token, token_owner=token_owner.name)
+        accepted(response, etag(content))
+        return
+    # 2015-04-15 BAW: We're subscribing some role other than a regular
+    # member.  Use the legacy API for this for now.
+    assert role in (MemberRole.owner,
+                    MemberRole.moderator,
+                    MemberRole.nonmember)
+    # 2015-04-15 BAW: We're limited to using an email address with this
+    # legacy API, so if the subscriber is a user, the user must have a
+    # preferred address, which we'll use, even though it will subscribe
+    # the explicit address.  It is an error if the user does not have a
+    # preferred address.
+    #
+    # If the subscriber is an address object, just use that.
+    if IUser.providedBy(subscriber):
+        if subscriber.preferred_address is None:
+            bad_request(response, b'User without preferred address')
+            return
+        email = subscriber.preferred_address.email
+    else:
+        assert IAddress.providedBy(subscriber)
+        email = subscriber.email
+    delivery_mode = arguments.pop('delivery_mode', DeliveryMode.regular)
+    record = RequestRecord(email, display_name, delivery_mode)
+    try:
+        member = add_member(mlist, record, role)
+    except InvalidEmailAddressError:
+        bad_request(response, b'Invalid email address')
+        return
+    except MembershipIsBannedError:
+        bad_request(response, b'Membership is banned')
+        return
+    except AlreadySubscribedError:
+        conflict(response, b'Member already subscribed')
+        return
+    # The subscription completed.  Let's get the resulting member
+    # and return the location to the new member.  Member ids are
+    # UUIDs and need to be converted to URLs because JSON doesn't
+    # directly support UUIDs.
+    member_id = member.member_id.int
+    location = path_to('members/{0}'.format(member_id))
+    created(response, location)
+
+
 
 class _MemberBase(CollectionMixin):
     """Shared base class for member representations."""
@@ -79,7 +199,7 @@ class _MemberBase(CollectionMixin):
     @paginate
     def _get_collection(self, request):
         """See `CollectionMixin`."""
-        return list(getUtility(ISubscriptionService))
+        return getUtility(ISubscriptionService).get_members()
 
 
 
@@ -232,7 +352,7 @@ class AllMembers(_MemberBase):
         subscriber = arguments.pop('subscriber')
         user_manager = getUtility(IUserManager)
         # We use the display name if there is one.
-        display_name = arguments.pop('display_name', '')
+        display_name = arguments.get('display_name', '')
         if isinstance(subscriber, UUID):
             user = user_manager.get_user_by_id(subscriber)
             if user is None:
@@ -248,88 +368,7 @@ class AllMembers(_MemberBase):
                 address = user_manager.create_address(
                     subscriber, display_name)
             subscriber = address
-        # What role are we subscribing?  Regular members go through the
-        # subscription policy workflow while owners, moderators, and
-        # nonmembers go through the legacy API for now.
-        role = arguments.pop('role', MemberRole.member)
-        if role is MemberRole.member:
-            # Get the pre_ flags for the subscription workflow.
-            pre_verified = arguments.pop('pre_verified', False)
-            pre_confirmed = arguments.pop('pre_confirmed', False)
-            pre_approved = arguments.pop('pre_approved', False)
-            # Now we can run the registration process until either the
-            # subscriber is subscribed, or the workflow is paused for
-            # verification, confirmation, or approval.
-            registrar = IRegistrar(mlist)
-            try:
-                token, token_owner, member = registrar.register(
-                    subscriber,
-                    pre_verified=pre_verified,
-                    pre_confirmed=pre_confirmed,
-                    pre_approved=pre_approved)
-            except AlreadySubscribedError:
-                conflict(response, b'Member already subscribed')
-                return
-            if token is None:
-                assert token_owner is TokenOwner.no_one, token_owner
-                # The subscription completed.  Let's get the resulting member
-                # and return the location to the new member.  Member ids are
-                # UUIDs and need to be converted to URLs because JSON doesn't
-                # directly support UUIDs.
-                member_id = member.member_id.int
-                location = path_to('members/{0}'.format(member_id))
-                created(response, location)
-                return
-            # The member could not be directly subscribed because there are
-            # some out-of-band steps that need to be completed.  E.g. the user
-            # must confirm their subscription or the moderator must approve
-            # it.  In this case, an HTTP 202 Accepted is exactly the code that
-            # we should use, and we'll return both the confirmation token and
-            # the "token owner" so the client knows who should confirm it.
-            assert token is not None, token
-            assert token_owner is not TokenOwner.no_one, token_owner
-            assert member is None, member
-            content = dict(token=token, token_owner=token_owner.name)
-            accepted(response, etag(content))
-            return
-        # 2015-04-15 BAW: We're subscribing some role other than a regular
-        # member.  Use the legacy API for this for now.
-        assert role in (MemberRole.owner,
-                        MemberRole.moderator,
-                        MemberRole.nonmember)
-        # 2015-04-15 BAW: We're limited to using an email address with this
-        # legacy API, so if the subscriber is a user, the user must have a
-        # preferred address, which we'll use, even though it will subscribe
-        # the explicit address.  It is an error if the user does not have a
-        # preferred address.
-        #
-        # If the subscriber is an address object, just use that.
-        if IUser.providedBy(subscriber):
-            if subscriber.preferred_address is None:
-                bad_request(response, b'User without preferred address')
-                return
-            email = subscriber.preferred_address.email
-        else:
-            assert IAddress.providedBy(subscriber)
-            email = subscriber.email
-        delivery_mode = arguments.pop('delivery_mode', DeliveryMode.regular)
-        record = RequestRecord(email, display_name, delivery_mode)
-        try:
-            member = add_member(mlist, record, role)
-        except InvalidEmailAddressError:
-            bad_request(response, b'Invalid email address')
-            return
-        except MembershipIsBannedError:
-            bad_request(response, b'Membership is banned')
-            return
-        # The subscription completed.  Let's get the resulting member
-        # and return the location to the new member.  Member ids are
-        # UUIDs and need to be converted to URLs because JSON doesn't
-        # directly support UUIDs.
-        member_id = member.member_id.int
-        location = path_to('members/{0}'.format(member_id))
-        created(response, location)
-        return
+        _subscribe(mlist, subscriber, arguments, response)
 
     def on_get(self, request, response):
         """/members"""
@@ -369,3 +408,286 @@ class FindMembers(_MemberBase):
         else:
             resource = _FoundMembers(members)._make_collection(request)
             okay(response, etag(resource))
+
+
+
+def _boolean(value):
+    # Rows from JSON have real booleans, but rows from CSV have strings.
+    # Anything else, e.g. a JSON number or null, is a bad value.
+    if isinstance(value, bool):
+        return value
+    if not isinstance(value, str):
+        raise ValueError('Not a boolean: {0!r}'.format(value))
+    return as_boolean(value)
+
+
+def _subscribe_validator():
+    """The validator of subscribe rows of a bulk request."""
+    return Validator(
+        action=str,
+        list_id=str,
+        subscriber=subscriber_validator,
+        display_name=str,
+        delivery_mode=enum_validator(DeliveryMode),
+        role=enum_validator(MemberRole),
+        pre_verified=_boolean,
+        pre_confirmed=_boolean,
+        pre_approved=_boolean,
+        _optional=('delivery_mode', 'display_name', 'role',
+                   'pre_verified', 'pre_confirmed', 'pre_approved'))
+
+
+def _unsubscribe_validator():
+    """The validator of unsubscribe rows of a bulk request."""
+    return Validator(
+        action=str,
+        list_id=str,
+        subscriber=subscriber_validator,
+        role=enum_validator(MemberRole),
+        _optional=('role',))
+
+
+class _RowResponse:
+    """The outcome of one row of a bulk request.
+
+    The same helpers which set the status and body of a response set them on
+    this, so that a row gets the same outcome as the single request would.
+    """
+
+    def __init__(self):
+        self.status = None
+        self.body = None
+        self.location = None
+
+    def as_dict(self, row):
+        """The outcome as a row of the bulk response.
+
+        :param row: The row number, counting from 1.
+        :type row: int
+        :return: The row's result.
+        :rtype: dict
+        """
+        result = dict(row=row, status=int(self.status.split()[0]))
+        if self.location is not None:
+            result['location'] = self.location
+        body = self.body
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        if self.status == falcon.HTTP_202:
+            # Like the single request, the body has the token and its owner.
+            content = json.loads(body)
+            del content['http_etag']
+            result.update(content)
+        elif body is not None:
+            result['description'] = body
+        return result
+
+
+
+class BulkMembers:
+    """/members/bulk"""
+
+    def __init__(self):
+        self._validators = dict(
+            subscribe=_subscribe_validator(),
+            unsubscribe=_unsubscribe_validator())
+        # Mailing lists by list id, as they're looked up.
+        self._lists = {}
+        # The addresses and members of the batch being processed.
+        self._addresses = {}
+        self._members = {}
+
+    def on_post(self, request, response):
+        """Subscribe and unsubscribe many members.
+
+        Each row of the request is either a JSON object on a line of its own,
+        or, if the content type is text/csv, a CSV row whose columns are
+        named in the first row.  The rows have the parameters of POST to
+        /members or DELETE of a member, and an `action` of either
+        `subscribe` or `unsubscribe`.  The rows are processed in batches,
+        each in its own transaction.  The response has a JSON object for each
+        row, with the row number, the status the single request would have
+        had and its location, token or description.  The results of a batch
+        are only sent once it has been committed, so if the response ends
+        early, none of the rows without results were processed.
+        """
+        # Read the whole request before sending any results.  A client
+        # usually doesn't read the response before it's sent the request, so
+        # if the results filled up the connection while the rows were still
+        # coming in, neither side could go on.
+        body = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        remaining = request.content_length or 0
+        try:
+            while remaining > 0:
+                data = request.stream.read(min(remaining, READ_SIZE))
+                if len(data) == 0:
+                    break
+                decoder.decode(data)
+                body.write(data)
+                remaining -= len(data)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            body.close()
+            bad_request(response, b'Request body is not UTF-8')
+            return
+        body.seek(0)
+        lines = (line.decode('utf-8') for line in body)
+        content_type = (request.content_type or '').partition(';')[0]
+        if content_type.strip().lower() == 'text/csv':
+            # Empty cells are left out, like missing parameters.
+            rows = ({key: value for key, value in row.items()
+                     if key is not None and value not in (None, '')}
+                    for row in csv.DictReader(lines))
+        else:
+            rows = (line for line in lines if len(line.strip()) > 0)
+        okay(response)
+        response.content_type = 'application/x-ndjson'
+        response.stream = self._results(body, rows)
+
+    def _results(self, body, rows):
+        batch_size = int(config.webservice.bulk_batch_size)
+        numbered = enumerate(rows, 1)
+        try:
+            while True:
+                batch = list(islice(numbered, batch_size))
+                if len(batch) == 0:
+                    break
+                with transaction():
+                    results = self._process(batch)
+                yield ''.join(json.dumps(result) + '\n'
+                              for result in results).encode('utf-8')
+        finally:
+            body.close()
+
+    def _get_list(self, list_id):
+        if list_id not in self._lists:
+            self._lists[list_id] = getUtility(
+                IListManager).get_by_list_id(list_id)
+        return self._lists[list_id]
+
+    def _process(self, batch):
+        # Validate all the rows first, so that their addresses, and the
+        # members being unsubscribed, can be looked up all at once.
+        operations = []
+        for number, row in batch:
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                if not isinstance(row, dict):
+                    raise ValueError('Bad row')
+                validator = self._validators.get(row.get('action'))
+                if validator is None:
+                    raise ValueError(
+                        'Bad action: {0}'.format(row.get('action')))
+                arguments = validator.convert(row)
+            except ValueError as error:
+                operations.append((number, error))
+            else:
+                operations.append((number, arguments))
+        emails = set(arguments['subscriber']
+                     for number, arguments in operations
+                     if isinstance(arguments, dict)
+                     and isinstance(arguments['subscriber'], str))
+        self._addresses = getUtility(IUserManager).get_addresses(emails)
+        unsubscribing = defaultdict(set)
+        for number, arguments in operations:
+            if (isinstance(arguments, dict)
+                    and arguments['action'] == 'unsubscribe'
+                    and isinstance(arguments['subscriber'], str)):
+                email = arguments['subscriber'].lower()
+                if email in self._addresses:
+                    role = arguments.get('role', MemberRole.member)
+                    unsubscribing[arguments['list_id'], role].add(email)
+        self._members = {}
+        for (list_id, role), emails in unsubscribing.items():
+            mlist = self._get_list(list_id)
+            if mlist is not None:
+                self._members[list_id, role] = mlist.get_roster(
+                    role).get_members(emails)
+        results = []
+        for number, arguments in operations:
+            response = _RowResponse()
+            if isinstance(arguments, ValueError):
+                bad_request(response, str(arguments))
+            else:
+                self._apply(number, arguments, response)
+            results.append(response.as_dict(number))
+        return results
+
+    def _apply(self, number, arguments, response):
+        # Each row has its own savepoint, so that an unexpected error only
+        # fails that row instead of the whole batch and the response.
+        subscriber = arguments['subscriber']
+        try:
+            with config.db.savepoint():
+                if arguments.pop('action') == 'subscribe':
+                    self._subscribe(arguments, response)
+                else:
+                    self._unsubscribe(arguments, response)
+        except Exception:
+            log.exception('Bulk membership row {0} failed'.format(number))
+            # An address created for the row is gone with the savepoint.
+            if isinstance(subscriber, str):
+                self._addresses.pop(subscriber.lower(), None)
+            response.status = falcon.HTTP_500
+            response.body = b'500 Internal Server Error'
+            response.location = None
+
+    def _subscribe(self, arguments, response):
+        mlist = self._get_list(arguments.pop('list_id'))
+        if mlist is None:
+            bad_request(response, b'No such list')
+            return
+        # The members being unsubscribed were looked up before this
+        # subscription, so look them up one by one from now on.
+        role = arguments.get('role', MemberRole.member)
+        self._members.pop((mlist.list_id, role), None)
+        subscriber = arguments.pop('subscriber')
+        user_manager = getUtility(IUserManager)
+        if isinstance(subscriber, UUID):
+            user = user_manager.get_user_by_id(subscriber)
+            if user is None:
+                bad_request(response, b'No such user')
+                return
+            subscriber = user
+        else:
+            address = self._addresses.get(subscriber.lower())
+            if address is None:
+                address = user_manager.create_address(
+                    subscriber, arguments.get('display_name', ''))
+                self._addresses[address.email] = address
+            subscriber = address
+        _subscribe(mlist, subscriber, arguments, response)
+
+    def _unsubscribe(self, arguments, response):
+        mlist = self._get_list(arguments['list_id'])
+        if mlist is None:
+            bad_request(response, b'No such list')
+            return
+        role = arguments.get('role', MemberRole.member)
+        subscriber = arguments['subscriber']
+        if isinstance(subscriber, UUID):
+            user = getUtility(IUserManager).get_user_by_id(subscriber)
+            if user is None:
+                bad_request(response, b'No such user')
+                return
+            if user.preferred_address is None:
+                bad_request(response, b'User without preferred address')
+                return
+            email = user.preferred_address.email
+        else:
+            email = subscriber.lower()
+        members = self._members.get((mlist.list_id, role))
+        if members is None or isinstance(subscriber, UUID):
+            # Only the rows' email addresses were looked up.
+            member = mlist.get_roster(role).get_member(email)
+        else:
+            member = members.pop(email, None)
+        if member is None:
+            not_found(response, b'No such member')
+            return
+        # As with DELETE of a single member, no notifications are sent, so
+        # this is all delete_member() would do.
+        member.unsubscribe()
+        no_content(response)
@@ -35,9 +35,10 @@ from mailman.rest.domains import ADomain, AllDomains
 from mailman.rest.helpers import (
     BadRequest, NotFound, child, etag, no_content, not_found, okay, path_to)
 from mailman.rest.lists import AList, AllLists, Styles
-from mailman.rest.members import AMember, AllMembers, FindMembers
+from mailman.rest.members import AMember, AllMembers, BulkMembers, FindMembers
 from mailman.rest.preferences import ReadOnlyPreferences
 from mailman.rest.queues import AQueue, AQueueFile, AllQueues
+from mailman.rest.runners import AllRunners
 from mailman.rest.templates import TemplateFinder
 from mailman.rest.users import AUser, AllUsers
 from zope.component import getUtility
@@ -154,6 +155,10 @@ class TopLevel:
             if len(segments) <= 2:
                 return SystemConfiguration(*segments[1:]), []
             return BadRequest(), []
+        elif segments[0] == 'runners':
+            if len(segments) > 1:
+                return BadRequest(), []
+            return AllRunners(), []
         else:
             return NotFound(), []
 
@@ -201,11 +206,13 @@ class TopLevel:
         """/<api>/members"""
         if len(segments) == 0:
             return AllMembers()
-        # Either the next segment is the string "find" or a member id.  They
-        # cannot collide.
+        # Either the next segment is the string "find", the string "bulk" or
+        # a member id.  They cannot collide.
         segment = segments.pop(0)
         if segment == 'find':
             return FindMembers(), segments
+        elif segment == 'bulk':
+            return BulkMembers(), segments
         else:
             return AMember(segment), segments
 
@@ -0,0 +1,47 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""<api>/system/runners."""
+
+__all__ = [
+    'AllRunners',
+    ]
+
+
+from mailman.core.scaling import read_status
+from mailman.rest.helpers import (
+    CollectionMixin, etag, okay, paginate, path_to)
+
+
+
+class AllRunners(CollectionMixin):
+    """The autoscaled runners, as last sampled by the master watcher."""
+
+    def _resource_as_dict(self, status):
+        """See `CollectionMixin`."""
+        return dict(status)
+
+    @paginate
+    def _get_collection(self, request):
+        """See `CollectionMixin`."""
+        return sorted(read_status(), key=lambda status: status['name'])
+
+    def on_get(self, request, response):
+        """<api>/system/runners"""
+        resource = self._make_collection(request)
+        resource['self_link'] = path_to('system/runners')
+        okay(response, etag(resource))
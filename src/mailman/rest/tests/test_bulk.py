@@ -0,0 +1,339 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test bulk membership requests."""
+
+__all__ = [
+    'TestBulkMembers',
+    'TestBulkMembersBatches',
+    ]
+
+
+import json
+import unittest
+
+from base64 import b64encode
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.database.transaction import transaction
+from mailman.interfaces.member import MemberRole
+from mailman.interfaces.usermanager import IUserManager
+from mailman.testing.helpers import LogFileMark
+from mailman.testing.layers import ConfigLayer, RESTLayer
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from zope.component import getUtility
+
+
+def _json_lines(*rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+
+
+
+class TestBulkMembers(unittest.TestCase):
+    """Test bulk membership requests."""
+
+    layer = RESTLayer
+
+    def setUp(self):
+        with transaction():
+            self._mlist = create_list('ant@example.com')
+        self._user_manager = getUtility(IUserManager)
+
+    def _post(self, body, content_type='application/x-ndjson'):
+        basic_auth = '{0}:{1}'.format(
+            config.webservice.admin_user, config.webservice.admin_pass)
+        token = b64encode(basic_auth.encode('utf-8')).decode('ascii')
+        request = Request(
+            'http://localhost:9001/3.0/members/bulk', body, {
+                'Authorization': 'Basic ' + token,
+                'Content-Type': content_type,
+                })
+        with urlopen(request) as response:
+            self.assertEqual(response.headers['content-type'],
+                             'application/x-ndjson')
+            lines = response.read().decode('utf-8').splitlines()
+        return [json.loads(line) for line in lines]
+
+    def _emails(self, role=MemberRole.member):
+        config.db.store.expire_all()
+        return sorted(member.address.email
+                      for member in self._mlist.get_roster(role).members)
+
+    def test_subscribe(self):
+        results = self._post(_json_lines(
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='anne@example.com', pre_verified=True,
+                 pre_confirmed=True, pre_approved=True),
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='bart@example.com', display_name='Bart',
+                 role='owner'),
+            ))
+        self.assertEqual([result['row'] for result in results], [1, 2])
+        self.assertEqual([result['status'] for result in results], [201, 201])
+        self.assertEqual(self._emails(), ['anne@example.com'])
+        self.assertEqual(self._emails(MemberRole.owner), ['bart@example.com'])
+        member = self._mlist.members.get_member('anne@example.com')
+        self.assertEqual(
+            results[0]['location'],
+            'http://localhost:9001/3.0/members/{0}'.format(
+                member.member_id.int))
+
+    def test_subscribe_pending(self):
+        # Like the single request, the subscription can wait on the
+        # subscriber's confirmation.
+        results = self._post(_json_lines(
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='anne@example.com'),
+            ))
+        self.assertEqual(results[0]['status'], 202)
+        self.assertEqual(results[0]['token_owner'], 'subscriber')
+        self.assertIn('token', results[0])
+        self.assertNotIn('http_etag', results[0])
+        self.assertEqual(self._emails(), [])
+
+    def test_csv(self):
+        results = self._post(b"""\
+action,list_id,subscriber,pre_verified,pre_confirmed,pre_approved,role
+subscribe,ant.example.com,anne@example.com,yes,yes,yes,
+subscribe,ant.example.com,bart@example.com,,,,moderator
+unsubscribe,ant.example.com,cris@example.com,,,,
+""", 'text/csv; charset=utf-8')
+        self.assertEqual([result['status'] for result in results],
+                         [201, 201, 404])
+        self.assertEqual(self._emails(), ['anne@example.com'])
+        self.assertEqual(self._emails(MemberRole.moderator),
+                         ['bart@example.com'])
+
+    def test_unsubscribe(self):
+        with transaction():
+            for email in ('anne@example.com', 'bart@example.com'):
+                self._mlist.subscribe(
+                    self._user_manager.create_address(email))
+            self._mlist.subscribe(
+                self._user_manager.create_address('cris@example.com'),
+                MemberRole.owner)
+        results = self._post(_json_lines(
+            dict(action='unsubscribe', list_id='ant.example.com',
+                 subscriber='Anne@example.com'),
+            dict(action='unsubscribe', list_id='ant.example.com',
+                 subscriber='anne@example.com'),
+            dict(action='unsubscribe', list_id='ant.example.com',
+                 subscriber='cris@example.com', role='owner'),
+            dict(action='unsubscribe', list_id='ant.example.com',
+                 subscriber='dave@example.com'),
+            ))
+        self.assertEqual([result['status'] for result in results],
+                         [204, 404, 204, 404])
+        self.assertEqual(results[1]['description'], 'No such member')
+        self.assertEqual(self._emails(), ['bart@example.com'])
+        self.assertEqual(self._emails(MemberRole.owner), [])
+
+    def test_subscribe_then_unsubscribe(self):
+        # The rows are processed in order, even within a batch.
+        with transaction():
+            self._mlist.subscribe(
+                self._user_manager.create_address('anne@example.com'))
+        results = self._post(_json_lines(
+            dict(action='unsubscribe', list_id='ant.example.com',
+                 subscriber='anne@example.com'),
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='anne@example.com', pre_verified=True,
+                 pre_confirmed=True, pre_approved=True),
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='bart@example.com', pre_verified=True,
+                 pre_confirmed=True, pre_approved=True),
+            dict(action='unsubscribe', list_id='ant.example.com',
+                 subscriber='bart@example.com'),
+            ))
+        self.assertEqual([result['status'] for result in results],
+                         [204, 201, 201, 204])
+        self.assertEqual(self._emails(), ['anne@example.com'])
+
+    def test_bad_rows(self):
+        # Bad rows get their own results, and the other rows are processed.
+        with transaction():
+            self._mlist.subscribe(
+                self._user_manager.create_address('anne@example.com'))
+        body = b''.join((
+            b'{"action": "subscribe"\n',
+            b'\n',
+            b'["subscribe"]\n',
+            _json_lines(
+                dict(action='join', list_id='ant.example.com',
+                     subscriber='bart@example.com'),
+                dict(action='subscribe', list_id='bee.example.com',
+                     subscriber='bart@example.com'),
+                dict(action='subscribe', list_id='ant.example.com'),
+                dict(action='unsubscribe', list_id='ant.example.com',
+                     subscriber='bart@example.com', display_name='Bart'),
+                dict(action='subscribe', list_id='ant.example.com',
+                     subscriber='anne@example.com', pre_verified=True,
+                     pre_confirmed=True, pre_approved=True),
+                dict(action='subscribe', list_id='ant.example.com',
+                     subscriber='bart@example.com', pre_verified=True,
+                     pre_confirmed=True, pre_approved=True),
+                )))
+        results = self._post(body)
+        # The blank line isn't a row.
+        self.assertEqual([result['row'] for result in results],
+                         list(range(1, 9)))
+        self.assertEqual([result['status'] for result in results],
+                         [400, 400, 400, 400, 400, 400, 409, 201])
+        descriptions = [result.get('description') for result in results]
+        self.assertEqual(descriptions[1:], [
+            'Bad row',
+            'Bad action: join',
+            'No such list',
+            'Missing parameters: subscriber',
+            'Unexpected parameters: display_name',
+            'Member already subscribed',
+            None,
+            ])
+        self.assertEqual(self._emails(),
+                         ['anne@example.com', 'bart@example.com'])
+
+    def test_bad_booleans(self):
+        # Values which aren't booleans or strings are bad parameters of their
+        # own row, and the other rows are still processed.
+        results = self._post(_json_lines(
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='anne@example.com', pre_verified=1),
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='bart@example.com', pre_confirmed=None),
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='cris@example.com', pre_verified=True,
+                 pre_confirmed=True, pre_approved=True),
+            ))
+        self.assertEqual([result['status'] for result in results],
+                         [400, 400, 201])
+        self.assertEqual(self._emails(), ['cris@example.com'])
+
+    def test_duplicate_owner(self):
+        # Like the single request, subscribing an owner twice is a conflict,
+        # and the other rows are still processed.
+        results = self._post(_json_lines(
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='bart@example.com', role='owner'),
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='bart@example.com', role='owner'),
+            dict(action='subscribe', list_id='ant.example.com',
+                 subscriber='cris@example.com', role='owner'),
+            ))
+        self.assertEqual([result['status'] for result in results],
+                         [201, 409, 201])
+        self.assertEqual(results[1]['description'],
+                         'Member already subscribed')
+        self.assertEqual(self._emails(MemberRole.owner),
+                         ['bart@example.com', 'cris@example.com'])
+
+    def test_not_utf8(self):
+        with self.assertRaises(HTTPError) as cm:
+            self._post(b'{"subscriber": "\xff@example.com"}\n')
+        self.assertEqual(cm.exception.code, 400)
+        self.assertEqual(cm.exception.read(), b'Request body is not UTF-8')
+
+    def test_empty(self):
+        self.assertEqual(self._post(b''), [])
+
+
+
+class TestBulkMembersBatches(unittest.TestCase):
+    """Test the batches of bulk membership requests."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        # The REST modules can only be imported once Mailman is initialized.
+        from mailman.rest.members import BulkMembers
+        with transaction():
+            self._mlist = create_list('ant@example.com')
+        self._bulk = BulkMembers()
+        config.push('batches', """\
+        [webservice]
+        bulk_batch_size: 2
+        """)
+        self.addCleanup(config.pop, 'batches')
+
+    def test_batches(self):
+        rows = [json.dumps(dict(action='subscribe', list_id='ant.example.com',
+                                subscriber='person{0}@example.com'.format(i),
+                                pre_verified=True, pre_confirmed=True,
+                                pre_approved=True))
+                for i in range(5)]
+        chunks = []
+        for chunk in self._bulk._results(open('/dev/null', 'rb'), rows):
+            # Each batch is committed before its results are sent.
+            config.db.abort()
+            chunks.append(chunk.decode('utf-8').splitlines())
+            self.assertEqual(len(list(self._mlist.members.members)),
+                             sum(len(lines) for lines in chunks))
+        self.assertEqual([len(lines) for lines in chunks], [2, 2, 1])
+
+    def test_unexpected_error(self):
+        # An unexpected error only fails its own row.
+        def add_member(mlist, record, role):
+            if record.email == 'bart@example.com':
+                raise RuntimeError('borked')
+            return real_add_member(mlist, record, role)
+        from mailman.rest import members
+        real_add_member = members.add_member
+        rows = [json.dumps(dict(action='subscribe', list_id='ant.example.com',
+                                subscriber=email, role='owner'))
+                for email in ('anne@example.com', 'bart@example.com',
+                              'cris@example.com')]
+        mark = LogFileMark('mailman.http')
+        with patch.object(members, 'add_member', add_member):
+            chunks = list(self._bulk._results(open('/dev/null', 'rb'), rows))
+        results = [json.loads(line)
+                   for chunk in chunks
+                   for line in chunk.decode('utf-8').splitlines()]
+        self.assertEqual([result['status'] for result in results],
+                         [201, 500, 201])
+        self.assertNotIn('location', results[1])
+        self.assertIn('Bulk membership row 2 failed', mark.read())
+        config.db.abort()
+        user_manager = getUtility(IUserManager)
+        self.assertEqual(
+            sorted(member.address.email
+                   for member in self._mlist.owners.members),
+            ['anne@example.com', 'cris@example.com'])
+        self.assertIsNone(user_manager.get_address('bart@example.com'))
+
+    def test_one_lookup(self):
+        # The addresses of a batch are looked up together.
+        user_manager = getUtility(IUserManager)
+        with transaction():
+            for email in ('anne@example.com', 'bart@example.com'):
+                self._mlist.subscribe(user_manager.create_address(email))
+        lookups = []
+        get_addresses = user_manager.get_addresses
+        def record(emails):
+            emails = list(emails)
+            lookups.append(sorted(emails))
+            return get_addresses(emails)
+        user_manager.get_addresses = record
+        self.addCleanup(delattr, user_manager, 'get_addresses')
+        rows = [json.dumps(dict(action='unsubscribe',
+                                list_id='ant.example.com',
+                                subscriber=email))
+                for email in ('anne@example.com', 'bart@example.com')]
+        chunks = list(self._bulk._results(open('/dev/null', 'rb'), rows))
+        self.assertEqual(lookups, [['anne@example.com', 'bart@example.com']])
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(list(self._mlist.members.members), [])
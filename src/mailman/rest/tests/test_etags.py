@@ -0,0 +1,178 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test conditional requests and the etag cache."""
+
+__all__ = [
+    'TestConditionalGet',
+    'TestEtagCache',
+    'TestEtagHeader',
+    ]
+
+
+import json
+import unittest
+
+from falcon import Request, Response
+from falcon.testing import create_environ
+from mailman.app.lifecycle import create_list
+from mailman.database.transaction import transaction
+from mailman.interfaces.usermanager import IUserManager
+from mailman.testing.helpers import call_api
+from mailman.testing.layers import ConfigLayer, RESTLayer
+from unittest.mock import patch
+from urllib.error import HTTPError
+from zope.component import getUtility
+
+
+
+class TestEtagCache(unittest.TestCase):
+    """Test the etag cache."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        # The REST modules can only be imported once Mailman is initialized.
+        from mailman.rest.wsgiapp import EtagCache
+        self._cache = EtagCache(2)
+
+    def test_get(self):
+        self.assertIsNone(self._cache.get('/one', 1))
+        self._cache.put('/one', 1, '"1"')
+        self.assertEqual(self._cache.get('/one', 1), '"1"')
+
+    def test_generation(self):
+        # Etags are only good at the generation they were calculated at.
+        self._cache.put('/one', 1, '"1"')
+        self.assertIsNone(self._cache.get('/one', 2))
+        self._cache.put('/one', 2, '"2"')
+        self.assertEqual(self._cache.get('/one', 2), '"2"')
+
+    def test_least_recently_used(self):
+        self._cache.put('/one', 1, '"1"')
+        self._cache.put('/two', 1, '"2"')
+        self._cache.get('/one', 1)
+        self._cache.put('/three', 1, '"3"')
+        self.assertEqual(self._cache.get('/one', 1), '"1"')
+        self.assertIsNone(self._cache.get('/two', 1))
+        self.assertEqual(self._cache.get('/three', 1), '"3"')
+
+
+
+class TestEtagHeader(unittest.TestCase):
+    """Test the etag header of representations."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._response = Response()
+
+    def test_etagged(self):
+        from mailman.rest.helpers import etag, okay
+        body = etag(dict(name='ant'))
+        okay(self._response, body)
+        self.assertEqual(self._response.etag,
+                         json.loads(body)['http_etag'])
+
+    def test_not_etagged(self):
+        from mailman.rest.helpers import okay
+        okay(self._response, json.dumps(dict(name='ant')))
+        self.assertIsNone(self._response.etag)
+
+    def test_body_not_parsed(self):
+        # Conditional GETs don't parse the representation for its etag.
+        from mailman.rest.root import Root
+        from mailman.rest.wsgiapp import RootedAPI
+        from mailman.rest.helpers import etag, okay
+        def responder(request, response):
+            okay(response, etag(dict(name='ant')))
+        api = RootedAPI(Root())
+        request = Request(create_environ('/3.0/lists'))
+        with patch('json.loads', side_effect=AssertionError):
+            api._get_conditionally(responder, 1, request, self._response)
+            tag = self._response.etag
+        self.assertIsNotNone(tag)
+        self.assertEqual(api._etags.get('/3.0/lists', 1), tag)
+
+
+
+class TestConditionalGet(unittest.TestCase):
+    """Test GET requests with If-None-Match."""
+
+    layer = RESTLayer
+
+    def setUp(self):
+        with transaction():
+            self._mlist = create_list('ant@example.com')
+        self._url = 'http://localhost:9001/3.0/lists/ant.example.com'
+
+    def _get(self, etag, url=None, **kws):
+        return call_api(self._url if url is None else url,
+                        headers={'If-None-Match': etag}, **kws)
+
+    def test_etag_header(self):
+        content, response = call_api(self._url)
+        self.assertEqual(response['etag'], content['http_etag'])
+
+    def test_not_modified(self):
+        content, response = call_api(self._url)
+        # The second time, the etag comes from the cache.
+        for i in range(2):
+            with self.assertRaises(HTTPError) as cm:
+                self._get(content['http_etag'])
+            self.assertEqual(cm.exception.code, 304)
+            self.assertEqual(cm.exception.headers['etag'],
+                             content['http_etag'])
+
+    def test_etag_list(self):
+        content, response = call_api(self._url)
+        with self.assertRaises(HTTPError) as cm:
+            self._get('"other", W/{0}'.format(content['http_etag']))
+        self.assertEqual(cm.exception.code, 304)
+        with self.assertRaises(HTTPError) as cm:
+            self._get('*')
+        self.assertEqual(cm.exception.code, 304)
+
+    def test_other_etag(self):
+        content, response = call_api(self._url)
+        new_content, response = self._get('"other"')
+        self.assertEqual(new_content, content)
+
+    def test_modified(self):
+        content, response = call_api(self._url)
+        with transaction():
+            self._mlist.display_name = 'Bee'
+        new_content, response = self._get(content['http_etag'])
+        self.assertEqual(new_content['display_name'], 'Bee')
+        self.assertNotEqual(new_content['http_etag'], content['http_etag'])
+
+    def test_roster_modified(self):
+        url = self._url + '/roster/member'
+        content, response = call_api(url)
+        with transaction():
+            address = getUtility(IUserManager).create_address(
+                'anne@example.com')
+            self._mlist.subscribe(address)
+        new_content, response = self._get(content['http_etag'], url)
+        self.assertEqual(new_content['total_size'], 1)
+
+    def test_not_authorized(self):
+        # Only authorized clients find out whether a resource has changed.
+        content, response = call_api(self._url)
+        with self.assertRaises(HTTPError) as cm:
+            self._get(content['http_etag'], password='bogus')
+        self.assertEqual(cm.exception.code, 401)
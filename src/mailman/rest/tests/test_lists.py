@@ -286,8 +286,8 @@ class TestListPagination(unittest.TestCase):
         resource, response = call_api(
             'http://localhost:9001/3.0/domains/example.com/lists'
             '?count=1&page=1')
-        # There are 6 total lists, but only the first one in the page.
-        self.assertEqual(resource['total_size'], 1)
+        # There are 6 total lists, but only one in the page.
+        self.assertEqual(resource['total_size'], 6)
         self.assertEqual(resource['start'], 0)
         self.assertEqual(len(resource['entries']), 1)
         entry = resource['entries'][0]
@@ -297,8 +297,8 @@ class TestListPagination(unittest.TestCase):
         resource, response = call_api(
             'http://localhost:9001/3.0/domains/example.com/lists'
             '?count=1&page=2')
-        # There are 6 total lists, but only the first one in the page.
-        self.assertEqual(resource['total_size'], 1)
+        # There are 6 total lists, but only one in the page.
+        self.assertEqual(resource['total_size'], 6)
         self.assertEqual(resource['start'], 0)
         self.assertEqual(len(resource['entries']), 1)
         entry = resource['entries'][0]
@@ -308,8 +308,8 @@ class TestListPagination(unittest.TestCase):
         resource, response = call_api(
             'http://localhost:9001/3.0/domains/example.com/lists'
             '?count=1&page=6')
-        # There are 6 total lists, but only the first one in the page.
-        self.assertEqual(resource['total_size'], 1)
+        # There are 6 total lists, but only one in the page.
+        self.assertEqual(resource['total_size'], 6)
         self.assertEqual(resource['start'], 0)
         self.assertEqual(len(resource['entries']), 1)
         entry = resource['entries'][0]
@@ -336,7 +336,80 @@ class TestListPagination(unittest.TestCase):
         resource, response = call_api(
             'http://localhost:9001/3.0/domains/example.com/lists'
             '?count=1&page=7')
-        # There are 6 total lists, but only the first one in the page.
-        self.assertEqual(resource['total_size'], 0)
+        # There are 6 total lists, but none in the page.
+        self.assertEqual(resource['total_size'], 6)
         self.assertEqual(resource['start'], 0)
         self.assertNotIn('entries', resource)
+
+    def test_count_only(self):
+        # A client which only wants to know how many lists there are can ask
+        # for an empty page.
+        resource, response = call_api(
+            'http://localhost:9001/3.0/domains/example.com/lists'
+            '?count=0&page=1')
+        self.assertEqual(resource['total_size'], 6)
+        self.assertNotIn('entries', resource)
+
+    def test_cursor(self):
+        # Giving a count without a page pages through the lists with a
+        # cursor.
+        url = 'http://localhost:9001/3.0/domains/example.com/lists?count=4'
+        resource, response = call_api(url)
+        self.assertEqual([entry['list_name'] for entry in resource['entries']],
+                         ['ant', 'bee', 'cat', 'dog'])
+        resource, response = call_api(
+            url + '&after=' + resource['next_cursor'])
+        self.assertEqual([entry['list_name'] for entry in resource['entries']],
+                         ['emu', 'fly'])
+        # That was the last page.
+        self.assertNotIn('next_cursor', resource)
+        self.assertEqual(resource['total_size'], 6)
+
+    def test_cursor_is_stable(self):
+        # Deleting a list which has already been returned doesn't make the
+        # next page skip a list, as it would with page numbers.
+        url = 'http://localhost:9001/3.0/domains/example.com/lists?count=2'
+        resource, response = call_api(url)
+        with transaction():
+            getUtility(IListManager).delete(
+                getUtility(IListManager).get('ant@example.com'))
+        resource, response = call_api(
+            url + '&after=' + resource['next_cursor'])
+        self.assertEqual([entry['list_name'] for entry in resource['entries']],
+                         ['cat', 'dog'])
+
+    def test_bad_cursor(self):
+        with self.assertRaises(HTTPError) as cm:
+            call_api('http://localhost:9001/3.0/domains/example.com/lists'
+                     '?count=1&after=bogus')
+        self.assertEqual(cm.exception.code, 400)
+
+    def test_cursor_with_page(self):
+        resource, response = call_api(
+            'http://localhost:9001/3.0/domains/example.com/lists?count=1')
+        with self.assertRaises(HTTPError) as cm:
+            call_api('http://localhost:9001/3.0/domains/example.com/lists'
+                     '?count=1&page=2&after=' + resource['next_cursor'])
+        self.assertEqual(cm.exception.code, 400)
+
+    def test_roster_cursor(self):
+        # The members of a roster are paged through in email order.
+        with transaction():
+            mlist = getUtility(IListManager).get('ant@example.com')
+            user_manager = getUtility(IUserManager)
+            for email in ('dave', 'anne', 'cris', 'bart', 'elle'):
+                address = user_manager.create_address(
+                    '{0}@example.com'.format(email))
+                mlist.subscribe(address)
+        url = 'http://localhost:9001/3.0/lists/ant.example.com/roster/member'
+        emails = []
+        resource, response = call_api(url + '?count=2')
+        while True:
+            emails.extend(entry['email'] for entry in resource['entries'])
+            if 'next_cursor' not in resource:
+                break
+            resource, response = call_api(
+                url + '?count=2&after=' + resource['next_cursor'])
+        self.assertEqual(emails, [
+            'anne@example.com', 'bart@example.com', 'cris@example.com',
+            'dave@example.com', 'elle@example.com'])
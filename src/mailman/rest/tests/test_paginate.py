@@ -18,27 +18,32 @@
 """paginate helper tests."""
 
 __all__ = [
+    'TestCollection',
     'TestPaginateHelper',
     ]
 
 
 import unittest
 
-from falcon import HTTPInvalidParam, Request
+from falcon import HTTPInvalidParam, HTTPMissingParam, Request
 from mailman.app.lifecycle import create_list
+from mailman.config import config
 from mailman.database.transaction import transaction
-from mailman.rest.helpers import paginate
+from mailman.rest.helpers import CollectionMixin, paginate
 from mailman.testing.layers import RESTLayer
 
 
 
 class _FakeRequest(Request):
-    def __init__(self, count=None, page=None):
+    def __init__(self, count=None, page=None, after=None):
         self._params = {}
+        self.context = {}
         if count is not None:
             self._params['count'] = count
         if page is not None:
             self._params['page'] = page
+        if after is not None:
+            self._params['after'] = after
 
 
 
@@ -127,3 +132,104 @@ class TestPaginateHelper(unittest.TestCase):
             return ['one', 'two', 'three', 'four', 'five']
         self.assertRaises(HTTPInvalidParam, get_collection,
                           None, _FakeRequest(-1, -1))
+
+    def test_total_size(self):
+        # The size of the whole collection is left in the request's context.
+        @paginate
+        def get_collection(self, request):
+            return ['one', 'two', 'three', 'four', 'five']
+        request = _FakeRequest(2, 2)
+        get_collection(None, request)
+        self.assertEqual(request.context['total_size'], 5)
+        request = _FakeRequest(2)
+        get_collection(None, request)
+        self.assertEqual(request.context['total_size'], 5)
+        # But not when the collection isn't paginated.
+        request = _FakeRequest()
+        get_collection(None, request)
+        self.assertNotIn('total_size', request.context)
+
+    def test_cursor(self):
+        # ?count=2 without a page pages through the collection with a cursor.
+        @paginate
+        def get_collection(self, request):
+            return ['one', 'two', 'three', 'four', 'five']
+        pages = []
+        after = None
+        while True:
+            request = _FakeRequest(2, after=after)
+            pages.append(get_collection(None, request))
+            after = request.context.get('next_cursor')
+            if after is None:
+                break
+        self.assertEqual(pages, [['one', 'two'], ['three', 'four'], ['five']])
+
+    def test_cursor_without_count(self):
+        @paginate
+        def get_collection(self, request):
+            return ['one', 'two', 'three', 'four', 'five']
+        request = _FakeRequest(2)
+        get_collection(None, request)
+        self.assertRaises(HTTPMissingParam, get_collection,
+                          None, _FakeRequest(after=request.context[
+                              'next_cursor']))
+
+    def test_bad_cursor(self):
+        @paginate
+        def get_collection(self, request):
+            return ['one', 'two', 'three', 'four', 'five']
+        self.assertRaises(HTTPInvalidParam, get_collection,
+                          None, _FakeRequest(2, after='bogus'))
+        # A valid encoding, but not of a position.
+        self.assertRaises(HTTPInvalidParam, get_collection,
+                          None, _FakeRequest(2, after='WyJ4Il0='))
+
+
+
+class _Collection(CollectionMixin):
+    def __init__(self, size):
+        self._size = size
+        self.built = []
+
+    def _resource_as_dict(self, resource):
+        self.built.append(resource)
+        return dict(number=resource)
+
+    @paginate
+    def _get_collection(self, request):
+        return list(range(self._size))
+
+
+
+class TestCollection(unittest.TestCase):
+    """Test making collection resources."""
+
+    layer = RESTLayer
+
+    def test_only_the_page_is_built(self):
+        collection = _Collection(10)
+        resource = collection._make_collection(_FakeRequest(3, 2))
+        self.assertEqual(resource['total_size'], 10)
+        self.assertEqual(collection.built, [3, 4, 5])
+        self.assertIn('http_etag', resource['entries'][0])
+
+    def test_empty_page(self):
+        collection = _Collection(10)
+        resource = collection._make_collection(_FakeRequest(0, 1))
+        self.assertEqual(resource, dict(start=0, total_size=10))
+        self.assertEqual(collection.built, [])
+
+    def test_no_pagination(self):
+        resource = _Collection(10)._make_collection(_FakeRequest())
+        self.assertEqual(resource['total_size'], 10)
+        self.assertEqual(len(resource['entries']), 10)
+
+    def test_no_entry_etags(self):
+        config.push('no entry etags', """\
+        [webservice]
+        entry_etags: no
+        """)
+        self.addCleanup(config.pop, 'no entry etags')
+        resource = _Collection(10)._make_collection(_FakeRequest(3, 1))
+        self.assertEqual(resource['entries'],
+                         [dict(number=0), dict(number=1), dict(number=2)])
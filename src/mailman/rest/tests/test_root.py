@@ -29,6 +29,7 @@ import unittest
 from base64 import b64encode
 from httplib2 import Http
 from mailman.config import config
+from mailman.core.scaling import RunnerScaler, status_path, write_status
 from mailman.core.system import system
 from mailman.testing.helpers import call_api
 from mailman.testing.layers import RESTLayer
@@ -57,6 +58,34 @@ class TestRoot(unittest.TestCase):
         self.assertEqual(json['python_version'], system.python_version)
         self.assertEqual(json['self_link'], url)
 
+    def test_system_runners_none(self):
+        # Without autoscaled runners, the collection is empty.
+        json, response = call_api('http://localhost:9001/3.0/system/runners')
+        self.assertEqual(json['total_size'], 0)
+        self.assertEqual(json['self_link'],
+                         'http://localhost:9001/3.0/system/runners')
+
+    def test_system_runners(self):
+        # The master watcher's scaling decisions are available via REST.
+        scaler = RunnerScaler('out', 1, 4, 10, 0, 2, 60)
+        scaler.decide(1, 25, 3.0, now=1000.0)
+        write_status([scaler])
+        self.addCleanup(os.remove, status_path())
+        json, response = call_api('http://localhost:9001/3.0/system/runners')
+        self.assertEqual(json['total_size'], 1)
+        entry = json['entries'][0]
+        self.assertEqual(entry['name'], 'out')
+        self.assertEqual(entry['instances'], 2)
+        self.assertEqual(entry['min_instances'], 1)
+        self.assertEqual(entry['max_instances'], 4)
+        self.assertEqual(entry['depth'], 25)
+        self.assertEqual(len(entry['decisions']), 1)
+        decision = entry['decisions'][0]
+        self.assertEqual(decision['before'], 1)
+        self.assertEqual(decision['after'], 2)
+        self.assertEqual(decision['reason'],
+                         'queue depth 25 > 10 per instance')
+
     def test_path_under_root_does_not_exist(self):
         # Accessing a non-existent path under root returns a 404.
         with self.assertRaises(HTTPError) as cm:
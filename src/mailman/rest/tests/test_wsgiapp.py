@@ -0,0 +1,180 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the REST servers."""
+
+__all__ = [
+    'TestMakeServer',
+    'TestPreforkWSGIServer',
+    'TestThreadPoolWSGIServer',
+    ]
+
+
+import os
+import time
+import signal
+import threading
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from mailman.config import config
+from mailman.testing.helpers import configuration
+from mailman.testing.layers import ConfigLayer
+from urllib.request import urlopen
+from wsgiref.simple_server import WSGIServer
+
+
+
+class _ServerMixin:
+    """Run a server in a thread, with a simple WSGI application."""
+
+    def _start(self, class_name, application, **kws):
+        # The REST modules can only be imported once Mailman is initialized.
+        from mailman.rest import wsgiapp
+        server_class = getattr(wsgiapp, class_name)
+        server = server_class(
+            ('localhost', 0), wsgiapp.AdminWebServiceWSGIRequestHandler,
+            **kws)
+        server.set_app(application)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        def stop():
+            server.shutdown()
+            thread.join()
+            server.server_close()
+        self.addCleanup(stop)
+        self._url = 'http://localhost:{0}/'.format(server.server_port)
+        return server
+
+    def _get(self, count):
+        # Make `count` requests at once.
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(
+                lambda i: urlopen(self._url, timeout=10).read(),
+                range(count)))
+
+
+
+class TestThreadPoolWSGIServer(_ServerMixin, unittest.TestCase):
+    layer = ConfigLayer
+
+    def test_concurrent_requests(self):
+        # Neither request finishes until both are being handled.
+        barrier = threading.Barrier(2, timeout=10)
+        def application(environ, start_response):
+            barrier.wait()
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'ok']
+        self._start('ThreadPoolWSGIServer', application, workers=2)
+        self.assertEqual(self._get(2), [b'ok', b'ok'])
+        self.assertFalse(barrier.broken)
+
+    def test_sessions(self):
+        # Each worker thread has its own database session.
+        sessions = []
+        def application(environ, start_response):
+            sessions.append(config.db.store())
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'ok']
+        self._start('ThreadPoolWSGIServer', application, workers=2)
+        self._get(2)
+        self.assertEqual(len(sessions), 2)
+        self.assertIsNot(sessions[0], config.db.store())
+        self.assertIsNot(sessions[1], config.db.store())
+
+
+
+class TestPreforkWSGIServer(_ServerMixin, unittest.TestCase):
+    layer = ConfigLayer
+
+    def test_concurrent_requests(self):
+        # Each worker process handles one request at a time.
+        def application(environ, start_response):
+            time.sleep(0.5)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [str(os.getpid()).encode('ascii')]
+        self._start('PreforkWSGIServer', application, workers=2)
+        pids = self._get(2)
+        self.assertEqual(len(set(pids)), 2)
+        self.assertNotIn(str(os.getpid()).encode('ascii'), pids)
+
+    def test_shutdown(self):
+        def application(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [str(os.getpid()).encode('ascii')]
+        server = self._start('PreforkWSGIServer', application, workers=2)
+        pid = int(self._get(1)[0])
+        server.shutdown()
+        # The worker has been reaped.
+        for i in range(100):
+            if pid not in server._children:
+                break
+            time.sleep(0.1)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+
+    def test_wait(self):
+        # The server only reaps its own workers, even when the wait is
+        # interrupted by a signal.
+        from mailman.rest.wsgiapp import (
+            AdminWebServiceWSGIRequestHandler, PreforkWSGIServer)
+        server = PreforkWSGIServer(
+            ('localhost', 0), AdminWebServiceWSGIRequestHandler)
+        self.addCleanup(server.server_close)
+        other = os.fork()
+        if other == 0:
+            os._exit(0)
+        worker = os.fork()
+        if worker == 0:
+            time.sleep(0.5)
+            os._exit(3)
+        server._children.add(worker)
+        signals = []
+        handler = signal.signal(
+            signal.SIGALRM, lambda signum, frame: signals.append(signum))
+        self.addCleanup(signal.signal, signal.SIGALRM, handler)
+        signal.setitimer(signal.ITIMER_REAL, 0.2)
+        pid, status = server._wait(0.1)
+        self.assertEqual(signals, [signal.SIGALRM])
+        self.assertEqual(pid, worker)
+        self.assertEqual(os.WEXITSTATUS(status), 3)
+        # The other child is still there to be reaped.
+        self.assertEqual(os.waitpid(other, os.WNOHANG)[0], other)
+
+
+
+class TestMakeServer(unittest.TestCase):
+    layer = ConfigLayer
+
+    def _make_server(self, concurrency):
+        from mailman.rest.wsgiapp import make_server
+        with configuration('webservice', port=0, concurrency=concurrency):
+            server = make_server()
+        self.addCleanup(server.server_close)
+        return server
+
+    def test_single(self):
+        self.assertIs(type(self._make_server('single')), WSGIServer)
+
+    def test_sqlite(self):
+        # The test suite uses SQLite, which only ever gets a single-threaded
+        # server.
+        self.assertIs(type(self._make_server('threads')), WSGIServer)
+        self.assertIs(type(self._make_server('processes')), WSGIServer)
+
+    def test_bad_concurrency(self):
+        self.assertRaises(ValueError, self._make_server, 'lots')
@@ -151,7 +151,7 @@ class _UserBase(CollectionMixin):
     @paginate
     def _get_collection(self, request):
         """See `CollectionMixin`."""
-        return list(getUtility(IUserManager).users)
+        return getUtility(IUserManager).users
 
 
 
@@ -93,6 +93,18 @@ class Validator:
         self._converters = kws.copy()
 
     def __call__(self, request):
+        return self.convert(request.params)
+
+    def convert(self, params):
+        """Validate and convert parameters.
+
+        :param params: The parameters, as a request would have them.
+        :type params: dict
+        :return: The converted values.
+        :rtype: dict
+        :raises ValueError: if there are unexpected or missing parameters,
+            or some could not be converted.
+        """
         values = {}
         extras = set()
         cannot_convert = set()
@@ -101,7 +113,7 @@ class Validator:
         # in the pre-converted dictionary.  All keys which show up more than
         # once get a list value.
         missing = object()
-        items = request.params.items()
+        items = params.items()
         for key, new_value in items:
             old_value = form_data.get(key, missing)
             if old_value is missing:
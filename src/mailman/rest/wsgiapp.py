@@ -18,21 +18,33 @@
 """Basic WSGI Application object for REST server."""
 
 __all__ = [
+    'EtagCache',
+    'PreforkWSGIServer',
+    'ThreadPoolWSGIServer',
     'make_application',
     'make_server',
     ]
 
 
+import os
 import re
+import time
+import falcon
+import signal
 import logging
+import threading
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from falcon import API
 from falcon.responders import path_not_found
 from falcon.routing import create_http_method_map
+from functools import partial
 from mailman.config import config
 from mailman.database.transaction import transactional
 from mailman.rest.root import Root
-from wsgiref.simple_server import WSGIRequestHandler
+from urllib.parse import urlparse
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
 from wsgiref.simple_server import make_server as wsgi_server
 
 
@@ -50,9 +62,202 @@ class AdminWebServiceWSGIRequestHandler(WSGIRequestHandler):
         log.info('%s - - %s', self.address_string(), format % args)
 
 
+class ThreadPoolWSGIServer(WSGIServer):
+    """A WSGI server which handles requests in a pool of worker threads.
+
+    Each worker thread has its own database session, which is closed after
+    every request.
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, workers=4):
+        super(ThreadPoolWSGIServer, self).__init__(
+            server_address, RequestHandlerClass)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        """See `socketserver.BaseServer`."""
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            config.db.store.remove()
+
+    def server_close(self):
+        """See `socketserver.BaseServer`."""
+        super(ThreadPoolWSGIServer, self).server_close()
+        # Let the requests being handled finish.
+        self._executor.shutdown(wait=True)
+
+
+class PreforkWSGIServer(WSGIServer):
+    """A WSGI server which handles requests in forked worker processes.
+
+    The worker processes take turns accepting requests on the listening
+    socket, and each handles one request at a time.  `serve_forever()` forks
+    the workers and replaces any which exit, until `shutdown()` is called.
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, workers=4):
+        super(PreforkWSGIServer, self).__init__(
+            server_address, RequestHandlerClass)
+        self._workers = workers
+        self._children = set()
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def serve_forever(self, poll_interval=0.5):
+        """See `socketserver.BaseServer`."""
+        # The workers must not share the database connections opened so far.
+        config.db.store.close()
+        config.db.engine.dispose()
+        while True:
+            with self._lock:
+                if self._stopping:
+                    break
+                while len(self._children) < self._workers:
+                    pid = os.fork()
+                    if pid == 0:
+                        self._serve_worker(poll_interval)
+                    self._children.add(pid)
+            pid, status = self._wait(poll_interval)
+            with self._lock:
+                self._children.discard(pid)
+                if not self._stopping:
+                    log.error('REST worker %d exited with status %d',
+                              pid, status)
+        while len(self._children) > 0:
+            pid, status = self._wait(poll_interval)
+            self._children.discard(pid)
+
+    def _wait(self, poll_interval):
+        # Only reap this server's own workers, checking on them every poll
+        # interval.  Python 3.4 doesn't restart system calls interrupted by
+        # signals, e.g. by the runner's SIGHUP handler, so that's done here.
+        while True:
+            for pid in list(self._children):
+                try:
+                    reaped, status = os.waitpid(pid, os.WNOHANG)
+                except InterruptedError:
+                    continue
+                except ChildProcessError:
+                    # Somebody else reaped it.
+                    return pid, 0
+                if reaped != 0:
+                    return reaped, status
+            try:
+                time.sleep(poll_interval)
+            except InterruptedError:
+                pass
+
+    def _serve_worker(self, poll_interval):
+        status = 0
+        try:
+            self._children = set()
+            def stop(signum, frame):
+                self._stopping = True
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+                signal.signal(signum, stop)
+            # Only one of the workers gets each request, and the others must
+            # not wait for it, or they would miss being stopped.
+            self.socket.setblocking(False)
+            self.timeout = poll_interval
+            while not self._stopping:
+                self.handle_request()
+        except:
+            log.exception('REST worker failed')
+            status = 1
+        finally:
+            os._exit(status)
+
+    def get_request(self):
+        """See `socketserver.TCPServer`."""
+        request, client_address = super(PreforkWSGIServer, self).get_request()
+        request.setblocking(True)
+        return request, client_address
+
+    def shutdown(self):
+        """See `socketserver.BaseServer`."""
+        with self._lock:
+            self._stopping = True
+            for pid in self._children:
+                os.kill(pid, signal.SIGTERM)
+
+
+class EtagCache:
+    """A cache of the etags of recently requested resources.
+
+    Each etag is stored along with the database generation it was calculated
+    at, and it is only good while the database stays at that generation.
+    """
+
+    def __init__(self, size):
+        """Create an etag cache.
+
+        :param size: The most etags to keep.  The least recently used ones
+            are forgotten first.
+        :type size: int
+        """
+        self._size = size
+        self._etags = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        """Return the etag of a resource.
+
+        :param key: The resource's key, e.g. its path.
+        :type key: str
+        :param generation: The current database generation.
+        :return: The resource's etag, or None if it isn't known at this
+            database generation.
+        :rtype: str
+        """
+        with self._lock:
+            cached = self._etags.get(key)
+            if cached is None or cached[0] != generation:
+                return None
+            self._etags.move_to_end(key)
+            return cached[1]
+
+    def put(self, key, generation, etag):
+        """Remember the etag of a resource.
+
+        :param key: The resource's key, e.g. its path.
+        :type key: str
+        :param generation: The database generation the etag was calculated
+            at.
+        :param etag: The resource's etag.
+        :type etag: str
+        """
+        with self._lock:
+            self._etags[key] = (generation, etag)
+            self._etags.move_to_end(key)
+            while len(self._etags) > self._size:
+                self._etags.popitem(last=False)
+
+
+def _matches(if_none_match, etag):
+    """Does the If-None-Match header match the etag?"""
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        # If-None-Match uses the weak comparison.
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
 class RootedAPI(API):
     def __init__(self, root, *args, **kws):
         self._root = root
+        self._etags = EtagCache(int(config.webservice.etag_cache_size))
         super(RootedAPI, self).__init__(*args, **kws)
 
     @transactional
@@ -65,6 +270,39 @@ class RootedAPI(API):
             environ, start_response)
 
     def _get_responder(self, req):
+        # Look up the database generation before the request reads anything
+        # from the database, so that the etag of the response can't be newer
+        # than the generation it is cached at.
+        generation = config.db.generation
+        responder, params, resource = self._find_responder(req)
+        if req.method == 'GET' and resource is not None:
+            responder = partial(self._get_conditionally, responder, generation)
+        return responder, params, resource
+
+    def _get_conditionally(self, responder, generation, req, resp, **params):
+        # Answer a GET request with 304 Not Modified when the client already
+        # has the current representation.  While the database is unchanged,
+        # the representation's etag is known without building it again.
+        key = req.relative_uri
+        if_none_match = req.if_none_match
+        if if_none_match is not None and generation is not None:
+            etag = self._etags.get(key, generation)
+            if etag is not None and _matches(if_none_match, etag):
+                resp.status = falcon.HTTP_304
+                resp.etag = etag
+                return
+        responder(req, resp, **params)
+        # okay() sets the etag of representations made by etag().
+        etag = resp.etag
+        if resp.status != falcon.HTTP_200 or etag is None:
+            return
+        if generation is not None:
+            self._etags.put(key, generation, etag)
+        if if_none_match is not None and _matches(if_none_match, etag):
+            resp.status = falcon.HTTP_304
+            resp.body = None
+
+    def _find_responder(self, req):
         path = req.path
         method = req.method
         path_segments = path.split('/')
@@ -157,10 +395,30 @@ def make_server():
     """Create the Mailman REST server.
 
     Use this if you just want to run Mailman's wsgiref-based REST server.
+    Depending on the `[webservice]concurrency` setting, it handles one
+    request at a time, or several in worker threads or processes.
     """
     host = config.webservice.hostname
     port = int(config.webservice.port)
+    concurrency = config.webservice.concurrency
+    if concurrency not in ('single', 'threads', 'processes'):
+        raise ValueError(
+            'Unknown REST server concurrency: {0}'.format(concurrency))
+    if (concurrency != 'single' and
+            urlparse(config.db.url).scheme.split('+')[0] == 'sqlite'):
+        # A SQLite database can only be written to by one connection at a
+        # time.
+        log.warning('REST server handles one request at a time with SQLite')
+        concurrency = 'single'
+    workers = int(config.webservice.workers)
+    if concurrency == 'threads':
+        server_class = partial(ThreadPoolWSGIServer, workers=workers)
+    elif concurrency == 'processes':
+        server_class = partial(PreforkWSGIServer, workers=workers)
+    else:
+        server_class = WSGIServer
     server = wsgi_server(
         host, port, make_application(),
+        server_class=server_class,
         handler_class=AdminWebServiceWSGIRequestHandler)
     return server
@@ -22,7 +22,6 @@ __all__ = [
     ]
 
 
-import copy
 import logging
 
 from email.utils import parsedate_tz, mktime_tz
@@ -30,9 +29,9 @@ from datetime import datetime
 from lazr.config import as_timedelta
 from mailman.config import config
 from mailman.core.runner import Runner
-from mailman.interfaces.archiver import ClobberDate
-from mailman.utilities.datetime import RFC822_DATE_FMT, now
+from mailman.interfaces.archiver import ClobberDate, IBatchingArchiver
 from mailman.interfaces.mailinglist import IListArchiverSet
+from mailman.utilities.datetime import RFC822_DATE_FMT, now
 
 
 log = logging.getLogger('mailman.error')
@@ -81,6 +80,24 @@ def _should_clobber(msg, msgdata, archiver):
     return (abs(now() - claimed_date) > skew)
 
 
+def _clobber_date(msg, received_time):
+    """Return a copy of the message with the received time as its Date."""
+    # Only the headers are copied.  The payload is shared with the original
+    # message, which the archivers don't change.  copy.copy() won't do, since
+    # the copy would share the original's __dict__ through __setstate__().
+    headers = list(msg._headers)
+    msg_copy = msg.__class__.__new__(msg.__class__)
+    msg_copy.__dict__.update(msg.__dict__)
+    msg_copy._headers = headers
+    original_date = msg_copy['date']
+    del msg_copy['date']
+    del msg_copy['x-original-date']
+    msg_copy['Date'] = received_time.strftime(RFC822_DATE_FMT)
+    if original_date:
+        msg_copy['X-Original-Date'] = original_date
+    return msg_copy
+
+
 
 class ArchiveRunner(Runner):
     """The archive runner."""
@@ -88,22 +105,46 @@ class ArchiveRunner(Runner):
     def _dispose(self, mlist, msg, msgdata):
         received_time = msgdata.get('received_time', now(strip_tzinfo=False))
         archiver_set = IListArchiverSet(mlist)
+        # The archivers all get the same message, or the same copy of it with
+        # its Date header clobbered.
+        clobbered = None
         for archiver in archiver_set.archivers:
             # The archiver is disabled if either the list-specific or
             # site-wide archiver is disabled.
             if not archiver.is_enabled:
                 continue
-            msg_copy = copy.deepcopy(msg)
             if _should_clobber(msg, msgdata, archiver.name):
-                original_date = msg_copy['date']
-                del msg_copy['date']
-                del msg_copy['x-original-date']
-                msg_copy['Date'] = received_time.strftime(RFC822_DATE_FMT)
-                if original_date:
-                    msg_copy['X-Original-Date'] = original_date
+                if clobbered is None:
+                    clobbered = _clobber_date(msg, received_time)
+                msg_copy = clobbered
+            else:
+                msg_copy = msg
             # A problem in one archiver should not prevent other archivers
             # from running.
             try:
                 archiver.system_archiver.archive_message(mlist, msg_copy)
             except Exception:
                 log.exception('Broken archiver: %s' % archiver.name)
+
+    def _do_periodic(self):
+        """See `IRunner`."""
+        self._flush()
+
+    def _clean_up(self):
+        """See `IRunner`."""
+        # Don't leave any batches waiting for the next time around.
+        self._flush(force=True)
+        super(ArchiveRunner, self)._clean_up()
+
+    def _flush(self, force=False):
+        # Archive the batches of the archivers which batch messages, once they
+        # are due.
+        for archiver in config.archivers:
+            if not archiver.is_enabled:
+                continue
+            if not IBatchingArchiver.providedBy(archiver):
+                continue
+            try:
+                archiver.flush(force)
+            except Exception:
+                log.exception('Broken archiver: %s' % archiver.name)
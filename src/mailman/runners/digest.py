@@ -25,7 +25,6 @@ __all__ = [
 import re
 import logging
 
-from copy import deepcopy
 from email.header import Header
 from email.mime.message import MIMEMessage
 from email.mime.text import MIMEText
@@ -93,7 +92,20 @@ class Digester:
 
     def add_to_toc(self, msg, count):
         """Add a message to the table of contents."""
-        subject = msg.get('subject', _('(no subject)'))
+        self.add_toc_entry(msg.get('subject'), msg.get('from'), count)
+
+    def add_toc_entry(self, subject, author, count):
+        """Add an entry to the table of contents.
+
+        :param subject: The message's raw Subject header, or None.
+        :type subject: string
+        :param author: The message's raw From header, or None.
+        :type author: string
+        :param count: The message's number in the digest.
+        :type count: int
+        """
+        if subject is None:
+            subject = _('(no subject)')
         subject = oneline(subject, in_unicode=True)
         # Don't include the redundant subject prefix in the toc
         mo = re.match('(re:? *)?({0})'.format(
@@ -104,7 +116,7 @@ class Digester:
         # Take only the first author we find.
         username = ''
         addresses = getaddresses(
-            [oneline(msg.get('from', ''), in_unicode=True)])
+            [oneline(author or '', in_unicode=True)])
         if addresses:
             username = addresses[0][0]
             if not username:
@@ -181,9 +193,9 @@ class MIMEDigester(Digester):
 
     def add_message(self, msg, count):
         """Add the message to the digest."""
-        # Make a copy of the message object, since the RFC 1153 processing
-        # scrubs out attachments.
-        self._message.attach(MIMEMessage(deepcopy(msg)))
+        # The message is attached as is, so it must be added to the RFC 1153
+        # digest first.  That only reads it.
+        self._message.attach(MIMEMessage(msg))
 
     def finish(self):
         """Finish up the digest, producing the email-ready copy."""
@@ -321,25 +333,29 @@ class DigestRunner(Runner):
             # Create the digesters.
             mime_digest = MIMEDigester(mlist, volume, digest_number)
             rfc1153_digest = RFC1153Digester(mlist, volume, digest_number)
-            # Cruise through all the messages in the mailbox, first building
-            # the table of contents and accumulating Subject: headers and
-            # authors.  The question really is whether it's better from a1
-            # performance and memory footprint to go through the mailbox once
-            # and cache the messages in a list, or to cruise through the
-            # mailbox twice.  We'll do the latter, but it's a complete guess.
-            count = None
-            for count, (key, message) in enumerate(mailbox.iteritems(), 1):
-                mime_digest.add_to_toc(message, count)
-                rfc1153_digest.add_to_toc(message, count)
-            assert count is not None, 'No digest messages?'
-            # Add the table of contents.
+            # The table of contents comes first.  The to-digest handler
+            # records each message's subject and author in the mailbox's
+            # index as it adds the message, so the messages don't have to be
+            # parsed for it.  Without a usable index, e.g. for a digest
+            # collected by an older version, read the headers from the
+            # messages themselves.
+            entries = mailbox.get_index()
+            if entries is None:
+                entries = [(message.get('subject'), message.get('from'))
+                           for message in mailbox.itervalues()]
+            count = len(entries)
+            assert count > 0, 'No digest messages?'
+            for number, (subject, author) in enumerate(entries, 1):
+                mime_digest.add_toc_entry(subject, author, number)
+                rfc1153_digest.add_toc_entry(subject, author, number)
             mime_digest.add_toc(count)
             rfc1153_digest.add_toc(count)
-            # Cruise through the set of messages a second time, adding them to
-            # the actual digest.
-            for count, (key, message) in enumerate(mailbox.iteritems(), 1):
-                mime_digest.add_message(message, count)
-                rfc1153_digest.add_message(message, count)
+            # Now go through the messages once, adding each one to both
+            # digests.  The MIME digest keeps the message itself, so it must
+            # come second.
+            for number, message in enumerate(mailbox.itervalues(), 1):
+                rfc1153_digest.add_message(message, number)
+                mime_digest.add_message(message, number)
             # Finish up the digests.
             mime = mime_digest.finish()
             rfc1153 = rfc1153_digest.finish()
@@ -63,6 +63,18 @@ class OutgoingRunner(Runner):
         self._logged = False
         self._retryq = config.switchboards['retry']
 
+    def _process_one_file(self, msg, msgdata):
+        """See `IRunner`."""
+        # Messages which aren't due for delivery yet go right back into the
+        # queue.  Don't even look up the mailing list or the sender's
+        # language, so that in the raw queue format the message is never
+        # parsed.
+        deliver_after = msgdata.get('deliver_after', datetime.fromtimestamp(0))
+        if now() < deliver_after:
+            self.switchboard.enqueue(msg, msgdata)
+            return
+        super(OutgoingRunner, self)._process_one_file(msg, msgdata)
+
     def _dispose(self, mlist, msg, msgdata):
         # See if we should retry delivery of this message again.
         deliver_after = msgdata.get('deliver_after', datetime.fromtimestamp(0))
@@ -42,10 +42,13 @@ class RESTRunner(Runner):
     def __init__(self, name, slice=None):
         """See `IRunner`."""
         super(RESTRunner, self).__init__(name, slice)
-        # Both the REST server and the signal handlers must run in the main
-        # thread; the former because of SQLite requirements (objects created
-        # in one thread cannot be shared with the other threads), and the
-        # latter because of Python's signal handling semantics.
+        # Both the REST server's main loop and the signal handlers must run
+        # in the main thread; the former because of SQLite requirements
+        # (objects created in one thread cannot be shared with the other
+        # threads), and the latter because of Python's signal handling
+        # semantics.  With PostgreSQL, the server can be configured to handle
+        # requests in worker threads, each with its own database session, or
+        # in worker processes.
         #
         # Unfortunately, we cannot issue a TCPServer shutdown in the main
         # thread, because that will cause a deadlock.  Yay.   So what we do is
@@ -63,7 +66,11 @@ class RESTRunner(Runner):
 
     def run(self):
         """See `IRunner`."""
-        self._server.serve_forever()
+        try:
+            self._server.serve_forever()
+        finally:
+            # Wait for any worker threads to finish their requests.
+            self._server.server_close()
 
     def signal_handler(self, signum, frame):
         super(RESTRunner, self).signal_handler(signum, frame)
@@ -26,12 +26,24 @@ import time
 
 from mailman.config import config
 from mailman.core.runner import Runner
+from mailman.email.message import LazyMessage
 
 
 
 class RetryRunner(Runner):
     """Retry delivery."""
 
+    def _process_one_file(self, msg, msgdata):
+        """See `IRunner`."""
+        # There's nothing to do here except to move the message along.  For
+        # entries in the raw queue format, skip the mailing list and language
+        # lookups, so that the message is never parsed.  Other entries get
+        # the usual checks.
+        if LazyMessage.unparsed(msg) is None:
+            super(RetryRunner, self)._process_one_file(msg, msgdata)
+        else:
+            self._dispose(None, msg, msgdata)
+
     def _dispose(self, mlist, msg, msgdata):
         # Move the message to the out queue for another try.
         config.switchboards['out'].enqueue(msg, msgdata)
@@ -28,7 +28,7 @@ import unittest
 from email import message_from_file
 from mailman.app.lifecycle import create_list
 from mailman.config import config
-from mailman.interfaces.archiver import IArchiver
+from mailman.interfaces.archiver import IArchiver, IBatchingArchiver
 from mailman.interfaces.mailinglist import IListArchiverSet
 from mailman.runners.archive import ArchiveRunner
 from mailman.testing.helpers import (
@@ -63,6 +63,22 @@ class DummyArchiver:
         return path
 
 
+
+@implementer(IBatchingArchiver)
+class BatchingDummyArchiver(DummyArchiver):
+    name = 'batching_dummy'
+    messages = []
+    flushes = []
+
+    @classmethod
+    def archive_message(cls, mlist, msg):
+        cls.messages.append(msg)
+
+    @classmethod
+    def flush(cls, force=False):
+        cls.flushes.append(force)
+
+
 
 class TestArchiveRunner(unittest.TestCase):
     """Test the archive runner."""
@@ -77,6 +93,9 @@ class TestArchiveRunner(unittest.TestCase):
         [archiver.dummy]
         class: mailman.runners.tests.test_archiver.DummyArchiver
         enable: no
+        [archiver.batching_dummy]
+        class: mailman.runners.tests.test_archiver.BatchingDummyArchiver
+        enable: no
         [archiver.prototype]
         enable: no
         [archiver.mhonarc]
@@ -96,6 +115,9 @@ First post!
 """)
         self._runner = make_testable_runner(ArchiveRunner)
         IListArchiverSet(self._mlist).get('dummy').is_enabled = True
+        IListArchiverSet(self._mlist).get('batching_dummy').is_enabled = True
+        self.addCleanup(BatchingDummyArchiver.messages.clear)
+        self.addCleanup(BatchingDummyArchiver.flushes.clear)
 
     def tearDown(self):
         config.pop('dummy')
@@ -247,3 +269,48 @@ First post!
             listid=self._mlist.list_id)
         self._runner.run()
         self.assertEqual(os.listdir(config.MESSAGES_DIR), [])
+
+    @configuration('archiver.batching_dummy', enable='yes')
+    def test_archivers_share_message(self):
+        # The archivers all get the same message, which isn't copied.
+        self._msg['Date'] = now(strip_tzinfo=False).strftime(RFC822_DATE_FMT)
+        self._runner._dispose(self._mlist, self._msg, {})
+        self._runner._dispose(self._mlist, self._msg, {})
+        self.assertEqual(len(BatchingDummyArchiver.messages), 2)
+        for msg in BatchingDummyArchiver.messages:
+            self.assertIs(msg, self._msg)
+
+    @configuration('archiver.batching_dummy', enable='yes',
+                   clobber_date='always')
+    def test_clobber_date_copy(self):
+        # The Date header is clobbered in a copy of the message's headers.
+        self._msg['Date'] = now(strip_tzinfo=False).strftime(RFC822_DATE_FMT)
+        factory.fast_forward(days=4)
+        self._runner._dispose(self._mlist, self._msg, {})
+        archived = BatchingDummyArchiver.messages[0]
+        self.assertIsNot(archived, self._msg)
+        self.assertEqual(archived['date'], 'Fri, 05 Aug 2005 07:49:23 +0000')
+        self.assertEqual(archived['x-original-date'],
+                         'Mon, 01 Aug 2005 07:49:23 +0000')
+        self.assertEqual(archived.get_payload(), self._msg.get_payload())
+        # The original message is left alone.
+        self.assertEqual(self._msg['date'], 'Mon, 01 Aug 2005 07:49:23 +0000')
+        self.assertIsNone(self._msg['x-original-date'])
+
+    @configuration('archiver.batching_dummy', enable='yes')
+    def test_flush(self):
+        # Archivers which batch messages are flushed every time around the
+        # runner's loop, and all their batches when it stops.
+        self._archiveq.enqueue(
+            self._msg, {},
+            listid=self._mlist.list_id)
+        self._runner.run()
+        self.assertEqual(len(BatchingDummyArchiver.messages), 1)
+        self.assertEqual(BatchingDummyArchiver.flushes, [True])
+        # The testable runner has its own periodic work.
+        ArchiveRunner._do_periodic(self._runner)
+        self.assertEqual(BatchingDummyArchiver.flushes, [True, False])
+
+    def test_no_flush_when_disabled(self):
+        self._runner.run()
+        self.assertEqual(BatchingDummyArchiver.flushes, [])
@@ -23,6 +23,8 @@ __all__ = [
     ]
 
 
+import os
+import json
 import unittest
 
 from email.iterators import _structure as structure
@@ -140,6 +142,80 @@ multipart/mixed
     text/plain
 """)
 
+    def _fill_digest(self):
+        # Fill the digest with a few messages, without sending it.
+        self._mlist.digest_size_threshold = 100
+        for i in range(1, 4):
+            self._process(self._mlist, mfs("""\
+From: Anne Person <aperson@example.com>
+To: test@example.com
+Subject: Test message {0}
+
+Here is message {0}
+""".format(i)), {})
+        path = os.path.join(self._mlist.data_path, 'digest.mmdf')
+        self._digestq.enqueue(
+            Message(), listid=self._mlist.list_id, digest_path=path,
+            volume=1, digest_number=1)
+        return path
+
+    def _get_toc(self):
+        # Run the digest runner, and return the table of contents from both
+        # digests.
+        self._runner.run()
+        items = get_queue_messages('virgin')
+        self.assertEqual(len(items), 2)
+        tocs = []
+        for item in sorted(items, key=lambda item: item.msg.is_multipart()):
+            if item.msg.is_multipart():
+                text = item.msg.get_payload(1).get_payload(decode=True)
+            else:
+                text = item.msg.get_payload(decode=True)
+            text = text.decode('us-ascii')
+            # The table of contents is a title and a paragraph of entries.
+            start = text.index("Today's Topics:")
+            paragraphs = text[start:].split('\n\n')
+            tocs.append('\n\n'.join(paragraphs[:2]).rstrip())
+        return tocs
+
+    def test_toc_from_index(self):
+        # The table of contents comes from the index which the to-digest
+        # handler keeps next to the mailbox, not from the messages.
+        path = self._fill_digest()
+        index_path = path + '.toc'
+        with open(index_path) as fp:
+            entries = [json.loads(line) for line in fp]
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[0], [
+            'Test message 1', 'Anne Person <aperson@example.com>'])
+        entries[1][0] = 'From the index'
+        with open(index_path, 'w') as fp:
+            for entry in entries:
+                print(json.dumps(entry), file=fp)
+        rfc1153_toc, mime_toc = self._get_toc()
+        self.assertMultiLineEqual(rfc1153_toc, """\
+Today's Topics:
+
+   1. Test message 1 (Anne Person)
+   2. From the index (Anne Person)
+   3. Test message 3 (Anne Person)""")
+        self.assertMultiLineEqual(mime_toc, rfc1153_toc)
+
+    def test_toc_without_index(self):
+        # Without a usable index, the table of contents is built from the
+        # messages themselves.
+        path = self._fill_digest()
+        with open(path + '.toc', 'a') as fp:
+            print(json.dumps(['Too many', None]), file=fp)
+        rfc1153_toc, mime_toc = self._get_toc()
+        self.assertMultiLineEqual(rfc1153_toc, """\
+Today's Topics:
+
+   1. Test message 1 (Anne Person)
+   2. Test message 2 (Anne Person)
+   3. Test message 3 (Anne Person)""")
+        self.assertMultiLineEqual(mime_toc, rfc1153_toc)
+
 
 
 class TestI18nDigest(unittest.TestCase):
@@ -44,10 +44,11 @@ from mailman.interfaces.pending import IPendings
 from mailman.interfaces.usermanager import IUserManager
 from mailman.runners.outgoing import OutgoingRunner
 from mailman.testing.helpers import (
-    LogFileMark, get_queue_messages, make_testable_runner,
+    LogFileMark, configuration, get_queue_messages, make_testable_runner,
     specialized_message_from_string as message_from_string)
 from mailman.testing.layers import ConfigLayer, SMTPLayer
 from mailman.utilities.datetime import factory, now
+from unittest.mock import patch
 from zope.component import getUtility
 
 
@@ -101,6 +102,24 @@ Message-Id: <first>
         self.assertEqual(items[0].msgdata['deliver_after'], deliver_after)
         self.assertEqual(items[0].msg['message-id'], '<first>')
 
+    @configuration('runner.out', queue_format='raw')
+    def test_deliver_after_without_parsing(self):
+        # In the raw queue format, messages which aren't due yet are requeued
+        # without being parsed.
+        deliver_after = now() + timedelta(days=10)
+        self._msgdata['deliver_after'] = deliver_after
+        outq = config.switchboards['out']
+        outq.enqueue(self._msg, self._msgdata,
+                     tolist=True, listid='test.example.com')
+        runner = make_testable_runner(OutgoingRunner, 'out', run_once)
+        with patch('mailman.email.message.email.message_from_bytes') as parse:
+            runner.run()
+        self.assertFalse(parse.called)
+        items = get_queue_messages('out')
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].msgdata['deliver_after'], deliver_after)
+        self.assertEqual(items[0].msg['message-id'], '<first>')
+
 
 
 captured_mlist = None
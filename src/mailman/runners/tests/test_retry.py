@@ -28,9 +28,10 @@ from mailman.app.lifecycle import create_list
 from mailman.config import config
 from mailman.runners.retry import RetryRunner
 from mailman.testing.helpers import (
-    get_queue_messages, make_testable_runner,
+    configuration, get_queue_messages, make_testable_runner,
     specialized_message_from_string as message_from_string)
 from mailman.testing.layers import ConfigLayer
+from unittest.mock import patch
 
 
 
@@ -56,3 +57,26 @@ Message-Id: <first>
         self._retryq.enqueue(self._msg, self._msgdata)
         self._runner.run()
         self.assertEqual(len(get_queue_messages('out')), 1)
+
+    def test_missing_list_shunted(self):
+        # Pickled entries still get the usual checks.
+        self._retryq.enqueue(self._msg, listid='missing.example.com')
+        self._runner.run()
+        self.assertEqual(len(get_queue_messages('out')), 0)
+        self.assertEqual(len(get_queue_messages('shunt')), 1)
+
+    @configuration('runner.retry', queue_format='raw')
+    def test_message_not_parsed(self):
+        # In the raw queue format, the message is moved along without being
+        # parsed.
+        retryq = config.switchboards['retry']
+        retryq.enqueue(self._msg, self._msgdata)
+        runner = make_testable_runner(RetryRunner, 'retry')
+        parser = 'mailman.email.message.email.message_from_bytes'
+        with configuration('runner.out', queue_format='raw'):
+            with patch(parser) as parse:
+                runner.run()
+            items = get_queue_messages('out')
+        self.assertFalse(parse.called)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].msg['message-id'], '<first>')
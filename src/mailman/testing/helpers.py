@@ -294,7 +294,8 @@ def wait_for_webservice():
         raise RuntimeError('Connection refused')
 
 
-def call_api(url, data=None, method=None, username=None, password=None):
+def call_api(url, data=None, method=None, username=None, password=None,
+             headers=None):
     """'Call a URL with a given HTTP method and return the resulting object.
 
     The object will have been JSON decoded.
@@ -311,12 +312,14 @@ def call_api(url, data=None, method=None, username=None, password=None):
     :param password: The HTTP Basic Auth password.  None means use the value
         from the configuration.
     :type username: str
+    :param headers: Additional HTTP request headers.
+    :type headers: dict
     :return: A 2-tuple containing the JSON decoded content (if there is any,
         else None) and the response object.
     :rtype: 2-tuple of (dict, response)
     :raises HTTPError: when a non-2xx return code is received.
     """
-    headers = {}
+    headers = ({} if headers is None else dict(headers))
     if data is not None:
         data = urlencode(data, doseq=True)
         headers['Content-Type'] = 'application/x-www-form-urlencoded'
@@ -474,11 +477,12 @@ def reset_the_world():
     """
     # Reset the database between tests.
     config.db._reset()
-    # Remove any digest files and members.txt file (for the file-recips
-    # handler) in the lists' data directories.
+    # Remove any digest files and their indexes, and members.txt file (for
+    # the file-recips handler) in the lists' data directories.
     for dirpath, dirnames, filenames in os.walk(config.LIST_DATA_DIR):
         for filename in filenames:
-            if filename.endswith('.mmdf') or filename == 'members.txt':
+            if (filename.endswith(('.mmdf', '.mmdf.toc')) or
+                    filename == 'members.txt'):
                 os.remove(os.path.join(dirpath, filename))
     # Remove all residual queue files.
     for dirpath, dirnames, filenames in os.walk(config.QUEUE_DIR):
@@ -48,6 +48,7 @@ from mailman.core.initialize import INHIBIT_CONFIG_FILE
 from mailman.core.logging import get_handler
 from mailman.database.transaction import transaction
 from mailman.interfaces.domain import IDomainManager
+from mailman.mta.connection import close_pools
 from mailman.testing.helpers import (
     TestableMaster, get_lmtp_client, reset_the_world, wait_for_webservice)
 from mailman.testing.mta import ConnectionCountingController
@@ -253,6 +254,8 @@ class SMTPLayer(ConfigLayer):
 
     @classmethod
     def testTearDown(cls):
+        # Don't let pooled connections carry over into the next test.
+        close_pools()
         cls.smtpd.reset()
         cls.smtpd.clear()
 
@@ -62,6 +62,7 @@ class StatisticsChannel(Channel):
         else:
             self._SMTPChannel__greeting = arg
             self.push('250-%s' % self._SMTPChannel__fqdn)
+            self.push('250-PIPELINING')
             self.push('250 AUTH PLAIN')
 
     def smtp_STAT(self, arg):
@@ -0,0 +1,208 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Wait for new files to show up in a directory.
+
+On Linux this uses inotify through ctypes, so no third party package is
+needed.  Everywhere else, or when inotify cannot be initialized, the watcher
+simply sleeps for the given timeout, which gives the old polling behavior.
+"""
+
+__all__ = [
+    'DirectoryWatcher',
+    ]
+
+
+import os
+import errno
+import time
+import ctypes
+import select
+import struct
+import logging
+import ctypes.util
+
+
+# Constants from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+elog = logging.getLogger('mailman.error')
+
+
+
+def _load_libc():
+    name = ctypes.util.find_library('c')
+    if name is None:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        # Make sure the inotify entry points actually exist.
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+
+class DirectoryWatcher:
+    """Block until new files appear in a directory, or a timeout expires."""
+
+    def __init__(self, path, extension=None):
+        """Start watching a directory.
+
+        :param path: The directory to watch.
+        :type path: str
+        :param extension: If given, only files with this extension (e.g.
+            '.pck') count as new files.
+        :type extension: str or None
+        """
+        self.path = path
+        self.extension = extension
+        self._fd = None
+        # New file names seen by wait() but not yet handed out by collect().
+        self._pending = []
+        self._overflowed = False
+        libc = _load_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            elog.error('inotify_init1() failed for %s: %s',
+                       path, os.strerror(ctypes.get_errno()))
+            return
+        wd = libc.inotify_add_watch(
+            fd, os.fsencode(path), IN_MOVED_TO | IN_CLOSE_WRITE)
+        if wd < 0:
+            elog.error('inotify_add_watch() failed for %s: %s',
+                       path, os.strerror(ctypes.get_errno()))
+            os.close(fd)
+            return
+        self._fd = fd
+
+    @property
+    def is_notifying(self):
+        """True when file system notifications are in use."""
+        return self._fd is not None
+
+    def _read_names(self):
+        """Drain the pending events and return the affected file names.
+
+        None is returned if the kernel's event queue overflowed, in which
+        case the caller must assume anything could have changed.
+        """
+        names = []
+        overflowed = False
+        while True:
+            try:
+                buf = os.read(self._fd, READ_SIZE)
+            except OSError as error:
+                if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            offset = 0
+            while offset < len(buf):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(
+                    buf, offset)
+                offset += EVENT_HEADER.size
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                name = buf[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if len(name) > 0:
+                    names.append(os.fsdecode(name))
+        return None if overflowed else names
+
+    def _drain(self):
+        """Read pending events, remembering the matching new file names.
+
+        :return: True if any matching file showed up, or if the kernel's
+            event queue overflowed.
+        :rtype: bool
+        """
+        names = self._read_names()
+        if names is None:
+            self._overflowed = True
+            return True
+        if self.extension is not None:
+            names = [name for name in names
+                     if os.path.splitext(name)[1] == self.extension]
+        self._pending.extend(names)
+        return len(names) > 0
+
+    def wait(self, timeout):
+        """Wait for new files to show up in the directory.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: True if new files may have arrived, or if a signal
+            interrupted the wait, False if the timeout expired without any
+            activity.
+        :rtype: bool
+        """
+        if self._fd is None:
+            time.sleep(timeout)
+            return True
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            try:
+                readable, writable, errors = select.select(
+                    [self._fd], [], [], remaining)
+            except InterruptedError:
+                # Python 3.4 doesn't retry select() after a signal.  Return,
+                # so that the runner can see whether it has been stopped.
+                return True
+            if not readable:
+                return False
+            if self._drain():
+                return True
+
+    def collect(self):
+        """Return the names of the files that appeared since the last call.
+
+        :return: The new file names, in the order the kernel reported them,
+            or None if that information isn't available, either because
+            inotify isn't being used or because events were lost.  In that
+            case the caller has to rescan the directory.
+        :rtype: list of str, or None
+        """
+        if self._fd is None:
+            return None
+        self._drain()
+        names = self._pending
+        self._pending = []
+        if self._overflowed:
+            self._overflowed = False
+            return None
+        return names
+
+    def close(self):
+        """Stop watching the directory."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -19,9 +19,16 @@
 
 __all__ = [
     'Mailbox',
+    'index_path',
     ]
 
 
+import os
+import json
+
+from email.message import Message
+
+
 # Use a single file format for the digest mailbox because this makes it easier
 # to calculate the current size of the mailbox.  This way, we don't have to
 # carry around or store the size of the mailbox, we can just stat the file to
@@ -31,9 +38,26 @@ __all__ = [
 from mailbox import MMDF
 
 
+
+def index_path(path):
+    """The path of a mailbox's table of contents index.
+
+    :param path: The path to the mailbox.
+    :type path: string
+    :return: The path to the mailbox's index.
+    :rtype: string
+    """
+    return path + '.toc'
+
+
 
 class Mailbox(MMDF):
-    """A mailbox that interoperates with the 'with' statement."""
+    """A mailbox that interoperates with the 'with' statement.
+
+    Along with the messages, the mailbox keeps an index of their Subject and
+    From headers in a side file, so that a digest's table of contents can be
+    built without parsing every message.
+    """
 
     def __enter__(self):
         self.lock()
@@ -44,3 +68,54 @@ class Mailbox(MMDF):
         self.unlock()
         # Don't suppress the exception.
         return False
+
+    def add(self, message):
+        """See `mailbox.Mailbox`."""
+        key = super().add(message)
+        if not isinstance(message, Message):
+            # Messages can also be added as strings, bytes or files.
+            message = self.get_message(key)
+        entry = [message.get(header) for header in ('subject', 'from')]
+        entry = [None if value is None else str(value) for value in entry]
+        with open(index_path(self._path), 'a', encoding='utf-8') as fp:
+            print(json.dumps(entry), file=fp)
+        return key
+
+    def remove(self, key):
+        """See `mailbox.Mailbox`."""
+        super().remove(key)
+        self._discard_index()
+
+    def __setitem__(self, key, message):
+        """See `mailbox.Mailbox`."""
+        super().__setitem__(key, message)
+        self._discard_index()
+
+    def _discard_index(self):
+        # The index can only be appended to, so once the messages change in
+        # any other way, it's useless.
+        try:
+            os.remove(index_path(self._path))
+        except FileNotFoundError:
+            pass
+
+    def get_index(self):
+        """Return the Subject and From headers of all the messages.
+
+        :return: The raw Subject and From header values of the messages, in
+            order, with None for missing headers.  If the index is missing
+            or doesn't match the messages, None is returned instead, and the
+            headers must be read from the messages themselves.
+        :rtype: list of 2-tuples, or None
+        """
+        try:
+            with open(index_path(self._path), encoding='utf-8') as fp:
+                entries = [tuple(json.loads(line)) for line in fp]
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # A partially written entry.
+            return None
+        if len(entries) != len(self):
+            return None
+        return entries
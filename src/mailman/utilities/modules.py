@@ -18,9 +18,11 @@
 """Package and module utilities."""
 
 __all__ = [
+    'LazyComponent',
     'call_name',
     'expand_path',
     'find_components',
+    'find_lazy_components',
     'find_name',
     'scan_module',
     ]
@@ -28,10 +30,19 @@ __all__ = [
 
 import os
 import sys
+import json
 
+from mailman.utilities.startup import profile
+from mailman.version import VERSION
 from pkg_resources import resource_filename, resource_listdir
 
 
+# The component registry cache file, in each package's __pycache__ directory.
+REGISTRY_CACHE = 'mailman-components.json'
+# Bump this when the registry cache's format changes.
+REGISTRY_FORMAT = 2
+
+
 
 def find_name(dotted_name):
     """Import and return the named object in package space.
@@ -84,12 +95,135 @@ def scan_module(module, interface):
 
 
 
+def _scan_package(package, basenames, interface, attributes):
+    # Import all the modules in the package, and return the components found
+    # in them as [module name, object name, attribute values] entries.
+    entries = []
+    missing = object()
+    for basename in basenames:
+        module_name = '{0}.{1}'.format(package, basename)
+        __import__(module_name, fromlist='*')
+        module = sys.modules[module_name]
+        if not hasattr(module, '__all__'):
+            continue
+        # Like scan_module(), but remember the names too.
+        for name in module.__all__:
+            component = getattr(module, name, missing)
+            assert component is not missing, (
+                '%s has bad __all__: %s' % (module, name))
+            if interface.implementedBy(component):
+                values = {attribute: getattr(component, attribute)
+                          for attribute in attributes}
+                entries.append([module_name, name, values])
+    return entries
+
+
+def _load_components(entries, interface):
+    # Import the modules the entries name, and return their components.
+    # Return None if any of them has disappeared.
+    components = []
+    for module_name, name, values in entries:
+        try:
+            __import__(module_name, fromlist='*')
+        except ImportError:
+            return None
+        component = getattr(sys.modules[module_name], name, None)
+        if component is None or not interface.implementedBy(component):
+            return None
+        components.append(component)
+    return components
+
+
+def _registry_key(directory, basenames):
+    # The registry cache is valid for the same version of Mailman, on the
+    # same Python implementation, with the same modules as when it was made.
+    mtimes = {}
+    for basename in basenames:
+        path = os.path.join(directory, basename + '.py')
+        mtimes[basename] = os.stat(path).st_mtime
+    return dict(
+        format=REGISTRY_FORMAT,
+        version=VERSION,
+        cache_tag=sys.implementation.cache_tag,
+        mtimes=mtimes,
+        )
+
+
+def _read_registry(cache_path):
+    try:
+        with open(cache_path) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_registry(cache_path, registry):
+    # Write the cache atomically since other processes may be starting up.
+    # Like byte-compiled files, the cache is an optimization only, so it's
+    # not an error if it can't be written.
+    tmp_path = '{0}.{1}'.format(cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'w') as fp:
+            json.dump(registry, fp)
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _component_entries(package, interface, attributes=(), rescan=False):
+    # Return the entries for the package's components, and whether they came
+    # from the registry cache.  The entries record at least the values of
+    # the given attributes.
+    basenames = []
+    for filename in resource_listdir(package, ''):
+        basename, extension = os.path.splitext(filename)
+        if extension == '.py':
+            basenames.append(basename)
+    directory = resource_filename(package, '')
+    if not os.path.isdir(directory):
+        # The package isn't in the file system, so don't cache anything.
+        return _scan_package(package, basenames, interface, attributes), False
+    cache_path = os.path.join(directory, '__pycache__', REGISTRY_CACHE)
+    interface_name = '{0}.{1}'.format(
+        interface.__module__, interface.__name__)
+    key = _registry_key(directory, basenames)
+    registry = _read_registry(cache_path)
+    if (registry is None or
+            registry.get('key', {}).get('format') != REGISTRY_FORMAT):
+        registry = dict(key=None, interfaces={})
+    entries = registry['interfaces'].get(interface_name)
+    # Keep recording the attributes that have been asked for before, even
+    # when the package has changed since.
+    recorded = set(attributes)
+    for module_name, name, values in (entries or []):
+        recorded.update(values)
+    if (registry['key'] == key and entries is not None and not rescan and
+            all(recorded.issubset(values)
+                for module_name, name, values in entries)):
+        return entries, True
+    if registry['key'] != key:
+        registry = dict(key=key, interfaces={})
+    entries = _scan_package(package, basenames, interface, sorted(recorded))
+    registry['interfaces'][interface_name] = entries
+    _write_registry(cache_path, registry)
+    return entries, False
+
+
 def find_components(package, interface):
     """Find components which conform to a given interface.
 
     Search all the modules in a given package, returning an iterator over all
     objects found that conform to the given interface.
 
+    The components found in a package are remembered in a registry cache
+    file in the package's `__pycache__` directory.  As long as the package's
+    modules and the Mailman version don't change, only the modules which
+    contain components are imported.
+
     :param package: The package path to search.
     :type package: string
     :param interface: The interface that returned objects must conform to.
@@ -97,17 +231,72 @@ def find_components(package, interface):
     :return: The sequence of matching components.
     :rtype: objects implementing `interface`
     """
-    for filename in resource_listdir(package, ''):
-        basename, extension = os.path.splitext(filename)
-        if extension != '.py':
-            continue
-        module_name = '{0}.{1}'.format(package, basename)
-        __import__(module_name, fromlist='*')
-        module = sys.modules[module_name]
-        if not hasattr(module, '__all__'):
-            continue
-        for component in scan_module(module, interface):
-            yield component
+    with profile.phase('find_components: {0}'.format(package)):
+        entries, cached = _component_entries(package, interface)
+        components = _load_components(entries, interface)
+        if components is None and cached:
+            entries, cached = _component_entries(
+                package, interface, rescan=True)
+            components = _load_components(entries, interface)
+    yield from components
+
+
+
+class LazyComponent:
+    """A component which is only imported when it is first used."""
+
+    def __init__(self, module_name, name, attributes):
+        """Create a lazy component.
+
+        :param module_name: The name of the component's module.
+        :type module_name: str
+        :param name: The component's name in its module.
+        :type name: str
+        :param attributes: The values of some of the component's attributes,
+            which are available without importing it.
+        :type attributes: dict
+        """
+        self.module_name = module_name
+        self.name = name
+        self.attributes = attributes
+
+    def load(self):
+        """Import the component.
+
+        :return: The component.
+        :rtype: object
+        """
+        return find_name('{0}.{1}'.format(self.module_name, self.name))
+
+    def __repr__(self):
+        return '<LazyComponent {0}.{1}>'.format(self.module_name, self.name)
+
+
+
+def find_lazy_components(package, interface, attributes=()):
+    """Find components which conform to a given interface, lazily.
+
+    This is like `find_components()`, except that the components aren't
+    imported.  Instead, the values of the given attributes of each component
+    are recorded in the package's registry cache, so that those values can
+    be used without importing the component.  Only when the registry cache
+    is out of date are the package's modules imported.
+
+    :param package: The package path to search.
+    :type package: string
+    :param interface: The interface that the components conform to.
+    :type interface: `Interface`
+    :param attributes: The names of the component attributes to record.
+        Their values must be serializable as JSON.
+    :type attributes: sequence of str
+    :return: The sequence of matching components.
+    :rtype: `LazyComponent`
+    """
+    with profile.phase('find_lazy_components: {0}'.format(package)):
+        entries, cached = _component_entries(package, interface, attributes)
+    for module_name, name, values in entries:
+        yield LazyComponent(module_name, name, {
+            attribute: values[attribute] for attribute in attributes})
 
 
 
@@ -0,0 +1,115 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Sequences of query results."""
+
+__all__ = [
+    'QuerySequence',
+    ]
+
+
+from collections.abc import Sequence
+from sqlalchemy import and_, or_
+
+
+
+class QuerySequence(Sequence):
+    """A sequence of the results of a query, loaded as they are needed.
+
+    Indexing or slicing the sequence loads just those results, with OFFSET
+    and LIMIT, and its length is counted in the database.  The sequence can
+    also be paged through by key, which stays fast for deep pages.
+    """
+
+    def __init__(self, query, keys, prepare=None):
+        """Create a query sequence.
+
+        :param query: The query.
+        :param keys: The column expressions to order the results by.  The
+            last one, or the combination, must be unique.
+        :type keys: sequence of column expressions
+        :param prepare: If given, it's called with each result as it is
+            loaded, and returns the sequence item.
+        :type prepare: callable
+        """
+        self._query = query.order_by(*keys)
+        self._keys = keys
+        self._prepare = prepare
+
+    def _items(self, results):
+        if self._prepare is None:
+            return list(results)
+        return [self._prepare(result) for result in results]
+
+    def __len__(self):
+        return self._query.order_by(None).count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                return self._items(self._query)[index]
+            start, stop = index.start, index.stop
+            if ((start is not None and start < 0) or
+                    (stop is not None and stop < 0)):
+                # OFFSET and LIMIT don't count from the end.
+                return self._items(self._query)[index]
+            return self._items(self._query[index])
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError('index out of range')
+        results = self._items(self._query[index:index + 1])
+        if len(results) == 0:
+            raise IndexError('index out of range')
+        return results[0]
+
+    def __iter__(self):
+        for result in self._query:
+            yield (result if self._prepare is None
+                   else self._prepare(result))
+
+    def page(self, count, after=None):
+        """Return the results following a key.
+
+        :param count: The most results to return.
+        :type count: int
+        :param after: The values of the ordering keys of the result to start
+            after, as returned by a previous call, or None to start at the
+            beginning.
+        :type after: sequence
+        :return: The results, and the values of the ordering keys of the last
+            one.  The latter is None if there can be no more results.
+        :rtype: 2-tuple of (list, list or None)
+        :raises ValueError: when `after` doesn't have a value for each of the
+            ordering keys.
+        """
+        query = self._query
+        if after is not None:
+            if len(after) != len(self._keys):
+                raise ValueError('Bad key: {0}'.format(after))
+            # (a, b) > (x, y) is spelled out, since not every database
+            # compares tuples.
+            query = query.filter(or_(*(
+                and_(*([self._keys[i] == after[i] for i in range(position)] +
+                       [self._keys[position] > after[position]]))
+                for position in range(len(self._keys))
+                )))
+        rows = query.add_columns(*self._keys).limit(count).all()
+        items = self._items(row[0] for row in rows)
+        if len(rows) < count or count == 0:
+            return items, None
+        return items, list(rows[-1][1:])
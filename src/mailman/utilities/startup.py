@@ -0,0 +1,172 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Start-up profiling.
+
+When the environment variable $MAILMAN_STARTUP_PROFILE names a file, the
+`mailman` package starts the profile as soon as it is imported, and
+`initialize()` writes the report to that file once Mailman is initialized.
+The report is a JSON object with the time taken by every initialization phase
+and every module import.
+"""
+
+__all__ = [
+    'PROFILE_ENVIRONMENT',
+    'StartupProfile',
+    'profile',
+    ]
+
+
+import os
+import sys
+import json
+import time
+import builtins
+
+from contextlib import contextmanager
+from importlib.util import resolve_name
+
+
+# The environment variable naming the report file.
+PROFILE_ENVIRONMENT = 'MAILMAN_STARTUP_PROFILE'
+
+
+
+class StartupProfile:
+    """Time the phases of initialization and the module imports."""
+
+    def __init__(self):
+        self.active = False
+        self._start = None
+        self._original_import = None
+        # The phases and imports, in the order they started.  Each is a list
+        # of [name, start offset, duration, depth]; imports also get their
+        # self time, which excludes the imports they caused.
+        self._phases = []
+        self._imports = []
+        self._phase_depth = 0
+        # Stack of [cumulative time of nested imports] for imports in
+        # progress.
+        self._import_stack = []
+
+    def start(self):
+        """Start profiling, and time module imports from now on."""
+        if self.active:
+            return
+        self.active = True
+        self._start = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        """Stop profiling."""
+        if not self.active:
+            return
+        self.active = False
+        builtins.__import__ = self._original_import
+        self._original_import = None
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase of the start-up, when profiling.
+
+        Phases may nest.
+
+        :param name: The name of the phase.
+        :type name: str
+        """
+        if not self.active:
+            yield
+            return
+        record = [name, time.perf_counter() - self._start, None,
+                  self._phase_depth]
+        self._phases.append(record)
+        self._phase_depth += 1
+        try:
+            yield
+        finally:
+            self._phase_depth -= 1
+            record[2] = time.perf_counter() - self._start - record[1]
+
+    def _import(self, name, globals=None, locals=None, fromlist=(),
+                level=0):
+        original_import = self._original_import
+        # Only imports which load a module are interesting.
+        try:
+            if level > 0:
+                package = (None if globals is None
+                           else globals.get('__package__'))
+                absolute_name = resolve_name('.' * level + name, package)
+            else:
+                absolute_name = name
+        except (ImportError, ValueError):
+            absolute_name = None
+        if (not self.active or absolute_name is None or
+                absolute_name in sys.modules):
+            return original_import(name, globals, locals, fromlist, level)
+        record = [absolute_name, time.perf_counter() - self._start, None,
+                  len(self._import_stack), None]
+        self._imports.append(record)
+        self._import_stack.append(0.0)
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            nested = self._import_stack.pop()
+            record[2] = time.perf_counter() - self._start - record[1]
+            record[4] = record[2] - nested
+            if len(self._import_stack) > 0:
+                self._import_stack[-1] += record[2]
+
+    def report(self):
+        """Return the profile report.
+
+        :return: The report, with the phases in the order they started and
+            the imports ordered by their self time, slowest first.
+        :rtype: dict
+        """
+        elapsed = (None if self._start is None
+                   else time.perf_counter() - self._start)
+        return dict(
+            argv=sys.argv,
+            pid=os.getpid(),
+            python=sys.version.split()[0],
+            elapsed=elapsed,
+            phases=[
+                dict(name=name, start=start, duration=duration, depth=depth)
+                for name, start, duration, depth in self._phases
+                ],
+            imports=[
+                dict(module=name, start=start, cumulative=cumulative,
+                     depth=depth, self=own)
+                for name, start, cumulative, depth, own in sorted(
+                    self._imports, key=lambda record: -(record[4] or 0))
+                ],
+            )
+
+    def write(self, path):
+        """Write the profile report.
+
+        :param path: The file to write the report to.
+        :type path: str
+        """
+        with open(path, 'w') as fp:
+            json.dump(self.report(), fp, indent=2, sort_keys=True)
+
+
+
+# The profile of this process.
+profile = StartupProfile()
@@ -0,0 +1,95 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the directory watcher."""
+
+__all__ = [
+    'TestDirectoryWatcher',
+    'TestPollingFallback',
+    ]
+
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from mailman.utilities.inotify import DirectoryWatcher
+from unittest.mock import patch
+
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp()
+        self._watcher = DirectoryWatcher(self._tempdir, '.pck')
+        if not self._watcher.is_notifying:
+            self._watcher.close()
+            shutil.rmtree(self._tempdir)
+            raise unittest.SkipTest('inotify is not available')
+
+    def tearDown(self):
+        self._watcher.close()
+        shutil.rmtree(self._tempdir)
+
+    def _touch(self, filename):
+        path = os.path.join(self._tempdir, filename)
+        with open(path + '.tmp', 'w') as fp:
+            print('x', file=fp)
+        os.rename(path + '.tmp', path)
+
+    def test_timeout_without_activity(self):
+        self.assertFalse(self._watcher.wait(0.01))
+
+    def test_wakeup_on_new_file(self):
+        self._touch('1+abc.pck')
+        start = time.time()
+        self.assertTrue(self._watcher.wait(10))
+        self.assertLess(time.time() - start, 5)
+
+    def test_ignore_other_extensions(self):
+        # Temporary files and files with other extensions don't wake us up.
+        self._touch('1+abc.bak')
+        self.assertFalse(self._watcher.wait(0.01))
+
+    def test_events_are_drained(self):
+        self._touch('1+abc.pck')
+        self._touch('2+abc.pck')
+        self.assertTrue(self._watcher.wait(10))
+        self.assertFalse(self._watcher.wait(0.01))
+
+    def test_interrupted(self):
+        # A signal ends the wait early.
+        with patch('mailman.utilities.inotify.select.select',
+                   side_effect=InterruptedError):
+            start = time.time()
+            self.assertTrue(self._watcher.wait(10))
+        self.assertLess(time.time() - start, 5)
+
+
+
+class TestPollingFallback(unittest.TestCase):
+    def test_no_inotify(self):
+        # Without inotify, the watcher just sleeps for the full timeout.
+        with patch('mailman.utilities.inotify._load_libc', return_value=None):
+            watcher = DirectoryWatcher(tempfile.gettempdir())
+        self.assertFalse(watcher.is_notifying)
+        with patch('mailman.utilities.inotify.time.sleep') as sleep:
+            self.assertTrue(watcher.wait(2.5))
+        sleep.assert_called_once_with(2.5)
+        watcher.close()
@@ -0,0 +1,194 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the package and module utilities."""
+
+__all__ = [
+    'TestFindComponents',
+    ]
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import importlib
+
+from mailman.interfaces.rules import IRule
+from mailman.utilities.modules import (
+    REGISTRY_CACHE, find_components, find_lazy_components)
+
+
+RULE = """\
+from mailman.interfaces.rules import IRule
+from zope.interface import implementer
+
+__all__ = ['{0}']
+
+@implementer(IRule)
+class {0}:
+    name = '{1}'
+"""
+
+NOT_A_RULE = """\
+__all__ = ['helper']
+
+def helper():
+    pass
+"""
+
+
+
+class TestFindComponents(unittest.TestCase):
+    """Test finding components, and the component registry cache."""
+
+    def setUp(self):
+        # Make a package of rules, in a temporary directory on sys.path.
+        self._tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._tempdir)
+        sys.path.insert(0, self._tempdir)
+        self.addCleanup(sys.path.remove, self._tempdir)
+        self._package_dir = os.path.join(self._tempdir, 'mmtestrules')
+        os.mkdir(self._package_dir)
+        self._write('__init__.py', '')
+        self._write('one.py', RULE.format('One', 'one'))
+        self._write('two.py', RULE.format('Two', 'two'))
+        self._write('helpers.py', NOT_A_RULE)
+        self.addCleanup(self._unimport)
+        self._cache_path = os.path.join(
+            self._package_dir, '__pycache__', REGISTRY_CACHE)
+
+    def _write(self, filename, contents, mtime=None):
+        path = os.path.join(self._package_dir, filename)
+        with open(path, 'w') as fp:
+            fp.write(contents)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        importlib.invalidate_caches()
+
+    def _unimport(self):
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'mmtestrules':
+                del sys.modules[name]
+
+    def _find(self):
+        return sorted(component.__name__ for component
+                      in find_components('mmtestrules', IRule))
+
+    def test_find_components(self):
+        self.assertEqual(self._find(), ['One', 'Two'])
+        self.assertIn('mmtestrules.helpers', sys.modules)
+
+    def test_registry_is_cached(self):
+        self.assertFalse(os.path.exists(self._cache_path))
+        self._find()
+        with open(self._cache_path) as fp:
+            registry = json.load(fp)
+        self.assertEqual(
+            sorted(registry['interfaces']['mailman.interfaces.rules.IRule']),
+            [['mmtestrules.one', 'One', {}], ['mmtestrules.two', 'Two', {}]])
+
+    def test_cached_registry_skips_other_modules(self):
+        # With the registry cached, the modules without components are not
+        # imported.
+        self._find()
+        self._unimport()
+        self.assertEqual(self._find(), ['One', 'Two'])
+        self.assertIn('mmtestrules.one', sys.modules)
+        self.assertNotIn('mmtestrules.helpers', sys.modules)
+
+    def test_new_module_invalidates_registry(self):
+        self._find()
+        self._unimport()
+        self._write('three.py', RULE.format('Three', 'three'))
+        self.assertEqual(self._find(), ['One', 'Three', 'Two'])
+
+    def test_changed_module_invalidates_registry(self):
+        self._find()
+        self._unimport()
+        # Make sure the module looks changed, even on file systems with a
+        # coarse modification time.
+        self._write('helpers.py', RULE.format('Helper', 'helper'),
+                    mtime=time.time() + 10)
+        self.assertEqual(self._find(), ['Helper', 'One', 'Two'])
+
+    def test_stale_registry_entry(self):
+        # The registry names a component which no longer exists, without the
+        # modules looking changed.  The package is scanned again.
+        self._find()
+        self._unimport()
+        with open(self._cache_path) as fp:
+            registry = json.load(fp)
+        registry['interfaces']['mailman.interfaces.rules.IRule'].append(
+            ['mmtestrules.helpers', 'helper', {}])
+        with open(self._cache_path, 'w') as fp:
+            json.dump(registry, fp)
+        self.assertEqual(self._find(), ['One', 'Two'])
+
+    def test_corrupt_registry(self):
+        self._find()
+        self._unimport()
+        with open(self._cache_path, 'w') as fp:
+            fp.write('{')
+        self.assertEqual(self._find(), ['One', 'Two'])
+
+    def test_unwritable_registry(self):
+        # The registry cache is only an optimization.
+        pycache = os.path.dirname(self._cache_path)
+        with open(pycache, 'w'):
+            pass
+        self.assertEqual(self._find(), ['One', 'Two'])
+        self.assertFalse(os.path.isdir(pycache))
+
+    def _find_lazy(self):
+        components = list(find_lazy_components(
+            'mmtestrules', IRule, ('name', '__doc__')))
+        return sorted(components, key=lambda component: component.name)
+
+    def test_lazy_components(self):
+        # Once the registry is cached, nothing is imported until the
+        # component is loaded.
+        self._find_lazy()
+        self._unimport()
+        one, two = self._find_lazy()
+        self.assertNotIn('mmtestrules.one', sys.modules)
+        self.assertEqual(one.attributes, dict(name='one', __doc__=None))
+        self.assertEqual(two.attributes, dict(name='two', __doc__=None))
+        self.assertEqual(one.load().__name__, 'One')
+        self.assertIn('mmtestrules.one', sys.modules)
+        self.assertNotIn('mmtestrules.two', sys.modules)
+
+    def test_attributes_are_recorded(self):
+        # The registry made by find_components() doesn't record the
+        # attributes, so the package gets scanned again.
+        self._find()
+        self._unimport()
+        one, two = self._find_lazy()
+        self.assertEqual(one.attributes['name'], 'one')
+        self.assertIn('mmtestrules.helpers', sys.modules)
+        # From now on, the attributes are recorded, even when only
+        # find_components() has scanned the package since.
+        self._unimport()
+        self._write('helpers.py', NOT_A_RULE, mtime=time.time() + 10)
+        self.assertEqual(self._find(), ['One', 'Two'])
+        self._unimport()
+        one, two = self._find_lazy()
+        self.assertEqual(two.attributes['name'], 'two')
+        self.assertNotIn('mmtestrules.two', sys.modules)
@@ -0,0 +1,110 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the query sequences."""
+
+__all__ = [
+    'TestQuerySequence',
+    ]
+
+
+import unittest
+
+from mailman.config import config
+from mailman.model.address import Address
+from mailman.testing.layers import ConfigLayer
+from mailman.utilities.queries import QuerySequence
+from sqlalchemy import event
+
+
+
+class TestQuerySequence(unittest.TestCase):
+    """Test the query sequences."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        # Add the addresses out of order.
+        for email in ('cris', 'anne', 'elle', 'bart', 'dave'):
+            config.db.store.add(Address('{0}@example.com'.format(email), ''))
+        config.db.store.flush()
+        self._sequence = QuerySequence(
+            config.db.store.query(Address), (Address.email, Address.id),
+            prepare=lambda address: address.email.split('@')[0])
+        self._statements = []
+        engine = config.db.engine
+        def record(conn, cursor, statement, *args):
+            self._statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', record)
+        self.addCleanup(event.remove, engine, 'before_cursor_execute', record)
+
+    def test_sequence(self):
+        self.assertEqual(len(self._sequence), 5)
+        self.assertEqual(list(self._sequence),
+                         ['anne', 'bart', 'cris', 'dave', 'elle'])
+        self.assertEqual(self._sequence[0], 'anne')
+        self.assertEqual(self._sequence[-1], 'elle')
+        self.assertEqual(self._sequence[-2:], ['dave', 'elle'])
+        self.assertEqual(self._sequence[::2], ['anne', 'cris', 'elle'])
+        with self.assertRaises(IndexError):
+            self._sequence[5]
+        with self.assertRaises(IndexError):
+            self._sequence[-6]
+
+    def test_slices_are_limited(self):
+        # Slices only load the items in them.
+        self.assertEqual(self._sequence[1:3], ['bart', 'cris'])
+        self.assertEqual(len(self._statements), 1)
+        self.assertIn('LIMIT', self._statements[0])
+        self.assertEqual(self._sequence[4:10], ['elle'])
+        self.assertEqual(self._sequence[5:10], [])
+
+    def test_count(self):
+        len(self._sequence)
+        self.assertEqual(len(self._statements), 1)
+        self.assertIn('count(', self._statements[0])
+
+    def test_page(self):
+        items, after = self._sequence.page(2)
+        self.assertEqual(items, ['anne', 'bart'])
+        self.assertEqual(after[0], 'bart@example.com')
+        items, after = self._sequence.page(2, after)
+        self.assertEqual(items, ['cris', 'dave'])
+        items, after = self._sequence.page(2, after)
+        self.assertEqual(items, ['elle'])
+        self.assertIsNone(after)
+
+    def test_page_exactly_at_the_end(self):
+        items, after = self._sequence.page(5)
+        self.assertEqual(len(items), 5)
+        items, after = self._sequence.page(5, after)
+        self.assertEqual(items, [])
+        self.assertIsNone(after)
+
+    def test_page_ties(self):
+        # The later keys break ties in the earlier ones.
+        sequence = QuerySequence(
+            config.db.store.query(Address),
+            (Address.display_name, Address.id))
+        items, after = sequence.page(3)
+        self.assertEqual(len(items), 3)
+        more, after = sequence.page(3, after)
+        self.assertEqual(len(more), 2)
+        self.assertEqual(set(items + more), set(sequence))
+
+    def test_bad_key(self):
+        self.assertRaises(ValueError, self._sequence.page, 2, ['anne'])
@@ -0,0 +1,93 @@
+# Copyright (C) 2015 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test the start-up profile."""
+
+__all__ = [
+    'TestStartupProfile',
+    ]
+
+
+import os
+import sys
+import json
+import builtins
+import tempfile
+import unittest
+
+from mailman.utilities.startup import StartupProfile
+
+
+
+class TestStartupProfile(unittest.TestCase):
+    """Test the start-up profile."""
+
+    def setUp(self):
+        self._profile = StartupProfile()
+        self.addCleanup(self._profile.stop)
+
+    def test_inactive(self):
+        original_import = builtins.__import__
+        with self._profile.phase('nothing'):
+            pass
+        self.assertIs(builtins.__import__, original_import)
+        self.assertEqual(self._profile.report()['phases'], [])
+
+    def test_phases(self):
+        self._profile.start()
+        with self._profile.phase('outer'):
+            with self._profile.phase('inner'):
+                pass
+        with self._profile.phase('next'):
+            pass
+        phases = self._profile.report()['phases']
+        self.assertEqual([(phase['name'], phase['depth']) for phase in phases],
+                         [('outer', 0), ('inner', 1), ('next', 0)])
+        self.assertGreaterEqual(phases[0]['duration'], phases[1]['duration'])
+
+    def test_imports(self):
+        # Only imports which load a module are recorded.
+        sys.modules.pop('colorsys', None)
+        self.addCleanup(sys.modules.pop, 'colorsys', None)
+        self._profile.start()
+        import os.path
+        import colorsys
+        self._profile.stop()
+        imports = self._profile.report()['imports']
+        self.assertEqual([record['module'] for record in imports],
+                         ['colorsys'])
+        self.assertGreaterEqual(imports[0]['cumulative'], imports[0]['self'])
+
+    def test_stop(self):
+        original_import = builtins.__import__
+        self._profile.start()
+        self.assertIsNot(builtins.__import__, original_import)
+        self._profile.stop()
+        self.assertIs(builtins.__import__, original_import)
+
+    def test_write(self):
+        self._profile.start()
+        with self._profile.phase('phase'):
+            pass
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self._profile.write(path)
+        with open(path) as fp:
+            report = json.load(fp)
+        self.assertEqual(report['phases'][0]['name'], 'phase')
+        self.assertEqual(report['pid'], os.getpid())